@@ -3,42 +3,24 @@ import json
 import requests
 import platform
 import subprocess
-import psutil
 import uuid
 import pandas as pd
 import os
-
-def calculate_average_cpu_usage(cpus_before, cpus_after):
-    total_idle_diff = 0
-    total_time_diff = 0
-
-    # Calculate the total idle and total time differences for all cores
-    for t0, t1 in zip(cpus_before, cpus_after):
-        # Calculate the difference in idle time
-        idle_diff = t1.idle - t0.idle
-
-        # Calculate the difference in total time
-        total_diff = (
-            (t1.user - t0.user) +
-            (t1.nice - t0.nice) +
-            (t1.system - t0.system) +
-            (t1.idle - t0.idle) +
-            (t1.iowait - t0.iowait) +
-            (t1.irq - t0.irq) +
-            (t1.softirq - t0.softirq) +
-            (t1.steal - t0.steal)
-        )
-
-        total_idle_diff += idle_diff
-        total_time_diff += total_diff
-
-    # Calculate the average CPU usage
-    if total_time_diff > 0:
-        average_usage = 100.0 * (1.0 - (total_idle_diff / total_time_diff))
-    else:
-        average_usage = 0.0
-
-    return round(average_usage, 2)
+import sys
+import argparse
+import itertools
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from benchmarkcommon import fleet
+from benchmarkcommon import matrix_plan
+from benchmarkcommon import payloads
+from benchmarkcommon import run_journal
+from benchmarkcommon import process_monitor
+from benchmarkcommon import results_store
+from benchmarkcommon import worker_client
+
+# Linux MAX_ARG_STRLEN
+MAX_ARGUMENT_BYTES = 128 * 1024
 
 def get_correct_answers(operations: list) -> dict:
     correct_answers = {}
@@ -51,11 +33,11 @@ def get_correct_answers(operations: list) -> dict:
 
     return correct_answers
 
-def get_testcase_inputs(operations: list) -> dict:
+def get_testcase_inputs(operations: list, inputs_dir: str = "../../TestArtifacts/AWS/inputs") -> dict:
     test_case_inputs = {}
 
     for operation in operations:
-        input_data_loc = f"../../TestArtifacts/AWS/inputs/{operation}.json"
+        input_data_loc = f"{inputs_dir}/{operation}.json"
         try:
             # Open and load the JSON content
             with open(input_data_loc, 'r') as file:
@@ -67,10 +49,16 @@ def get_testcase_inputs(operations: list) -> dict:
 
     return test_case_inputs
 
-def save_testcase_results(finished_test_cases: list, file_name: str) -> None:
+def save_testcase_results(finished_test_cases: list, results_store_root: str) -> None:
     """
-    Save the test case results to a CSV file using pandas.
+    Append the test case results to the results store as one run.
     """
+    # Convert list of dictionaries to a DataFrame
+    df = pd.DataFrame(testcase_result_rows(finished_test_cases))
+    
+    results_store.append(df, "ec2", results_store_root)
+
+def testcase_result_rows(finished_test_cases: list) -> list[dict]:
     # List to hold all rows of data
     data_rows = []
 
@@ -94,19 +82,30 @@ def save_testcase_results(finished_test_cases: list, file_name: str) -> None:
                 "avg_cpu_usage_percent": test_case_result.get("avg_cpu_usage", 0),
                 "max_memory_usage_mb": test_case_result.get("max_memory_usage", 0),
                 "avg_memory_usage_mb": test_case_result.get("avg_memory_usage", 0),
+                "user_cpu_ms": test_case_result.get("user_cpu_ms"),
+                "system_cpu_ms": test_case_result.get("system_cpu_ms"),
+                "rss_samples": test_case_result.get("rss_samples"),
+                "monitor_overhead_percent": test_case_result.get("monitor_overhead_percent"),
+                "execution_mode": test_case.get("execution_mode", "subprocess"),
+                "crypto_mode": test_case.get("crypto_mode", "remote"),
+                "batch_size": test_case.get("batch_size", 1),
+                "data_key_cache": test_case.get("data_key_cache", "off"),
+                "payload_bytes": test_case.get("payload_bytes", 0),
+                "stream_mode": test_case.get("stream_mode", "none"),
+                # Phase timings only exist in worker mode
+                "startup_ms": test_case_result.get("startup_ms"),
+                "import_ms": test_case_result.get("import_ms"),
+                "client_init_ms": test_case_result.get("client_init_ms"),
+                "remote_ms": test_case_result.get("remote_ms"),
+                "local_ms": test_case_result.get("local_ms"),
+                # Data key cache hits and misses of the AES workloads, also worker mode only
+                "data_key_hits": test_case_result.get("data_key_hits"),
+                "data_key_misses": test_case_result.get("data_key_misses"),
             }
 
             data_rows.append(data_row)
 
-    # Convert list of dictionaries to a DataFrame
-    df = pd.DataFrame(data_rows)
-    
-    # Save DataFrame to a CSV file
-    try:
-        df.to_csv(file_name, index=False)
-        print(f"Results successfully saved to {file_name}")
-    except Exception as e:
-        print(f"Failed to save results: {e}")
+    return data_rows
 
 # Just checking if the received response from execution matches the correct answer struct    
 def determine_result_tc(received_response: dict, correct_answer: dict):
@@ -135,7 +134,7 @@ def convert_dict_keys(input_dict):
     # Create a new dictionary with transformed keys
     return {to_pascal_case(key): value for key, value in input_dict.items()}
 
-def create_tc(arch_dir: str, language: str, operation: str, input: dict, correct_answer: dict, start_type: str, instance_type: str, iterations: int)-> dict:
+def create_tc(arch_dir: str, language: str, operation: str, input: dict, correct_answer: dict, start_type: str, instance_type: str, iterations: int, execution_mode: str = "subprocess", crypto_mode: str = "remote", batch_size: int = 1, data_key_cache: str = "off", payload_bytes: int = 0, stream_mode: str = "none", chunk_size: int = 64 * 1024, payload_dir: str = "./payloads")-> dict:
     # Get the base directory where the script is being executed
     base_dir = str(os.path.dirname(os.path.abspath(__file__)))
     new_file_base_str = f"iac-microbenchmark/ec2/{language}/{arch_dir}/{operation}"
@@ -169,6 +168,24 @@ def create_tc(arch_dir: str, language: str, operation: str, input: dict, correct
     if language == "c#":
         input = convert_dict_keys(input)
 
+    # The Python AES workloads stream a payload file of the given size in framed chunks instead of the message, see aes_stream.py
+    stream_file = None
+    prepare_input = []
+    if payload_bytes:
+        stream_file = payloads.payload_path(payload_bytes, payload_dir)
+        stream_request = {"stream_mode": stream_mode, "chunk_size": chunk_size, "output_file": os.devnull}
+        if operation == "aes256_decrypt":
+            # Encrypted once before the test case by the encrypt workload, with the test case's keys
+            plaintext_file = stream_file
+            stream_file = f"{plaintext_file}.{crypto_mode}.{stream_mode}.{chunk_size}.enc"
+            encrypt_location = os.path.join(os.path.dirname(settings["file_loc"]), "aes256_encrypt.py")
+            prepare_input = settings["command"].split() + [encrypt_location, json.dumps({**stream_request, "input_file": plaintext_file, "output_file": stream_file + ".partial"})]
+        input = {**stream_request, "input_file": stream_file}
+
+    # The Python workloads take a batch of inputs in one request, see request_batch.py
+    if batch_size > 1:
+        input = {"batch": [input] * batch_size}
+
     subprocess_input = []
 
     if settings["command"] == "":
@@ -183,6 +200,19 @@ def create_tc(arch_dir: str, language: str, operation: str, input: dict, correct
     # Always add input to the end.
     subprocess_input.append(json.dumps(input))
 
+    # Linux limits a single argument to 128 KiB, larger batches only fit through the worker's stdin
+    if execution_mode != "worker" and len(subprocess_input[-1].encode("utf-8")) >= MAX_ARGUMENT_BYTES:
+        print(f"The input of {operation} with batch size {batch_size} is too large for a command line argument, use --execution-mode worker")
+        exit(1)
+
+    # Only the Python workloads have a persistent worker so far, the others keep spawning a process per iteration
+    if execution_mode == "worker" and language != "python":
+        execution_mode = "subprocess"
+
+    worker_input = []
+    if execution_mode == "worker":
+        worker_input = settings["command"].split() + [os.path.join(os.path.dirname(file_executable_location), "benchmark_worker.py"), operation]
+
     # Build the test case
     test_case = {
         "id" : str(uuid.uuid4()), # generate a unique id for the test case
@@ -193,19 +223,48 @@ def create_tc(arch_dir: str, language: str, operation: str, input: dict, correct
         "operation" : operation,
         "language" : language,
         "architecture" : arch_dir,
-        "instance_type": instance_type
+        "instance_type": instance_type,
+        "execution_mode": execution_mode,
+        "crypto_mode": crypto_mode,
+        "batch_size": batch_size,
+        "data_key_cache": data_key_cache,
+        "payload_bytes": payload_bytes,
+        "stream_mode": stream_mode,
+        "payload_dir": payload_dir,
+        "stream_file": stream_file,
+        "prepare_input": prepare_input,
+        "worker_input": worker_input,
+        "worker_request": input
     }
 
     return test_case
 
-def execute_warmup(subprocess_input):
+def workload_environment(test_case: dict) -> dict:
+    # The Python workloads read CRYPTO_MODE and DATA_KEY_CACHE when creating their clients, see local_crypto.py and data_key_cache.py
+    return {**os.environ, "CRYPTO_MODE": test_case.get("crypto_mode", "remote"), "DATA_KEY_CACHE": test_case.get("data_key_cache", "off")}
+
+def prepare_payload(test_case: dict) -> None:
+    """
+    Write the payload file of a streaming test case, and for decrypt its encrypted stream, unless they exist.
+    """
+    if not test_case.get("payload_bytes"):
+        return
+
+    payloads.payload_file(test_case["payload_bytes"], test_case["payload_dir"])
+    if test_case["prepare_input"] and not os.path.exists(test_case["stream_file"]):
+        print(f"Encrypting {test_case['stream_file']}")
+        subprocess.run(test_case["prepare_input"], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, env=workload_environment(test_case), check=True)
+        os.replace(test_case["stream_file"] + ".partial", test_case["stream_file"])
+
+def execute_warmup(subprocess_input, env: dict = None):
     """Executes a warm-up operation using the provided subprocess input."""
     try:
-        # Use subprocess to run the executable
-        process = subprocess.Popen(
+        # Wait for the warmup to finish so it does not overlap with the measured iterations
+        subprocess.run(
             subprocess_input,
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env,
             shell=False
         )
         
@@ -215,82 +274,40 @@ def execute_warmup(subprocess_input):
         raise e
     
 
-def execute_tc(test_case: dict) -> list:
+def execute_tc(test_case: dict, sample_interval_ms: float = 5.0) -> list:
     subprocess_input = test_case["subprocess_input"]
+    env = workload_environment(test_case)
     test_case_results = []
 
     # Retrieve how many times we need to run this test case
     num_iterations = test_case["iterations"]
 
-    # Check if we need to do a warm-up, execute the operations 50 times to warm up
+    # Check if we need to do a warm-up, execute the operations 10 times to warm up
     if test_case["start_type"] == "warm":
         print("Begin Warmup")
         for i in range(0, 10):
-            execute_warmup(subprocess_input)
+            execute_warmup(subprocess_input, env)
         print("Finished Warmup")
     else:
         print("No Warmup")
 
     for iteration in range(num_iterations):
         print(f"Test Case Iteration: {iteration}")
-        start_time = 0.0
-        end_time = 0.0
-        mem_usage_samples = []  # to store memory usage samples
 
         # Final result dict
         singular_test_case_result = {}
 
-        # Start the timer
-        start_time = time.perf_counter()
-
-        # record times before execution 
-        cpus_before = psutil.cpu_times(percpu=True)
-
-        # Use subprocess to run the operation
-        process = subprocess.Popen(
-            subprocess_input,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=False
-        )
-
-        # Create a process object for tracking memory
-        process_psutil = psutil.Process(process.pid)
-
+        # Run the operation, sampling its memory on a background thread
         try:
-            # Monitor the process while it's running
-            while True:  # While the script is still running
-                if process_psutil.is_running() and not process_psutil.status() == psutil.STATUS_ZOMBIE:
-                    
-                    # Update memory samples
-                    mem_usage_samples.append(process_psutil.memory_info().rss)
-                else:
-                    # After process finishes, record the end time of execution
-                    end_time = time.perf_counter()
-                    break
+            monitored = process_monitor.run_monitored(subprocess_input, sample_interval_ms / 1000, env)
         except Exception as e:
-            process.kill()  # Ensure the process is killed in case of any exception
             print(f"Error occurred: {e}")
             exit(1)
 
-        # Capture the second snapshot of CPU times
-        cpus_after = psutil.cpu_times(percpu=True)
-
-        average_cpu_usage = calculate_average_cpu_usage(cpus_before, cpus_after)
-
-        execution_time = end_time - start_time
-
-        # Calculate average and max memory usage
-        average_mem_usage = sum(mem_usage_samples) / len(mem_usage_samples) if mem_usage_samples else 0
-
-        max_mem = max(mem_usage_samples)
-
-        # Retrieve the process output
-        stdout, stderr = process.communicate()
+        stdout = monitored["stdout"]
+        stderr = monitored["stderr"]
 
         if stderr.decode() != "":
-            print(type(stderr))
             print(f"stderr: {stderr.decode()}")
 
         # Grab the function's output for verification
@@ -305,10 +322,14 @@ def execute_tc(test_case: dict) -> list:
             test_case_output = {}
 
         # Compile results into dict
-        singular_test_case_result["execution_time"] = execution_time * 1000  # Convert to ms
-        singular_test_case_result["avg_cpu_usage"] = average_cpu_usage  # in % float
-        singular_test_case_result["max_memory_usage"] = max_mem / (1024 ** 2)  # Convert to MB
-        singular_test_case_result["avg_memory_usage"] = average_mem_usage / (1024 ** 2)  # Convert to MB
+        singular_test_case_result["execution_time"] = monitored["wall_ms"]  # in ms
+        singular_test_case_result["avg_cpu_usage"] = round(monitored["cpu_percent"], 2)  # in % of one core, process only
+        singular_test_case_result["max_memory_usage"] = monitored["peak_rss_mb"]  # in MB, from wait4 rusage
+        singular_test_case_result["avg_memory_usage"] = monitored["avg_rss_mb"]  # in MB, from the sampler
+        singular_test_case_result["user_cpu_ms"] = monitored["user_cpu_ms"]
+        singular_test_case_result["system_cpu_ms"] = monitored["system_cpu_ms"]
+        singular_test_case_result["rss_samples"] = monitored["rss_samples"]
+        singular_test_case_result["monitor_overhead_percent"] = monitored["monitor_overhead_percent"]
         singular_test_case_result["iteration"] = iteration  # int
         singular_test_case_result["test_case_id"] = test_case["id"]
 
@@ -316,13 +337,45 @@ def execute_tc(test_case: dict) -> list:
 
     return test_case_results
 
-def main():
+def ec2_case_key(test_case: dict) -> str:
+    # The uuid "id" changes on every start, so it is not part of the key
+    return run_journal.case_key(test_case, ["language", "operation", "start_type", "architecture", "instance_type", "iterations", "execution_mode", "crypto_mode", "batch_size", "data_key_cache", "payload_bytes", "stream_mode"])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AWS EC2 Benchmark Runner")
+    parser.add_argument("--execution-mode", choices=["subprocess", "worker"], default="subprocess", help="worker: time requests against a persistent worker instead of a process per iteration (Python only)")
+    parser.add_argument("--sample-interval-ms", type=float, default=5.0, help="RSS sampling interval of the process monitor")
+    parser.add_argument("--results-store", default=results_store.DEFAULT_ROOT, help="Parquet results store the results are appended to")
+    parser.add_argument("--crypto-modes", default="remote", help="Comma separated crypto modes to run: remote (KMS), local (in process) and public_key (verify and RSA encrypt in process with the fetched public key), non-remote modes are Python only, see local_crypto.py")
+    parser.add_argument("--batch-sizes", default="1", help="Comma separated inputs per request, batches above 1 are Python only, see request_batch.py")
+    parser.add_argument("--data-key-cache", default="off", help="Comma separated data key cache settings to run (off,on), on reuses data keys across the messages of a worker or batch, AES Python workloads only, see data_key_cache.py")
+    parser.add_argument("--payload-sizes", default="input", help="Comma separated AES payloads: input (the operation's input) and sizes like 1KB,1MB,1GB, streamed from a file in framed chunks by the Python AES workloads, see aes_stream.py")
+    parser.add_argument("--stream-modes", default="gcm", help="Comma separated stream modes of the payload sizes: gcm (authenticated chunks) and ctr")
+    parser.add_argument("--chunk-size", default="64KB", help="Chunk size of the streamed payloads")
+    parser.add_argument("--payload-dir", default="./payloads", help="Payload files and their encrypted streams, written on first use")
+    parser.add_argument("--inputs-dir", default="../../TestArtifacts/AWS/inputs", help="Operation inputs, e.g. the ones made by kms_emulator prepare-inputs")
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--journal", default="./ec2-run-journal.sqlite", help="SQLite run journal, finished test cases are skipped when the runner is restarted")
+    parser.add_argument("--matrix", default=None, help="Matrix spec (TOML) replacing the languages, operations and start types below, see benchmarkcommon/matrix_plan.py")
+    parser.add_argument("--shard", default=None, help="With --matrix: run shard i/n of the plan on this host, e.g. 2/4")
+    parser.add_argument("--plan-only", action="store_true", help="With --matrix: print the plan's time and cost estimate and exit")
+    parser.add_argument("--fleet-url", default=None, help="Fleet coordinator the results are sent to instead of the local results store, set by python -m benchmarkcommon.fleet worker")
+    parser.add_argument("--fleet-pool", default="default", help="Fleet pool of the worker running this shard, set by python -m benchmarkcommon.fleet worker")
+    args = parser.parse_args()
+    if (args.shard or args.plan_only) and not args.matrix:
+        parser.error("--shard and --plan-only need --matrix")
+    return args
+
+def main(args):
 
     # Get Architecture
     architecture = platform.machine()
 
     #instance_type = get_instance_type()
     instance_type = "TEST"
+    # The pools of a fleet run are told apart by the real instance type in the saved rows
+    if args.fleet_url:
+        instance_type = get_instance_type()
 
     if architecture == "x86_64":
         arch_dir = "x86"
@@ -363,38 +416,70 @@ def main():
         "warm"
     ]
 
+    # A matrix spec replaces the lists above
+    matrix = None
+    if args.matrix:
+        matrix = matrix_plan.load_matrix(args.matrix, "ec2", {"languages": languages, "operations": operations, "start_types": start_options,
+                                                              "iterations": args.iterations})
+        languages, operations, start_options = matrix["languages"], matrix["operations"], matrix["start_types"]
+
     # Key is operation, value is json containing answers
     correct_answers = get_correct_answers(operations)
     print("Succesful loading of correct answers")
 
     # Key is operation, value is json containing inputs
-    test_case_inputs = get_testcase_inputs(operations)
+    test_case_inputs = get_testcase_inputs(operations, args.inputs_dir)
     print("Succesful loading of operation inputs")
 
     test_cases = []
-    iterations = 1
-
-    # To save the results
-    save_result_file_name = f"./{architecture}-{instance_type}-AWSEC2-Benchmarkresults.csv"
+    iterations = matrix["iterations"] if matrix else args.iterations
 
-    finished_test_cases = []
+    crypto_modes = args.crypto_modes.split(",")
+    batch_sizes = [int(batch_size) for batch_size in args.batch_sizes.split(",")]
+    data_key_cache_settings = args.data_key_cache.split(",")
+    payload_variants = payloads.variants(args.payload_sizes, args.stream_modes)
+    chunk_size = payloads.parse_size(args.chunk_size)
 
     # First we need to create the testcases themselves
     for language in languages:
         for operation in operations:
             for start_option in start_options:
-                # Get operation's input
-                test_case_input = test_case_inputs[operation]
-
-                # get operation's correct_answer
-                correct_answer = correct_answers[operation]
-
-                new_test_case = create_tc(arch_dir,language,operation, test_case_input,correct_answer,start_option, instance_type, iterations)
-
-                test_cases.append(new_test_case)
+                for crypto_mode, batch_size, data_key_cache, (payload_bytes, stream_mode) in itertools.product(crypto_modes, batch_sizes, data_key_cache_settings, payload_variants):
+                    # Only the Python workloads have a local crypto mode and batch requests
+                    if (crypto_mode != "remote" or batch_size != 1) and language != "python":
+                        continue
+                    # public_key only changes verify and RSA encrypt
+                    if not results_store.runs_crypto_mode(crypto_mode, operation):
+                        continue
+                    # and only their AES workloads use data keys and stream payloads (one per request)
+                    if (data_key_cache != "off" or payload_bytes) and (language != "python" or not operation.startswith("aes256")):
+                        continue
+                    if payload_bytes and batch_size != 1:
+                        continue
+                    if not matrix_plan.selected(matrix, {"language": language, "operation": operation, "start_type": start_option, "architecture": arch_dir,
+                                                         "instance_type": instance_type, "crypto_mode": crypto_mode, "batch_size": batch_size, "data_key_cache": data_key_cache,
+                                                         "payload_bytes": payload_bytes, "stream_mode": stream_mode}):
+                        continue
+
+                    # Get operation's input
+                    test_case_input = test_case_inputs[operation]
+
+                    # get operation's correct_answer
+                    correct_answer = correct_answers[operation]
+
+                    new_test_case = create_tc(arch_dir,language,operation, test_case_input,correct_answer,start_option, instance_type, iterations, args.execution_mode, crypto_mode, batch_size, data_key_cache,
+                                              payload_bytes, stream_mode, chunk_size, args.payload_dir)
+
+                    test_cases.append(new_test_case)
 
     print("Finished Initialization")
 
+    # This host's shard only, every cold iteration is a new process so there is no idle time to wait for
+    if matrix:
+        test_cases = matrix_plan.plan_run(test_cases, matrix, lambda test_case: f"{test_case['language']}/{test_case['operation']}", args.shard)
+        if args.plan_only:
+            exit(0)
+
     print("")
     print("")
 
@@ -402,8 +487,15 @@ def main():
     print(f"Architecture: {architecture}")
     print(f"Instance Type: {instance_type}")
 
+    journal = run_journal.RunJournal(args.journal)
+    journal.register([ec2_case_key(test_case) for test_case in test_cases])
+    print(f"Run journal {args.journal}: {journal.summary()}")
 
     for test_case in test_cases:
+        key = ec2_case_key(test_case)
+        if not journal.needs_execution(key):
+            continue
+
         test_case_operation = test_case["operation"]
         test_case_language = test_case["language"]
         test_case_start_type = test_case["start_type"]
@@ -412,12 +504,27 @@ def main():
         print(f">Operation: {test_case_operation}")
         print(f">Language: {test_case_language}")
         print(f">Start Type: {test_case_start_type}")
+        print(f">Execution Mode: {test_case['execution_mode']}")
+        print(f">Crypto Mode: {test_case['crypto_mode']}")
+        print(f">Batch Size: {test_case['batch_size']}")
+        print(f">Data Key Cache: {test_case['data_key_cache']}")
+        if test_case["payload_bytes"]:
+            print(f">Payload: {payloads.format_size(test_case['payload_bytes'])} ({test_case['stream_mode']})")
 
         # Execute Test Case
-        test_case_result = execute_tc(test_case)
+        journal.mark_running(key)
+        prepare_payload(test_case)
+        if test_case["execution_mode"] == "worker":
+            test_case_result = worker_client.execute_tc_worker(test_case, workload_environment(test_case))
+        else:
+            test_case_result = execute_tc(test_case, args.sample_interval_ms)
+
+        # Checkpoint the raw results straight away so a restart resumes after this test case
+        journal.mark_done(key, {"test_case": test_case, "results": test_case_result})
 
-        # Save a tuple containing the results and the test case into a list to save for later
-        finished_test_cases.append((test_case_result,test_case))
+        # A fleet run sends every finished test case to the coordinator straight away (see fleet.py)
+        if args.fleet_url and fleet.submit_results(args.fleet_url, args.fleet_pool, "ec2", key, testcase_result_rows([(test_case_result, test_case)])):
+            journal.mark_exported([key])
         print("Finished Test Case.")
         print("---------------------------------------")
         print("")
@@ -426,12 +533,42 @@ def main():
 
     print("Finished AWS EC2 Benchmark Runner")
 
-    save_testcase_results(finished_test_cases, save_result_file_name)
-    
-    print(f"Saved Results to file: {save_result_file_name}")
+    # Every save appends a new run to the store, so only finished test cases not saved by an earlier run are written
+    finished_test_cases = []
+    exported_keys = []
+    for test_case in test_cases:
+        key = ec2_case_key(test_case)
+        if journal.state(key) == run_journal.DONE and not journal.is_exported(key):
+            finished = journal.results(key)
+            finished_test_cases.append((finished["results"], finished["test_case"]))
+            exported_keys.append(key)
+
+    print(f"Run journal {args.journal}: {journal.summary()}")
+
+    if args.fleet_url:
+        # The coordinator could not take these earlier, what it still cannot take is kept in the local store
+        unsent = [(finished, key) for finished, key in zip(finished_test_cases, exported_keys)
+                  if not fleet.submit_results(args.fleet_url, args.fleet_pool, "ec2", key, testcase_result_rows([finished]))]
+        if unsent:
+            # The shard still counts as done, another host running it again would measure these cases a second time
+            print(f"{len(unsent)} test cases were not sent to the fleet coordinator, saving them to {args.results_store}")
+            save_testcase_results([finished for finished, _ in unsent], args.results_store)
+        else:
+            print("Results were sent to the fleet coordinator.")
+        journal.mark_exported(exported_keys)
+        journal.close()
+        exit(0)
+
+    if finished_test_cases:
+        save_testcase_results(finished_test_cases, args.results_store)
+        journal.mark_exported(exported_keys)
+    else:
+        print("Nothing new to save, results were saved by an earlier run.")
+
+    journal.close()
 
     exit(0)
 
 if __name__ == "__main__":
     print("Begin Initialization of AWS EC2 Benchmark runner")
-    main()
+    main(parse_args())
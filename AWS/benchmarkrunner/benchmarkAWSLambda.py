@@ -1,17 +1,49 @@
 import boto3
+from botocore.config import Config
 import time
 import json
 import requests
-import re
+import os
+import sys
+import argparse
+import itertools
 from datetime import datetime, timezone
 import pandas as pd
 
+# Shared runner helpers live in benchmarkcommon at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from benchmarkcommon import async_runner
+from benchmarkcommon import client_timing
+from benchmarkcommon import load_generator
+from benchmarkcommon import matrix_plan
+from benchmarkcommon import payloads
+from benchmarkcommon import results_store
+from benchmarkcommon import run_journal
+from benchmarkcommon import wire_format
+import cloudwatch_reports
+import cold_start_driver
+
 # Initialize a boto3 client for CloudWatch Logs
 cloudwatch_logs_client = boto3.client('logs', region_name='us-east-1')  # Specify the correct region
 save_file_name = "AWSLambdaBenchmarkResults.csv"
 start_end_benchmark_times = []
 
-def save_lambda_reports_to_csv(lambda_reports: dict, start_option: str)-> None:
+# Function URLs take 6 MB requests and responses, a streamed payload comes back base64 encoded
+LAMBDA_MAX_PAYLOAD_BYTES = 4 * 1024 * 1024
+
+def save_lambda_reports(lambda_reports: dict, start_option: str, results_store_root: str, client_timings: dict = None, invocation_tags: dict = None)-> None:
+    """
+    Append the REPORT rows to the results store as one run.
+
+    :param client_timings: Optional client side timing records keyed by RequestId, joined onto the REPORT rows.
+    :param invocation_tags: Optional start_type, crypto_mode, batch_size, data_key_cache, payload_bytes, stream_mode, wire_format and cold_strategy of each invocation keyed by RequestId,
+                            start_option, remote, 1, off, 0, none, json and sequential when missing.
+                            Rows of the cold start driver (cold_strategy rotate or fanout) get their start_type from the REPORT line's Init Duration.
+    """
+    if client_timings is None:
+        client_timings = {}
+    if invocation_tags is None:
+        invocation_tags = {}
 
     data_rows = []
     # essentially, key will be the cloudwatch log group, then a list of the reports (dictionaries)
@@ -38,16 +70,42 @@ def save_lambda_reports_to_csv(lambda_reports: dict, start_option: str)-> None:
                 "execution_time_ms" : report.get("Duration"),
                 "max_memory_usage_mb" : report.get("MaxMemoryUsed"),
                 "init_duration_ms" : report.get("InitDuration"),
-                "billed_duration_ms" : report.get("BilledDuration")
+                "billed_duration_ms" : report.get("BilledDuration"),
+                "request_id": report.get("RequestId"),
+                "crypto_mode": "remote",
+                "batch_size": 1,
+                "data_key_cache": "off",
+                "payload_bytes": 0,
+                "stream_mode": "none",
+                "wire_format": "json",
+                "cold_strategy": "sequential",
+                **invocation_tags.get(report.get("RequestId"), {})
                 }
+
+            # A driven sample is only cold if it started a new execution environment
+            if data_row["cold_strategy"] != "sequential":
+                data_row["start_type"] = "cold" if report.get("InitDuration") else "warm"
+
+            # Client side view of the same invocation, the difference to Duration is URL, TLS and network time
+            client_timing_record = client_timings.get(report.get("RequestId"))
+            if client_timing_record is not None:
+                data_row["client_dns_ms"] = client_timing_record["dns_ms"]
+                data_row["client_connect_ms"] = client_timing_record["connect_ms"]
+                data_row["client_tls_ms"] = client_timing_record["tls_ms"]
+                data_row["client_ttfb_ms"] = client_timing_record["ttfb_ms"]
+                data_row["client_total_ms"] = client_timing_record["total_ms"]
+                data_row["client_overhead_ms"] = client_timing_record["total_ms"] - report.get("Duration")
+                data_row["client_request_bytes"] = client_timing_record.get("request_bytes")
+                data_row["client_response_bytes"] = client_timing_record.get("response_bytes")
+                # Response headers of the AES functions, see data_key_cache.py
+                data_row["data_key_hits"] = client_timing_record.get("data_key_hits")
+                data_row["data_key_misses"] = client_timing_record.get("data_key_misses")
+
             data_rows.append(data_row)
 
     df = pd.DataFrame(data_rows)
 
-
-    # Write the DataFrame to a CSV file
-    csv_file_path = f"./Lambda-Benchmark-Results-{start_option}-java-csharp-go.csv"
-    df.to_csv(csv_file_path, index=False, mode='a')  # Set index=False to avoid writing row indices
+    results_store.append(df, "lambda", results_store_root)
 
 def get_lambda_reports(start_end_benchmark_times: list[dict[str, list]]) -> dict[str, list]:
     """
@@ -56,66 +114,35 @@ def get_lambda_reports(start_end_benchmark_times: list[dict[str, list]]) -> dict
     :param start_end_benchmark_times: List of dictionaries with log group as the key and [start_time, end_time] as the value.
     :return: A dictionary with log group names as keys and a list of Lambda report dictionaries as values.
     """
-    logs_client = boto3.client('logs')
-    lambda_reports = {}
+    return cloudwatch_reports.harvest_reports(get_logs_client(), start_end_benchmark_times)
 
-    # Regex to extract fields from the Lambda REPORT log lines
-    report_regex = re.compile(
-        r"REPORT RequestId: (?P<RequestId>[a-z0-9\-]+)\s+"
-        r"Duration: (?P<Duration>[\d.]+) ms\s+"
-        r"Billed Duration: (?P<BilledDuration>\d+) ms\s+"
-        r"Memory Size: (?P<MemorySize>\d+) MB\s+"
-        r"Max Memory Used: (?P<MaxMemoryUsed>\d+) MB\s+"
-        r"(Init Duration: (?P<InitDuration>[\d.]+) ms\s+)?"
-    )
+def get_logs_client():
+    # Adaptive retries absorb FilterLogEvents throttling while windows are fetched concurrently
+    return boto3.client('logs', config=Config(retries={'max_attempts': 10, 'mode': 'adaptive'}))
+
+def save_report_completeness(tracker_results: list[dict], start_option: str) -> None:
+    """
+    Save how many of each test case's invocations produced a harvested REPORT line.
+    """
+    data_rows = []
+    for tracker_result in tracker_results:
+        data_rows.append({
+            "cloudwatch_log_group": tracker_result["log_group"],
+            "expected_reports": tracker_result["expected"],
+            "found_reports": tracker_result["found"],
+            "completeness": tracker_result["completeness"],
+            "polls": tracker_result["polls"],
+        })
+
+    df = pd.DataFrame(data_rows)
+
+    incomplete = df[df["completeness"] < 1.0]
+    print(f"Report completeness: {len(df) - len(incomplete)}/{len(df)} test cases complete")
+    for _, row in incomplete.iterrows():
+        print(f"  {row['cloudwatch_log_group']}: {row['found_reports']}/{row['expected_reports']}")
 
-    for benchmark in start_end_benchmark_times:
-        for log_group, times in benchmark.items():
-            start_time = times[0]
-            end_time = times[1]
-            reports_for_log_group = []
-
-            # Get log streams for the log group
-            log_streams = logs_client.describe_log_streams(
-                logGroupName=log_group,
-                orderBy='LastEventTime',
-                descending=True
-            ).get('logStreams', [])
-
-            for stream in log_streams:
-                log_stream_name = stream['logStreamName']
-
-                # Get log events for the log stream within the time range
-                events = logs_client.get_log_events(
-                    logGroupName=log_group,
-                    logStreamName=log_stream_name,
-                    startTime=start_time,
-                    endTime=end_time,
-                    startFromHead=True
-                ).get('events', [])
-
-                for event in events:
-                    message = event['message']
-                    match = report_regex.search(message)
-
-                    if match:
-                        report = {}
-                        # Extract fields and add to the reports list
-                        groupedReport = match.groupdict()
-                        # Convert numeric fields to appropriate types
-                        report['Duration'] = float(groupedReport['Duration'])
-                        report['BilledDuration'] = int(groupedReport['BilledDuration'])
-                        report['MemorySize'] = int(groupedReport['MemorySize'])
-                        report['MaxMemoryUsed'] = int(groupedReport['MaxMemoryUsed'])
-                        if groupedReport['InitDuration'] is not None:
-                            report['InitDuration'] = float(groupedReport['InitDuration'])
-                        else:
-                            report['InitDuration'] = float(0.0)
-                        reports_for_log_group.append(report)
-
-                lambda_reports[log_group] = reports_for_log_group
-
-    return lambda_reports
+    csv_file_path = f"./Lambda-Benchmark-Completeness-{start_option}.csv"
+    df.to_csv(csv_file_path, index=False, mode='a')
 
 def get_correct_answers(operations: list[str]) -> dict:
     correct_answers = {}
@@ -141,13 +168,13 @@ def get_testcase_inputs(operations: list[str]) -> dict:
 
 # build the key lookup dictionary for getting lambda api urls.
 # value is string api_url
-def get_lambda_api_urls() -> dict[str,str]:
+def get_lambda_api_urls(urls_file: str = "./lambda_benchmark_urls.json") -> dict[str,str]:
 
     # Initialize an empty dictionary to store API URLs
     lambda_api_urls = {}
 
     # Read the JSON file
-    with open("./lambda_benchmark_urls.json") as file:
+    with open(urls_file) as file:
         # Load the JSON content
         lambda_api_urls = json.load(file)
 
@@ -158,11 +185,21 @@ def get_lambda_api_urls() -> dict[str,str]:
 
     return lambda_api_urls
 
-def create_tc(start_option: str, operation: str, language: str, lambda_url: str, test_case_input: dict[str,str], correct_answer: dict[str,str], iterations: int, arch_dir: str, memory_size: int)-> dict:
+def create_tc(start_option: str, operation: str, language: str, lambda_url: str, test_case_input: dict[str,str], correct_answer: dict[str,str], iterations: int, arch_dir: str, memory_size: int, crypto_mode: str = "remote", batch_size: int = 1, data_key_cache: str = "off", payload_bytes: int = 0, stream_mode: str = "none", wire_format_name: str = "json", cold_strategy: str = "sequential")-> dict:
 
     # Clean in case of c# -> csharp
     cleanedLang = language.replace("#","sharp")
 
+    # The Python functions take a batch of inputs in one request (see request_batch.py)
+    # and read the crypto mode and data key cache setting from the request (see local_crypto.py and data_key_cache.py)
+    if language == "python":
+        if batch_size > 1:
+            test_case_input = {"batch": [test_case_input] * batch_size}
+        test_case_input = {**test_case_input, "crypto_mode": crypto_mode, "data_key_cache": data_key_cache}
+        # Sent as a binary frame, encoded once here rather than for every invocation (see wire_format.py)
+        if wire_format_name == "binary":
+            test_case_input = wire_format.encode_request(test_case_input)
+
     cloudwatch_group_name = f"/aws/lambda/{arch_dir}-{cleanedLang}-{operation}-{memory_size}"
     # Build the test case
     test_case = {
@@ -175,16 +212,47 @@ def create_tc(start_option: str, operation: str, language: str, lambda_url: str,
         "lambda_url" : lambda_url,
         "cloudwatch_log_group" :  cloudwatch_group_name,
         "architecture": arch_dir,
-        "memory": memory_size
+        "memory": memory_size,
+        "crypto_mode": crypto_mode,
+        "batch_size": batch_size,
+        "data_key_cache": data_key_cache,
+        "payload_bytes": payload_bytes,
+        "stream_mode": stream_mode,
+        "wire_format": wire_format_name,
+        # Warm test cases always run sequentially
+        "cold_strategy": cold_strategy if start_option == "cold" else "sequential"
     }
 
     return test_case
 
-def execute_warmup(lambda_url: str, payload_body: str) -> None:
+def stream_test_case_input(operation: str, encrypt_url: str, crypto_mode: str, payload_bytes: int, stream_mode: str, chunk_size: int, streams: dict) -> dict:
+    """
+    Input of a streaming AES test case: the payload as the message for encrypt, for decrypt
+    its stream, made once per crypto mode by the encrypt function at encrypt_url (see aes_stream.py).
+    """
+    stream_request = {"message": payloads.payload_text(payload_bytes), "stream_mode": stream_mode, "chunk_size": chunk_size}
+    if operation == "aes256_encrypt":
+        return stream_request
+
+    key = (crypto_mode, payload_bytes, stream_mode, chunk_size)
+    if key not in streams:
+        if encrypt_url is None:
+            print("ERROR!! The streamed aes256_decrypt test cases need the aes256_encrypt URL of the same architecture and memory size.")
+            exit(1)
+        print(f"Encrypting a {payloads.format_size(payload_bytes)} {stream_mode} stream ({crypto_mode})")
+        response = requests.post(ensure_https(encrypt_url), json={**stream_request, "crypto_mode": crypto_mode})
+        response.raise_for_status()
+        streams[key] = response.json()["stream"]
+    return {"stream": streams[key]}
+
+def execute_warmup(lambda_url: str, payload_body: dict | bytes) -> None:
 
     try:
         # Perform an HTTP POST request
-        response = requests.post(lambda_url, json=payload_body)
+        if isinstance(payload_body, bytes):
+            response = requests.post(lambda_url, data=payload_body, headers={"Content-Type": wire_format.CONTENT_TYPE})
+        else:
+            response = requests.post(lambda_url, json=payload_body)
 
         response.raise_for_status()  # Raise an error for any 4xx/5xx status codes
         
@@ -196,10 +264,17 @@ def execute_warmup(lambda_url: str, payload_body: str) -> None:
         exit(1)
 
 def ensure_https(url):
-    if not url.startswith("https://"):
+    # Leave explicit schemes alone (e.g. http:// for the local stub server)
+    if not url.startswith("https://") and not url.startswith("http://"):
         url = "https://" + url
     return url
 
+def encode_request_body(payload_body: dict | bytes) -> tuple[bytes, dict]:
+    # Binary frames are sent as they are (see wire_format.py)
+    if isinstance(payload_body, bytes):
+        return payload_body, {"Content-Type": wire_format.CONTENT_TYPE}
+    return json.dumps(payload_body).encode("utf-8"), {"Content-Type": "application/json"}
+
 def execute_tc(test_case: dict):
 
     # Extract the lambda URL from the dictionary
@@ -235,26 +310,30 @@ def execute_tc(test_case: dict):
             execute_warmup(lambda_url, payload_body)    
 
         print("Finished Warmup")
-        print("Begin sleeping 2.5 for cloudwatch")
-        time.sleep(2.5)
-        print("finish waiting")    # Get the current UTC time
 
+    # Warmup REPORT lines inside the window are told apart by RequestId, so there is no settle sleep
     start_formatted_time = int(datetime.now(timezone.utc).timestamp() * 1000) - 2000 # add two second buffer
 
-    request_headers = {"Content-Type": "application/json"}
+    request_body, request_headers = encode_request_body(payload_body)
+    request_ids = []
+    client_timings = []
+    failed_requests = 0
     for _ in range(0,iterations):
-        try:
-            # Perform an HTTP POST request
-            response = requests.post(lambda_url, json=payload_body, headers=request_headers)
-            
-            response.raise_for_status()  # Raise an error for any 4xx/5xx status codes
-
-        except requests.exceptions.RequestException as e:
-                print(f"HTTP Request failed: {e}")
-                print(f"Test Case: \n")
-                print(f"{test_case}")
-                time.sleep(10)
-                print("wait a second to test it again")
+        # Perform an HTTP POST request over a new connection, timing DNS, connect, TLS and TTFB
+        timings = client_timing.timed_post(lambda_url, request_body, request_headers)
+        timings.pop("response_body")
+
+        # The function URL echoes the invocation RequestId, matching the REPORT line
+        request_ids.append(timings["request_id"])
+        client_timings.append(timings)
+
+        if timings["error"] is not None:
+            failed_requests += 1
+            print(f"HTTP Request failed: {timings['error']}")
+            print(f"Test Case: \n")
+            print(f"{test_case}")
+            time.sleep(10)
+            print("wait a second to test it again")
 
     # Once we are all done with the benchmarks
     # Format the time as 'YYYY-MM-DDTHH:MM:SS.sssZ'
@@ -265,6 +344,262 @@ def execute_tc(test_case: dict):
 
     start_end_benchmark_times.append(start_end_benchmark_time)
 
+    return {
+        "window": [start_formatted_time, end_formatted_time],
+        "request_ids": request_ids,
+        "client_timings": client_timings,
+        "failed_requests": failed_requests
+    }
+
+def lambda_case_key(test_case: dict) -> str:
+    return run_journal.case_key(test_case, ["cloudwatch_log_group", "start_type", "iterations", "crypto_mode", "batch_size", "data_key_cache", "payload_bytes", "stream_mode", "wire_format", "cold_strategy"])
+
+def record_execution(test_case: dict, execution: dict, journal: run_journal.RunJournal, report_tracker: cloudwatch_reports.ReportCompletionTracker) -> None:
+    """
+    Journal a finished test case and, unless it has failed requests, start polling for its REPORT lines.
+    """
+    key = lambda_case_key(test_case)
+
+    if execution["failed_requests"] > 0:
+        # Partial samples are not kept, the whole test case runs again on the next start
+        journal.mark_failed(key, f"{execution['failed_requests']} failed requests")
+        return
+
+    journal.mark_executed(key, execution)
+
+    if report_tracker is not None:
+        start_time, end_time = execution["window"]
+        report_tracker.submit(test_case["cloudwatch_log_group"], start_time, end_time, execution["request_ids"], test_case["iterations"], key)
+
+def execute_tcs(test_cases: list[dict], journal: run_journal.RunJournal, report_tracker: cloudwatch_reports.ReportCompletionTracker = None, idle_timer: matrix_plan.IdleTimer = None) -> None:
+
+    num_of_test_cases = len(test_cases)
+    for test_case in test_cases:
+
+        print("---------------------------------------")
+        print(f"Executing Test Case")
+        #print(f">Operation: {test_case["operation"]}
+        print(f"Operation")
+        test_case_op = test_case["operation"]
+        test_case_lang = test_case["language"]
+        test_case_start = test_case["start_type"]
+        test_case_arch = test_case["architecture"]
+        test_case_mem = test_case["memory"]
+
+        print(f">Operation: {test_case_op}")
+        print(f">Language: {test_case_lang}")
+        print(f">Start Type: {test_case_start}")
+        print(f">Architecture:{test_case_arch} ")
+        print(f">Memory Size: {test_case_mem}")
+        print(f">Crypto Mode: {test_case['crypto_mode']}")
+        print(f">Batch Size: {test_case['batch_size']}")
+        print(f">Data Key Cache: {test_case['data_key_cache']}")
+        if test_case["payload_bytes"]:
+            print(f">Payload: {payloads.format_size(test_case['payload_bytes'])} ({test_case['stream_mode']})")
+        print(f">Wire Format: {test_case['wire_format']}")
+
+
+        # Execute Test Case, a planned cold case once its function is idle (see matrix_plan.py)
+        if idle_timer is not None:
+            idle_timer.wait(test_case)
+        journal.mark_running(lambda_case_key(test_case))
+        execution = execute_tc(test_case)
+        if idle_timer is not None:
+            idle_timer.used(test_case)
+
+        # Start polling for this test case's REPORT lines while the next ones run
+        record_execution(test_case, execution, journal, report_tracker)
+
+        num_of_test_cases -= 1
+        print(f"Number of test cases left: {num_of_test_cases}")
+        print("---------------------------------------")
+        print("")
+
+        # Sleep for some time before moving on to next test case to settle
+        time.sleep(0.1)
+
+def execute_cold_tcs(test_cases: list[dict], strategy: str, fanout: int, parallel: int, journal: run_journal.RunJournal, report_tracker: cloudwatch_reports.ReportCompletionTracker = None) -> None:
+    """
+    Execute cold test cases with the cold start driver, a new execution environment per sample
+    and many functions at once (see cold_start_driver.py).
+    """
+    lambda_client = cold_start_driver.get_lambda_client()
+    num_of_test_cases = len(test_cases)
+
+    def run_function(function_test_cases: list[dict]) -> list[tuple[dict, dict]]:
+        executions = []
+        for test_case in function_test_cases:
+            lambda_url = ensure_https(test_case["lambda_url"])
+            payload_body = test_case["operation_input"]
+
+            # Need to fix this later, this is to fix serialization issues
+            if test_case["language"] == "c#":
+                payload_body = convert_dict_keys(payload_body)
+
+            request_body, request_headers = encode_request_body(payload_body)
+            journal.mark_running(lambda_case_key(test_case))
+            execution = cold_start_driver.execute_cold_tc(lambda_client, test_case, strategy, fanout,
+                                                          lambda: client_timing.timed_post(lambda_url, request_body, request_headers))
+            executions.append((test_case, execution))
+        return executions
+
+    print(f"Cold start driver: {num_of_test_cases} test cases, strategy={strategy}, fanout={fanout}, parallel functions={parallel}")
+    for test_case, execution in cold_start_driver.run_parallel(test_cases, run_function, parallel):
+        start_end_benchmark_time = {}
+        start_end_benchmark_time[test_case["cloudwatch_log_group"]] = execution["window"]
+        start_end_benchmark_times.append(start_end_benchmark_time)
+
+        record_execution(test_case, execution, journal, report_tracker)
+
+        num_of_test_cases -= 1
+        print(f"Finished {test_case['cloudwatch_log_group']} (cold, {strategy}), {execution['failed_requests']} failed requests, test cases left: {num_of_test_cases}")
+
+def execute_tcs_async(test_cases: list[dict], concurrency: int, per_url_concurrency: int, journal: run_journal.RunJournal, report_tracker: cloudwatch_reports.ReportCompletionTracker = None) -> None:
+    """
+    Execute the test cases concurrently over a pooled keep-alive session.
+    Invocations inside a test case stay sequential, only independent test cases overlap.
+    """
+    num_of_test_cases = len(test_cases)
+
+    for test_case in test_cases:
+        test_case["lambda_url"] = ensure_https(test_case["lambda_url"])
+
+        # Need to fix this later, this is to fix serialization issues
+        if test_case["language"] == "c#":
+            test_case["operation_input"] = convert_dict_keys(test_case["operation_input"])
+
+        journal.mark_running(lambda_case_key(test_case))
+
+    def on_complete(result: dict) -> None:
+        nonlocal num_of_test_cases
+        test_case = result["test_case"]
+
+        # Same two second buffers as the sequential runner
+        window = [result["start_ms"] - 2000, result["end_ms"] + 2000]
+
+        start_end_benchmark_time = {}
+        start_end_benchmark_time[test_case["cloudwatch_log_group"]] = window
+        start_end_benchmark_times.append(start_end_benchmark_time)
+
+        execution = {
+            "window": window,
+            "request_ids": [invocation["request_id"] for invocation in result["invocations"]],
+            "client_timings": [invocation["timings"] for invocation in result["invocations"]],
+            "failed_requests": sum(1 for invocation in result["invocations"] if invocation["error"] is not None)
+        }
+        record_execution(test_case, execution, journal, report_tracker)
+
+        num_of_test_cases -= 1
+        print(f"Finished {test_case['cloudwatch_log_group']} ({test_case['start_type']}), test cases left: {num_of_test_cases}")
+
+    async_runner.run_test_cases(
+        test_cases,
+        url_key="lambda_url",
+        payload_key="operation_input",
+        concurrency=concurrency,
+        per_url_concurrency=per_url_concurrency,
+        warmup_settle_seconds=0,
+        on_complete=on_complete
+    )
+
+def load_test_targets(test_cases: list[dict], load_targets: list[str] = None) -> list[dict]:
+    """
+    One test case per function URL, crypto mode, batch size, data key cache setting, payload and wire format (start types share a URL), optionally limited to
+    the given url keys, e.g. x86-python-sha256-128.
+    """
+    targets = {}
+    for test_case in test_cases:
+        url_key = test_case["cloudwatch_log_group"].replace("/aws/lambda/", "")
+        if load_targets and url_key not in load_targets:
+            continue
+        targets.setdefault((test_case["lambda_url"], test_case["crypto_mode"], test_case["batch_size"], test_case["data_key_cache"],
+                                test_case["payload_bytes"], test_case["stream_mode"], test_case["wire_format"]), test_case)
+    return list(targets.values())
+
+def cold_start_stats(tracker_result: dict) -> dict:
+    # REPORT lines carry an Init Duration only for invocations that started a new execution environment
+    reports = tracker_result["reports"]
+    cold_starts = sum(1 for report in reports if report["InitDuration"] > 0)
+    return {
+        "reports_found": len(reports),
+        "cold_starts": cold_starts,
+        "cold_start_rate": cold_starts / len(reports) if reports else None,
+    }
+
+def run_load_tests(test_cases: list[dict], args: argparse.Namespace) -> None:
+    """
+    Open-loop (or concurrency ramp) load against each target function URL. Latency
+    percentiles and histograms are saved per target, together with the cold start
+    rate taken from the harvested REPORT lines.
+    """
+    targets = load_test_targets(test_cases, args.load_targets.split(",") if args.load_targets else None)
+    print(f"Load testing {len(targets)} function URLs, mode: {args.load_mode}")
+
+    report_tracker = None
+    if not args.no_harvest:
+        report_tracker = cloudwatch_reports.ReportCompletionTracker(get_logs_client(), deadline_seconds=args.report_deadline)
+
+    summary_rows = []
+    histogram_rows = []
+    for test_case in targets:
+        lambda_url = ensure_https(test_case["lambda_url"])
+        payload_body = test_case["operation_input"]
+
+        # Need to fix this later, this is to fix serialization issues
+        if test_case["language"] == "c#":
+            payload_body = convert_dict_keys(payload_body)
+
+        if args.load_mode == "rate":
+            print(f"{test_case['cloudwatch_log_group']}: {args.arrivals} arrivals, {args.start_rps or args.target_rps} -> {args.target_rps} rps for {args.duration}s")
+            results = [load_generator.run_rate(lambda_url, payload_body, args.target_rps, args.duration, args.arrivals, args.start_rps, args.seed)]
+        else:
+            steps = [int(step) for step in args.concurrency_steps.split(",")]
+            print(f"{test_case['cloudwatch_log_group']}: concurrency steps {steps}, {args.step_seconds}s each")
+            results = load_generator.run_concurrency_steps(lambda_url, payload_body, steps, args.step_seconds)
+
+        for result in results:
+            row = {
+                "cloudwatch_log_group": test_case["cloudwatch_log_group"],
+                "architecture": test_case["architecture"],
+                "language": test_case["language"],
+                "operation": test_case["operation"],
+                "memory_size": test_case["memory"],
+                "crypto_mode": test_case["crypto_mode"],
+                "batch_size": test_case["batch_size"],
+                "data_key_cache": test_case["data_key_cache"],
+                "payload_bytes": test_case["payload_bytes"],
+                "stream_mode": test_case["stream_mode"],
+                "wire_format": test_case["wire_format"],
+                "load_mode": args.load_mode,
+                "arrivals": args.arrivals if args.load_mode == "rate" else "closed",
+                "start_rps": args.start_rps if args.load_mode == "rate" else None,
+                "target_rps": args.target_rps if args.load_mode == "rate" else None,
+                "concurrency": result.get("concurrency"),
+            }
+            row.update(load_generator.summarize(result))
+            summary_rows.append(row)
+
+            for bucket in result["latency"].buckets():
+                histogram_rows.append({
+                    "cloudwatch_log_group": test_case["cloudwatch_log_group"],
+                    "concurrency": result.get("concurrency"),
+                    **bucket
+                })
+
+            print(f"  {row['requests']} requests, {row['errors']} errors, {row['achieved_rps']:.1f} rps, p50 {row['latency_p50_ms'] or 0:.1f} ms, p99 {row['latency_p99_ms'] or 0:.1f} ms")
+
+            if report_tracker is not None:
+                report_tracker.submit(test_case["cloudwatch_log_group"], result["start_ms"] - 2000, result["end_ms"] + 2000, result["request_ids"], len(result["request_ids"]), len(summary_rows) - 1)
+
+    if report_tracker is not None:
+        print("Waiting for REPORT lines to compute cold start rates.")
+        for tracker_result in report_tracker.wait_all():
+            summary_rows[tracker_result["case_key"]].update(cold_start_stats(tracker_result))
+
+    pd.DataFrame(summary_rows).to_csv(args.load_results_file, index=False, mode='a')
+    pd.DataFrame(histogram_rows).to_csv(args.load_results_file.replace(".csv", "-Histograms.csv"), index=False, mode='a')
+    print(f"Saved load test results to {args.load_results_file}")
+
 def convert_dict_keys(input_dict):
     # Create a new dictionary with transformed keys
     return {to_pascal_case(key): value for key, value in input_dict.items()}
@@ -274,7 +609,46 @@ def to_pascal_case(snake_str):
     components = snake_str.split('_')
     return ''.join(x.title() for x in components)
 
-def main():
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="AWS Lambda benchmark runner")
+    parser.add_argument("--async-runner", action="store_true", help="Run independent test cases concurrently over pooled connections")
+    parser.add_argument("--concurrency", type=int, default=8, help="Async runner: test cases in flight across all function URLs")
+    parser.add_argument("--per-url-concurrency", type=int, default=1, help="Async runner: test cases in flight against one function URL")
+    parser.add_argument("--urls-file", default="./lambda_benchmark_urls.json", help="Function URL file (see getURLSFromCF.py or benchmarkcommon/stub_server.py)")
+    parser.add_argument("--no-harvest", action="store_true", help="Skip CloudWatch report harvesting (e.g. against the local stub server)")
+    parser.add_argument("--journal", default="./lambda-run-journal.sqlite", help="SQLite run journal, finished test cases in it are skipped (use a new file for a new sweep)")
+    parser.add_argument("--results-store", default=results_store.DEFAULT_ROOT, help="Parquet results store the REPORT rows are appended to")
+    parser.add_argument("--load-test", action="store_true", help="Drive each function URL with load instead of running the closed-loop test cases")
+    parser.add_argument("--load-mode", choices=["rate", "concurrency"], default="rate", help="Load test: open-loop request rate or closed-loop concurrency ramp")
+    parser.add_argument("--target-rps", type=float, default=10.0, help="Load test: request rate (at the end of the ramp)")
+    parser.add_argument("--start-rps", type=float, default=None, help="Load test: ramp linearly from this rate to --target-rps")
+    parser.add_argument("--arrivals", choices=["constant", "poisson"], default="poisson", help="Load test: arrival process in rate mode")
+    parser.add_argument("--duration", type=float, default=60.0, help="Load test: seconds per function URL in rate mode")
+    parser.add_argument("--seed", type=int, default=None, help="Load test: seed for Poisson arrivals")
+    parser.add_argument("--concurrency-steps", default="1,2,4,8,16", help="Load test: comma separated concurrency levels in concurrency mode")
+    parser.add_argument("--step-seconds", type=float, default=30.0, help="Load test: seconds per concurrency level")
+    parser.add_argument("--load-targets", default=None, help="Load test: comma separated url keys (e.g. x86-python-sha256-128), default every URL of the matrix")
+    parser.add_argument("--load-results-file", default="./Lambda-LoadTest-Results.csv")
+    parser.add_argument("--crypto-modes", default="remote", help="Comma separated crypto modes to run: remote (KMS), local (in the function) and public_key (verify and RSA encrypt in the function with the fetched public key), non-remote modes are Python only, see local_crypto.py")
+    parser.add_argument("--batch-sizes", default="1", help="Comma separated inputs per request, batches above 1 are Python only, see request_batch.py")
+    parser.add_argument("--data-key-cache", default="off", help="Comma separated data key cache settings to run (off,on), on reuses data keys across warm invocations, AES Python functions only, see data_key_cache.py")
+    parser.add_argument("--payload-sizes", default="input", help="Comma separated AES payloads: input (the operation's input) and sizes like 1KB,64KB,1MB (up to 4MB), encrypted in framed chunks by the Python AES functions, see aes_stream.py")
+    parser.add_argument("--stream-modes", default="gcm", help="Comma separated stream modes of the payload sizes: gcm (authenticated chunks) and ctr")
+    parser.add_argument("--chunk-size", default="64KB", help="Chunk size of the streamed payloads")
+    parser.add_argument("--wire-formats", default="json", help="Comma separated request and response formats to run: json (base64 fields) and binary (raw bytes in a length-prefixed frame), binary is Python only, see wire_format.py")
+    parser.add_argument("--report-deadline", type=float, default=300.0, help="Seconds to keep polling CloudWatch for a test case's REPORT lines")
+    parser.add_argument("--cold-strategy", choices=cold_start_driver.COLD_STRATEGIES, default="sequential", help="How cold test cases get new execution environments: sequential (invocations one after another, only the first is cold), rotate (a configuration change before every --cold-fanout invocations) or fanout (all invocations at once), see cold_start_driver.py")
+    parser.add_argument("--cold-fanout", type=int, default=1, help="Rotate: concurrent invocations per configuration change")
+    parser.add_argument("--cold-parallel", type=int, default=16, help="Rotate and fanout: functions driven at once")
+    parser.add_argument("--matrix", default=None, help="Matrix spec (TOML) replacing the languages, operations, start types, memory sizes and architectures below, see benchmarkcommon/matrix_plan.py")
+    parser.add_argument("--shard", default=None, help="With --matrix: run shard i/n of the plan on this host, e.g. 2/4")
+    parser.add_argument("--plan-only", action="store_true", help="With --matrix: print the plan's time and cost estimate and exit")
+    args = parser.parse_args()
+    if (args.shard or args.plan_only) and not args.matrix:
+        parser.error("--shard and --plan-only need --matrix")
+    return args
+
+def main(args: argparse.Namespace):
     print("Beginning Initialization of AWS Lambda Benchmark runner")
 
     architectures = [
@@ -324,6 +698,13 @@ def main():
         3008
     ]
 
+    # A matrix spec replaces the lists above, cold and warm can run together
+    matrix = None
+    if args.matrix:
+        matrix = matrix_plan.load_matrix(args.matrix, "lambda", {"languages": languages, "operations": operations, "start_types": start_options,
+                                                                 "memory_sizes": memory_sizes, "architectures": architectures, "iterations": 30})
+        languages, operations, start_options, memory_sizes, architectures = (matrix[key] for key in matrix_plan.LIST_KEYS)
+
     # Key is operation, value is json containing answers
     #correct_answers = get_correct_answers(operations)
     correct_answers = {}
@@ -335,11 +716,25 @@ def main():
 
     # Grab appropriate urls for lambda calls
     # value is string api_url
-    operation_urls = get_lambda_api_urls()
+    operation_urls = get_lambda_api_urls(args.urls_file)
     print("Succesful Loading of AWS Lambda URLs")
 
     test_cases = []
-    iterations = 30
+    iterations = matrix["iterations"] if matrix else 30
+
+    crypto_modes = args.crypto_modes.split(",")
+    batch_sizes = [int(batch_size) for batch_size in args.batch_sizes.split(",")]
+    data_key_cache_settings = args.data_key_cache.split(",")
+    payload_variants = payloads.variants(args.payload_sizes, args.stream_modes)
+    chunk_size = payloads.parse_size(args.chunk_size)
+    wire_formats = args.wire_formats.split(",")
+    # Encrypted streams of the decrypt test cases, by crypto mode and payload
+    streams = {}
+
+    for payload_bytes, stream_mode in payload_variants:
+        if payload_bytes > LAMBDA_MAX_PAYLOAD_BYTES:
+            print(f"Skipping {payloads.format_size(payload_bytes)} payloads, function URLs take up to {payloads.format_size(LAMBDA_MAX_PAYLOAD_BYTES)}")
+    payload_variants = [variant for variant in payload_variants if variant[0] <= LAMBDA_MAX_PAYLOAD_BYTES]
 
     # First we need to create the testcases themselves
     for language in languages:
@@ -370,68 +765,166 @@ def main():
                         test_case_input = test_case_inputs[operation]
                         correct_answer_input  = correct_answers.get(operation, "")
 
-                        # Then Create the test case
-                        new_test_case = create_tc(start_option,operation,language,test_case_lambda_api_url,test_case_input,correct_answer_input,iterations,architecture,memory_size)
-
-                        test_cases.append(new_test_case)
+                        # Then Create the test case, once per crypto mode, batch size, data key cache setting, payload and wire format
+                        for crypto_mode, batch_size, data_key_cache, (payload_bytes, stream_mode), wire_format_name in itertools.product(crypto_modes, batch_sizes, data_key_cache_settings, payload_variants, wire_formats):
+                            # Only the Python functions have a local crypto mode, batch requests and a binary wire format
+                            if (crypto_mode != "remote" or batch_size != 1 or wire_format_name != "json") and language != "python":
+                                continue
+                            # public_key only changes verify and RSA encrypt
+                            if not results_store.runs_crypto_mode(crypto_mode, operation):
+                                continue
+                            # Batches are JSON only
+                            if wire_format_name != "json" and batch_size != 1:
+                                continue
+                            # and only their AES functions use data keys and stream payloads (one per request)
+                            if (data_key_cache != "off" or payload_bytes) and (language != "python" or not operation.startswith("aes256")):
+                                continue
+                            if payload_bytes and batch_size != 1:
+                                continue
+                            if not matrix_plan.selected(matrix, {"language": language, "operation": operation, "start_type": start_option, "memory_size": memory_size,
+                                                                 "architecture": architecture, "crypto_mode": crypto_mode, "batch_size": batch_size, "data_key_cache": data_key_cache,
+                                                                 "payload_bytes": payload_bytes, "stream_mode": stream_mode, "wire_format": wire_format_name}):
+                                continue
+
+                            operation_input = test_case_input
+                            if payload_bytes:
+                                encrypt_url = operation_urls.get(f"{architecture}-{sanitizedLang}-aes256_encrypt-{memory_size}")
+                                operation_input = stream_test_case_input(operation, encrypt_url, crypto_mode, payload_bytes, stream_mode, chunk_size, streams)
+
+                            new_test_case = create_tc(start_option,operation,language,test_case_lambda_api_url,operation_input,correct_answer_input,iterations,architecture,memory_size,crypto_mode,batch_size,data_key_cache,payload_bytes,stream_mode,wire_format_name,args.cold_strategy)
+
+                            test_cases.append(new_test_case)
 
     print("Finished Initialization of AWS Lambda Benchmark Runner")
+
+    # Cold cases interleaved across functions, this host's shard only
+    idle_timer = None
+    if matrix:
+        # Driven cold cases do not wait for their function to go idle
+        if args.cold_strategy != "sequential":
+            matrix["cold_idle_seconds"] = 0
+        test_cases = matrix_plan.plan_run(test_cases, matrix, lambda test_case: test_case["lambda_url"], args.shard)
+        idle_timer = matrix_plan.IdleTimer(matrix, lambda test_case: test_case["lambda_url"])
+        if args.plan_only:
+            exit(0)
+
+    if args.load_test:
+        run_load_tests(test_cases, args)
+        print("Finished AWS Lambda Benchmark Runner")
+        exit(0)
+
     print("EXECUTE")
 
-    # Then execute the test cases, http requests
-    num_of_test_cases = len(test_cases)
+    # Finished test cases and their raw REPORT lines are journaled as they complete
+    journal = run_journal.RunJournal(args.journal)
+    journal.register([lambda_case_key(test_case) for test_case in test_cases])
+    print(f"Run journal {args.journal}: {journal.summary()}")
+
+    # REPORT lines are collected in the background as each test case finishes
+    report_tracker = None
+    if not args.no_harvest:
+        report_tracker = cloudwatch_reports.ReportCompletionTracker(
+            get_logs_client(),
+            deadline_seconds=args.report_deadline,
+            on_result=lambda tracker_result: journal.mark_done(tracker_result["case_key"], tracker_result)
+        )
+
+    pending_test_cases = []
     for test_case in test_cases:
+        key = lambda_case_key(test_case)
 
-        print("---------------------------------------")
-        print(f"Executing Test Case")
-        #print(f">Operation: {test_case["operation"]}
-        print(f"Operation")
-        test_case_op = test_case["operation"]
-        test_case_lang = test_case["language"]
-        test_case_start = test_case["start_type"]
-        test_case_arch = test_case["architecture"]
-        test_case_mem = test_case["memory"]
+        if journal.needs_execution(key):
+            pending_test_cases.append(test_case)
 
-        print(f">Operation: {test_case_op}")
-        print(f">Language: {test_case_lang}")
-        print(f">Start Type: {test_case_start}")
-        print(f">Architecture:{test_case_arch} ")
-        print(f">Memory Size: {test_case_mem}")
+        elif journal.state(key) == run_journal.EXECUTED and report_tracker is not None:
+            # Executed by an earlier run but never harvested, only the REPORT lines are fetched
+            execution = journal.execution(key)
+            start_time, end_time = execution["window"]
+            report_tracker.submit(test_case["cloudwatch_log_group"], start_time, end_time, execution["request_ids"], test_case["iterations"], key)
 
+    print(f"Test cases to execute: {len(pending_test_cases)} of {len(test_cases)}")
 
-        # Execute Test Case
-        execute_tc(test_case)
-        num_of_test_cases -= 1
-        print(f"Number of test cases left: {num_of_test_cases}")
-        print("---------------------------------------")
-        print("")
+    # Cold test cases of the cold start driver first, all their functions at once
+    if args.cold_strategy != "sequential":
+        driven_test_cases = [test_case for test_case in pending_test_cases if test_case["cold_strategy"] != "sequential"]
+        pending_test_cases = [test_case for test_case in pending_test_cases if test_case["cold_strategy"] == "sequential"]
+        execute_cold_tcs(driven_test_cases, args.cold_strategy, args.cold_fanout, args.cold_parallel, journal, report_tracker)
 
-        # Sleep for some time before moving on to next test case to settle
-        time.sleep(0.1)
+    # Then execute the test cases, http requests
+    if args.async_runner:
+        if idle_timer is not None:
+            # The async runner cannot hold a cold case back until its function is idle, the
+            # planned cold cases run one after another first
+            cold_test_cases = [test_case for test_case in pending_test_cases if test_case["start_type"] == "cold"]
+            pending_test_cases = [test_case for test_case in pending_test_cases if test_case["start_type"] != "cold"]
+            print(f"Running {len(cold_test_cases)} cold test cases of the matrix sequentially")
+            execute_tcs(cold_test_cases, journal, report_tracker, idle_timer)
+        print(f"Async runner: concurrency={args.concurrency}, per url concurrency={args.per_url_concurrency}")
+        execute_tcs_async(pending_test_cases, args.concurrency, args.per_url_concurrency, journal, report_tracker)
+    else:
+        execute_tcs(pending_test_cases, journal, report_tracker, idle_timer)
+
+    if report_tracker is None:
+        print("Skipping CloudWatch harvesting, executed test cases are harvested on the next run.")
+        print("Finished AWS Lambda Benchmark Runner")
+        exit(0)
 
     print("-" * 10)
-    print("-" * 10)
-    print("Waiting for Cloudwatch to settle, lambda operations may take a minute to fully report.")
-    print("Begin wait for 120 seconds.")
-    print("-" * 10)
+    print("Waiting for the remaining REPORT lines to arrive in CloudWatch.")
     print("-" * 10)
 
-    # wait for 120 seconds
-    time.sleep(120)
-
-    print("Finished waiting 120 seconds.")
+    report_tracker.wait_all()
 
+    print(f"Run journal {args.journal}: {journal.summary()}")
     print("Begin Saving Results from benchmark.")
 
-    lambda_reports = get_lambda_reports(start_end_benchmark_times)
+    # Every save appends a new run to the store, so only finished test cases not saved by an earlier run are written
+    tracker_results = []
+    tracker_start_types = []
+    exported_keys = []
+    invocation_tags = {}
+    for test_case in test_cases:
+        key = lambda_case_key(test_case)
+        if journal.state(key) == run_journal.DONE and not journal.is_exported(key):
+            tracker_results.append(journal.results(key))
+            tracker_start_types.append(test_case["start_type"])
+            exported_keys.append(key)
+
+            # Start types, crypto modes, batch sizes, data key cache settings, payloads, wire formats and cold strategies invoke the same function, so the REPORT rows are told apart by RequestId
+            for request_id in journal.execution(key)["request_ids"]:
+                invocation_tags[request_id] = {name: test_case[name] for name in ["start_type", "crypto_mode", "batch_size", "data_key_cache", "payload_bytes", "stream_mode", "wire_format", "cold_strategy"]}
+
+    if not tracker_results:
+        print("Nothing new to save, results were saved by an earlier run.")
+        print("Finished AWS Lambda Benchmark Runner")
+        exit(0)
 
-    save_lambda_reports_to_csv(lambda_reports, start_options[0])
+    lambda_reports = {}
+    for tracker_result in tracker_results:
+        lambda_reports.setdefault(tracker_result["log_group"], []).extend(tracker_result["reports"])
+
+    # Client side timings were journaled with each execution, keyed by RequestId for the join
+    client_timings = {}
+    for key in exported_keys:
+        for timings in journal.execution(key).get("client_timings", []):
+            if timings["request_id"] is not None:
+                client_timings[timings["request_id"]] = timings
+
+    save_lambda_reports(lambda_reports, start_options[0], args.results_store, client_timings, invocation_tags)
+    # One completeness file per start type, as when they ran separately
+    for start_type in dict.fromkeys(tracker_start_types):
+        save_report_completeness([tracker_result for tracker_result, tracker_start_type in zip(tracker_results, tracker_start_types) if tracker_start_type == start_type], start_type)
+    journal.mark_exported(exported_keys)
 
     print("Finished saving results from benchmark.")
 
+    failed = journal.summary().get(run_journal.FAILED, 0)
+    if failed:
+        print(f"{failed} test cases had failed requests, run again with --journal {args.journal} to retry them.")
+
+    journal.close()
     print("Finished AWS Lambda Benchmark Runner")
-    time.sleep(15000)
     exit(0)
 
 if __name__ == "__main__":
-    main()
+    main(parse_args())
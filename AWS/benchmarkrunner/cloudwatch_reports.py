@@ -0,0 +1,317 @@
+"""
+Bulk harvesting of Lambda REPORT lines from CloudWatch Logs.
+
+Each (log group, time window) is read with paginated FilterLogEvents calls that
+follow nextToken until the window is exhausted, so large runs no longer drop
+REPORT lines. Windows are fetched concurrently and events are parsed as the
+pages stream in instead of materialising whole event lists.
+
+FakeLogsClient is an offline stand-in for the logs client. Running this module
+directly harvests 120k synthetic REPORT lines through it:
+
+    python3 cloudwatch_reports.py
+"""
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Only REPORT lines are transferred, the rest of the function output stays in CloudWatch
+REPORT_FILTER_PATTERN = '"REPORT RequestId"'
+
+# Regex to extract fields from the Lambda REPORT log lines
+REPORT_REGEX = re.compile(
+    r"REPORT RequestId: (?P<RequestId>[a-z0-9\-]+)\s+"
+    r"Duration: (?P<Duration>[\d.]+) ms\s+"
+    r"Billed Duration: (?P<BilledDuration>\d+) ms\s+"
+    r"Memory Size: (?P<MemorySize>\d+) MB\s+"
+    r"Max Memory Used: (?P<MaxMemoryUsed>\d+) MB\s+"
+    r"(Init Duration: (?P<InitDuration>[\d.]+) ms\s+)?"
+)
+
+
+def parse_report_line(message: str) -> dict | None:
+    """
+    Parse a single REPORT line, returns None for any other log line.
+    """
+    match = REPORT_REGEX.search(message)
+    if not match:
+        return None
+
+    groupedReport = match.groupdict()
+
+    # Convert numeric fields to appropriate types
+    report = {
+        'RequestId': groupedReport['RequestId'],
+        'Duration': float(groupedReport['Duration']),
+        'BilledDuration': int(groupedReport['BilledDuration']),
+        'MemorySize': int(groupedReport['MemorySize']),
+        'MaxMemoryUsed': int(groupedReport['MaxMemoryUsed']),
+    }
+    if groupedReport['InitDuration'] is not None:
+        report['InitDuration'] = float(groupedReport['InitDuration'])
+    else:
+        report['InitDuration'] = float(0.0)
+
+    return report
+
+
+def iter_window_events(logs_client, log_group: str, start_time: int, end_time: int, page_size: int = 10000):
+    """
+    Yield every REPORT event of a log group within [start_time, end_time] (epoch ms),
+    following nextToken across pages.
+    """
+    paginator = logs_client.get_paginator('filter_log_events')
+    pages = paginator.paginate(
+        logGroupName=log_group,
+        startTime=start_time,
+        endTime=end_time,
+        filterPattern=REPORT_FILTER_PATTERN,
+        PaginationConfig={'PageSize': page_size}
+    )
+
+    for page in pages:
+        for event in page.get('events', []):
+            yield event
+
+
+def iter_reports(events):
+    """
+    Streaming parser: turn an iterable of log events into parsed REPORT dicts.
+    """
+    for event in events:
+        report = parse_report_line(event['message'])
+        if report is not None:
+            report['timestamp'] = event.get('timestamp')
+            yield report
+
+
+def harvest_window(logs_client, log_group: str, start_time: int, end_time: int) -> list[dict]:
+    return list(iter_reports(iter_window_events(logs_client, log_group, start_time, end_time)))
+
+
+def harvest_reports(logs_client, start_end_benchmark_times: list[dict[str, list]], max_workers: int = 4) -> dict[str, list]:
+    """
+    Harvest REPORT lines for every benchmark window.
+
+    :param start_end_benchmark_times: List of dictionaries with log group as the key and [start_time, end_time] as the value.
+    :param max_workers: Windows fetched concurrently (FilterLogEvents is throttled per account, keep this small).
+    :return: A dictionary with log group names as keys and a list of Lambda report dictionaries as values.
+    """
+    windows = []
+    for benchmark in start_end_benchmark_times:
+        for log_group, times in benchmark.items():
+            windows.append((log_group, times[0], times[1]))
+
+    lambda_reports = {log_group: [] for log_group, _, _ in windows}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            (log_group, executor.submit(harvest_window, logs_client, log_group, start_time, end_time))
+            for log_group, start_time, end_time in windows
+        ]
+
+        # Collect in submission order so a log group's windows keep their run order
+        for log_group, future in futures:
+            lambda_reports[log_group].extend(future.result())
+
+    return lambda_reports
+
+
+class ReportCompletionTracker:
+    """
+    Event-driven replacement for sleeping before harvesting.
+
+    Finished test cases are submitted with the RequestIds returned by their invocations.
+    Each submission is polled in the background, with exponential backoff, until every
+    expected REPORT line is present or the deadline passes, so harvesting overlaps with
+    the execution of later test cases.
+    """
+
+    def __init__(self, logs_client, deadline_seconds: float = 300.0, initial_backoff_seconds: float = 2.0, max_backoff_seconds: float = 30.0, max_workers: int = 4, on_result=None):
+        """
+        :param on_result: Optional callback invoked (from a worker thread) with each result as soon as it is final.
+        """
+        self.logs_client = logs_client
+        self.on_result = on_result
+        self.deadline_seconds = deadline_seconds
+        self.initial_backoff_seconds = initial_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = []
+
+    def submit(self, log_group: str, start_time: int, end_time: int, request_ids: list[str], expected_count: int, case_key: str = None) -> None:
+        """
+        :param request_ids: RequestIds of the timed invocations, None entries are ignored.
+        :param expected_count: Number of timed invocations (used when RequestIds are unavailable).
+        :param case_key: Opaque test case identifier passed through to the result.
+        """
+        deadline = time.monotonic() + self.deadline_seconds
+        future = self.executor.submit(self._poll, log_group, start_time, end_time, [request_id for request_id in request_ids if request_id], expected_count, deadline, case_key)
+        self.futures.append(future)
+
+    def _poll(self, log_group: str, start_time: int, end_time: int, request_ids: list[str], expected_count: int, deadline: float, case_key: str) -> dict:
+        expected_ids = set(request_ids)
+        backoff = self.initial_backoff_seconds
+        polls = 0
+
+        while True:
+            polls += 1
+            reports = harvest_window(self.logs_client, log_group, start_time, end_time)
+
+            if expected_ids:
+                # Only keep the timed invocations, warmup REPORT lines in the window are dropped
+                reports = [report for report in reports if report['RequestId'] in expected_ids]
+                found = len({report['RequestId'] for report in reports})
+            else:
+                found = len(reports)
+
+            if found >= expected_count or time.monotonic() + backoff > deadline:
+                break
+
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff_seconds)
+
+        result = {
+            'case_key': case_key,
+            'log_group': log_group,
+            'reports': reports,
+            'expected': expected_count,
+            'found': found,
+            'completeness': found / expected_count if expected_count else 1.0,
+            'polls': polls,
+        }
+
+        if self.on_result is not None:
+            self.on_result(result)
+
+        return result
+
+    def wait_all(self) -> list[dict]:
+        """
+        Block until every submitted test case is complete or past its deadline.
+        Results are returned in submission order.
+        """
+        results = [future.result() for future in self.futures]
+        self.executor.shutdown()
+        return results
+
+
+class FakeLogsPaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, PaginationConfig: dict = None, **kwargs):
+        page_size = (PaginationConfig or {}).get('PageSize', 10000)
+        next_token = None
+        while True:
+            request = dict(kwargs, limit=page_size)
+            if next_token is not None:
+                request['nextToken'] = next_token
+
+            page = self.client.filter_log_events(**request)
+            yield page
+
+            next_token = page.get('nextToken')
+            if next_token is None:
+                return
+
+
+class FakeLogsClient:
+    """
+    In-memory stand-in for boto3.client('logs') implementing the FilterLogEvents subset used above.
+    Pages are capped at page_limit events so pagination is always exercised.
+    """
+
+    def __init__(self, page_limit: int = 10000, call_latency_seconds: float = 0.0):
+        self.log_groups = {}
+        self.page_limit = page_limit
+        self.call_latency_seconds = call_latency_seconds
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def put_events(self, log_group: str, events: list[dict]) -> None:
+        self.log_groups.setdefault(log_group, []).extend(events)
+        self.log_groups[log_group].sort(key=lambda event: event['timestamp'])
+
+    def get_paginator(self, operation_name: str) -> FakeLogsPaginator:
+        if operation_name != 'filter_log_events':
+            raise NotImplementedError(operation_name)
+        return FakeLogsPaginator(self)
+
+    def filter_log_events(self, logGroupName: str, startTime: int, endTime: int, filterPattern: str = None, nextToken: str = None, limit: int = 10000) -> dict:
+        with self.lock:
+            self.calls += 1
+        if self.call_latency_seconds:
+            time.sleep(self.call_latency_seconds)
+
+        matching = [
+            event for event in self.log_groups.get(logGroupName, [])
+            if startTime <= event['timestamp'] <= endTime
+            and (filterPattern is None or 'REPORT RequestId' in event['message'])
+        ]
+
+        offset = int(nextToken) if nextToken else 0
+        page_size = min(limit, self.page_limit)
+        page = {'events': matching[offset:offset + page_size]}
+
+        if offset + page_size < len(matching):
+            page['nextToken'] = str(offset + page_size)
+
+        return page
+
+
+def synthetic_report_events(count: int, start_time: int, memory_size: int = 128, cold_every: int = 30) -> list[dict]:
+    """
+    Build `count` REPORT events (plus START/END noise) spaced 1 ms apart from start_time.
+    """
+    events = []
+    for i in range(count):
+        request_id = str(uuid.uuid4())
+        duration = random.uniform(1.0, 900.0)
+        init = f"Init Duration: {random.uniform(100.0, 900.0):.2f} ms\t" if i % cold_every == 0 else ""
+        timestamp = start_time + i
+
+        events.append({'timestamp': timestamp, 'message': f"START RequestId: {request_id} Version: $LATEST\n"})
+        events.append({'timestamp': timestamp, 'message': f"END RequestId: {request_id}\n"})
+        events.append({
+            'timestamp': timestamp,
+            'message': (
+                f"REPORT RequestId: {request_id}\tDuration: {duration:.2f} ms\t"
+                f"Billed Duration: {int(duration) + 1} ms\tMemory Size: {memory_size} MB\t"
+                f"Max Memory Used: {random.randint(40, memory_size)} MB\t{init}\n"
+            )
+        })
+    return events
+
+
+def main():
+    log_groups = 12
+    reports_per_group = 10000
+    start_time = 1_700_000_000_000
+
+    fake_client = FakeLogsClient(page_limit=1000, call_latency_seconds=0.005)
+    start_end_benchmark_times = []
+
+    for i in range(log_groups):
+        log_group = f"/aws/lambda/x86-python-sha256-{i}"
+        fake_client.put_events(log_group, synthetic_report_events(reports_per_group, start_time))
+        start_end_benchmark_times.append({log_group: [start_time, start_time + reports_per_group]})
+
+    harvest_start = time.perf_counter()
+    lambda_reports = harvest_reports(fake_client, start_end_benchmark_times)
+    harvest_seconds = time.perf_counter() - harvest_start
+
+    harvested = sum(len(reports) for reports in lambda_reports.values())
+    expected = log_groups * reports_per_group
+    print(f"Harvested {harvested}/{expected} REPORT lines in {harvest_seconds:.2f}s using {fake_client.calls} FilterLogEvents calls")
+
+    if harvested != expected:
+        print("ERROR: REPORT lines were dropped")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
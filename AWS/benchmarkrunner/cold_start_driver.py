@@ -0,0 +1,138 @@
+"""
+Cold start driver of the Lambda runner.
+
+Sequential "cold" invocations are only cold once: after the first one the
+execution environment is warm, and getting another cold sample means waiting
+for Lambda to reclaim it. The driver gets a new execution environment per
+sample instead:
+
+    rotate  before every cycle the function's configuration is changed (a new
+            BENCHMARK_COLD_START_NONCE environment variable). Lambda retires
+            every environment of the old configuration, so the cycle's
+            invocations all start new ones. A cycle is --cold-fanout
+            concurrent invocations (default 1), the variable is removed
+            again when the function is done.
+    fanout  all of a test case's invocations at once, without touching the
+            configuration. Concurrent invocations cannot share an environment,
+            so they are cold as long as the function had none (freshly deployed
+            or idle).
+
+Functions are driven in parallel (--cold-parallel), the test cases of one
+function one after another. Whether a sample really was cold is taken from
+its REPORT line (Init Duration), the rows of driven test cases get their
+start_type from it.
+
+    lambda_client = cold_start_driver.get_lambda_client()
+    execution = cold_start_driver.execute_cold_tc(lambda_client, test_case, "rotate", fanout, post)
+    cold_start_driver.run_parallel(test_cases, run_function, parallel)  one function per worker
+"""
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import boto3
+from botocore.config import Config
+
+COLD_STRATEGIES = ("sequential", "rotate", "fanout")
+
+NONCE_VARIABLE = "BENCHMARK_COLD_START_NONCE"
+
+# Configuration updates of one function are serialised by Lambda, wait for each to finish
+UPDATE_WAITER = "function_updated_v2"
+
+
+def get_lambda_client():
+    # Adaptive retries absorb the control plane throttling of many functions updated at once
+    return boto3.client('lambda', config=Config(retries={'max_attempts': 10, 'mode': 'adaptive'}))
+
+
+def function_name(test_case: dict) -> str:
+    # The functions are named like their log groups, x86-python-sha256-128
+    return test_case["cloudwatch_log_group"].replace("/aws/lambda/", "")
+
+
+def set_nonce(lambda_client, name: str, nonce: str | None) -> None:
+    """
+    Set (or with None remove) the nonce variable, keeping the function's other variables.
+    """
+    variables = lambda_client.get_function_configuration(FunctionName=name).get("Environment", {}).get("Variables", {})
+    variables = {key: value for key, value in variables.items() if key != NONCE_VARIABLE}
+    if nonce is not None:
+        variables[NONCE_VARIABLE] = nonce
+
+    lambda_client.update_function_configuration(FunctionName=name, Environment={"Variables": variables})
+    lambda_client.get_waiter(UPDATE_WAITER).wait(FunctionName=name)
+
+
+def invoke_concurrently(post, count: int) -> list[dict]:
+    """
+    count invocations released together, so none of them finds an environment freed by another.
+    """
+    if count == 1:
+        return [post()]
+
+    barrier = threading.Barrier(count)
+
+    def released():
+        barrier.wait()
+        return post()
+
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        return list(executor.map(lambda _: released(), range(count)))
+
+
+def execute_cold_tc(lambda_client, test_case: dict, strategy: str, fanout: int, post) -> dict:
+    """
+    Cold samples of one test case, post() sends one invocation and returns its client timings.
+    Returns the execution as the sequential runner records it.
+    """
+    iterations = test_case["iterations"]
+    cycle_size = iterations if strategy == "fanout" else fanout
+    name = function_name(test_case)
+
+    # Same two second buffers as the sequential runner
+    start_time = int(datetime.now(timezone.utc).timestamp() * 1000) - 2000
+    client_timings = []
+    try:
+        for cycle in range(math.ceil(iterations / cycle_size)):
+            if strategy == "rotate":
+                set_nonce(lambda_client, name, uuid.uuid4().hex)
+            count = min(cycle_size, iterations - len(client_timings))
+            client_timings.extend(invoke_concurrently(post, count))
+    finally:
+        if strategy == "rotate":
+            set_nonce(lambda_client, name, None)
+    end_time = int(datetime.now(timezone.utc).timestamp() * 1000) + 2000
+
+    for timings in client_timings:
+        timings.pop("response_body", None)
+        if timings["error"] is not None:
+            print(f"{name}: HTTP Request failed: {timings['error']}")
+
+    return {
+        "window": [start_time, end_time],
+        "request_ids": [timings["request_id"] for timings in client_timings],
+        "client_timings": client_timings,
+        "failed_requests": sum(1 for timings in client_timings if timings["error"] is not None),
+    }
+
+
+def run_parallel(test_cases: list[dict], run_function, parallel: int):
+    """
+    run_function(test_cases of one function) on up to parallel functions at a time, yields
+    (test case, execution) as their test cases finish.
+    """
+    functions = {}
+    for test_case in test_cases:
+        functions.setdefault(function_name(test_case), []).append(test_case)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = [executor.submit(run_function, function_test_cases) for function_test_cases in functions.values()]
+        for future in as_completed(futures):
+            yield from future.result()
+
+    print(f"Cold start driver: {len(test_cases)} test cases of {len(functions)} functions in {time.monotonic() - started:.0f}s")
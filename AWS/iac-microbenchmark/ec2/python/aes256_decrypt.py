@@ -1,17 +1,40 @@
 import boto3
 import base64
 import json
+import os
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 import sys
 
-def main():
+import aes_stream
+import data_key_cache
+import local_crypto
+import request_batch
+
+def create_clients() -> dict:
+    # Decrypted data keys are reused when DATA_KEY_CACHE=on, see data_key_cache.py
+    data_keys = data_key_cache.DataKeyCache.from_env()
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"kms_client": local_crypto.LocalKmsClient("aes"), "data_keys": data_keys}
     # Initialize KMS client
-    kms_client = boto3.client('kms')
+    return {"kms_client": boto3.client('kms'), "data_keys": data_keys}
 
-     # Get the name argument from sys.argv
-    request_json_raw = sys.argv[1]
+def handle_stream(request_json: dict, clients: dict) -> dict:
+    kms_client = clients["kms_client"]
 
-    request_json = json.loads(request_json_raw)
+    with aes_stream.open_input(request_json["input_file"]) as reader, open(request_json.get("output_file", os.devnull), "wb") as writer:
+        # The encrypted data key is in the stream header
+        header = aes_stream.read_header(reader)
+        response = clients["data_keys"].decrypt(kms_client, header["encrypted_data_key"])
+
+        return aes_stream.decrypt_stream(reader, writer, response['Plaintext'], header)
+
+def handle(request_json: dict, clients: dict) -> dict:
+    # A framed stream file (or "-" for stdin) from aes256_encrypt, see aes_stream.py
+    if "input_file" in request_json:
+        return handle_stream(request_json, clients)
+
+    kms_client = clients["kms_client"]
 
     # Extract the encrypted data key and encrypted message from the data
     encrypted_data_key = base64.b64decode(request_json.get('encrypted_data_key'))
@@ -19,10 +42,8 @@ def main():
     iv = base64.b64decode(request_json.get('iv'))
     tag = base64.b64decode(request_json.get('tag'))
     
-    # Decrypt the data key using KMS
-    response = kms_client.decrypt(
-        CiphertextBlob=encrypted_data_key
-    )
+    # Decrypt the data key using KMS, or take it from the cache
+    response = clients["data_keys"].decrypt(kms_client, encrypted_data_key)
 
     plaintext_data_key = response['Plaintext']
     
@@ -39,7 +60,15 @@ def main():
 
     decrypt_message = {"message" : plaintext_message}
 
-    print(json.dumps(decrypt_message))
+    return decrypt_message
+
+def main():
+    # Get the name argument from sys.argv
+    request_json_raw = sys.argv[1]
+
+    request_json = json.loads(request_json_raw)
+
+    print(json.dumps(request_batch.run(handle, request_json, create_clients())))
 
 if __name__ == "__main__":
     main()
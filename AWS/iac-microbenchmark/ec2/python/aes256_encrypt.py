@@ -7,27 +7,49 @@ import json
 # Initialize encryption using AES-GCM
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
-def main():
+import aes_stream
+import data_key_cache
+import local_crypto
+import request_batch
+
+def create_clients() -> dict:
+    # Data keys are reused across messages when DATA_KEY_CACHE=on, see data_key_cache.py
+    data_keys = data_key_cache.DataKeyCache.from_env()
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"kms_client": local_crypto.LocalKmsClient("aes"), "data_keys": data_keys}
     # Initialize KMS client
-    kms_client = boto3.client('kms')
+    return {"kms_client": boto3.client('kms'), "data_keys": data_keys}
 
-    # Get the KMS key ARN from environment variables
+def handle_stream(request_json: dict, clients: dict) -> dict:
+    kms_client = clients["kms_client"]
     kms_key_id = os.environ['AES_KMS_KEY_ARN']
+    input_file = request_json["input_file"]
 
+    response = clients["data_keys"].generate_data_key(kms_client, kms_key_id, aes_stream.input_size(input_file))
 
-    # Get the name argument from sys.argv
-    request_json_raw = sys.argv[1]
+    # Encrypted chunk by chunk into the framed stream format, memory stays at a few chunks
+    with aes_stream.open_input(input_file) as reader, open(request_json.get("output_file", os.devnull), "wb") as writer:
+        return aes_stream.encrypt_stream(
+            reader, writer, response['Plaintext'], response['CiphertextBlob'],
+            request_json.get("stream_mode", "gcm"), int(request_json.get("chunk_size", aes_stream.DEFAULT_CHUNK_SIZE))
+        )
 
-    request_json = json.loads(request_json_raw)
+def handle(request_json: dict, clients: dict) -> dict:
+    # A file (or "-" for stdin) of any size instead of the message, see aes_stream.py
+    if "input_file" in request_json:
+        return handle_stream(request_json, clients)
 
-    message = request_json["message"]
+    kms_client = clients["kms_client"]
+
+    # Get the KMS key ARN from environment variables
+    kms_key_id = os.environ['AES_KMS_KEY_ARN']
 
+    message = request_json["message"]
+    message_bytes = message.encode('utf-8')
 
-    # Create a new data key for AES-256-GCM encryption
-    response = kms_client.generate_data_key(
-        KeyId=kms_key_id,
-        KeySpec='AES_256'
-    )
+    # Create a new data key for AES-256-GCM encryption, or reuse the cached one
+    response = clients["data_keys"].generate_data_key(kms_client, kms_key_id, len(message_bytes))
     
     plaintext_data_key = response['Plaintext']
     encrypted_data_key = response['CiphertextBlob']
@@ -39,7 +61,7 @@ def main():
     encryptor = cipher.encryptor()
 
     # Encrypt the message (no padding required in AES-GCM)
-    ciphertext = encryptor.update(message.encode('utf-8')) + encryptor.finalize()
+    ciphertext = encryptor.update(message_bytes) + encryptor.finalize()
     tag = encryptor.tag
     
     # Return the response without json.dumps
@@ -50,7 +72,15 @@ def main():
         'encrypted_message': base64.b64encode(ciphertext).decode('utf-8')
     }
 
-    print(json.dumps(encrypt_result))
+    return encrypt_result
+
+def main():
+    # Get the name argument from sys.argv
+    request_json_raw = sys.argv[1]
+
+    request_json = json.loads(request_json_raw)
+
+    print(json.dumps(request_batch.run(handle, request_json, create_clients())))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,185 @@
+"""
+Persistent worker for the Python workloads.
+
+The operation module is imported once and its clients are created once, then
+requests are served over stdin/stdout as JSON lines, so warm measurements no
+longer include interpreter startup, SDK imports or client construction.
+
+    python3.11 benchmark_worker.py <operation>
+
+    worker -> {"ready": true, "operation": ..., "import_ms": ...}
+    runner -> {"input": {...}, "reinit_clients": false}
+    worker -> {"output": {...}, "error": null, "phases": {...}, "cpu_ms": ..., "rss_mb": ..., "max_rss_mb": ...,
+               "data_keys": {"hits": ..., "misses": ...} or null}
+
+Phases per request:
+    client_init_ms  create_clients() (0 when the cached clients were reused)
+    remote_ms       time spent in HTTP round trips (KMS)
+    local_ms        the rest of the handler (parsing, local crypto, encoding)
+    handle_ms       remote_ms + local_ms
+
+data_keys counts the request's data key cache hits and misses, for workloads
+with a data key cache (the AWS AES workloads, see data_key_cache.py).
+"""
+import importlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+import urllib3.connectionpool
+
+import request_batch
+
+
+class RemoteTimer:
+    """
+    Accumulates the time spent inside urllib3 requests. Both botocore and the Azure SDK
+    (through requests) send every call through HTTPConnectionPool.urlopen. Concurrent
+    requests (batches) count once, as the time at least one of them is in flight.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.total_seconds = 0.0
+        self.in_flight = 0
+        self.busy_since = 0.0
+
+    def install(self):
+        original_urlopen = urllib3.connectionpool.HTTPConnectionPool.urlopen
+        timer = self
+
+        def timed_urlopen(pool, *args, **kwargs):
+            depth = getattr(timer.local, "depth", 0)
+            timer.local.depth = depth + 1
+            # urlopen calls itself on retries and redirects, only the outermost call counts
+            if depth == 0:
+                timer.begin()
+            try:
+                return original_urlopen(pool, *args, **kwargs)
+            finally:
+                timer.local.depth = depth
+                if depth == 0:
+                    timer.end()
+
+        urllib3.connectionpool.HTTPConnectionPool.urlopen = timed_urlopen
+
+    def begin(self) -> None:
+        with self.lock:
+            if self.in_flight == 0:
+                self.busy_since = time.perf_counter()
+            self.in_flight += 1
+
+    def end(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.total_seconds += time.perf_counter() - self.busy_since
+
+    def reset(self) -> None:
+        with self.lock:
+            self.total_seconds = 0.0
+            if self.in_flight:
+                self.busy_since = time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        with self.lock:
+            return self.total_seconds * 1000
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as file:
+            resident_pages = int(file.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 ** 2)
+    except (OSError, ValueError):
+        return max_rss_mb()
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is reported in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def data_key_stats(clients: dict) -> dict:
+    data_keys = (clients or {}).get("data_keys")
+    return data_keys.stats() if data_keys is not None else None
+
+
+def serve(operation: str, protocol_in, protocol_out) -> None:
+    remote_timer = RemoteTimer()
+    remote_timer.install()
+
+    import_start = time.perf_counter()
+    workload = importlib.import_module(operation)
+    import_ms = (time.perf_counter() - import_start) * 1000
+
+    protocol_out.write(json.dumps({"ready": True, "operation": operation, "import_ms": import_ms}) + "\n")
+    protocol_out.flush()
+
+    clients = None
+
+    for line in protocol_in:
+        if not line.strip():
+            continue
+
+        request = json.loads(line)
+        response = {"output": None, "error": None}
+
+        cpu_start = time.process_time()
+        client_init_ms = 0.0
+        remote_timer.reset()
+        data_keys_before = data_key_stats(clients)
+
+        try:
+            if clients is None or request.get("reinit_clients", False):
+                init_start = time.perf_counter()
+                clients = workload.create_clients()
+                client_init_ms = (time.perf_counter() - init_start) * 1000
+                remote_timer.reset()
+                data_keys_before = data_key_stats(clients)
+
+            handle_start = time.perf_counter()
+            # Batch requests run handle once per input, see request_batch.py
+            response["output"] = request_batch.run(workload.handle, request["input"], clients)
+            handle_ms = (time.perf_counter() - handle_start) * 1000
+        except Exception as e:
+            response["error"] = f"{type(e).__name__}: {e}"
+            handle_ms = None
+
+        remote_ms = remote_timer.elapsed_ms()
+        response["phases"] = {
+            "client_init_ms": client_init_ms,
+            "remote_ms": remote_ms,
+            "local_ms": handle_ms - remote_ms if handle_ms is not None else None,
+            "handle_ms": handle_ms,
+        }
+        response["cpu_ms"] = (time.process_time() - cpu_start) * 1000
+        response["rss_mb"] = current_rss_mb()
+        response["max_rss_mb"] = max_rss_mb()
+
+        data_keys_after = data_key_stats(clients)
+        response["data_keys"] = None
+        if data_keys_after is not None:
+            before = data_keys_before or {"hits": 0, "misses": 0}
+            response["data_keys"] = {name: data_keys_after[name] - before[name] for name in data_keys_after}
+
+        protocol_out.write(json.dumps(response) + "\n")
+        protocol_out.flush()
+
+
+def main():
+    operation = sys.argv[1]
+
+    # stdout is reserved for the protocol, anything the workload or SDKs print goes to stderr
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    sys.stdout = sys.stderr
+
+    serve(operation, sys.stdin, protocol_out)
+
+
+if __name__ == "__main__":
+    main()
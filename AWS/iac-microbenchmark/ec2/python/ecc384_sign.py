@@ -5,15 +5,18 @@ from botocore.exceptions import ClientError
 import os
 import sys
 
-# Initialize the KMS client
-kms_client = boto3.client('kms')
+import local_crypto
+import request_batch
 
-def main():
-
-    # Get the name argument from sys.argv
-    request_json_raw = sys.argv[1]
+def create_clients() -> dict:
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"kms_client": local_crypto.LocalKmsClient("ecc384")}
+    # Initialize the KMS client
+    return {"kms_client": boto3.client('kms')}
 
-    request_json = json.loads(request_json_raw)
+def handle(request_json: dict, clients: dict) -> dict:
+    kms_client = clients["kms_client"]
 
     # Extract the message from the event payload
     message = request_json.get('message')
@@ -31,7 +34,15 @@ def main():
 
     # Encode the signature to base64 for easier transport
     signature_b64 = base64.b64encode(signature).decode('utf-8')
-    print(json.dumps({'signature': signature_b64}))
+    return {'signature': signature_b64}
+
+def main():
+    # Get the name argument from sys.argv
+    request_json_raw = sys.argv[1]
+
+    request_json = json.loads(request_json_raw)
+
+    print(json.dumps(request_batch.run(handle, request_json, create_clients())))
 
 if __name__ == "__main__":
     main()
@@ -5,13 +5,21 @@ from botocore.exceptions import ClientError
 import os
 import sys
 
-kms_client = boto3.client('kms')
-
-def main():
-    # Get the name argument from sys.argv
-    request_json_raw = sys.argv[1]
-
-    request_json = json.loads(request_json_raw)
+import local_crypto
+import request_batch
+
+def create_clients() -> dict:
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"kms_client": local_crypto.LocalKmsClient("ecc384")}
+    if local_crypto.crypto_mode() == "public_key":
+        # Verify with the public key fetched once instead of calling KMS, see local_crypto.py
+        return {"kms_client": local_crypto.PublicKeyKmsClient(boto3.client('kms'))}
+    # Initialize the KMS client
+    return {"kms_client": boto3.client('kms')}
+
+def handle(request_json: dict, clients: dict) -> dict:
+    kms_client = clients["kms_client"]
 
     # Extract the message from the event payload
     message = request_json.get('message')
@@ -30,7 +38,15 @@ def main():
         SigningAlgorithm='ECDSA_SHA_384'  # Use 'ECDSA_SHA_384' for P-384
     )
         
-    print(json.dumps({'verified': response['SignatureValid']}))
+    return {'verified': response['SignatureValid']}
+
+def main():
+    # Get the name argument from sys.argv
+    request_json_raw = sys.argv[1]
+
+    request_json = json.loads(request_json_raw)
+
+    print(json.dumps(request_batch.run(handle, request_json, create_clients())))
 
 if __name__ == "__main__":
     main()
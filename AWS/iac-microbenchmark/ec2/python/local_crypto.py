@@ -0,0 +1,258 @@
+"""
+Local crypto mode for the Python workloads.
+
+With crypto mode "local" a workload does the same operation in process with
+`cryptography` instead of calling KMS or Key Vault, so its time is the CPU cost
+of the crypto alone. The local clients accept the calls the workloads make on
+the real ones:
+
+    LocalKmsClient(key_name)            encrypt, decrypt, generate_data_key, sign, verify,
+                                        generate_mac (boto3 KMS client subset)
+    LocalCryptographyClient(key_name)   encrypt, decrypt, sign, verify (Key Vault
+                                        CryptographyClient subset)
+
+With crypto mode "public_key" the operations that need no secret, verify and
+RSA encrypt, are done in process with the cloud key's public key, fetched once;
+sign, decrypt, MAC and data keys still go to KMS / Key Vault:
+
+    PublicKeyKmsClient(kms_client)      verify and RSA encrypt with the GetPublicKey key,
+                                        every other call passed to kms_client
+
+On Azure the Key Vault SDK does this itself when the CryptographyClient has the
+key material, see handler_runtime.py and key_vault_client.py.
+
+The mode is the request's "crypto_mode" field, else the CRYPTO_MODE environment
+variable, else "remote".
+
+Key material is read from LOCAL_KEYS_FILE (default local_keys.json next to this
+file), in the keys file format of benchmarkcommon/kms_emulator.py:
+
+    python3 -m benchmarkcommon.kms_emulator generate-keys --keys-file local_keys.json
+
+Data keys are wrapped in the emulator's blob format too, so decrypt and verify
+inputs made with kms_emulator prepare-inputs (with the same keys file) work in
+both modes.
+
+The same file is used by lambdas/python, ec2/python, af/python and vmc/python,
+keep the copies identical.
+"""
+import base64
+import json
+import os
+import secrets
+from types import SimpleNamespace
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, hmac, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed, decode_dss_signature, encode_dss_signature
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+CRYPTO_MODES = ("remote", "local", "public_key")
+
+DEFAULT_KEYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_keys.json")
+
+# Key specs whose material is raw bytes rather than a PEM private key
+SECRET_KEY_SPECS = ("SYMMETRIC_DEFAULT", "HMAC_256", "HMAC_384")
+
+KMS_ENCRYPTION_HASHES = {"RSAES_OAEP_SHA_1": hashes.SHA1, "RSAES_OAEP_SHA_256": hashes.SHA256}
+KMS_SIGNING_HASHES = {"ECDSA_SHA_256": hashes.SHA256, "ECDSA_SHA_384": hashes.SHA384, "ECDSA_SHA_512": hashes.SHA512}
+KMS_MAC_HASHES = {"HMAC_SHA_256": hashes.SHA256, "HMAC_SHA_384": hashes.SHA384, "HMAC_SHA_512": hashes.SHA512}
+
+KEY_VAULT_ENCRYPTION_HASHES = {"RSA-OAEP": hashes.SHA1, "RSA-OAEP-256": hashes.SHA256}
+KEY_VAULT_SIGNING_HASHES = {"ES256": hashes.SHA256, "ES384": hashes.SHA384, "ES512": hashes.SHA512}
+
+# Version byte of the emulator's symmetric ciphertext blobs
+SYMMETRIC_BLOB_VERSION = 1
+
+_keys = None
+
+
+def crypto_mode(request_json: dict = None) -> str:
+    mode = (request_json or {}).get("crypto_mode") or os.environ.get("CRYPTO_MODE", "remote")
+    if mode not in CRYPTO_MODES:
+        raise ValueError(f"Unknown crypto mode: {mode}, expected one of {CRYPTO_MODES}")
+    return mode
+
+
+def load_keys(file_name: str = None) -> dict:
+    """
+    Key name -> private key object, or the secret bytes of symmetric and HMAC keys.
+    Loaded once per process.
+    """
+    global _keys
+    if _keys is not None:
+        return _keys
+
+    with open(file_name or os.environ.get("LOCAL_KEYS_FILE", DEFAULT_KEYS_FILE)) as file:
+        serialized = json.load(file)
+
+    keys = {}
+    for name, entry in serialized.items():
+        if entry["spec"] in SECRET_KEY_SPECS:
+            keys[name] = base64.b64decode(entry["material"])
+        else:
+            keys[name] = serialization.load_pem_private_key(entry["material"].encode("utf-8"), password=None)
+
+    _keys = keys
+    return keys
+
+
+def str_value(algorithm) -> str:
+    # The SDK's algorithm enums are str enums, plain strings work too
+    return getattr(algorithm, "value", algorithm)
+
+
+def oaep(hash_type) -> padding.OAEP:
+    return padding.OAEP(mgf=padding.MGF1(hash_type()), algorithm=hash_type(), label=None)
+
+
+def seal(key_name: str, key: bytes, plaintext: bytes, aad: bytes) -> bytes:
+    # version | name length | name | nonce | AES-GCM ciphertext and tag
+    name = key_name.encode("utf-8")
+    nonce = secrets.token_bytes(12)
+    return bytes([SYMMETRIC_BLOB_VERSION, len(name)]) + name + nonce + AESGCM(key).encrypt(nonce, plaintext, aad)
+
+
+def unseal(keys: dict, blob: bytes, aad: bytes) -> bytes:
+    if blob[0] != SYMMETRIC_BLOB_VERSION:
+        raise ValueError("The ciphertext was not made by a local or emulator key")
+    name_end = 2 + blob[1]
+    key = keys[blob[2:name_end].decode("utf-8")]
+    nonce = blob[name_end:name_end + 12]
+    return AESGCM(key).decrypt(nonce, blob[name_end + 12:], aad)
+
+
+def kms_public_encrypt(public_key, plaintext: bytes, encryption_algorithm: str) -> bytes:
+    return public_key.encrypt(plaintext, oaep(KMS_ENCRYPTION_HASHES[encryption_algorithm]))
+
+
+def kms_public_verify(public_key, message: bytes, signature: bytes, signing_algorithm: str, message_type: str) -> bool:
+    hash_type = KMS_SIGNING_HASHES[signing_algorithm]
+    algorithm = Prehashed(hash_type()) if message_type == "DIGEST" else hash_type()
+    try:
+        public_key.verify(signature, message, ec.ECDSA(algorithm))
+        return True
+    except InvalidSignature:
+        # KMS raises KMSInvalidSignatureException here, the workloads only time the valid case
+        return False
+
+
+def encryption_context_aad(encryption_context: dict = None) -> bytes:
+    return json.dumps(encryption_context or {}, sort_keys=True).encode("utf-8")
+
+
+class LocalKmsClient:
+    """
+    The KMS calls of the AWS workloads, done with the local key `key_name` (aes, rsa2048,
+    ecc256, sha256, ...). KeyId is accepted and ignored, it names the cloud key.
+    """
+
+    def __init__(self, key_name: str):
+        self.keys = load_keys()
+        self.key_name = key_name
+        self.key = self.keys[key_name]
+
+    def generate_data_key(self, KeySpec: str = "AES_256", EncryptionContext: dict = None, **kwargs) -> dict:
+        plaintext = secrets.token_bytes(32 if KeySpec == "AES_256" else 16)
+        return {
+            "Plaintext": plaintext,
+            "CiphertextBlob": seal(self.key_name, self.key, plaintext, encryption_context_aad(EncryptionContext)),
+        }
+
+    def encrypt(self, Plaintext: bytes, EncryptionAlgorithm: str = "SYMMETRIC_DEFAULT", EncryptionContext: dict = None, **kwargs) -> dict:
+        if EncryptionAlgorithm == "SYMMETRIC_DEFAULT":
+            blob = seal(self.key_name, self.key, Plaintext, encryption_context_aad(EncryptionContext))
+        else:
+            blob = kms_public_encrypt(self.key.public_key(), Plaintext, EncryptionAlgorithm)
+        return {"CiphertextBlob": blob, "EncryptionAlgorithm": EncryptionAlgorithm}
+
+    def decrypt(self, CiphertextBlob: bytes, EncryptionAlgorithm: str = "SYMMETRIC_DEFAULT", EncryptionContext: dict = None, **kwargs) -> dict:
+        if EncryptionAlgorithm == "SYMMETRIC_DEFAULT":
+            plaintext = unseal(self.keys, CiphertextBlob, encryption_context_aad(EncryptionContext))
+        else:
+            plaintext = self.key.decrypt(CiphertextBlob, oaep(KMS_ENCRYPTION_HASHES[EncryptionAlgorithm]))
+        return {"Plaintext": plaintext, "EncryptionAlgorithm": EncryptionAlgorithm}
+
+    def sign(self, Message: bytes, SigningAlgorithm: str, MessageType: str = "RAW", **kwargs) -> dict:
+        hash_type = KMS_SIGNING_HASHES[SigningAlgorithm]
+        algorithm = Prehashed(hash_type()) if MessageType == "DIGEST" else hash_type()
+        # KMS returns DER encoded ECDSA signatures, like cryptography
+        return {"Signature": self.key.sign(Message, ec.ECDSA(algorithm)), "SigningAlgorithm": SigningAlgorithm}
+
+    def verify(self, Message: bytes, Signature: bytes, SigningAlgorithm: str, MessageType: str = "RAW", **kwargs) -> dict:
+        valid = kms_public_verify(self.key.public_key(), Message, Signature, SigningAlgorithm, MessageType)
+        return {"SignatureValid": valid, "SigningAlgorithm": SigningAlgorithm}
+
+    def generate_mac(self, Message: bytes, MacAlgorithm: str, **kwargs) -> dict:
+        mac = hmac.HMAC(self.key, KMS_MAC_HASHES[MacAlgorithm]())
+        mac.update(Message)
+        return {"Mac": mac.finalize(), "MacAlgorithm": MacAlgorithm}
+
+
+class PublicKeyKmsClient:
+    """
+    A boto3 KMS client whose verify and RSA encrypt are done in process with the key's
+    public key, fetched with GetPublicKey on first use of each KeyId. Everything else,
+    symmetric encrypt included, is passed to kms_client.
+    """
+
+    def __init__(self, kms_client):
+        self.kms_client = kms_client
+        self.public_keys = {}
+
+    def __getattr__(self, name: str):
+        return getattr(self.kms_client, name)
+
+    def public_key(self, key_id: str):
+        if key_id not in self.public_keys:
+            response = self.kms_client.get_public_key(KeyId=key_id)
+            self.public_keys[key_id] = serialization.load_der_public_key(response["PublicKey"])
+        return self.public_keys[key_id]
+
+    def encrypt(self, KeyId: str, Plaintext: bytes, EncryptionAlgorithm: str = "SYMMETRIC_DEFAULT", **kwargs) -> dict:
+        if EncryptionAlgorithm == "SYMMETRIC_DEFAULT":
+            return self.kms_client.encrypt(KeyId=KeyId, Plaintext=Plaintext, EncryptionAlgorithm=EncryptionAlgorithm, **kwargs)
+        blob = kms_public_encrypt(self.public_key(KeyId), Plaintext, EncryptionAlgorithm)
+        return {"CiphertextBlob": blob, "KeyId": KeyId, "EncryptionAlgorithm": EncryptionAlgorithm}
+
+    def verify(self, KeyId: str, Message: bytes, Signature: bytes, SigningAlgorithm: str, MessageType: str = "RAW", **kwargs) -> dict:
+        valid = kms_public_verify(self.public_key(KeyId), Message, Signature, SigningAlgorithm, MessageType)
+        return {"KeyId": KeyId, "SignatureValid": valid, "SigningAlgorithm": SigningAlgorithm}
+
+
+class LocalCryptographyClient:
+    """
+    The Key Vault CryptographyClient calls of the Azure workloads, done with the local key
+    `key_name` (rsa2048, ecc256, ...). Results have the attributes the workloads read.
+    """
+
+    def __init__(self, key_name: str):
+        self.key = load_keys()[key_name]
+
+    def encrypt(self, algorithm, plaintext: bytes, **kwargs) -> SimpleNamespace:
+        ciphertext = self.key.public_key().encrypt(plaintext, oaep(KEY_VAULT_ENCRYPTION_HASHES[str_value(algorithm)]))
+        return SimpleNamespace(ciphertext=ciphertext, algorithm=algorithm)
+
+    def decrypt(self, algorithm, ciphertext: bytes, **kwargs) -> SimpleNamespace:
+        plaintext = self.key.decrypt(ciphertext, oaep(KEY_VAULT_ENCRYPTION_HASHES[str_value(algorithm)]))
+        return SimpleNamespace(plaintext=plaintext, algorithm=algorithm)
+
+    def sign(self, algorithm, digest: bytes, **kwargs) -> SimpleNamespace:
+        hash_type = KEY_VAULT_SIGNING_HASHES[str_value(algorithm)]
+        r, s = decode_dss_signature(self.key.sign(digest, ec.ECDSA(Prehashed(hash_type()))))
+        # Key Vault signatures are the raw r || s
+        length = (self.key.curve.key_size + 7) // 8
+        return SimpleNamespace(signature=r.to_bytes(length, "big") + s.to_bytes(length, "big"), algorithm=algorithm)
+
+    def verify(self, algorithm, digest: bytes, signature: bytes, **kwargs) -> SimpleNamespace:
+        hash_type = KEY_VAULT_SIGNING_HASHES[str_value(algorithm)]
+        half = len(signature) // 2
+        der_signature = encode_dss_signature(int.from_bytes(signature[:half], "big"), int.from_bytes(signature[half:], "big"))
+        try:
+            self.key.public_key().verify(der_signature, digest, ec.ECDSA(Prehashed(hash_type())))
+            valid = True
+        except InvalidSignature:
+            valid = False
+        return SimpleNamespace(is_valid=valid, algorithm=algorithm)
+
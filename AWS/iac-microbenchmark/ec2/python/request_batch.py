@@ -0,0 +1,138 @@
+"""
+Batch requests for the Python workloads.
+
+A request {"batch": [input, ...], <shared fields>} runs the operation once per
+input and answers {"results": [result, ...]} in input order. Each input has the
+fields of a single request, the shared fields (e.g. crypto_mode) apply to all of
+them. Requests without "batch" are handled as before.
+
+Neither KMS nor Key Vault has a batch crypto call, so the inputs are fanned out
+over BATCH_CONCURRENCY threads (default 8) to overlap their round trips. In
+local crypto mode there is nothing to overlap and they run one after another.
+
+    run(handle, request_json, clients)      EC2 / VM workloads, handle(request_json, clients)
+    lambda_handler(handler)                 decorator of a Lambda handler(event, context)
+    function_handler(main)                  decorator of an Azure Function main(req)
+
+The same file is used by lambdas/python, ec2/python, af/python and vmc/python,
+keep the copies identical.
+"""
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CONCURRENCY = 8
+
+# Counters the handlers answer per request as headers, summed over a batch (see data_key_cache.py)
+COUNTER_HEADERS = ("x-data-key-hits", "x-data-key-misses")
+
+
+def is_batch(request_json) -> bool:
+    return isinstance(request_json, dict) and isinstance(request_json.get("batch"), list)
+
+
+def batch_items(request_json: dict) -> list[dict]:
+    shared = {name: value for name, value in request_json.items() if name != "batch"}
+    return [{**shared, **item} for item in request_json["batch"]]
+
+
+def concurrency(items: list[dict]) -> int:
+    if not items:
+        return 1
+    # Local crypto is CPU only, threads would just take turns on the GIL
+    if all(item.get("crypto_mode", os.environ.get("CRYPTO_MODE")) == "local" for item in items):
+        return 1
+    return max(1, min(len(items), int(os.environ.get("BATCH_CONCURRENCY", DEFAULT_CONCURRENCY))))
+
+
+def map_items(func, items: list) -> list:
+    """
+    [func(item) for item in items], on up to concurrency(items) threads.
+    """
+    workers = concurrency(items)
+    if workers == 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, items))
+
+
+def run(handle, request_json: dict, clients: dict) -> dict:
+    if not is_batch(request_json):
+        return handle(request_json, clients)
+    return {"results": map_items(lambda item: handle(item, clients), batch_items(request_json))}
+
+
+def response_body(body):
+    # Most handlers answer JSON, a few the plain result
+    try:
+        return json.loads(body)
+    except (TypeError, ValueError):
+        return body
+
+
+def batch_status(status_codes: list[int]) -> int:
+    # The first failed input decides, so a batch with an error is not counted as a success
+    return next((code for code in status_codes if code != 200), 200)
+
+
+def batch_headers(responses: list[dict]) -> dict:
+    headers = dict(responses[0]["headers"]) if responses else {"content-type": "application/json"}
+    for name in COUNTER_HEADERS:
+        if name in headers:
+            headers[name] = str(sum(int(response["headers"].get(name, 0)) for response in responses))
+    return headers
+
+
+def lambda_handler(handler):
+    """
+    Runs handler once per input of a batch request, answering the input responses'
+    bodies as {"results": [...]}.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            body = json.loads(event["body"])
+        except (KeyError, TypeError, ValueError):
+            return handler(event, context)
+        if not is_batch(body):
+            return handler(event, context)
+
+        responses = map_items(lambda item: handler({**event, "body": json.dumps(item)}, context), batch_items(body))
+        return {
+            "statusCode": batch_status([response["statusCode"] for response in responses]),
+            "headers": batch_headers(responses),
+            "body": json.dumps({"results": [response_body(response["body"]) for response in responses]}),
+        }
+
+    return wrapper
+
+
+def function_handler(main):
+    """
+    Azure Functions counterpart of lambda_handler(). Goes below the app decorators,
+    the signature the Functions host reads is kept by functools.wraps.
+    """
+    @functools.wraps(main)
+    def wrapper(req):
+        import azure.functions as func
+
+        try:
+            body = req.get_json()
+        except ValueError:
+            return main(req)
+        if not is_batch(body):
+            return main(req)
+
+        def handle_item(item: dict):
+            return main(func.HttpRequest(method=req.method, url=req.url, headers=dict(req.headers), params=dict(req.params),
+                                         route_params=dict(req.route_params), body=json.dumps(item).encode("utf-8")))
+
+        responses = map_items(handle_item, batch_items(body))
+        return func.HttpResponse(
+            json.dumps({"results": [response_body(response.get_body().decode("utf-8")) for response in responses]}),
+            status_code=batch_status([response.status_code for response in responses]),
+            mimetype="application/json",
+        )
+
+    return wrapper
@@ -6,14 +6,18 @@ import boto3
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
-# AWS KMS Client
-kms_client = boto3.client('kms')
-
-def main():
-    # Get the name argument from sys.argv
-    request_json_raw = sys.argv[1]
-
-    request_json = json.loads(request_json_raw)
+import local_crypto
+import request_batch
+
+def create_clients() -> dict:
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"kms_client": local_crypto.LocalKmsClient("rsa3072")}
+    # AWS KMS Client
+    return {"kms_client": boto3.client('kms')}
+
+def handle(request_json: dict, clients: dict) -> dict:
+    kms_client = clients["kms_client"]
     # Get the KMS key ID from environment variables
     rsa_kms_key_id = os.environ['RSA3072_KMS_KEY_ARN']
     
@@ -45,7 +49,15 @@ def main():
         'plaintext': plaintext.decode('utf-8')
     }
 
-    print(json.dumps(result))
+    return result
+
+def main():
+    # Get the name argument from sys.argv
+    request_json_raw = sys.argv[1]
+
+    request_json = json.loads(request_json_raw)
+
+    print(json.dumps(request_batch.run(handle, request_json, create_clients())))
 
 if __name__ == "__main__":
     main()
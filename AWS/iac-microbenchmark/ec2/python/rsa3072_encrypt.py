@@ -8,15 +8,21 @@ from botocore.exceptions import ClientError
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
-# Initialize AWS KMS client
-kms_client = boto3.client('kms')
+import local_crypto
+import request_batch
 
-def main():
-
-    # Get the name argument from sys.argv
-    request_json_raw = sys.argv[1]
+def create_clients() -> dict:
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"kms_client": local_crypto.LocalKmsClient("rsa3072")}
+    if local_crypto.crypto_mode() == "public_key":
+        # Encrypt with the public key fetched once instead of calling KMS, see local_crypto.py
+        return {"kms_client": local_crypto.PublicKeyKmsClient(boto3.client('kms'))}
+    # Initialize AWS KMS client
+    return {"kms_client": boto3.client('kms')}
 
-    request_json = json.loads(request_json_raw)
+def handle(request_json: dict, clients: dict) -> dict:
+    kms_client = clients["kms_client"]
 
        # Extract the message from the input payload
     message = request_json.get('message')
@@ -49,7 +55,15 @@ def main():
         'encrypted_aes_key': base64.b64encode(encrypted_aes_key).decode('utf-8')
     }
 
-    print(json.dumps(result))
+    return result
+
+def main():
+    # Get the name argument from sys.argv
+    request_json_raw = sys.argv[1]
+
+    request_json = json.loads(request_json_raw)
+
+    print(json.dumps(request_batch.run(handle, request_json, create_clients())))
 
 if __name__ == "__main__":
     main()
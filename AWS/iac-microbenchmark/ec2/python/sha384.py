@@ -4,20 +4,22 @@ import json
 import os
 import sys
 
-
-# Initialize the boto3 client for KMS
-kms_client = boto3.client('kms')
+import local_crypto
+import request_batch
 
 SIGN_ALGORITHM = 'HMAC_SHA_384'
 
-def main():
-
-    sha_kms_key_id = os.environ['SHA384_KMS_KEY_ARN']
+def create_clients() -> dict:
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"kms_client": local_crypto.LocalKmsClient("sha384")}
+    # Initialize the boto3 client for KMS
+    return {"kms_client": boto3.client('kms')}
 
-    # Get the name argument from sys.argv
-    request_json_raw = sys.argv[1]
+def handle(request_json: dict, clients: dict) -> dict:
+    kms_client = clients["kms_client"]
 
-    request_json = json.loads(request_json_raw)
+    sha_kms_key_id = os.environ['SHA384_KMS_KEY_ARN']
 
     message = request_json["message"]
 
@@ -37,7 +39,15 @@ def main():
         "signature" : signature
     }
 
-    print(json.dumps(result_dict))
+    return result_dict
+
+def main():
+    # Get the name argument from sys.argv
+    request_json_raw = sys.argv[1]
+
+    request_json = json.loads(request_json_raw)
+
+    print(json.dumps(request_batch.run(handle, request_json, create_clients())))
 
 if __name__ == "__main__":
     main()
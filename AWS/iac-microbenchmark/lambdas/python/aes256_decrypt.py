@@ -1,13 +1,34 @@
-import boto3
-import base64
+import io
 import json
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
+import aes_stream
+import data_key_cache
+import handler_runtime
+import request_batch
+import wire_format
+
+# KMS client, created during init and reused by warm invocations (see handler_runtime.py)
+handler_runtime.kms_client()
+
+# Batch requests run the handler once per input, see request_batch.py
+@request_batch.lambda_handler
 def lambda_handler(event, context):
-    # Initialize KMS client
-    kms_client = boto3.client('kms')
-    
-    body = json.loads(event["body"])
+    # JSON or a binary frame, answered in the same format (see wire_format.py)
+    body = wire_format.request_body(event)
+
+    # KMS client, or the local key when the request asks for local crypto mode, reused by warm invocations (see handler_runtime.py)
+    kms_client = handler_runtime.kms_client("aes", body)
+
+    # A framed stream from aes256_encrypt's stream mode, the encrypted data key is in its header (see aes_stream.py)
+    if body.get('stream'):
+        reader = io.BytesIO(wire_format.field_bytes(body, 'stream'))
+        header = aes_stream.read_header(reader)
+        response = handler_runtime.data_key_cache(body).decrypt(kms_client, header['encrypted_data_key'])
+
+        plaintext_stream = io.BytesIO()
+        aes_stream.decrypt_stream(reader, plaintext_stream, response['Plaintext'], header)
+        return wire_format.response(body, {'message': plaintext_stream.getvalue().decode('utf-8')}, data_key_cache.response_headers(response))
 
     # Extract the encrypted values from the request body
     encrypted_data_key_b64 = body.get('encrypted_data_key')
@@ -23,16 +44,14 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'Missing required encrypted data or parameters.'})
         }
 
-    # Decode the base64-encoded values
-    encrypted_data_key = base64.b64decode(encrypted_data_key_b64)
-    iv = base64.b64decode(iv_b64)
-    tag = base64.b64decode(tag_b64)
-    ciphertext = base64.b64decode(encrypted_message_b64)
+    # Decode the base64-encoded values, a binary request has the bytes already
+    encrypted_data_key = bytes(wire_format.field_bytes(body, 'encrypted_data_key'))
+    iv = wire_format.field_bytes(body, 'iv')
+    tag = bytes(wire_format.field_bytes(body, 'tag'))
+    ciphertext = wire_format.field_bytes(body, 'encrypted_message')
     
-    # Decrypt the data key using KMS
-    response = kms_client.decrypt(
-        CiphertextBlob=encrypted_data_key
-    )
+    # Decrypt the data key using KMS, or take it from the cache when the request turns it on (see data_key_cache.py)
+    response = handler_runtime.data_key_cache(body).decrypt(kms_client, encrypted_data_key)
 
     plaintext_data_key = response['Plaintext']
     
@@ -43,11 +62,6 @@ def lambda_handler(event, context):
     # Decrypt the message
     plaintext_message = decryptor.update(ciphertext) + decryptor.finalize()
     
-    return {
-        'statusCode': 200,
-        'headers' : {"Access-Control-Allow-Origin": "*",
-                     "content-type": "application/json"},
-        'body': json.dumps({
-            'message': plaintext_message.decode('utf-8')
-        })
-    }
+    return wire_format.response(body, {
+        'message': plaintext_message.decode('utf-8')
+    }, data_key_cache.response_headers(response))
@@ -1,20 +1,31 @@
-import boto3
-import base64
+import io
 import os
 import secrets
 import json
 # Initialize encryption using AES-GCM
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
-def lambda_handler(event, context):
+import aes_stream
+import data_key_cache
+import handler_runtime
+import request_batch
+import wire_format
+
+# KMS client, created during init and reused by warm invocations (see handler_runtime.py)
+handler_runtime.kms_client()
 
-    # Initialize KMS client
-    kms_client = boto3.client('kms')
+# Batch requests run the handler once per input, see request_batch.py
+@request_batch.lambda_handler
+def lambda_handler(event, context):
 
     # Get the KMS key ARN from environment variables
     kms_key_id = os.environ['AES_KMS_KEY_ARN']
 
-    body = json.loads(event["body"])
+    # JSON or a binary frame, answered in the same format (see wire_format.py)
+    body = wire_format.request_body(event)
+
+    # KMS client, or the local key when the request asks for local crypto mode, reused by warm invocations (see handler_runtime.py)
+    kms_client = handler_runtime.kms_client("aes", body)
 
     # Extract the message from the API Gateway event
     # the json is initially a physical string
@@ -28,15 +39,23 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'Message not provided.'})
         }
 
-    # Create a new data key for AES-256-GCM encryption
-    response = kms_client.generate_data_key(
-        KeyId=kms_key_id,
-        KeySpec='AES_256'
-    )
+    message_bytes = message.encode('utf-8')
+
+    # Create a new data key for AES-256-GCM encryption, or reuse the cached one when the request turns
+    # the data key cache on, kept by warm invocations (see data_key_cache.py)
+    response = handler_runtime.data_key_cache(body).generate_data_key(kms_client, kms_key_id, len(message_bytes))
     
     plaintext_data_key = response['Plaintext']
     encrypted_data_key = response['CiphertextBlob']
 
+    # Large messages in framed chunks when the request asks for a stream mode (see aes_stream.py)
+    stream_mode = body.get('stream_mode')
+    if stream_mode:
+        stream = io.BytesIO()
+        aes_stream.encrypt_stream(io.BytesIO(message_bytes), stream, plaintext_data_key, encrypted_data_key,
+                                  stream_mode, int(body.get('chunk_size', aes_stream.DEFAULT_CHUNK_SIZE)))
+        return wire_format.response(body, {'stream': stream.getbuffer()}, data_key_cache.response_headers(response))
+
     # Generate 12 secure random bytes
     iv = secrets.token_bytes(12)  # 12 bytes for AES-GCM IV
 
@@ -44,20 +63,13 @@ def lambda_handler(event, context):
     encryptor = cipher.encryptor()
 
     # Encrypt the message (no padding required in AES-GCM)
-    ciphertext = encryptor.update(message.encode('utf-8')) + encryptor.finalize()
+    ciphertext = encryptor.update(message_bytes) + encryptor.finalize()
     tag = encryptor.tag
     
-    # Return the response without json.dumps
-    return {
-        'statusCode': 200,
-        'headers' : {"Access-Control-Allow-Origin": "*",
-                     "content-type": "application/json"},
-
-        'body' : json.dumps({
-            'encrypted_data_key': base64.b64encode(encrypted_data_key).decode('utf-8'),
-            'iv': base64.b64encode(iv).decode('utf-8'),
-            'tag': base64.b64encode(tag).decode('utf-8'),
-            'encrypted_message': base64.b64encode(ciphertext).decode('utf-8')
-        })
-       
-    }
+    # Base64 encoded in a JSON response, the raw bytes in a binary one
+    return wire_format.response(body, {
+        'encrypted_data_key': encrypted_data_key,
+        'iv': iv,
+        'tag': tag,
+        'encrypted_message': ciphertext
+    }, data_key_cache.response_headers(response))
@@ -0,0 +1,211 @@
+"""
+Streaming AES of the AES workloads, for payloads of any size.
+
+The plaintext is read and encrypted in fixed-size chunks, so memory stays at a
+few chunks whatever the payload size. The output is a framed stream:
+
+    header  "AESS" | version (1) | mode | chunk size (u32) | nonce prefix (8 bytes)
+            | encrypted data key length (u16) | encrypted data key
+    frames  length (u32, top bit set on the last frame) | ciphertext
+
+Stream modes:
+    gcm     every chunk is its own AES-256-GCM message (16 byte tag appended), with
+            nonce prefix + chunk index as nonce and the header, chunk index and last
+            flag as associated data, so reordered, dropped or truncated frames fail
+    ctr     one AES-256-CTR keystream over all chunks, for the raw cipher throughput;
+            nothing is authenticated
+
+The encrypted data key travels in the header, so a stream decrypts with nothing
+but the stream and KMS (or the local key).
+
+    encrypt_stream(reader, writer, data_key, encrypted_data_key, stream_mode, chunk_size)
+    header = read_header(reader)
+    decrypt_stream(reader, writer, data_key, header)
+
+Both return {"plaintext_bytes": ..., "ciphertext_bytes": ..., "chunks": ...}.
+
+The same file is used by lambdas/python and ec2/python, keep the copies identical.
+"""
+import contextlib
+import os
+import secrets
+import struct
+import sys
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+MAGIC = b"AESS"
+VERSION = 1
+
+# stream mode -> header byte
+STREAM_MODES = {"gcm": 1, "ctr": 2}
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# Upper bound a reader accepts, so a corrupt length cannot make it allocate gigabytes
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+TAG_BYTES = 16
+LAST_FRAME = 0x80000000
+
+# magic, version, mode, chunk size, nonce prefix, encrypted data key length
+HEADER = struct.Struct(">4sBBI8sH")
+FRAME = struct.Struct(">I")
+# chunk index, last flag (GCM associated data after the header)
+CHUNK = struct.Struct(">IB")
+
+
+def open_input(path: str):
+    # "-" is stdin, left open when done
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin.buffer)
+    return open(path, "rb")
+
+
+def input_size(path: str) -> int:
+    # Unknown for stdin
+    return 0 if path == "-" else os.path.getsize(path)
+
+
+def read_full(reader, size: int) -> bytes:
+    """
+    Up to size bytes, fewer only at the end of the input (pipes return short reads).
+    """
+    data = reader.read(size)
+    if len(data) in (0, size):
+        return data
+
+    parts = [data]
+    received = len(data)
+    while received < size:
+        part = reader.read(size - received)
+        if not part:
+            break
+        parts.append(part)
+        received += len(part)
+    return b"".join(parts)
+
+
+def read_exactly(reader, size: int) -> bytes:
+    data = read_full(reader, size)
+    if len(data) != size:
+        raise ValueError("Truncated AES stream")
+    return data
+
+
+def chunks(reader, chunk_size: int):
+    """
+    (index, chunk, last) of the input, one chunk read ahead to know the last one. An empty
+    input is one empty last chunk.
+    """
+    current = read_full(reader, chunk_size)
+    index = 0
+    while True:
+        following = read_full(reader, chunk_size) if len(current) == chunk_size else b""
+        last = not following
+        yield index, current, last
+        if last:
+            return
+        current = following
+        index += 1
+
+
+def encode_header(stream_mode: str, chunk_size: int, nonce_prefix: bytes, encrypted_data_key: bytes) -> bytes:
+    return HEADER.pack(MAGIC, VERSION, STREAM_MODES[stream_mode], chunk_size, nonce_prefix, len(encrypted_data_key)) + encrypted_data_key
+
+
+def read_header(reader) -> dict:
+    raw = read_exactly(reader, HEADER.size)
+    magic, version, mode, chunk_size, nonce_prefix, key_length = HEADER.unpack(raw)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not an AES stream (or an unknown version)")
+
+    stream_modes = {value: name for name, value in STREAM_MODES.items()}
+    if mode not in stream_modes:
+        raise ValueError(f"Unknown stream mode byte: {mode}")
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Invalid chunk size: {chunk_size}")
+
+    encrypted_data_key = read_exactly(reader, key_length)
+    return {
+        "stream_mode": stream_modes[mode],
+        "chunk_size": chunk_size,
+        "nonce_prefix": nonce_prefix,
+        "encrypted_data_key": encrypted_data_key,
+        # Authenticated with every GCM chunk
+        "raw": raw + encrypted_data_key,
+    }
+
+
+def gcm_nonce(nonce_prefix: bytes, index: int) -> bytes:
+    if index >= 2 ** 32:
+        raise ValueError("AES stream has too many chunks for its nonces, use a larger chunk size")
+    return nonce_prefix + index.to_bytes(4, "big")
+
+
+def encrypt_stream(reader, writer, data_key: bytes, encrypted_data_key: bytes, stream_mode: str = "gcm", chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    if stream_mode not in STREAM_MODES:
+        raise ValueError(f"Unknown stream mode: {stream_mode}, expected one of {list(STREAM_MODES)}")
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Invalid chunk size: {chunk_size}")
+
+    nonce_prefix = secrets.token_bytes(8)
+    header = encode_header(stream_mode, chunk_size, nonce_prefix, encrypted_data_key)
+    writer.write(header)
+
+    if stream_mode == "gcm":
+        aesgcm = AESGCM(data_key)
+    else:
+        encryptor = Cipher(algorithms.AES(data_key), modes.CTR(nonce_prefix + bytes(8))).encryptor()
+
+    stats = {"plaintext_bytes": 0, "ciphertext_bytes": len(header), "chunks": 0}
+    for index, chunk, last in chunks(reader, chunk_size):
+        if stream_mode == "gcm":
+            ciphertext = aesgcm.encrypt(gcm_nonce(nonce_prefix, index), chunk, header + CHUNK.pack(index, last))
+        else:
+            ciphertext = encryptor.update(chunk)
+
+        writer.write(FRAME.pack(len(ciphertext) | (LAST_FRAME if last else 0)))
+        writer.write(ciphertext)
+        stats["plaintext_bytes"] += len(chunk)
+        stats["ciphertext_bytes"] += FRAME.size + len(ciphertext)
+        stats["chunks"] += 1
+
+    return stats
+
+
+def decrypt_stream(reader, writer, data_key: bytes, header: dict) -> dict:
+    stream_mode = header["stream_mode"]
+    if stream_mode == "gcm":
+        aesgcm = AESGCM(data_key)
+    else:
+        decryptor = Cipher(algorithms.AES(data_key), modes.CTR(header["nonce_prefix"] + bytes(8))).decryptor()
+
+    max_frame = header["chunk_size"] + (TAG_BYTES if stream_mode == "gcm" else 0)
+    stats = {"plaintext_bytes": 0, "ciphertext_bytes": len(header["raw"]), "chunks": 0}
+    index = 0
+    while True:
+        (length,) = FRAME.unpack(read_exactly(reader, FRAME.size))
+        last = bool(length & LAST_FRAME)
+        length &= ~LAST_FRAME
+        if length > max_frame:
+            raise ValueError(f"AES stream frame of {length} bytes is larger than its chunk size")
+
+        ciphertext = read_exactly(reader, length)
+        if stream_mode == "gcm":
+            # Raises InvalidTag for a modified, reordered or wrongly flagged chunk
+            chunk = aesgcm.decrypt(gcm_nonce(header["nonce_prefix"], index), ciphertext, header["raw"] + CHUNK.pack(index, last))
+        else:
+            chunk = decryptor.update(ciphertext)
+
+        writer.write(chunk)
+        stats["plaintext_bytes"] += len(chunk)
+        stats["ciphertext_bytes"] += FRAME.size + length
+        stats["chunks"] += 1
+        index += 1
+        if last:
+            break
+
+    if reader.read(1):
+        raise ValueError("Data after the last frame of the AES stream")
+    return stats
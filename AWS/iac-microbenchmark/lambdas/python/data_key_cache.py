@@ -0,0 +1,161 @@
+"""
+Data key cache of the AES workloads (envelope encryption).
+
+Without it aes256_encrypt makes a GenerateDataKey call for every message and
+aes256_decrypt a KMS Decrypt of every encrypted data key. With the cache on,
+encrypt reuses a data key until it is older than DATA_KEY_MAX_AGE_SECONDS
+(default 300), has encrypted DATA_KEY_MAX_MESSAGES messages (default 1000) or
+would go past DATA_KEY_MAX_BYTES of plaintext (default 1 GiB). Decrypt keeps the
+last DATA_KEY_CACHE_SIZE (default 1000) decrypted data keys in an LRU keyed by
+the encrypted data key, dropping them after the same max age.
+
+    data_keys = DataKeyCache.from_env(request_json)
+    data_keys.generate_data_key(kms_client, key_id, message_bytes)  GenerateDataKey response
+    data_keys.decrypt(kms_client, ciphertext_blob)                  Decrypt response
+    data_keys.stats()                                               {"hits": ..., "misses": ...}
+
+The responses carry "Cached": True when no KMS call was made. With the cache off
+every call goes to KMS and counts as a miss, so cached and uncached runs report
+the same counters.
+
+The cache is on when the request's "data_key_cache" field, else the
+DATA_KEY_CACHE environment variable, is "on" (default "off").
+
+The same file is used by lambdas/python and ec2/python, keep the copies identical.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DATA_KEY_CACHE_SETTINGS = ("off", "on")
+
+DEFAULT_MAX_AGE_SECONDS = 300
+DEFAULT_MAX_MESSAGES = 1000
+DEFAULT_MAX_BYTES = 1024 ** 3
+DEFAULT_CACHE_SIZE = 1000
+
+
+def setting(request_json: dict = None) -> str:
+    value = (request_json or {}).get("data_key_cache") or os.environ.get("DATA_KEY_CACHE", "off")
+    if value not in DATA_KEY_CACHE_SETTINGS:
+        raise ValueError(f"Unknown data key cache setting: {value}, expected one of {DATA_KEY_CACHE_SETTINGS}")
+    return value
+
+
+class DataKeyCache:
+
+    def __init__(self, enabled: bool = True, max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS, max_messages: int = DEFAULT_MAX_MESSAGES,
+                 max_bytes: int = DEFAULT_MAX_BYTES, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.enabled = enabled
+        self.max_age_seconds = max_age_seconds
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.cache_size = cache_size
+        # Batches call from several threads. Held across GenerateDataKey so concurrent messages share one key
+        self.lock = threading.Lock()
+        # KMS key id -> {"response", "created", "messages", "bytes"}
+        self.encryption_keys = {}
+        # encrypted data key -> (created, Decrypt response), least recently used first
+        self.decryption_keys = OrderedDict()
+        # encrypted data key -> Event set once the thread decrypting it is done
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, request_json: dict = None) -> "DataKeyCache":
+        return cls(
+            enabled=setting(request_json) == "on",
+            max_age_seconds=float(os.environ.get("DATA_KEY_MAX_AGE_SECONDS", DEFAULT_MAX_AGE_SECONDS)),
+            max_messages=int(os.environ.get("DATA_KEY_MAX_MESSAGES", DEFAULT_MAX_MESSAGES)),
+            max_bytes=int(os.environ.get("DATA_KEY_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            cache_size=int(os.environ.get("DATA_KEY_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+        )
+
+    def expired(self, created: float) -> bool:
+        return time.monotonic() - created >= self.max_age_seconds
+
+    def count(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def generate_data_key(self, kms_client, key_id: str, message_bytes: int) -> dict:
+        """
+        An AES-256 data key of key_id for a message of message_bytes, the cached one while it is within its limits.
+        """
+        # A message larger than a key may ever encrypt gets a key of its own
+        if not self.enabled or message_bytes > self.max_bytes:
+            response = kms_client.generate_data_key(KeyId=key_id, KeySpec='AES_256')
+            with self.lock:
+                self.count(False)
+            return {**response, "Cached": False}
+
+        with self.lock:
+            entry = self.encryption_keys.get(key_id)
+            hit = (entry is not None and not self.expired(entry["created"])
+                   and entry["messages"] < self.max_messages and entry["bytes"] + message_bytes <= self.max_bytes)
+            if not hit:
+                entry = {
+                    "response": kms_client.generate_data_key(KeyId=key_id, KeySpec='AES_256'),
+                    "created": time.monotonic(),
+                    "messages": 0,
+                    "bytes": 0,
+                }
+                self.encryption_keys[key_id] = entry
+
+            entry["messages"] += 1
+            entry["bytes"] += message_bytes
+            self.count(hit)
+            return {**entry["response"], "Cached": hit}
+
+    def decrypt(self, kms_client, ciphertext_blob: bytes) -> dict:
+        """
+        KMS Decrypt of an encrypted data key, answered from the LRU when it was decrypted before.
+        """
+        if not self.enabled:
+            response = kms_client.decrypt(CiphertextBlob=ciphertext_blob)
+            with self.lock:
+                self.count(False)
+            return {**response, "Cached": False}
+
+        while True:
+            with self.lock:
+                entry = self.decryption_keys.get(ciphertext_blob)
+                if entry is not None and not self.expired(entry[0]):
+                    self.decryption_keys.move_to_end(ciphertext_blob)
+                    self.count(True)
+                    return {**entry[1], "Cached": True}
+
+                pending = self.pending.get(ciphertext_blob)
+                if pending is None:
+                    pending = self.pending[ciphertext_blob] = threading.Event()
+                    break
+            # Another thread is decrypting the same data key, wait for it rather than calling KMS twice
+            pending.wait()
+
+        # Not under the lock, different data keys are decrypted concurrently
+        try:
+            response = kms_client.decrypt(CiphertextBlob=ciphertext_blob)
+            with self.lock:
+                self.count(False)
+                self.decryption_keys[ciphertext_blob] = (time.monotonic(), response)
+                self.decryption_keys.move_to_end(ciphertext_blob)
+                while len(self.decryption_keys) > self.cache_size:
+                    self.decryption_keys.popitem(last=False)
+        finally:
+            with self.lock:
+                self.pending.pop(ciphertext_blob).set()
+        return {**response, "Cached": False}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def response_headers(response: dict) -> dict:
+    # Per invocation counters for the Lambda runner, summed over a batch by request_batch.py
+    cached = response.get("Cached", False)
+    return {"x-data-key-hits": str(int(cached)), "x-data-key-misses": str(int(not cached))}
@@ -1,20 +1,28 @@
 import json
-import boto3
-import base64
 from botocore.exceptions import ClientError
 import os
-# Initialize the KMS client
-kms_client = boto3.client('kms')
 
+import handler_runtime
+import request_batch
+import wire_format
+
+# KMS client, created during init and reused by warm invocations (see handler_runtime.py)
+handler_runtime.kms_client()
+
+# Batch requests run the handler once per input, see request_batch.py
+@request_batch.lambda_handler
 def lambda_handler(event, context):
 
-    body = json.loads(event["body"])
+    # JSON or a binary frame, answered in the same format (see wire_format.py)
+    body = wire_format.request_body(event)
+    # KMS, or the local key when the request asks for local crypto mode, reused by warm invocations (see handler_runtime.py)
+    kms = handler_runtime.kms_client("ecc256", body)
     message = body['message']  # The message to sign
 
     ecc_kms_key_id = os.environ['ECC256_KMS_KEY_ARN']
     try:
         # Sign the message
-        response = kms_client.sign(
+        response = kms.sign(
             KeyId=ecc_kms_key_id,
             Message=message.encode('utf-8'),
             MessageType='RAW',
@@ -23,15 +31,8 @@ def lambda_handler(event, context):
         
         signature = response['Signature']
 
-        # Encode the signature to base64 for easier transport
-        signature_b64 = base64.b64encode(signature).decode('utf-8')
-
-        return {
-            'statusCode': 200,
-        'headers' : {"Access-Control-Allow-Origin": "*",
-                     "content-type": "application/json"},
-            'body': json.dumps({'signature': signature_b64})
-        }
+        # Encoded to base64 for a JSON response, the raw bytes in a binary one
+        return wire_format.response(body, {'signature': signature})
 
     except ClientError as e:
         return {
@@ -1,25 +1,32 @@
 import json
-import boto3
-import base64
 from botocore.exceptions import ClientError
 import os
 
-kms_client = boto3.client('kms')
+import handler_runtime
+import request_batch
+import wire_format
 
+# KMS client, created during init and reused by warm invocations (see handler_runtime.py)
+handler_runtime.kms_client()
+
+# Batch requests run the handler once per input, see request_batch.py
+@request_batch.lambda_handler
 def lambda_handler(event, context):
 
-    body = json.loads(event["body"])
+    # JSON or a binary frame, answered in the same format (see wire_format.py)
+    body = wire_format.request_body(event)
+    # KMS, or the local key when the request asks for local crypto mode, reused by warm invocations (see handler_runtime.py)
+    kms = handler_runtime.kms_client("ecc256", body)
     message = body['message']  # The original message
-    signature_b64 = body['signature']  # The base64 encoded signature
 
 
     ecc_kms_key_id = os.environ['ECC256_KMS_KEY_ARN']
     # Decode the signature from base64
-    signature = base64.b64decode(signature_b64)
+    signature = bytes(wire_format.field_bytes(body, 'signature'))
 
     try:
         # Verify the signature
-        response = kms_client.verify(
+        response = kms.verify(
             KeyId=ecc_kms_key_id,
             Message=message.encode('utf-8'),
             MessageType='RAW',
@@ -27,12 +34,7 @@ def lambda_handler(event, context):
             SigningAlgorithm='ECDSA_SHA_256'  # Use 'ECDSA_SHA_384' for P-384
         )
         
-        return {
-            'statusCode': 200,
-        'headers' : {"Access-Control-Allow-Origin": "*",
-                     "content-type": "application/json"},
-            'body': json.dumps({'verified': response['SignatureValid']})
-        }
+        return wire_format.response(body, {'verified': response['SignatureValid']})
     except ClientError as e:
         return {
             'statusCode': e.response['ResponseMetadata']['HTTPStatusCode'],
@@ -15,6 +15,11 @@ for py_file in *.py; do
   # Get the filename without the extension
   dir_name="${py_file%.py}"
 
+  # Shared by every function, zipped into each of them below
+  if [[ "$dir_name" == "local_crypto" || "$dir_name" == "handler_runtime" || "$dir_name" == "request_batch" || "$dir_name" == "data_key_cache" || "$dir_name" == "aes_stream" || "$dir_name" == "wire_format" ]]; then
+    continue
+  fi
+
   # Check if the current file is in the allowed list
   #if [[ ! " ${ALLOWED_FILES[@]} " =~ " ${dir_name} " ]]; then
     #echo "Skipping $dir_name (not in allowed list)"
@@ -50,6 +55,21 @@ for py_file in *.py; do
 
   # zip the py into it
   zip -9 $dir_name.zip $dir_name.py
+  # client cache of warm invocations (see handler_runtime.py)
+  zip -9 -j $dir_name.zip ../../handler_runtime.py
+  # batch requests (see request_batch.py)
+  zip -9 -j $dir_name.zip ../../request_batch.py
+  # data key cache of the AES functions (see data_key_cache.py)
+  zip -9 -j $dir_name.zip ../../data_key_cache.py
+  # chunked AES stream format of the AES functions (see aes_stream.py)
+  zip -9 -j $dir_name.zip ../../aes_stream.py
+  # binary wire format of the requests and responses (see wire_format.py)
+  zip -9 -j $dir_name.zip ../../wire_format.py
+  # local crypto mode, with the keys when they were provisioned (see local_crypto.py)
+  zip -9 -j $dir_name.zip ../../local_crypto.py
+  if [ -f ../../local_keys.json ]; then
+    zip -9 -j $dir_name.zip ../../local_keys.json
+  fi
   # remove the py inside the folder so the zip is the only thing in it.
   rm $dir_name.py
 
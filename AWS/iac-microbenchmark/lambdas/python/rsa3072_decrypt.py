@@ -1,32 +1,34 @@
-import base64
 import json
 import os
 from botocore.exceptions import ClientError
-import boto3
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
-# AWS KMS Client
-kms_client = boto3.client('kms')
+import handler_runtime
+import request_batch
+import wire_format
 
+# KMS client, created during init and reused by warm invocations (see handler_runtime.py)
+handler_runtime.kms_client()
+
+# Batch requests run the handler once per input, see request_batch.py
+@request_batch.lambda_handler
 def lambda_handler(event, context):
     # Get the KMS key ID from environment variables or directly
     rsa_kms_key_id = os.environ['RSA3072_KMS_KEY_ARN']
     
-    body = json.loads(event['body'])
-    # Get the data from the event
-    encrypted_aes_key_b64 = body.get('encrypted_aes_key')
-    iv_b64 = body.get('iv')
-    ciphertext_b64 = body.get('ciphertext')
-
-    # Decode base64 values
-    encrypted_aes_key = base64.b64decode(encrypted_aes_key_b64)
-    iv = base64.b64decode(iv_b64)
-    ciphertext = base64.b64decode(ciphertext_b64)
+    # JSON or a binary frame, answered in the same format (see wire_format.py)
+    body = wire_format.request_body(event)
+    # KMS, or the local key when the request asks for local crypto mode, reused by warm invocations (see handler_runtime.py)
+    kms = handler_runtime.kms_client("rsa3072", body)
+    # Decode base64 values, a binary request has the bytes already
+    encrypted_aes_key = bytes(wire_format.field_bytes(body, 'encrypted_aes_key'))
+    iv = wire_format.field_bytes(body, 'iv')
+    ciphertext = wire_format.field_bytes(body, 'ciphertext')
 
     # Decrypt the AES key using KMS
     try:
-        response = kms_client.decrypt(
+        response = kms.decrypt(
             CiphertextBlob=encrypted_aes_key,
             KeyId=rsa_kms_key_id,
             EncryptionAlgorithm="RSAES_OAEP_SHA_256"
@@ -44,6 +46,9 @@ def lambda_handler(event, context):
     decryptor = cipher.decryptor()
     plaintext = decryptor.update(ciphertext) + decryptor.finalize()
 
+    # The JSON response is the plain message
+    if wire_format.is_binary(body):
+        return wire_format.response(body, {'message': plaintext.decode('utf-8')})
     return {
         'statusCode': 200,
         'headers' : {"Access-Control-Allow-Origin": "*",
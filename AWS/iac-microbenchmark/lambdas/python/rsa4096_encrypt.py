@@ -1,17 +1,25 @@
-import base64
 import json
 import os
 from botocore.exceptions import ClientError
-import boto3
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 import secrets
-# AWS KMS Client
-kms_client = boto3.client('kms')
 
+import handler_runtime
+import request_batch
+import wire_format
+
+# KMS client, created during init and reused by warm invocations (see handler_runtime.py)
+handler_runtime.kms_client()
+
+# Batch requests run the handler once per input, see request_batch.py
+@request_batch.lambda_handler
 def lambda_handler(event, context):
 
-    body = json.loads(event['body'])
+    # JSON or a binary frame, answered in the same format (see wire_format.py)
+    body = wire_format.request_body(event)
+    # KMS, or the local key when the request asks for local crypto mode, reused by warm invocations (see handler_runtime.py)
+    kms = handler_runtime.kms_client("rsa4096", body)
     # Get the KMS key ID from environment variables or directly
     rsa_kms_key_id = os.environ['RSA4096_KMS_KEY_ARN']
     
@@ -30,7 +38,7 @@ def lambda_handler(event, context):
 
     # Encrypt the AES key using KMS
     try:
-        response = kms_client.encrypt(
+        response = kms.encrypt(
             KeyId=rsa_kms_key_id,
             Plaintext=aes_key,
             EncryptionAlgorithm="RSAES_OAEP_SHA_256"
@@ -45,13 +53,9 @@ def lambda_handler(event, context):
             'body': json.dumps('Encryption failed')
         }
 
-    return {
-        'statusCode': 200,
-        'headers' : {"Access-Control-Allow-Origin": "*",
-                     "content-type": "application/json"},
-        'body' : json.dumps({
-            'iv': base64.b64encode(iv).decode('utf-8'),
-            'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
-            'encrypted_aes_key': base64.b64encode(encrypted_aes_key).decode('utf-8')
-        })        
-    }
+    # Base64 encoded in a JSON response, the raw bytes in a binary one
+    return wire_format.response(body, {
+        'iv': iv,
+        'ciphertext': ciphertext,
+        'encrypted_aes_key': encrypted_aes_key
+    })
@@ -1,17 +1,24 @@
-import boto3
-import base64
 import json
 import os
 
-# Initialize the boto3 client for KMS
-kms_client = boto3.client('kms')
+import handler_runtime
+import request_batch
+import wire_format
+
+# KMS client, created during init and reused by warm invocations (see handler_runtime.py)
+handler_runtime.kms_client()
 
 SIGN_ALGORITHM = 'HMAC_SHA_256'
 
+# Batch requests run the handler once per input, see request_batch.py
+@request_batch.lambda_handler
 def lambda_handler(event, context):
 
     # Extract the message from the event payload
-    body = json.loads(event['body'])
+    # JSON or a binary frame, answered in the same format (see wire_format.py)
+    body = wire_format.request_body(event)
+    # KMS, or the local key when the request asks for local crypto mode, reused by warm invocations (see handler_runtime.py)
+    kms = handler_runtime.kms_client("sha256", body)
 
     message = body.get('message')
 
@@ -22,21 +29,15 @@ def lambda_handler(event, context):
 
     try:
         # Use KMS to generate (HMAC) the message
-        response = kms_client.generate_mac(
+        response = kms.generate_mac(
             KeyId=sha_kms_key_id,
             Message=message_bytes,
             MacAlgorithm=SIGN_ALGORITHM
         )
-        # Base64 encode the signature for output
-        signature = base64.b64encode(response['Mac']).decode('utf-8')
-        return {
-            'statusCode': 200,
-            'headers' : {"Access-Control-Allow-Origin": "*",
-                     "content-type": "application/json"},
-            'body': json.dumps({
-                'signature': signature
-            })
-        }
+        # Base64 encoded in a JSON response, the raw bytes in a binary one
+        return wire_format.response(body, {
+            'signature': response['Mac']
+        })
     except Exception as e:
         return {
             'statusCode': 500,
@@ -1,8 +1,18 @@
 import time
 import json
+import os
+import sys
+import argparse
 import requests
+import uuid
 from datetime import datetime, timezone
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from benchmarkcommon import app_insights
+from benchmarkcommon import app_insights_query
+from benchmarkcommon import matrix_plan
+from benchmarkcommon import results_store
+
 def get_correct_answers(operations: list) -> dict:
     correct_answers = {}
 
@@ -35,13 +45,13 @@ def get_testcase_inputs(operations: list) -> dict:
 
 # build the key lookup dictionary for getting af api urls.
 # value is string api_url
-def get_azure_func_api_urls() -> dict[str,str]:
+def get_azure_func_api_urls(urls_file: str = "./function_urls.json") -> dict[str,str]:
 
     # Initialize an empty dictionary to store API URLs
     azure_api_urls = {}
 
     # Read the JSON file
-    with open("./function_urls.json") as file:
+    with open(urls_file) as file:
         # Load the JSON content
         azure_api_urls = json.load(file)
 
@@ -69,7 +79,7 @@ def execute_warmup(azure_url: str, payload_body: str) -> None:
 
 
 
-def create_tc(start_option: str, operation: str, language: str, azure_url: str, test_case_input: dict[str,str], correct_answer: dict[str,str], iterations: int, arch_dir: str)-> dict:
+def create_tc(start_option: str, operation: str, language: str, azure_url: str, test_case_input: dict[str,str], correct_answer: dict[str,str], iterations: int, arch_dir: str, crypto_mode: str = "remote", batch_size: int = 1)-> dict:
 
     # Clean in case of c# -> csharp
     operationName = ""
@@ -77,6 +87,14 @@ def create_tc(start_option: str, operation: str, language: str, azure_url: str,
         operationName = f"dotnet_{operation}_program"
 
     operationName = f"{language}_{operation}"
+
+    # The Python functions take a batch of inputs in one request (see request_batch.py)
+    # and read the crypto mode from the request (see local_crypto.py)
+    if language == "python":
+        if batch_size > 1:
+            test_case_input = {"batch": [test_case_input] * batch_size}
+        test_case_input = {**test_case_input, "crypto_mode": crypto_mode}
+
     # Build the test case
     test_case = {
         "operation_input": test_case_input,
@@ -87,7 +105,9 @@ def create_tc(start_option: str, operation: str, language: str, azure_url: str,
         "language" : language,
         "azure_url" : azure_url,
         "architecture": arch_dir,
-        "operationName" : operationName
+        "operationName" : operationName,
+        "crypto_mode": crypto_mode,
+        "batch_size": batch_size
     }
 
     return test_case
@@ -130,11 +150,15 @@ def execute_tc(test_case: dict):
     # Format as KQL datetime format
     start_kql_datetime = dt.strftime("%Y-%m-%dT%H:%M:%SZ")
     request_headers = {"Content-Type": "application/json"}
+    # The measured requests carry the test case's id in their url, App Insights records it and the
+    # rows are joined to the test case on it, not on the window (see app_insights.py)
+    case_id = uuid.uuid4().hex
+    case_params = {app_insights.CASE_PARAMETER: case_id}
     for i in range(0,iterations):
         print(i)
         try:
             # Perform an HTTP POST request
-            response = requests.post(azure_url, json=payload_body, headers=request_headers)
+            response = requests.post(azure_url, json=payload_body, headers=request_headers, params=case_params)
             
             response.raise_for_status()  # Raise an error for any 4xx/5xx status codes
 
@@ -155,11 +179,30 @@ def execute_tc(test_case: dict):
     # Format as KQL datetime format
     end_kql_datetime = end_dt.strftime("%Y-%m-%dT%H:%M:%SZ")
     start_end_benchmark_times["benchmarktimes"] = [start_kql_datetime, end_kql_datetime]
+    start_end_benchmark_times["case_id"] = case_id
 
     test_case.update(start_end_benchmark_times)
     return test_case
 
-def main():
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Azure Function Benchmark Runner")
+    parser.add_argument("--matrix", default=None, help="Matrix spec (TOML) replacing the languages, operations and start types below, see benchmarkcommon/matrix_plan.py")
+    parser.add_argument("--shard", default=None, help="With --matrix: run shard i/n of the plan on this host, e.g. 2/4")
+    parser.add_argument("--plan-only", action="store_true", help="With --matrix: print the plan's time and cost estimate and exit")
+    parser.add_argument("--urls-file", default="./function_urls.json", help="Function URL file (see getFuncs.sh or benchmarkcommon/stub_server.py)")
+    parser.add_argument("--workspace-id", default=os.environ.get("LOG_ANALYTICS_WORKSPACE_ID"), help="Log Analytics workspace of the functions' App Insights, the test cases' requests are queried from it and saved to the results store (default $LOG_ANALYTICS_WORKSPACE_ID)")
+    parser.add_argument("--query-stub", default=None, help="Query endpoint of the local stub instead of the Log Analytics API, e.g. https://127.0.0.1:8080/v1")
+    parser.add_argument("--results-store", default=results_store.DEFAULT_ROOT, help="Parquet results store the queried rows are appended to")
+    parser.add_argument("--window-set-size", type=int, default=20, help="Test case windows covered by one query")
+    parser.add_argument("--page-rows", type=int, default=50000, help="Rows per query page")
+    parser.add_argument("--ingestion-deadline", type=float, default=600.0, help="Seconds to keep querying until every request has arrived in App Insights")
+    parser.add_argument("--poll-seconds", type=float, default=30.0, help="Seconds between queries while requests are missing")
+    args = parser.parse_args()
+    if (args.shard or args.plan_only) and not args.matrix:
+        parser.error("--shard and --plan-only need --matrix")
+    return args
+
+def main(args: argparse.Namespace):
 
     languages = [
         'c#',
@@ -187,6 +230,28 @@ def main():
         #"warm"
     ]
 
+    # remote is Key Vault, local is the same crypto inside the function, public_key verifies and
+    # encrypts with the fetched public key inside the function (Python only, see local_crypto.py)
+    crypto_modes = [
+        "remote",
+        #"local",
+        #"public_key"
+    ]
+
+    # Inputs per request, batches above 1 are Python only (see request_batch.py)
+    batch_sizes = [
+        1,
+        #10,
+        #100
+    ]
+
+    # A matrix spec replaces the lists above, cold and warm can run together
+    matrix = None
+    if args.matrix:
+        matrix = matrix_plan.load_matrix(args.matrix, "azure_function", {"languages": languages, "operations": operations, "start_types": start_options,
+                                                                         "architectures": ["x86"], "iterations": 30})
+        languages, operations, start_options = matrix["languages"], matrix["operations"], matrix["start_types"]
+
     # Key is operation, value is json containing answers
     #correct_answers = get_correct_answers(operations)
     print("Succesful loading of correct answers")
@@ -195,39 +260,56 @@ def main():
     test_case_inputs = get_testcase_inputs(operations)
     print("Succesful loading of operation inputs")
 
-    operation_urls = get_azure_func_api_urls()
+    operation_urls = get_azure_func_api_urls(args.urls_file)
 
     test_cases = []
-    iterations = 30
+    iterations = matrix["iterations"] if matrix else 30
     arch_dir = "x86"
 
-    # To save the results
-    save_result_file_name = f"./{start_options[0]}-azurefunc-BenchmarkTimes.json"
-
     finished_test_cases = []
 
     # First we need to create the testcases themselves
     for language in languages:
         for operation in operations:
             for start_option in start_options:
-                # Get operation's input
-                test_case_input = test_case_inputs[operation]
-                # Clean in case of c# -> csharp
-                operationName = ""
-
-                if language == "c#":
-                    operationName = f"dotnet_{operation}_program"
-                else:
-                    operationName = f"{language}_{operation}"
-
-                azure_url = operation_urls[operationName]
-
-                # get operation's correct_answer
-                #correct_answer = correct_answers[operation]
-                
-                new_test_case = create_tc(start_option,operation,language,azure_url,test_case_input,{},iterations,arch_dir)
-
-                test_cases.append(new_test_case)
+                for crypto_mode in crypto_modes:
+                    for batch_size in batch_sizes:
+                        # Only the Python functions have a local crypto mode and batch requests
+                        if (crypto_mode != "remote" or batch_size != 1) and language != "python":
+                            continue
+                        # public_key only changes verify and RSA encrypt
+                        if not results_store.runs_crypto_mode(crypto_mode, operation):
+                            continue
+                        if not matrix_plan.selected(matrix, {"language": language, "operation": operation, "start_type": start_option, "architecture": arch_dir,
+                                                             "crypto_mode": crypto_mode, "batch_size": batch_size}):
+                            continue
+
+                        # Get operation's input
+                        test_case_input = test_case_inputs[operation]
+                        # Clean in case of c# -> csharp
+                        operationName = ""
+
+                        if language == "c#":
+                            operationName = f"dotnet_{operation}_program"
+                        else:
+                            operationName = f"{language}_{operation}"
+
+                        azure_url = operation_urls[operationName]
+
+                        # get operation's correct_answer
+                        #correct_answer = correct_answers[operation]
+
+                        new_test_case = create_tc(start_option,operation,language,azure_url,test_case_input,{},iterations,arch_dir,crypto_mode,batch_size)
+
+                        test_cases.append(new_test_case)
+
+    # Cold cases interleaved across functions, this host's shard only
+    idle_timer = None
+    if matrix:
+        test_cases = matrix_plan.plan_run(test_cases, matrix, lambda test_case: test_case["azure_url"], args.shard)
+        idle_timer = matrix_plan.IdleTimer(matrix, lambda test_case: test_case["azure_url"])
+        if args.plan_only:
+            exit(0)
 
     # Then execute the test cases, http requests
     num_of_test_cases = len(test_cases)
@@ -245,9 +327,15 @@ def main():
         print(f">Language: {test_case_lang}")
         print(f">Start Type: {test_case_start}")
         print(f">Architecture:{test_case_arch} ")
+        print(f">Crypto Mode: {test_case['crypto_mode']}")
+        print(f">Batch Size: {test_case['batch_size']}")
 
-        # Execute Test Case
+        # Execute Test Case, a planned cold case once its function is idle (see matrix_plan.py)
+        if idle_timer is not None:
+            idle_timer.wait(test_case)
         finished_test_case = execute_tc(test_case)
+        if idle_timer is not None:
+            idle_timer.used(test_case)
 
         finished_test_cases.append(finished_test_case)
 
@@ -266,12 +354,29 @@ def main():
     print("-" * 10)
 
 
-    # Write the list of JSON objects to the file
-    with open(save_result_file_name, 'w') as json_file:
-        json.dump(test_cases, json_file, indent=4)  # 'indent=4' for pretty printing
+    # One file per start type, sortAzureFunctionData.py reads the cold and warm files
+    for start_option in dict.fromkeys(test_case["start_type"] for test_case in finished_test_cases):
+        save_result_file_name = f"./{start_option}-azurefunc-BenchmarkTimes.json"
+
+        # Write the list of JSON objects to the file
+        with open(save_result_file_name, 'w') as json_file:
+            json.dump([test_case for test_case in finished_test_cases if test_case["start_type"] == start_option], json_file, indent=4)  # 'indent=4' for pretty printing
+
+        print(f"Data has been written to {save_result_file_name}")
+
+    # The requests of the windows straight from App Insights, instead of a portal export and sortAzureFunctionData.py
+    if not args.workspace_id:
+        print("No --workspace-id, export the requests from App Insights and run sortAzureFunctionData.py")
+        return
+    if not finished_test_cases:
+        return
 
-    print(f"Data has been written to {save_result_file_name}")
+    rows = app_insights_query.export_rows(app_insights_query.get_logs_client(args.query_stub), args.workspace_id,
+                                          app_insights.windows_frame(finished_test_cases), args.window_set_size, args.page_rows,
+                                          args.ingestion_deadline, args.poll_seconds)
+    print(rows.groupby(["start_type", "language"]).size())
+    results_store.append(rows, "azure_function", args.results_store)
 
 
 if __name__ == "__main__":
-    main()
+    main(parse_args())
@@ -3,10 +3,22 @@ import json
 import requests
 import platform
 import subprocess
-import psutil
 import uuid
 import pandas as pd
 import os
+import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from benchmarkcommon import fleet
+from benchmarkcommon import matrix_plan
+from benchmarkcommon import process_monitor
+from benchmarkcommon import results_store
+from benchmarkcommon import run_journal
+from benchmarkcommon import worker_client
+
+# Linux MAX_ARG_STRLEN
+MAX_ARGUMENT_BYTES = 128 * 1024
 
 def get_azure_instance_type():
     metadata_url = "http://169.254.169.254/metadata/instance?api-version=2021-02-01"
@@ -25,38 +37,6 @@ def get_azure_instance_type():
         print(f"Error retrieving instance metadata: {e}")
         return None
 
-def calculate_average_cpu_usage(cpus_before, cpus_after):
-    total_idle_diff = 0
-    total_time_diff = 0
-
-    # Calculate the total idle and total time differences for all cores
-    for t0, t1 in zip(cpus_before, cpus_after):
-        # Calculate the difference in idle time
-        idle_diff = t1.idle - t0.idle
-
-        # Calculate the difference in total time
-        total_diff = (
-            (t1.user - t0.user) +
-            (t1.nice - t0.nice) +
-            (t1.system - t0.system) +
-            (t1.idle - t0.idle) +
-            (t1.iowait - t0.iowait) +
-            (t1.irq - t0.irq) +
-            (t1.softirq - t0.softirq) +
-            (t1.steal - t0.steal)
-        )
-
-        total_idle_diff += idle_diff
-        total_time_diff += total_diff
-
-    # Calculate the average CPU usage
-    if total_time_diff > 0:
-        average_usage = 100.0 * (1.0 - (total_idle_diff / total_time_diff))
-    else:
-        average_usage = 0.0
-
-    return round(average_usage, 2)
-
 def get_correct_answers(operations: list) -> dict:
     correct_answers = {}
 
@@ -68,11 +48,11 @@ def get_correct_answers(operations: list) -> dict:
 
     return correct_answers
 
-def get_testcase_inputs(operations: list) -> dict:
+def get_testcase_inputs(operations: list, inputs_dir: str = "../../TestArtifacts/Azure/inputs") -> dict:
     test_case_inputs = {}
 
     for operation in operations:
-        input_data_loc = f"../../TestArtifacts/Azure/inputs/{operation}.json"
+        input_data_loc = f"{inputs_dir}/{operation}.json"
         try:
             # Open and load the JSON content
             with open(input_data_loc, 'r') as file:
@@ -88,10 +68,16 @@ def get_testcase_inputs(operations: list) -> dict:
 def determine_result_tc(received_response: dict, correct_answer: dict):
     return received_response == correct_answer
 
-def save_testcase_results(finished_test_cases: list, file_name: str) -> None:
+def save_testcase_results(finished_test_cases: list, results_store_root: str) -> None:
     """
-    Save the test case results to a CSV file using pandas.
+    Append the test case results to the results store as one run.
     """
+    # Convert list of dictionaries to a DataFrame
+    df = pd.DataFrame(testcase_result_rows(finished_test_cases))
+    
+    results_store.append(df, "azure_vm", results_store_root)
+
+def testcase_result_rows(finished_test_cases: list) -> list[dict]:
     # List to hold all rows of data
     data_rows = []
 
@@ -115,21 +101,30 @@ def save_testcase_results(finished_test_cases: list, file_name: str) -> None:
                 "avg_cpu_usage_percent": test_case_result.get("avg_cpu_usage", 0),
                 "max_memory_usage_mb": test_case_result.get("max_memory_usage", 0),
                 "avg_memory_usage_mb": test_case_result.get("avg_memory_usage", 0),
+                "user_cpu_ms": test_case_result.get("user_cpu_ms"),
+                "system_cpu_ms": test_case_result.get("system_cpu_ms"),
+                "rss_samples": test_case_result.get("rss_samples"),
+                "monitor_overhead_percent": test_case_result.get("monitor_overhead_percent"),
+                "execution_mode": test_case.get("execution_mode", "subprocess"),
+                "crypto_mode": test_case.get("crypto_mode", "remote"),
+                "batch_size": test_case.get("batch_size", 1),
+                # Phase timings only exist in worker mode
+                "startup_ms": test_case_result.get("startup_ms"),
+                "import_ms": test_case_result.get("import_ms"),
+                "client_init_ms": test_case_result.get("client_init_ms"),
+                "remote_ms": test_case_result.get("remote_ms"),
+                "local_ms": test_case_result.get("local_ms"),
             }
 
             data_rows.append(data_row)
 
-    # Convert list of dictionaries to a DataFrame
-    df = pd.DataFrame(data_rows)
-    
-    # Save DataFrame to a CSV file
-    try:
-        df.to_csv(file_name, index=False)
-        print(f"Results successfully saved to {file_name}")
-    except Exception as e:
-        print(f"Failed to save results: {e}")
+    return data_rows
+
+def vm_case_key(test_case: dict) -> str:
+    # The uuid "id" changes on every start, so it is not part of the key
+    return run_journal.case_key(test_case, ["language", "operation", "start_type", "architecture", "instance_type", "iterations", "execution_mode", "crypto_mode", "batch_size"])
 
-def create_tc(arch_dir: str, language: str, operation: str, input: dict, correct_answer: dict, start_type: str, instance_type: str, iterations: int)-> dict:
+def create_tc(arch_dir: str, language: str, operation: str, input: dict, correct_answer: dict, start_type: str, instance_type: str, iterations: int, execution_mode: str = "subprocess", crypto_mode: str = "remote", batch_size: int = 1)-> dict:
     # Get the base directory where the script is being executed
     base_dir = str(os.path.dirname(os.path.abspath(__file__)))
     new_file_base_str = f"iac-microbenchmark/vmc/{language}/{arch_dir}/{operation}"
@@ -158,6 +153,10 @@ def create_tc(arch_dir: str, language: str, operation: str, input: dict, correct
         # EXIT FAILURE STOP BENCHMARK
         exit(1)
 
+    # The Python workloads take a batch of inputs in one request, see request_batch.py
+    if batch_size > 1:
+        input = {"batch": [input] * batch_size}
+
     subprocess_input = []
 
     if settings["command"] == "":
@@ -171,6 +170,19 @@ def create_tc(arch_dir: str, language: str, operation: str, input: dict, correct
     # Always add input to the end.
     subprocess_input.append(json.dumps(input))
 
+    # Linux limits a single argument to 128 KiB, larger batches only fit through the worker's stdin
+    if execution_mode != "worker" and len(subprocess_input[-1].encode("utf-8")) >= MAX_ARGUMENT_BYTES:
+        print(f"The input of {operation} with batch size {batch_size} is too large for a command line argument, use --execution-mode worker")
+        exit(1)
+
+    # Only the Python workloads have a persistent worker so far, the others keep spawning a process per iteration
+    if execution_mode == "worker" and language != "python":
+        execution_mode = "subprocess"
+
+    worker_input = []
+    if execution_mode == "worker":
+        worker_input = settings["command"].split() + [os.path.join(os.path.dirname(file_executable_location), "benchmark_worker.py"), operation]
+
     # Build the test case
     test_case = {
         "id" : str(uuid.uuid4()), # generate a unique id for the test case
@@ -181,105 +193,72 @@ def create_tc(arch_dir: str, language: str, operation: str, input: dict, correct
         "operation" : operation,
         "language" : language,
         "architecture" : arch_dir,
-        "instance_type": instance_type
+        "instance_type": instance_type,
+        "execution_mode": execution_mode,
+        "crypto_mode": crypto_mode,
+        "batch_size": batch_size,
+        "worker_input": worker_input,
+        "worker_request": input
     }
 
     return test_case
 
-def execute_warmup(subprocess_input):
+def crypto_mode_environment(test_case: dict) -> dict:
+    # The Python workloads read CRYPTO_MODE when creating their clients, see local_crypto.py
+    return {**os.environ, "CRYPTO_MODE": test_case.get("crypto_mode", "remote")}
+
+def execute_warmup(subprocess_input, env: dict = None):
     """Executes a warm-up operation using the provided subprocess input."""
     try:
-        # Use subprocess to run the executable
-        process = subprocess.Popen(
+        # Wait for the warmup to finish so it does not overlap with the measured iterations
+        subprocess.run(
             subprocess_input,
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env,
             shell=False
         )
-        stdout, stderr = process.communicate()
-        #stdout, stderr = process.communicate()
+        
         return
     except Exception as e:
         print(f"Error occurred in warmup: {e}")
         raise e
+    
 
-def execute_tc(test_case: dict) -> list:
+def execute_tc(test_case: dict, sample_interval_ms: float = 5.0) -> list:
     subprocess_input = test_case["subprocess_input"]
+    env = crypto_mode_environment(test_case)
     test_case_results = []
 
     # Retrieve how many times we need to run this test case
     num_iterations = test_case["iterations"]
 
-    # Check if we need to do a warm-up, execute the operations 50 times to warm up
+    # Check if we need to do a warm-up, execute the operations 10 times to warm up
     if test_case["start_type"] == "warm":
         print("Begin Warmup")
-        for i in range(1, 11):
-            print("Warmup Iteration # ", i)
-            execute_warmup(subprocess_input)
+        for i in range(0, 10):
+            execute_warmup(subprocess_input, env)
         print("Finished Warmup")
     else:
         print("No Warmup")
 
     for iteration in range(num_iterations):
         print(f"Test Case Iteration: {iteration}")
-        start_time = 0.0
-        end_time = 0.0
-        mem_usage_samples = []  # to store memory usage samples
 
         # Final result dict
         singular_test_case_result = {}
 
-        # Start the timer
-        start_time = time.perf_counter()
-
-        # record times before execution 
-        cpus_before = psutil.cpu_times(percpu=True)
-
-        # Use subprocess to run the operation
-        process = subprocess.Popen(
-            subprocess_input,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=False
-        )
-
-        # Create a process object for tracking memory
-        process_psutil = psutil.Process(process.pid)
-
+        # Run the operation, sampling its memory on a background thread
         try:
-            # Monitor the process while it's running
-            while True:  # While the script is still running
-                if process_psutil.is_running() and not process_psutil.status() == psutil.STATUS_ZOMBIE:
-                    
-                    # Update memory samples
-                    mem_usage_samples.append(process_psutil.memory_info().rss)
-                else:
-                    # After process finishes, record the end time of execution
-                    end_time = time.perf_counter()
-                    break
+            monitored = process_monitor.run_monitored(subprocess_input, sample_interval_ms / 1000, env)
         except Exception as e:
-            process.kill()  # Ensure the process is killed in case of any exception
             print(f"Error occurred: {e}")
             exit(1)
 
-        # Capture the second snapshot of CPU times
-        cpus_after = psutil.cpu_times(percpu=True)
-
-        average_cpu_usage = calculate_average_cpu_usage(cpus_before, cpus_after)
-
-        execution_time = end_time - start_time
-
-        # Calculate average and max memory usage
-        average_mem_usage = sum(mem_usage_samples) / len(mem_usage_samples) if mem_usage_samples else 0
-
-        max_mem = max(mem_usage_samples)
-
-        # Retrieve the process output
-        stdout, stderr = process.communicate()
+        stdout = monitored["stdout"]
+        stderr = monitored["stderr"]
 
         if stderr.decode() != "":
-            print(type(stderr))
             print(f"stderr: {stderr.decode()}")
 
         # Grab the function's output for verification
@@ -294,10 +273,14 @@ def execute_tc(test_case: dict) -> list:
             test_case_output = {}
 
         # Compile results into dict
-        singular_test_case_result["execution_time"] = execution_time * 1000  # Convert to ms
-        singular_test_case_result["avg_cpu_usage"] = average_cpu_usage  # in % float
-        singular_test_case_result["max_memory_usage"] = max_mem / (1024 ** 2)  # Convert to MB
-        singular_test_case_result["avg_memory_usage"] = average_mem_usage / (1024 ** 2)  # Convert to MB
+        singular_test_case_result["execution_time"] = monitored["wall_ms"]  # in ms
+        singular_test_case_result["avg_cpu_usage"] = round(monitored["cpu_percent"], 2)  # in % of one core, process only
+        singular_test_case_result["max_memory_usage"] = monitored["peak_rss_mb"]  # in MB, from wait4 rusage
+        singular_test_case_result["avg_memory_usage"] = monitored["avg_rss_mb"]  # in MB, from the sampler
+        singular_test_case_result["user_cpu_ms"] = monitored["user_cpu_ms"]
+        singular_test_case_result["system_cpu_ms"] = monitored["system_cpu_ms"]
+        singular_test_case_result["rss_samples"] = monitored["rss_samples"]
+        singular_test_case_result["monitor_overhead_percent"] = monitored["monitor_overhead_percent"]
         singular_test_case_result["iteration"] = iteration  # int
         singular_test_case_result["test_case_id"] = test_case["id"]
 
@@ -305,7 +288,26 @@ def execute_tc(test_case: dict) -> list:
 
     return test_case_results
 
-def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description="Azure Virtual Machine Benchmark Runner")
+    parser.add_argument("--execution-mode", choices=["subprocess", "worker"], default="subprocess", help="worker: time requests against a persistent worker instead of a process per iteration (Python only)")
+    parser.add_argument("--sample-interval-ms", type=float, default=5.0, help="RSS sampling interval of the process monitor")
+    parser.add_argument("--results-store", default=results_store.DEFAULT_ROOT, help="Parquet results store the results are appended to")
+    parser.add_argument("--crypto-modes", default="remote", help="Comma separated crypto modes to run: remote (Key Vault), local (in process) and public_key (verify and RSA encrypt in process with the fetched public key), non-remote modes are Python only, see local_crypto.py")
+    parser.add_argument("--batch-sizes", default="1", help="Comma separated inputs per request, batches above 1 are Python only, see request_batch.py")
+    parser.add_argument("--inputs-dir", default="../../TestArtifacts/Azure/inputs", help="Operation inputs, e.g. the ones made by kms_emulator prepare-inputs")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--matrix", default=None, help="Matrix spec (TOML) replacing the languages, operations and start types below, see benchmarkcommon/matrix_plan.py")
+    parser.add_argument("--shard", default=None, help="With --matrix: run shard i/n of the plan on this host, e.g. 2/4")
+    parser.add_argument("--plan-only", action="store_true", help="With --matrix: print the plan's time and cost estimate and exit")
+    parser.add_argument("--fleet-url", default=None, help="Fleet coordinator the results are sent to instead of the local results store, set by python -m benchmarkcommon.fleet worker")
+    parser.add_argument("--fleet-pool", default="default", help="Fleet pool of the worker running this shard, set by python -m benchmarkcommon.fleet worker")
+    args = parser.parse_args()
+    if (args.shard or args.plan_only) and not args.matrix:
+        parser.error("--shard and --plan-only need --matrix")
+    return args
+
+def main(args):
 
     # Get Architecture
     architecture = platform.machine()
@@ -347,19 +349,23 @@ def main():
         "warm"
     ]
 
+    # A matrix spec replaces the lists above
+    matrix = None
+    if args.matrix:
+        matrix = matrix_plan.load_matrix(args.matrix, "azure_vm", {"languages": languages, "operations": operations, "start_types": start_options,
+                                                                   "iterations": args.iterations})
+        languages, operations, start_options = matrix["languages"], matrix["operations"], matrix["start_types"]
+
     # Key is operation, value is json containing answers
     correct_answers = get_correct_answers(operations)
     print("Succesful loading of correct answers")
 
     # Key is operation, value is json containing inputs
-    test_case_inputs = get_testcase_inputs(operations)
+    test_case_inputs = get_testcase_inputs(operations, args.inputs_dir)
     print("Succesful loading of operation inputs")
 
     test_cases = []
-    iterations = 30
-
-    # To save the results
-    save_result_file_name = f"./{architecture}-{instance_type}-AzureVM-Benchmarkresults.csv"
+    iterations = matrix["iterations"] if matrix else args.iterations
 
     finished_test_cases = []
 
@@ -367,18 +373,36 @@ def main():
     for language in languages:
         for operation in operations:
             for start_option in start_options:
-                # Get operation's input
-                test_case_input = test_case_inputs[operation]
+                for crypto_mode in args.crypto_modes.split(","):
+                    for batch_size in [int(batch_size) for batch_size in args.batch_sizes.split(",")]:
+                        # Only the Python workloads have a local crypto mode and batch requests
+                        if (crypto_mode != "remote" or batch_size != 1) and language != "python":
+                            continue
+                        # public_key only changes verify and RSA encrypt
+                        if not results_store.runs_crypto_mode(crypto_mode, operation):
+                            continue
+                        if not matrix_plan.selected(matrix, {"language": language, "operation": operation, "start_type": start_option, "architecture": arch_dir,
+                                                             "instance_type": instance_type, "crypto_mode": crypto_mode, "batch_size": batch_size}):
+                            continue
 
-                # get operation's correct_answer
-                correct_answer = correct_answers[operation]
+                        # Get operation's input
+                        test_case_input = test_case_inputs[operation]
 
-                new_test_case = create_tc(arch_dir,language,operation, test_case_input,correct_answer,start_option, instance_type, iterations)
+                        # get operation's correct_answer
+                        correct_answer = correct_answers[operation]
 
-                test_cases.append(new_test_case)
+                        new_test_case = create_tc(arch_dir,language,operation, test_case_input,correct_answer,start_option, instance_type, iterations, args.execution_mode, crypto_mode, batch_size)
+
+                        test_cases.append(new_test_case)
 
     print("Finished Initialization")
 
+    # This host's shard only, every cold iteration is a new process so there is no idle time to wait for
+    if matrix:
+        test_cases = matrix_plan.plan_run(test_cases, matrix, lambda test_case: f"{test_case['language']}/{test_case['operation']}", args.shard)
+        if args.plan_only:
+            exit(0)
+
     print("")
     print("")
 
@@ -396,12 +420,20 @@ def main():
         print(f">Operation: {test_case_operation}")
         print(f">Language: {test_case_language}")
         print(f">Start Type: {test_case_start_type}")
+        print(f">Execution Mode: {test_case['execution_mode']}")
+        print(f">Crypto Mode: {test_case['crypto_mode']}")
+        print(f">Batch Size: {test_case['batch_size']}")
 
         # Execute Test Case
-        test_case_result = execute_tc(test_case)
-
-        # Save a tuple containing the results and the test case into a list to save for later
-        finished_test_cases.append((test_case_result,test_case))
+        if test_case["execution_mode"] == "worker":
+            test_case_result = worker_client.execute_tc_worker(test_case, crypto_mode_environment(test_case))
+        else:
+            test_case_result = execute_tc(test_case, args.sample_interval_ms)
+
+        # A fleet run sends every finished test case to the coordinator straight away (see fleet.py),
+        # otherwise save a tuple containing the results and the test case into a list to save for later
+        if not (args.fleet_url and fleet.submit_results(args.fleet_url, args.fleet_pool, "azure_vm", vm_case_key(test_case), testcase_result_rows([(test_case_result, test_case)]))):
+            finished_test_cases.append((test_case_result,test_case))
         print("Finished Test Case.")
         print("---------------------------------------")
         print("")
@@ -410,15 +442,24 @@ def main():
 
     print("Finished Azure Virtual Benchmark Runner")
 
-    save_testcase_results(finished_test_cases, save_result_file_name)
-    
-    print(f"Saved Results to file: {save_result_file_name}")
+    if args.fleet_url:
+        # The coordinator could not take these earlier, what it still cannot take is kept in the local store
+        finished_test_cases = [finished_test_case for finished_test_case in finished_test_cases
+                               if not fleet.submit_results(args.fleet_url, args.fleet_pool, "azure_vm", vm_case_key(finished_test_case[1]), testcase_result_rows([finished_test_case]))]
+        if not finished_test_cases:
+            exit(0)
+        # The shard still counts as done, running it again would measure these cases a second time
+        print(f"{len(finished_test_cases)} test cases were not sent to the fleet coordinator, saving them to {args.results_store}")
+        save_testcase_results(finished_test_cases, args.results_store)
+        exit(0)
+
+    save_testcase_results(finished_test_cases, args.results_store)
 
     exit(0)
 
 if __name__ == "__main__":
     print("Begin Initialization of Azure Virtual Benchmark runner")
-    main()
+    main(parse_args())
 
 
 
@@ -20,6 +20,16 @@ for PROJECT in "${PROJECTS[@]}"; do
     # Create the zip file without including the top-level project folder
     (cd "$PROJECT" && zip -r "../${PROJECT}.zip" .)
 
+    # client cache of warm invocations (see handler_runtime.py)
+    zip -j "${PROJECT}.zip" handler_runtime.py
+    # batch requests (see request_batch.py)
+    zip -j "${PROJECT}.zip" request_batch.py
+    # local crypto mode, with the keys when they were provisioned (see local_crypto.py)
+    zip -j "${PROJECT}.zip" local_crypto.py
+    if [ -f local_keys.json ]; then
+        zip -j "${PROJECT}.zip" local_keys.json
+    fi
+
     # Move the zip file to the x86 directory
     mv "${PROJECT}.zip" "$ZIPDIR/"
 
@@ -2,14 +2,17 @@ import os
 import base64
 import json
 import azure.functions as func
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.keys import KeyClient
-from azure.keyvault.keys.crypto import CryptographyClient, SignatureAlgorithm
+from azure.keyvault.keys.crypto import SignatureAlgorithm
+
+import handler_runtime
+import request_batch
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
 @app.function_name(name="python_ecc256_verify")
 @app.route(route="ecc256_verify")
+# Batch requests run main once per input, see request_batch.py
+@request_batch.function_handler
 def main(req: func.HttpRequest) -> func.HttpResponse:
 
     # Get environment variables
@@ -23,15 +26,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
 
     # main code here
     try:
-        # Authenticate using default azure creds in azure function
-        credential = DefaultAzureCredential()
-        key_client = KeyClient(vault_url=key_vault_url, credential=credential)
-
-        # Get the key from Azure Key Vault
-        key = key_client.get_key(key_name)
-
-        # Initialize the cryptography client for operation
-        crypto_client = CryptographyClient(key, credential)
+        # Key Vault, or the local key when the request asks for local crypto mode, reused by warm invocations (see handler_runtime.py)
+        crypto_client = handler_runtime.crypto_client(key_vault_url, key_name, "ecc256", body)
 
         # Extract message and signature from the input
         message_digest = body.get("message_digest")
@@ -0,0 +1,147 @@
+"""
+Per execution environment cache of what the handlers set up before their operation.
+
+Lambda and Azure Functions keep the Python process between invocations, so the
+credential, SDK clients, fetched Key Vault keys and local crypto clients are
+created by the first invocation (or during init) and reused by the warm ones.
+An entry older than HANDLER_CACHE_TTL_SECONDS (default 900) is created again by
+the next call that needs it, which picks up rotated keys and new credentials.
+Warm invocations then time the operation rather than client setup and the Key
+Vault GET of the key.
+
+    kms_client(key_name, request_json)          boto3 KMS client, the LocalKmsClient of key_name
+                                                in local crypto mode, or a PublicKeyKmsClient
+                                                in public_key mode
+    crypto_client(key_vault_url, key_name,      Key Vault CryptographyClient of key_name, or the
+                  local_key_name, request_json) LocalCryptographyClient of local_key_name
+    data_key_cache(request_json)                DataKeyCache of the AES handlers, one per crypto
+                                                mode and setting (see data_key_cache.py)
+    cached(name, factory)                       anything else, factory() once per TTL
+
+boto3, the Azure SDK and data_key_cache (lambdas/python only) are imported on
+first use, so the same file is used by lambdas/python and af/python, keep the
+copies identical.
+"""
+import logging
+import os
+import threading
+import time
+
+import local_crypto
+
+DEFAULT_TTL_SECONDS = 900
+
+# name -> (monotonic creation time, value)
+_entries = {}
+# Azure Functions may run invocations on several threads, the first one creates an entry.
+# Reentrant because factories use other entries (the credential of a client)
+_lock = threading.RLock()
+
+
+def ttl_seconds() -> float:
+    return float(os.environ.get("HANDLER_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+
+
+def cached(name: str, factory):
+    """
+    The value of factory() cached under name, created again once it is older than the TTL.
+    """
+    entry = _entries.get(name)
+    if entry is not None and time.monotonic() - entry[0] < ttl_seconds():
+        return entry[1]
+
+    with _lock:
+        # Another thread may have created it while this one waited
+        entry = _entries.get(name)
+        if entry is not None and time.monotonic() - entry[0] < ttl_seconds():
+            return entry[1]
+
+        value = factory()
+        _entries[name] = (time.monotonic(), value)
+        return value
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def _create_kms_client():
+    import boto3
+    return boto3.client("kms")
+
+
+def kms_client(key_name: str = None, request_json: dict = None):
+    """
+    The KMS client of this execution environment, or the LocalKmsClient of key_name when the
+    request (or CRYPTO_MODE) asks for local crypto mode. In public_key mode verify and RSA
+    encrypt use the key's public key, fetched once per TTL.
+    """
+    mode = local_crypto.crypto_mode(request_json)
+    if key_name is not None and mode == "local":
+        return cached(f"local-kms-client/{key_name}", lambda: local_crypto.LocalKmsClient(key_name))
+    if mode == "public_key":
+        return cached("public-key-kms-client", lambda: local_crypto.PublicKeyKmsClient(cached("kms-client", _create_kms_client)))
+    return cached("kms-client", _create_kms_client)
+
+
+def data_key_cache(request_json: dict = None):
+    """
+    The data key cache of this execution environment for the request's crypto mode, so local
+    and KMS data keys are not mixed. With the cache off it only counts the KMS calls.
+    """
+    import data_key_cache
+
+    mode = local_crypto.crypto_mode(request_json)
+    setting = data_key_cache.setting(request_json)
+    return cached(f"data-key-cache/{mode}/{setting}", lambda: data_key_cache.DataKeyCache.from_env(request_json))
+
+
+def azure_credential():
+    def create():
+        from azure.identity import DefaultAzureCredential
+        return DefaultAzureCredential()
+
+    # Keeps its tokens, so warm invocations do not fetch a new one either
+    return cached("azure-credential", create)
+
+
+def key_client(key_vault_url: str):
+    def create():
+        from azure.keyvault.keys import KeyClient
+        return KeyClient(vault_url=key_vault_url, credential=azure_credential())
+
+    return cached(f"key-client/{key_vault_url}", create)
+
+
+def without_local_operations(key):
+    """
+    Copy of a KeyVaultKey that allows no operations on its local material. Given the key,
+    CryptographyClient does verify and encrypt itself with the public key, with this copy
+    every operation goes to Key Vault.
+    """
+    from azure.keyvault.keys import KeyVaultKey
+    # The client logs a warning for every local attempt the copy refuses
+    logging.getLogger("azure.keyvault.keys.crypto").setLevel(logging.ERROR)
+    return KeyVaultKey(key.id, jwk=dict(vars(key.key), key_ops=[]))
+
+
+def crypto_client(key_vault_url: str, key_name: str, local_key_name: str, request_json: dict = None):
+    """
+    CryptographyClient of the Key Vault key key_name, fetched once per TTL, or the
+    LocalCryptographyClient of local_key_name when the request asks for local crypto mode.
+    In remote mode every operation goes to Key Vault, in public_key mode the client
+    verifies and encrypts with the fetched public key.
+    """
+    mode = local_crypto.crypto_mode(request_json)
+    if mode == "local":
+        return cached(f"local-crypto-client/{local_key_name}", lambda: local_crypto.LocalCryptographyClient(local_key_name))
+
+    def create():
+        from azure.keyvault.keys.crypto import CryptographyClient
+        key = key_client(key_vault_url).get_key(key_name)
+        if mode == "remote":
+            key = without_local_operations(key)
+        return CryptographyClient(key, azure_credential())
+
+    return cached(f"crypto-client/{mode}/{key_vault_url}/{key_name}", create)
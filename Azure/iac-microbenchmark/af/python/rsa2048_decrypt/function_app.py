@@ -2,16 +2,19 @@ import os
 import base64
 import json
 import azure.functions as func
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.keys import KeyClient
-from azure.keyvault.keys.crypto import CryptographyClient, EncryptionAlgorithm
+from azure.keyvault.keys.crypto import EncryptionAlgorithm
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 
+import handler_runtime
+import request_batch
+
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
 @app.function_name(name="python_rsa2048_decrypt")
 @app.route(route="rsa2048_decrypt")
+# Batch requests run main once per input, see request_batch.py
+@request_batch.function_handler
 def main(req: func.HttpRequest) -> func.HttpResponse:
 
     # Get environment variables
@@ -25,15 +28,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
 
     # main code here
     try:
-        # Authenticate using default azure creds in azure function
-        credential = DefaultAzureCredential()
-        key_client = KeyClient(vault_url=key_vault_url, credential=credential)
-
-        # Get the key from Azure Key Vault
-        key = key_client.get_key(key_name)
-
-        # Initialize the cryptography client for operation
-        crypto_client = CryptographyClient(key, credential)
+        # Key Vault, or the local key when the request asks for local crypto mode, reused by warm invocations (see handler_runtime.py)
+        crypto_client = handler_runtime.crypto_client(key_vault_url, key_name, "rsa2048", body)
         # Extract base64-encoded values and decode them
         iv = base64.b64decode(body['iv'])
         ciphertext = base64.b64decode(body['ciphertext'])
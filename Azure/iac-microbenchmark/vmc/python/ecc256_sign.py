@@ -1,32 +1,25 @@
 import json
 import base64
 import sys
-import os
-from azure.identity import AzureCliCredential
-from azure.keyvault.keys import KeyClient
-from azure.keyvault.keys.crypto import CryptographyClient, SignatureAlgorithm
+from azure.keyvault.keys.crypto import SignatureAlgorithm
 
-def main():
-    # Get the name argument from sys.argv
-    request_json_raw = sys.argv[1]
-    request_json = json.loads(request_json_raw)
+import key_vault_client
+import local_crypto
+import request_batch
+
+def create_clients() -> dict:
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"crypto_client": local_crypto.LocalCryptographyClient("ecc256")}
+    # Key Vault from AZURE_KEY_VAULT_URL, authenticated with the Azure CLI (or the local emulator)
+    return {"crypto_client": key_vault_client.create_crypto_client("ECC256_KEY_NAME")}
+
+def handle(request_json: dict, clients: dict) -> dict:
+    crypto_client = clients["crypto_client"]
 
     # Extract the message digest from the event payload
     message_digest = request_json.get('message_digest')
     message_digest_bytes = bytes.fromhex(message_digest)
-    # Get environment variables
-    key_vault_url = os.environ["AZURE_KEY_VAULT_URL"]
-    key_name = os.environ["ECC256_KEY_NAME"]
-
-    # Authenticate using AzureCliCredential
-    credential = AzureCliCredential()
-    key_client = KeyClient(vault_url=key_vault_url, credential=credential)
-
-    # Get the key from Azure Key Vault
-    key = key_client.get_key(key_name)
-
-    # Initialize the cryptography client for signing
-    crypto_client = CryptographyClient(key, credential)
 
     # Sign the hash
     sign_result = crypto_client.sign(
@@ -36,7 +29,14 @@ def main():
 
     # Encode the signature to base64 for easier transport
     signature_b64 = base64.b64encode(sign_result.signature).decode("utf-8")
-    print(json.dumps({"signature": signature_b64}))
+    return {"signature": signature_b64}
+
+def main():
+    # Get the name argument from sys.argv
+    request_json_raw = sys.argv[1]
+    request_json = json.loads(request_json_raw)
+
+    print(json.dumps(request_batch.run(handle, request_json, create_clients())))
 
 if __name__ == "__main__":
     main()
@@ -1,39 +1,29 @@
 import json
 import base64
 import sys
-import os
-from azure.identity import AzureCliCredential
-from azure.keyvault.keys import KeyClient
-from azure.keyvault.keys.crypto import CryptographyClient, SignatureAlgorithm
+from azure.keyvault.keys.crypto import SignatureAlgorithm
 
-def main():
-    # Get the input JSON from command-line arguments
-    request_json_raw = sys.argv[1]
-    request_json = json.loads(request_json_raw)
+import key_vault_client
+import local_crypto
+import request_batch
+
+
+def create_clients() -> dict:
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"crypto_client": local_crypto.LocalCryptographyClient("ecc384")}
+    # Key Vault from AZURE_KEY_VAULT_URL, authenticated with the Azure CLI (or the local emulator)
+    return {"crypto_client": key_vault_client.create_crypto_client("ECC384_KEY_NAME")}
 
+def handle(request_json: dict, clients: dict) -> dict:
     # Extract message and signature from the input
     message_digest = request_json.get("message_digest")
-
     message_digest_bytes = bytes.fromhex(message_digest)
-
     signature_b64 = request_json.get("signature")
 
     is_valid = False
-
     try:
-        # Get environment variables
-        key_vault_url = os.environ["AZURE_KEY_VAULT_URL"]
-        key_name = os.environ["ECC384_KEY_NAME"]
-
-        # Authenticate using AzureCliCredential
-        credential = AzureCliCredential()
-        key_client = KeyClient(vault_url=key_vault_url, credential=credential)
-
-        # Retrieve the ECC P-384 key from Azure Key Vault
-        key = key_client.get_key(key_name)
-
-        # Initialize the cryptography client
-        crypto_client = CryptographyClient(key, credential)
+        crypto_client = clients["crypto_client"]
 
         # Decode the Base64-encoded signature
         signature = base64.b64decode(signature_b64)
@@ -44,15 +34,26 @@ def main():
             digest=message_digest_bytes,
             signature=signature
         )
-
         is_valid = verify_result.is_valid
 
+    except Exception as e:
+        return {"error": str(e)}
+
+    return {"is_valid": is_valid}
+
+def main():
+    # Get the input JSON from command-line arguments
+    request_json_raw = sys.argv[1]
+    request_json = json.loads(request_json_raw)
+
+    try:
+        clients = create_clients()
     except Exception as e:
         print(json.dumps({"error": str(e)}))
         return False
 
     # Print the result as JSON
-    print(json.dumps({"is_valid": is_valid}))
+    print(json.dumps(request_batch.run(handle, request_json, clients)))
 
 if __name__ == "__main__":
     main()
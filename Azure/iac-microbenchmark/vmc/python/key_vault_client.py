@@ -0,0 +1,57 @@
+"""
+Key Vault client construction shared by the Python workloads.
+
+On the VMs the workloads authenticate with the Azure CLI login. With
+AZURE_KEY_VAULT_EMULATOR=1 they talk to the local stand-in instead
+(python -m benchmarkcommon.kms_emulator serve --tls), which accepts any
+bearer token and whose authentication challenge names vault.azure.net
+rather than its own address.
+
+Given the fetched key, CryptographyClient verifies and encrypts with its public
+key in process. That is what crypto mode "public_key" measures, in the default
+"remote" mode the client gets a copy of the key without local operations, so
+every operation goes to Key Vault.
+"""
+import logging
+import os
+import time
+
+from azure.core.credentials import AccessToken
+from azure.identity import AzureCliCredential
+from azure.keyvault.keys import KeyClient, KeyVaultKey
+from azure.keyvault.keys.crypto import CryptographyClient
+
+import local_crypto
+
+
+class EmulatorCredential:
+    def get_token(self, *scopes, **kwargs) -> AccessToken:
+        return AccessToken("emulator", int(time.time()) + 3600)
+
+
+def without_local_operations(key: KeyVaultKey) -> KeyVaultKey:
+    # key_ops of the local copy only, Key Vault still allows them. The client logs a
+    # warning for every local attempt the copy refuses
+    logging.getLogger("azure.keyvault.keys.crypto").setLevel(logging.ERROR)
+    return KeyVaultKey(key.id, jwk=dict(vars(key.key), key_ops=[]))
+
+
+def create_crypto_client(key_name_variable: str) -> CryptographyClient:
+    """
+    CryptographyClient for the key named by the environment variable key_name_variable.
+    """
+    key_vault_url = os.environ["AZURE_KEY_VAULT_URL"]
+    key_name = os.environ[key_name_variable]
+
+    if os.environ.get("AZURE_KEY_VAULT_EMULATOR") == "1":
+        credential = EmulatorCredential()
+        options = {"verify_challenge_resource": False}
+    else:
+        credential = AzureCliCredential()
+        options = {}
+
+    key_client = KeyClient(vault_url=key_vault_url, credential=credential, **options)
+    key = key_client.get_key(key_name)
+    if local_crypto.crypto_mode() == "remote":
+        key = without_local_operations(key)
+    return CryptographyClient(key, credential, **options)
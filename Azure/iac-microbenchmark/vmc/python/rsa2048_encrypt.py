@@ -1,32 +1,32 @@
 import base64
 import json
-import os
 import sys
 import secrets
-from azure.identity import AzureCliCredential
-from azure.keyvault.keys import KeyClient
-from azure.keyvault.keys.crypto import CryptographyClient, EncryptionAlgorithm
+from azure.keyvault.keys.crypto import EncryptionAlgorithm
+
+import key_vault_client
+import local_crypto
+import request_batch
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 
-def main():
-    # Get the input JSON from command-line arguments
-        # Read input JSON from CLI argument
-    input_json = json.loads(sys.argv[1])
+def create_clients() -> dict:
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"crypto_client": local_crypto.LocalCryptographyClient("rsa2048")}
+    # Key Vault from AZURE_KEY_VAULT_URL, authenticated with the Azure CLI (or the local emulator)
+    return {"crypto_client": key_vault_client.create_crypto_client("RSA2048_KEY_NAME")}
+
+def handle(input_json: dict, clients: dict) -> dict:
+    crypto_client = clients["crypto_client"]
+
     message = input_json.get("message")
     # Generate a random 256-bit AES key
     aes_key = secrets.token_bytes(32)
     
     # Generate a random IV (16 bytes for AES-CTR)
     iv = secrets.token_bytes(16)
-    # Azure Key Vault configurations
-    key_vault_url = os.environ["AZURE_KEY_VAULT_URL"]  
-    key_name = os.environ["RSA2048_KEY_NAME"]
-
-    # Authenticate to Azure
-    credential = AzureCliCredential()
-    key_client = KeyClient(vault_url=key_vault_url, credential=credential)
-    crypto_client = CryptographyClient(key_client.get_key(key_name), credential)
+
     # Encrypt the message using AES-CTR
     cipher = Cipher(algorithms.AES(aes_key), modes.CTR(iv), backend=default_backend())
     encryptor = cipher.encryptor()
@@ -35,12 +35,19 @@ def main():
     # Encrypt the AES key using RSA-OAEP (SHA-256)
     encrypt_result = crypto_client.encrypt(EncryptionAlgorithm.rsa_oaep_256, aes_key)
     encrypted_aes_key = encrypt_result.ciphertext
-    # Print the result as JSON
-    print(json.dumps({
+    # Return the result
+    return {
         'iv': base64.b64encode(iv).decode('utf-8'),
         'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
         'encrypted_aes_key': base64.b64encode(encrypted_aes_key).decode('utf-8')
-    }))
+    }
+
+def main():
+    # Read input JSON from CLI argument
+    input_json = json.loads(sys.argv[1])
+
+    # Print the result as JSON
+    print(json.dumps(request_batch.run(handle, input_json, create_clients())))
 
 if __name__ == "__main__":
     main()
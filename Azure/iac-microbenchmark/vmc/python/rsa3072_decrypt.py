@@ -1,31 +1,29 @@
 import base64
 import json
-import os
 import sys
-from azure.identity import AzureCliCredential
-from azure.keyvault.keys import KeyClient
-from azure.keyvault.keys.crypto import CryptographyClient, EncryptionAlgorithm
+from azure.keyvault.keys.crypto import EncryptionAlgorithm
+
+import key_vault_client
+import local_crypto
+import request_batch
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 
-def main():
-    # Read encrypted input JSON from CLI argument
-    encrypted_json = json.loads(sys.argv[1])
+def create_clients() -> dict:
+    if local_crypto.crypto_mode() == "local":
+        # Same calls against the local key instead, see local_crypto.py
+        return {"crypto_client": local_crypto.LocalCryptographyClient("rsa3072")}
+    # Key Vault from AZURE_KEY_VAULT_URL, authenticated with the Azure CLI (or the local emulator)
+    return {"crypto_client": key_vault_client.create_crypto_client("RSA3072_KEY_NAME")}
+
+def handle(encrypted_json: dict, clients: dict) -> dict:
+    crypto_client = clients["crypto_client"]
 
     # Extract base64-encoded values and decode them
     iv = base64.b64decode(encrypted_json['iv'])
     ciphertext = base64.b64decode(encrypted_json['ciphertext'])
     encrypted_aes_key = base64.b64decode(encrypted_json['encrypted_aes_key'])
 
-    # Azure Key Vault configurations
-    key_vault_url = os.environ["AZURE_KEY_VAULT_URL"]  
-    key_name = os.environ["RSA3072_KEY_NAME"]
-
-    # Authenticate to Azure
-    credential = AzureCliCredential()
-    key_client = KeyClient(vault_url=key_vault_url, credential=credential)
-    crypto_client = CryptographyClient(key_client.get_key(key_name), credential)
-
     # Decrypt the AES key using Azure Key Vault RSA key
     decrypt_result = crypto_client.decrypt(EncryptionAlgorithm.rsa_oaep_256, encrypted_aes_key)
     aes_key = decrypt_result.plaintext
@@ -35,8 +33,15 @@ def main():
     decryptor = cipher.decryptor()
     plaintext = decryptor.update(ciphertext) + decryptor.finalize()
 
+    # Return the decrypted message
+    return {"decrypted_message": plaintext.decode('utf-8')}
+
+def main():
+    # Read encrypted input JSON from CLI argument
+    encrypted_json = json.loads(sys.argv[1])
+
     # Print the decrypted message
-    print(json.dumps({"decrypted_message": plaintext.decode('utf-8')}))
+    print(json.dumps(request_batch.run(handle, encrypted_json, create_clients())))
 
 if __name__ == "__main__":
     main()
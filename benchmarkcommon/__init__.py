@@ -0,0 +1,6 @@
+"""
+Helpers shared by the AWS and Azure benchmark runners.
+
+The runners live in <provider>/benchmarkrunner and add the repository root to
+sys.path before importing from this package.
+"""
@@ -0,0 +1,218 @@
+"""
+Disk cache for intermediate analysis products (trimmed frames, per-group stats, pivots).
+
+Entries are keyed by a fingerprint of the results store files they were computed
+from (name, size and modification time of every Parquet file), the function
+(name and source) and its parameters. New results or an edit of the function
+make a new key, the old entry is left for eviction.
+
+    cached(name, func, platforms)       func(df) over all rows of the platforms,
+                                        recomputed when any of their files changed
+    map_partitions(name, func, platform) func(df) per partition (architecture, language,
+                                        operation), concatenated. Only partitions whose
+                                        files changed are loaded and recomputed, so
+                                        the results of one new instance type only
+                                        recompute the partitions they were saved to
+
+map_partitions() is only correct when the groups of func never span partitions,
+i.e. it groups by architecture, language and operation or something finer
+(instance_type implies architecture).
+
+Entries are pickles in <cache_dir>. Every read marks an entry as used, the least
+recently used entries are removed once the directory is larger than max_bytes.
+"""
+import hashlib
+import inspect
+import os
+import pickle
+
+import pandas as pd
+
+from benchmarkcommon import results_store
+
+DEFAULT_CACHE_DIR = ".analysis-cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+ENTRY_EXTENSION = ".pkl"
+
+_MISSING = object()
+
+
+def _digest(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def function_key(func) -> str:
+    """
+    Hash of a function's name and source, editing the function invalidates its entries.
+    """
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = None
+    return _digest(func.__module__, func.__qualname__, source)
+
+
+def directory_fingerprint(directory: str) -> str:
+    files = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".parquet"):
+            stat = os.stat(os.path.join(directory, name))
+            files.append((name, stat.st_size, stat.st_mtime_ns))
+    return _digest(files)
+
+
+def partition_fingerprints(platform: str, root: str = results_store.DEFAULT_ROOT, filters: dict = None) -> dict[tuple, tuple[str, str]]:
+    """
+    (directory, fingerprint) of every partition of a platform, keyed by (architecture, language, operation).
+    """
+    return {
+        key: (directory, directory_fingerprint(directory))
+        for key, directory in results_store.partition_dirs(platform, root, filters).items()
+    }
+
+
+def fingerprint(platforms: str | list[str], root: str = results_store.DEFAULT_ROOT, filters: dict = None) -> str:
+    """
+    One fingerprint of all result files of the platforms.
+    """
+    platforms = [platforms] if isinstance(platforms, str) else list(platforms)
+    parts = []
+    for platform in platforms:
+        for key, (_, partition_fingerprint) in partition_fingerprints(platform, root, filters).items():
+            parts.append((platform, key, partition_fingerprint))
+    return _digest(parts)
+
+
+def _entry_path(cache_dir: str, name: str, key: str) -> str:
+    return os.path.join(cache_dir, f"{name}-{key}{ENTRY_EXTENSION}")
+
+
+def _read(path: str):
+    try:
+        with open(path, "rb") as file:
+            value = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return _MISSING
+
+    # Mark as used for eviction
+    os.utime(path)
+    return value
+
+
+def _write(path: str, value, cache_dir: str, max_bytes: int) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+    evict(cache_dir, max_bytes, keep=path)
+
+
+def evict(cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES, keep: str = None) -> int:
+    """
+    Remove the least recently used entries until the cache is at most max_bytes.
+
+    :return: Number of entries removed.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    with os.scandir(cache_dir) as scan:
+        for entry in scan:
+            if entry.name.endswith(ENTRY_EXTENSION) and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+
+    return removed
+
+
+def cached(name: str, func, platforms: str | list[str], root: str = results_store.DEFAULT_ROOT, columns: list[str] = None, filters: dict = None,
+           cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES, **params):
+    """
+    func(df, **params) of the platforms' results, loaded and computed only when not cached.
+
+    :param name: Prefix of the entry file, for humans.
+    :param func: Module level function of the loaded rows.
+    :param platforms: Platform or platforms to load, as in results_store.load_results().
+    :param columns: Columns to load, all when None.
+    :param filters: Filters passed to results_store.load_results(), part of the key.
+    :param params: Keyword arguments of func, part of the key (by repr).
+    """
+    key = _digest(function_key(func), platforms, columns, sorted((filters or {}).items()), sorted(params.items()),
+                  fingerprint(platforms, root, filters))
+    path = _entry_path(cache_dir, name, key)
+
+    value = _read(path)
+    if value is _MISSING:
+        value = func(results_store.load_results(platforms, root, columns, filters), **params)
+        _write(path, value, cache_dir, max_bytes)
+        print(f"{name}: computed")
+
+    return value
+
+
+def _concat(values: list):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    if all(isinstance(value.index, pd.RangeIndex) for value in values):
+        # Rows of the partitions, their positional indexes mean nothing together
+        return pd.concat(values, ignore_index=True)
+    # Per-group results, sorted like a single groupby over all partitions
+    return pd.concat(values).sort_index()
+
+
+def map_partitions(name: str, func, platform: str, root: str = results_store.DEFAULT_ROOT, columns: list[str] = None, filters: dict = None,
+                   cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES, **params):
+    """
+    func(df, **params) of every partition of a platform, concatenated. Partitions whose files
+    did not change since the last call are not loaded or computed again.
+
+    Parameters as in cached(). func must return a DataFrame or Series (or None for nothing).
+    Row results are concatenated with a new index, per-group results are sorted by their index.
+    """
+    key = _digest(function_key(func), platform, columns, sorted((filters or {}).items()), sorted(params.items()))
+    path = _entry_path(cache_dir, name, key)
+
+    # {"partitions": partition key -> (fingerprint, result), "combined": concatenated results}
+    previous = _read(path)
+    if previous is _MISSING:
+        previous = {"partitions": {}, "combined": None}
+
+    results = {}
+    recomputed = 0
+    for partition, (directory, partition_fingerprint) in partition_fingerprints(platform, root, filters).items():
+        if partition in previous["partitions"] and previous["partitions"][partition][0] == partition_fingerprint:
+            results[partition] = previous["partitions"][partition]
+            continue
+
+        df = results_store.load_partition(platform, directory, root, columns, filters)
+        results[partition] = (partition_fingerprint, func(df, **params))
+        recomputed += 1
+
+    if not recomputed and results.keys() == previous["partitions"].keys():
+        return previous["combined"]
+
+    combined = _concat([result for _, result in results.values()])
+    _write(path, {"partitions": results, "combined": combined}, cache_dir, max_bytes)
+    print(f"{name}: recomputed {recomputed} of {len(results)} partitions")
+    return combined
@@ -0,0 +1,228 @@
+"""
+Ingestion of Azure Functions telemetry (Application Insights requests) into benchmark rows.
+
+The Azure Function runner saves the time window of every test case
+(<start type>-azurefunc-BenchmarkTimes.json), App Insights has a request row per
+invocation with its function name, timestamp, url and customDimensions (a JSON
+object holding FunctionExecutionTimeMs). The runner tags the measured requests of a
+test case with its case id in the url (?benchmark_case=<id>, saved with the window),
+a telemetry row with a tag belongs to the test case of that id. Warmup requests have
+no tag and belong to none. Windows saved before the tag existed have no case id, an
+untagged row belongs to the one whose window of the same function contains its
+timestamp.
+
+Instead of filtering the whole export once per window, telemetry is read in blocks
+of rows and every block is joined to the windows in one pass, column-wise with
+pyarrow compute:
+
+    timestamps are parsed by strptime over the column, function names are cleaned
+    once per distinct name
+    merge_asof by function name assigns each untagged row the last untagged window
+    started before it,
+    rows after that window's end belong to none (overlapping windows of a function,
+    e.g. two test cases run back to back with the two second buffers, get each row
+    once, in the later window)
+    case ids are extracted from the url column by a regex, tagged rows are merged
+    with the windows on case id and function name
+    customDimensions is only expanded for the rows inside a window, a regex per key
+    over the column instead of json.loads per row
+
+    windows = app_insights.load_windows(["cold-azurefunc-BenchmarkTimes.json", ...])
+    rows = app_insights.ingest_csv("azurefunctionx86Data.csv", windows)
+    rows = app_insights.benchmark_rows(telemetry, windows)   telemetry already in a DataFrame or Table
+"""
+import json
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+from benchmarkcommon import results_store
+
+# Timestamps of the portal's CSV export (UTC), like 02/19/2025, 02:07:17.571159 PM.
+# strptime has no fractional seconds with %p, the fraction is split off first
+EXPORT_TIMESTAMP_PATTERN = r"^(?P<base>[^.]+?)(?P<fraction>\.\d+)? (?P<half>[AP]M)$"
+EXPORT_TIMESTAMP_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+WINDOW_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# customDimensions keys -> benchmark columns
+DIMENSIONS = {"FunctionExecutionTimeMs": "execution_time_ms"}
+
+# Query parameter of the measured requests' url holding the test case id (see benchmarkAzureFunction.py)
+CASE_PARAMETER = "benchmark_case"
+CASE_PATTERN = rf"[?&]{CASE_PARAMETER}=(?P<case_id>[^&#]+)"
+
+TELEMETRY_COLUMNS = ["timestamp", "name", "customDimensions"]
+# Request url, holds the case id of the measured requests
+URL_COLUMN = "url"
+# Carried into the rows when the telemetry has it (query exports, see app_insights_query.py)
+OPTIONAL_TELEMETRY_COLUMNS = ["request_id"]
+
+ROW_COLUMNS = ["start_type", "language", "architecture", "operation", "execution_time_ms", "crypto_mode", "batch_size"]
+
+
+def load_windows(json_files: list[str]) -> pd.DataFrame:
+    """
+    Benchmark windows of the runner's BenchmarkTimes files, one row per test case.
+    """
+    test_cases = []
+    for json_file in json_files:
+        with open(json_file, "r") as file:
+            test_cases.extend(json.load(file))
+    return windows_frame(test_cases)
+
+
+def windows_frame(test_cases: list[dict]) -> pd.DataFrame:
+    """
+    Benchmark windows of finished test cases (as the runner saves them), sorted by start time.
+    """
+    entries = []
+    for entry in test_cases:
+        entries.append({
+            "name": entry["operationName"],
+            "start_time": entry["benchmarktimes"][0],
+            "end_time": entry["benchmarktimes"][1],
+            "start_type": entry["start_type"],
+            "architecture": entry.get("architecture", "x86"),
+            # Windows saved before the crypto mode and batch size existed are single requests, the Python
+            # verify and encrypt ones with the public key in process (see results_store.LEGACY_PUBLIC_KEY_OPERATIONS)
+            "crypto_mode": entry.get("crypto_mode") or results_store.legacy_crypto_mode("azure_function", entry.get("language"), entry.get("operation")),
+            "batch_size": entry.get("batch_size", 1),
+            "iterations": entry.get("iterations", 0),
+            # None for windows saved before the runner tagged its requests
+            "case_id": entry.get("case_id"),
+        })
+
+    windows = pd.DataFrame(entries, columns=["name", "start_time", "end_time", "start_type", "architecture", "crypto_mode", "batch_size", "iterations", "case_id"])
+    windows["start_time"] = pd.to_datetime(windows["start_time"], format=WINDOW_TIMESTAMP_FORMAT).astype("datetime64[ns]")
+    windows["end_time"] = pd.to_datetime(windows["end_time"], format=WINDOW_TIMESTAMP_FORMAT).astype("datetime64[ns]")
+    return windows.sort_values("start_time", kind="stable", ignore_index=True)
+
+
+def operation_names(names: pd.Series) -> pd.DataFrame:
+    """
+    language and operation of function names like dotnet_ecc256_sign_program or python_sha256.
+    """
+    parts = names.str.split("_", n=1, expand=True)
+    return pd.DataFrame({
+        "language": parts[0].replace("dotnet", "c#"),
+        "operation": parts[1].str.replace("_program", "", regex=False),
+    }, index=names.index)
+
+
+def function_name(name: str) -> str:
+    """
+    App Insights function name of a window name, c#_ecc256_sign -> dotnet_ecc256_sign_program.
+    """
+    if name.startswith("c#_"):
+        return f"dotnet_{name[len('c#_'):]}_program"
+    return name
+
+
+def parse_export_timestamps(values: pa.Array) -> pa.Array:
+    """
+    Timestamps of the portal export as timestamp[us], null where they do not parse.
+    """
+    parts = pc.extract_regex(values, EXPORT_TIMESTAMP_PATTERN)
+    seconds = pc.strptime(pc.binary_join_element_wise(pc.struct_field(parts, "base"), pc.struct_field(parts, "half"), " "),
+                          format=EXPORT_TIMESTAMP_FORMAT, unit="us", error_is_null=True)
+    fraction = pc.struct_field(parts, "fraction")
+    fraction_us = pc.cast(pc.round(pc.multiply(pc.cast(pc.if_else(pc.equal(fraction, ""), "0", fraction), pa.float64()), 1e6)), pa.int64())
+    return pc.add(seconds, pc.cast(fraction_us, pa.duration("us")))
+
+
+def expand_dimensions(custom_dimensions: pa.Array, dimensions: dict = DIMENSIONS) -> pd.DataFrame:
+    """
+    Numeric customDimensions values as columns, NaN where a key is missing.
+    """
+    columns = {}
+    for key, column in dimensions.items():
+        values = pc.struct_field(pc.extract_regex(custom_dimensions, rf'"{re.escape(key)}"\s*:\s*"?(?P<value>[^",}}]*)'), "value")
+        columns[column] = pd.to_numeric(values.to_pandas(), errors="coerce").astype("float64")
+    return pd.DataFrame(columns)
+
+
+def benchmark_rows(telemetry, windows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows of the telemetry of a benchmark window, by case id or inside an untagged window of the same
+    function, with the window's start type, architecture, crypto mode and batch size.
+
+    :param telemetry: DataFrame or pyarrow Table with timestamp (export text or timestamps), name and customDimensions columns,
+                      and optionally request_id and url.
+    """
+    names = telemetry.columns if isinstance(telemetry, pd.DataFrame) else telemetry.column_names
+    carried = [column for column in OPTIONAL_TELEMETRY_COLUMNS if column in names]
+    columns = TELEMETRY_COLUMNS + carried + ([URL_COLUMN] if URL_COLUMN in names else [])
+    row_columns = ROW_COLUMNS + carried
+
+    if isinstance(telemetry, pd.DataFrame):
+        telemetry = pa.Table.from_pandas(telemetry[columns], preserve_index=False)
+    telemetry = telemetry.select(columns).combine_chunks()
+    if telemetry.num_rows == 0 or windows.empty:
+        return pd.DataFrame(columns=row_columns)
+
+    timestamps = telemetry["timestamp"].chunk(0)
+    if pa.types.is_timestamp(timestamps.type):
+        # Windows are naive UTC, a time zone aware column keeps its UTC values
+        timestamps = pc.cast(timestamps, pa.timestamp("us"))
+    else:
+        timestamps = parse_export_timestamps(pc.cast(timestamps, pa.string()))
+
+    # Function names cleaned once per distinct name, then as codes shared with the windows
+    names = pc.dictionary_encode(pc.cast(telemetry["name"].chunk(0), pa.string()))
+    cleaned = operation_names(pd.Series(names.dictionary.to_pylist(), dtype=object))
+    cleaned = cleaned["language"] + "_" + cleaned["operation"]
+    codes, distinct_names = pd.factorize(pd.concat([cleaned, windows["name"]], ignore_index=True))
+    name_codes = np.where(pd.isna(names.indices), -1, codes[:len(cleaned)][names.indices.fill_null(0).to_numpy()])
+
+    if URL_COLUMN in columns:
+        case_ids = pc.struct_field(pc.extract_regex(pc.cast(telemetry[URL_COLUMN].chunk(0), pa.string()), CASE_PATTERN), "case_id").to_pandas()
+    else:
+        case_ids = pd.Series(None, index=range(telemetry.num_rows), dtype=object)
+
+    rows = pd.DataFrame({
+        "timestamp": pd.Series(timestamps.to_numpy(zero_copy_only=False), dtype="datetime64[ns]"),
+        "name_code": name_codes,
+        "position": np.arange(telemetry.num_rows),
+        "case_id": case_ids.astype(object),
+    })
+    rows = rows[rows["timestamp"].notna() & (rows["name_code"] >= 0)].sort_values("timestamp", kind="stable")
+
+    windows = windows.assign(name_code=codes[len(cleaned):])
+    tagged = windows["case_id"].notna()
+    # A tagged row belongs to the window of its case id only, warmup requests and other runs' requests to none
+    joined = [rows.dropna(subset=["case_id"]).merge(windows[tagged], on=["case_id", "name_code"])]
+    if not tagged.all():
+        untagged = pd.merge_asof(rows[rows["case_id"].isna()], windows[~tagged].drop(columns="case_id"),
+                                 left_on="timestamp", right_on="start_time", by="name_code", direction="backward")
+        # Rows without a window got NaN in the window columns
+        joined.append(untagged[untagged["timestamp"] <= untagged["end_time"]])
+    joined = pd.concat(joined, ignore_index=True).sort_values("timestamp", kind="stable", ignore_index=True).astype({"batch_size": "int64"})
+
+    positions = pa.array(joined["position"].to_numpy())
+    dimensions = expand_dimensions(pc.take(telemetry["customDimensions"].chunk(0), positions))
+    joined = pd.concat([joined, operation_names(pd.Series(distinct_names[joined["name_code"].to_numpy()], dtype=object)), dimensions], axis=1)
+    for column in carried:
+        joined[column] = pc.take(telemetry[column].chunk(0), positions).to_pandas()
+    return joined[row_columns]
+
+
+def ingest_csv(csv_file: str, windows: pd.DataFrame, encoding: str = "utf-7", block_mb: int = 64) -> pd.DataFrame:
+    """
+    Benchmark rows of a portal CSV export, streamed block_mb of the file at a time.
+    """
+    read_options = pa_csv.ReadOptions(encoding=encoding, block_size=block_mb * 1024 * 1024)
+    # Exports without a url column get a null one, their rows join untagged windows only
+    export_columns = TELEMETRY_COLUMNS + [URL_COLUMN]
+    convert_options = pa_csv.ConvertOptions(include_columns=export_columns, include_missing_columns=True,
+                                            column_types={column: pa.string() for column in export_columns})
+
+    frames = []
+    with pa_csv.open_csv(csv_file, read_options=read_options, convert_options=convert_options) as reader:
+        for batch in reader:
+            frames.append(benchmark_rows(pa.Table.from_batches([batch]), windows))
+    frames = [frame for frame in frames if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ROW_COLUMNS)
@@ -0,0 +1,178 @@
+"""
+Export of the Azure Function runner's benchmark rows straight from Log Analytics.
+
+The runner knows the window of every test case, so instead of exporting the App
+Insights requests from the portal and running sortAzureFunctionData.py, the
+requests of the windows are queried from the Log Analytics workspace of the App
+Insights resource (AppRequests table):
+
+    consecutive windows are grouped in sets of --window-set-size, one KQL query
+    covers a set's time range and function names
+    a set's rows are paged by (TimeGenerated, Id), --page-rows per page
+    the next pages of up to 10 sets go in one batch request (the API's limit)
+    the rows of all sets are joined to the windows by app_insights.benchmark_rows, on
+    the case id in the url of the measured requests
+
+Telemetry reaches the workspace minutes after the requests, the sets are queried
+again every --poll-seconds until there is a request row for every measured
+invocation or --ingestion-deadline has passed.
+
+    client = app_insights_query.get_logs_client()    or get_logs_client(stub="https://127.0.0.1:8080/v1")
+    rows = app_insights_query.export_rows(client, workspace_id, windows)
+
+The local stub (python -m benchmarkcommon.stub_server --tls) records every function
+URL request as a request row and answers these queries from them, any token is
+accepted.
+"""
+import json
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+from azure.core.credentials import AccessToken
+from azure.identity import DefaultAzureCredential
+from azure.monitor.query import LogsBatchQuery, LogsQueryClient, LogsQueryStatus
+
+from benchmarkcommon import app_insights
+
+# Queries per batch request allowed by the Log Analytics API
+QUERIES_PER_BATCH = 10
+
+QUERY_COLUMNS = ["timestamp", "name", "customDimensions", "request_id", "url"]
+
+# Timespan of a query around its set's windows, the windows themselves are in the query
+TIMESPAN_PADDING = timedelta(minutes=1)
+
+
+class StubCredential:
+    def get_token(self, *scopes, **kwargs) -> AccessToken:
+        return AccessToken("stub", int(time.time()) + 3600)
+
+
+def get_logs_client(stub: str = None) -> LogsQueryClient:
+    """
+    Client of the public Log Analytics API, or with stub of the local stub's query endpoint.
+    """
+    if stub:
+        return LogsQueryClient(StubCredential(), endpoint=stub)
+    return LogsQueryClient(DefaultAzureCredential())
+
+
+def utc(timestamp: pd.Timestamp) -> datetime:
+    # Windows are naive UTC
+    return timestamp.tz_localize("UTC").to_pydatetime()
+
+
+def kql_datetime(timestamp: pd.Timestamp) -> str:
+    return f"datetime({timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ')})"
+
+
+def window_sets(windows: pd.DataFrame, set_size: int) -> list[dict]:
+    """
+    Consecutive windows (by start time) in sets of set_size, with their time range and function names.
+    """
+    sets = []
+    for first in range(0, len(windows), set_size):
+        chunk = windows.iloc[first:first + set_size]
+        sets.append({
+            "start": chunk["start_time"].min(),
+            "end": chunk["end_time"].max(),
+            "names": sorted({app_insights.function_name(name) for name in chunk["name"]}),
+        })
+    return sets
+
+
+def kql_query(window_set: dict, page_rows: int, cursor: tuple = None) -> str:
+    """
+    Query of a set's requests, the page after cursor (timestamp, request id of the last row) when given.
+    """
+    names = ", ".join(json.dumps(name) for name in window_set["names"])
+    lines = [
+        "AppRequests",
+        f"| where TimeGenerated between ({kql_datetime(window_set['start'])} .. {kql_datetime(window_set['end'])})",
+        f"| where Name in ({names})",
+    ]
+    if cursor is not None:
+        timestamp = kql_datetime(cursor[0])
+        # Kusto has no relational operators on strings, the id is compared with strcmp
+        lines.append(f"| where TimeGenerated > {timestamp} or (TimeGenerated == {timestamp} and strcmp(Id, {json.dumps(cursor[1])}) > 0)")
+    lines.append("| project timestamp = TimeGenerated, name = Name, customDimensions = Properties, request_id = Id, url = Url")
+    lines.append(f"| top {page_rows} by timestamp asc, request_id asc")
+    return "\n".join(lines)
+
+
+def result_page(result) -> pd.DataFrame | None:
+    """
+    Rows of a batch query result, None if the query failed.
+    """
+    if result.status == LogsQueryStatus.FAILURE:
+        print(f"Log Analytics query failed: {result.message}")
+        return None
+    if result.status == LogsQueryStatus.PARTIAL:
+        print(f"Log Analytics query returned partial results: {result.partial_error.message}")
+        tables = result.partial_data
+    else:
+        tables = result.tables
+
+    if not tables:
+        return pd.DataFrame(columns=QUERY_COLUMNS)
+    page = pd.DataFrame([list(row) for row in tables[0].rows], columns=tables[0].columns)
+    page["timestamp"] = pd.to_datetime(page["timestamp"], utc=True)
+    # dynamic columns come as JSON text, keep it that way for expand_dimensions
+    page["customDimensions"] = page["customDimensions"].map(lambda value: value if isinstance(value, str) else json.dumps(value))
+    return page[QUERY_COLUMNS]
+
+
+def fetch_telemetry(client: LogsQueryClient, workspace_id: str, sets: list[dict], page_rows: int) -> pd.DataFrame:
+    """
+    Request rows of every window set, each row once.
+    """
+    pages = []
+    pending = [(window_set, None) for window_set in sets]
+    while pending:
+        next_pending = []
+        for first in range(0, len(pending), QUERIES_PER_BATCH):
+            batch = pending[first:first + QUERIES_PER_BATCH]
+            queries = [
+                LogsBatchQuery(workspace_id, kql_query(window_set, page_rows, cursor),
+                               timespan=(utc(window_set["start"]) - TIMESPAN_PADDING, utc(window_set["end"]) + TIMESPAN_PADDING))
+                for window_set, cursor in batch
+            ]
+            for (window_set, cursor), result in zip(batch, client.query_batch(queries)):
+                page = result_page(result)
+                if page is None:
+                    # Queried again on the next poll
+                    continue
+                pages.append(page)
+                if len(page) == page_rows:
+                    last = page.iloc[-1]
+                    next_pending.append((window_set, (last["timestamp"], last["request_id"])))
+        pending = next_pending
+
+    pages = [page for page in pages if not page.empty]
+    if not pages:
+        return pd.DataFrame(columns=QUERY_COLUMNS)
+    # Sets overlap where their windows do, and a page cursor at microseconds can repeat a row
+    return pd.concat(pages, ignore_index=True).drop_duplicates("request_id", ignore_index=True)
+
+
+def export_rows(client: LogsQueryClient, workspace_id: str, windows: pd.DataFrame, set_size: int = 20, page_rows: int = 50000,
+                ingestion_deadline: float = 600.0, poll_seconds: float = 30.0) -> pd.DataFrame:
+    """
+    Benchmark rows of the windows (app_insights.windows_frame) from the workspace, with their request ids.
+    """
+    sets = window_sets(windows, set_size)
+    expected = int(windows["iterations"].sum())
+    started = time.monotonic()
+
+    while True:
+        rows = app_insights.benchmark_rows(fetch_telemetry(client, workspace_id, sets, page_rows), windows)
+        print(f"App Insights: {len(rows)} of {expected} requests of {len(windows)} test cases ({len(sets)} window sets)")
+        if len(rows) >= expected or time.monotonic() - started + poll_seconds > ingestion_deadline:
+            break
+        print(f"Waiting {poll_seconds:.0f}s for telemetry ingestion")
+        time.sleep(poll_seconds)
+
+    if len(rows) < expected:
+        print(f"Missing {expected - len(rows)} requests after {ingestion_deadline:.0f}s, the test case windows are saved for a later export")
+    return rows
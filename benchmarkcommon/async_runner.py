@@ -0,0 +1,151 @@
+"""
+Asyncio execution engine for HTTP (FaaS) benchmark test cases.
+
+All requests go through one pooled keep-alive aiohttp session. Test cases run
+concurrently, bounded by a global limit and a per-URL limit, while the
+invocations inside a single test case stay strictly sequential (warmup first,
+then the timed iterations) so the cold/warm semantics of the sync runner hold.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import aiohttp
+
+from benchmarkcommon import client_timing
+from benchmarkcommon import wire_format
+
+
+def epoch_ms() -> int:
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+async def post_json(session: aiohttp.ClientSession, url: str, payload_body: dict | bytes, headers: dict) -> dict:
+    """
+    POST a JSON payload, or a binary frame given as bytes (see wire_format.py), and return a small record describing the invocation.
+    The response body is drained so the connection can go back into the pool.
+    Phase timings are filled in when the session uses client_timing.trace_config().
+    """
+    invocation = {
+        "status": None,
+        "request_id": None,
+        "elapsed_ms": None,
+        "error": None,
+        "timings": client_timing.new_timings(),
+    }
+
+    if isinstance(payload_body, bytes):
+        request = {"data": payload_body, "headers": {**(headers or {}), "Content-Type": wire_format.CONTENT_TYPE}}
+    else:
+        request = {"json": payload_body, "headers": headers}
+
+    start = time.perf_counter()
+    try:
+        async with session.post(url, **request, trace_request_ctx={"timings": invocation["timings"]}) as response:
+            invocation["timings"]["response_bytes"] = len(await response.read())
+            invocation["status"] = response.status
+            invocation["request_id"] = response.headers.get("x-amzn-RequestId")
+            client_timing.read_counters(invocation["timings"], response.headers)
+            response.raise_for_status()  # Raise an error for any 4xx/5xx status codes
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        invocation["error"] = str(e)
+
+    invocation["elapsed_ms"] = (time.perf_counter() - start) * 1000
+
+    timings = invocation["timings"]
+    timings["request_id"] = invocation["request_id"]
+    timings["status"] = invocation["status"]
+    timings["total_ms"] = invocation["elapsed_ms"]
+    timings["error"] = invocation["error"]
+    return invocation
+
+
+async def execute_tc(session: aiohttp.ClientSession, test_case: dict, url_key: str, payload_key: str, headers: dict, warmup_iterations: int, warmup_settle_seconds: float) -> dict:
+    """
+    Run one test case: optional warmup, then `iterations` sequential invocations.
+    Returns the raw start/end of the timed section (epoch ms) and every invocation record.
+    """
+    url = test_case[url_key]
+    payload_body = test_case[payload_key]
+    iterations = test_case["iterations"]
+
+    if test_case["start_type"] == "warm":
+        for _ in range(0, warmup_iterations):
+            warmup = await post_json(session, url, payload_body, headers)
+            if warmup["error"] is not None:
+                raise RuntimeError(f"Warmup failed for {url}: {warmup['error']}")
+
+        # Let the warmup invocations settle so they fall outside the timed window
+        await asyncio.sleep(warmup_settle_seconds)
+
+    start_ms = epoch_ms()
+
+    invocations = []
+    for _ in range(0, iterations):
+        invocation = await post_json(session, url, payload_body, headers)
+
+        if invocation["error"] is not None:
+            print(f"HTTP Request failed: {invocation['error']}")
+            print(f"Test Case: {test_case['operation']} {test_case['language']} -> {url}")
+            await asyncio.sleep(10)
+            print("wait a second to test it again")
+
+        invocations.append(invocation)
+
+    end_ms = epoch_ms()
+
+    return {
+        "test_case": test_case,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "invocations": invocations,
+    }
+
+
+async def run_test_cases_async(test_cases: list[dict], url_key: str, payload_key: str, concurrency: int, per_url_concurrency: int, headers: dict, warmup_iterations: int, warmup_settle_seconds: float, on_complete=None) -> list[dict]:
+    global_limit = asyncio.Semaphore(concurrency)
+    url_limits = {}
+
+    # Keep-alive pool sized to the number of test cases allowed in flight.
+    # Per-URL limits are enforced by the semaphores, several URLs may share one host.
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=900)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[client_timing.trace_config()]) as session:
+
+        async def guarded(test_case: dict) -> dict:
+            url = test_case[url_key]
+            if url not in url_limits:
+                url_limits[url] = asyncio.Semaphore(per_url_concurrency)
+
+            # asyncio semaphores are FIFO, so test cases sharing a URL keep their matrix order
+            async with url_limits[url]:
+                async with global_limit:
+                    result = await execute_tc(session, test_case, url_key, payload_key, headers, warmup_iterations, warmup_settle_seconds)
+
+            if on_complete is not None:
+                on_complete(result)
+
+            return result
+
+        tasks = [asyncio.create_task(guarded(test_case)) for test_case in test_cases]
+        return await asyncio.gather(*tasks)
+
+
+def run_test_cases(test_cases: list[dict], url_key: str, payload_key: str = "operation_input", concurrency: int = 8, per_url_concurrency: int = 1, headers: dict = None, warmup_iterations: int = 10, warmup_settle_seconds: float = 2.5, on_complete=None) -> list[dict]:
+    """
+    Execute test cases concurrently and return one result dict per test case, in input order.
+
+    :param url_key: Test case key holding the function URL (e.g. "lambda_url").
+    :param payload_key: Test case key holding the JSON body sent on every invocation.
+    :param concurrency: Maximum number of test cases in flight across all URLs.
+    :param per_url_concurrency: Maximum number of test cases in flight against one URL.
+    :param on_complete: Optional callback invoked with each result as soon as its test case finishes.
+    """
+    if concurrency < 1 or per_url_concurrency < 1:
+        raise ValueError("concurrency and per_url_concurrency must be at least 1")
+
+    if headers is None:
+        headers = {"Content-Type": "application/json"}
+
+    return asyncio.run(run_test_cases_async(test_cases, url_key, payload_key, concurrency, per_url_concurrency, headers, warmup_iterations, warmup_settle_seconds, on_complete))
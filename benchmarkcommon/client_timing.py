@@ -0,0 +1,187 @@
+"""
+Client-side timing of individual function URL invocations.
+
+timed_post() performs a POST over a fresh connection (like requests.post
+without a session) and times each phase itself:
+
+    dns_ms      getaddrinfo
+    connect_ms  TCP connect
+    tls_ms      TLS handshake (0 for http://)
+    ttfb_ms     request sent -> status line and headers received
+    total_ms    start of DNS -> body fully read
+
+trace_config() provides the same record for aiohttp sessions. aiohttp reports
+TCP connect and TLS handshake as one step, so there connect_ms includes TLS
+and tls_ms is None.
+
+The record also has the request and response body sizes (request_bytes and
+response_bytes), which differ between the JSON and binary wire formats.
+
+Counters a function answers as response headers (the data key cache hits and
+misses of the Python AES functions) are read into the record by read_counters(),
+None when the function does not send them.
+"""
+import http.client
+import socket
+import ssl
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+REQUEST_ID_HEADER = "x-amzn-RequestId"
+
+# response header -> timing record field
+COUNTER_HEADERS = {
+    "x-data-key-hits": "data_key_hits",
+    "x-data-key-misses": "data_key_misses",
+}
+
+_ssl_context = ssl.create_default_context()
+
+
+def new_timings() -> dict:
+    return {
+        "request_id": None,
+        "status": None,
+        "dns_ms": None,
+        "connect_ms": None,
+        "tls_ms": None,
+        "ttfb_ms": None,
+        "total_ms": None,
+        "error": None,
+        "data_key_hits": None,
+        "data_key_misses": None,
+        "request_bytes": None,
+        "response_bytes": None,
+    }
+
+
+def read_counters(timings: dict, headers) -> None:
+    """
+    Copy the counter headers into the timing record, headers is any case insensitive mapping.
+    """
+    for header, field in COUNTER_HEADERS.items():
+        value = headers.get(header)
+        timings[field] = int(value) if value is not None else None
+
+
+def timed_post(url: str, body: bytes, headers: dict, timeout_seconds: float = 900.0, request_id_header: str = REQUEST_ID_HEADER) -> dict:
+    """
+    POST `body` to `url` over a new connection and return the timing record
+    (plus "response_body"). Errors are reported in the record instead of raised.
+    """
+    timings = new_timings()
+    timings["response_body"] = None
+    timings["request_bytes"] = len(body)
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    port = parts.port or (443 if https else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+
+    connection = None
+    start = time.perf_counter()
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        dns_done = time.perf_counter()
+        timings["dns_ms"] = (dns_done - start) * 1000
+
+        family, socktype, proto, _, address = addresses[0]
+        sock = socket.socket(family, socktype, proto)
+        sock.settimeout(timeout_seconds)
+        sock.connect(address)
+        connect_done = time.perf_counter()
+        timings["connect_ms"] = (connect_done - dns_done) * 1000
+
+        timings["tls_ms"] = 0.0
+        if https:
+            sock = _ssl_context.wrap_socket(sock, server_hostname=parts.hostname)
+            timings["tls_ms"] = (time.perf_counter() - connect_done) * 1000
+
+        # http.client only connects when it has no socket, so it uses the one timed above
+        connection = http.client.HTTPConnection(parts.hostname, port, timeout=timeout_seconds)
+        connection.sock = sock
+
+        connection.request("POST", path, body=body, headers=headers)
+        sent = time.perf_counter()
+
+        response = connection.getresponse()
+        timings["ttfb_ms"] = (time.perf_counter() - sent) * 1000
+        timings["status"] = response.status
+        timings["request_id"] = response.getheader(request_id_header)
+        read_counters(timings, response.headers)
+
+        timings["response_body"] = response.read()
+        timings["response_bytes"] = len(timings["response_body"])
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+
+        if response.status >= 400:
+            timings["error"] = f"{response.status} {response.reason} for url: {url}"
+    except (OSError, http.client.HTTPException) as e:
+        timings["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if connection is not None:
+            connection.close()
+
+    return timings
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """
+    aiohttp trace hooks filling the dict passed as `trace_request_ctx={"timings": ...}`.
+    Reused keep-alive connections leave dns_ms and connect_ms at 0.
+    """
+    config = aiohttp.TraceConfig()
+
+    def timings_of(trace_config_ctx) -> dict | None:
+        request_ctx = trace_config_ctx.trace_request_ctx
+        return request_ctx.get("timings") if isinstance(request_ctx, dict) else None
+
+    async def on_request_start(session, trace_config_ctx, params):
+        trace_config_ctx.start = time.perf_counter()
+        trace_config_ctx.sent = None
+        timings = timings_of(trace_config_ctx)
+        if timings is not None:
+            timings["dns_ms"] = 0.0
+            timings["connect_ms"] = 0.0
+
+    async def on_dns_resolvehost_start(session, trace_config_ctx, params):
+        trace_config_ctx.dns_start = time.perf_counter()
+
+    async def on_dns_resolvehost_end(session, trace_config_ctx, params):
+        timings = timings_of(trace_config_ctx)
+        if timings is not None:
+            timings["dns_ms"] = (time.perf_counter() - trace_config_ctx.dns_start) * 1000
+
+    async def on_connection_create_start(session, trace_config_ctx, params):
+        trace_config_ctx.connect_start = time.perf_counter()
+
+    async def on_connection_create_end(session, trace_config_ctx, params):
+        timings = timings_of(trace_config_ctx)
+        if timings is not None:
+            # Includes DNS when it was not cached, which is reported separately
+            timings["connect_ms"] = (time.perf_counter() - trace_config_ctx.connect_start) * 1000 - timings["dns_ms"]
+
+    async def on_request_chunk_sent(session, trace_config_ctx, params):
+        trace_config_ctx.sent = time.perf_counter()
+        timings = timings_of(trace_config_ctx)
+        if timings is not None:
+            timings["request_bytes"] = (timings["request_bytes"] or 0) + len(params.chunk)
+
+    async def on_request_end(session, trace_config_ctx, params):
+        timings = timings_of(trace_config_ctx)
+        if timings is not None:
+            sent = trace_config_ctx.sent or trace_config_ctx.start
+            timings["ttfb_ms"] = (time.perf_counter() - sent) * 1000
+
+    config.on_request_start.append(on_request_start)
+    config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    config.on_connection_create_start.append(on_connection_create_start)
+    config.on_connection_create_end.append(on_connection_create_end)
+    config.on_request_chunk_sent.append(on_request_chunk_sent)
+    config.on_request_end.append(on_request_end)
+
+    return config
@@ -0,0 +1,218 @@
+"""
+Parallel, cached figure rendering for the analysis scripts.
+
+A figure job is a dict
+
+    {"output_path": ..., "render": fn, "data": DataFrame, "kwargs": {...}}
+
+where `render(data, output_path, **kwargs)` draws one figure and saves it to
+output_path. The scripts aggregate their data once, build one job per figure
+with only the rows and columns that figure needs, and hand the list to
+render_figures(), which
+
+- hashes each job (data content, render function source, kwargs, matplotlib version)
+- skips figures whose output still holds the render of the same hash
+- restores figures rendered before from the content-addressed cache (<cache_dir>/<hash>.png)
+- renders the rest on a process pool with the Agg backend
+- reports the render time of every figure (printed and saved to <cache_dir>/figure-timings.csv)
+
+Render functions must be module level so they can be sent to the worker processes.
+"""
+import concurrent.futures
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+
+import matplotlib
+import pandas as pd
+
+DEFAULT_CACHE_DIR = ".figure-cache"
+MANIFEST_FILE = "manifest.json"
+TIMINGS_FILE = "figure-timings.csv"
+
+
+def figure_job(output_path: str, render, data, **kwargs) -> dict:
+    return {"output_path": output_path, "render": render, "data": data, "kwargs": kwargs}
+
+
+def _update_with_data(digest, data) -> None:
+    if isinstance(data, pd.DataFrame):
+        digest.update(repr(list(data.columns)).encode())
+        digest.update(repr([str(dtype) for dtype in data.dtypes]).encode())
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    elif isinstance(data, pd.Series):
+        digest.update(repr((data.name, str(data.dtype))).encode())
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    elif isinstance(data, dict):
+        for key in sorted(data, key=repr):
+            digest.update(repr(key).encode())
+            _update_with_data(digest, data[key])
+    elif isinstance(data, (list, tuple)):
+        for item in data:
+            _update_with_data(digest, item)
+    else:
+        digest.update(repr(data).encode())
+
+
+def job_hash(job: dict) -> str:
+    """
+    Content hash of everything that determines the rendered figure.
+    """
+    digest = hashlib.sha256()
+    render = job["render"]
+    digest.update(f"{render.__module__}.{render.__qualname__}".encode())
+    try:
+        # Editing the plotting code invalidates its figures
+        digest.update(inspect.getsource(render).encode())
+    except (OSError, TypeError):
+        pass
+    digest.update(repr(sorted(job["kwargs"].items())).encode())
+    digest.update(matplotlib.__version__.encode())
+    _update_with_data(digest, job["data"])
+    return digest.hexdigest()
+
+
+def _init_worker() -> None:
+    matplotlib.use("Agg")
+
+
+def _render_job(render, data, kwargs: dict, temp_path: str) -> float:
+    """
+    Runs in a worker process. Returns the render time in ms.
+    """
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    try:
+        render(data, temp_path, **kwargs)
+    finally:
+        plt.close("all")
+    return (time.perf_counter() - start) * 1000
+
+
+def _load_manifest(cache_dir: str) -> dict:
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE)) as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_manifest(cache_dir: str, manifest: dict) -> None:
+    temp_path = os.path.join(cache_dir, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(temp_path, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temp_path, os.path.join(cache_dir, MANIFEST_FILE))
+
+
+def _publish(cached_path: str, output_path: str) -> None:
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    shutil.copyfile(cached_path, output_path)
+
+
+def render_figures(jobs: list[dict], cache_dir: str = DEFAULT_CACHE_DIR, max_workers: int = None, force: bool = False) -> list[dict]:
+    """
+    Render figure jobs in parallel, skipping the ones whose inputs did not change.
+
+    :param jobs: Jobs from figure_job().
+    :param cache_dir: Content-addressed cache of rendered figures, the manifest and the timings csv.
+    :param max_workers: Worker processes (default os.cpu_count()), 1 renders in this process.
+    :param force: Render every job even when cached.
+    :return: One record per job: output_path, hash, status (unchanged, cached, rendered, failed), render_ms, error.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = _load_manifest(cache_dir)
+    start = time.perf_counter()
+
+    records = []
+    to_render = {}
+    for job in jobs:
+        output_path = job["output_path"]
+        digest = job_hash(job)
+        extension = os.path.splitext(output_path)[1] or ".png"
+        cached_path = os.path.join(cache_dir, f"{digest}{extension}")
+        record = {"output_path": output_path, "hash": digest, "status": None, "render_ms": None, "error": None}
+        records.append(record)
+
+        if not force and manifest.get(output_path) == digest and os.path.exists(output_path):
+            record["status"] = "unchanged"
+        elif not force and os.path.exists(cached_path):
+            _publish(cached_path, output_path)
+            manifest[output_path] = digest
+            record["status"] = "cached"
+        elif cached_path in to_render:
+            # Identical figure under another name, rendered once
+            to_render[cached_path][1].append(record)
+        else:
+            to_render[cached_path] = (job, [record])
+
+    def finish(cached_path: str, temp_path: str, job_records: list[dict], render_ms: float = None, error: Exception = None) -> None:
+        if error is None:
+            os.replace(temp_path, cached_path)
+        elif os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        for record in job_records:
+            record["render_ms"] = render_ms
+            if error is None:
+                _publish(cached_path, record["output_path"])
+                manifest[record["output_path"]] = record["hash"]
+                record["status"] = "rendered"
+            else:
+                record["status"] = "failed"
+                record["error"] = f"{type(error).__name__}: {error}"
+                print(f"Failed to render {record['output_path']}: {record['error']}")
+
+    def temp_path_of(cached_path: str) -> str:
+        root, extension = os.path.splitext(cached_path)
+        return f"{root}.tmp{extension}"
+
+    if to_render:
+        if max_workers == 1:
+            _init_worker()
+            for cached_path, (job, job_records) in to_render.items():
+                temp_path = temp_path_of(cached_path)
+                try:
+                    finish(cached_path, temp_path, job_records, _render_job(job["render"], job["data"], job["kwargs"], temp_path))
+                except Exception as e:
+                    finish(cached_path, temp_path, job_records, error=e)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+                futures = {}
+                for cached_path, (job, job_records) in to_render.items():
+                    temp_path = temp_path_of(cached_path)
+                    future = executor.submit(_render_job, job["render"], job["data"], job["kwargs"], temp_path)
+                    futures[future] = (cached_path, temp_path, job_records)
+
+                for future in concurrent.futures.as_completed(futures):
+                    cached_path, temp_path, job_records = futures[future]
+                    try:
+                        finish(cached_path, temp_path, job_records, future.result())
+                    except Exception as e:
+                        finish(cached_path, temp_path, job_records, error=e)
+
+    _save_manifest(cache_dir, manifest)
+    report(records, time.perf_counter() - start, cache_dir)
+    return records
+
+
+def report(records: list[dict], wall_seconds: float, cache_dir: str) -> None:
+    """
+    Print a summary and save the per-figure render times.
+    """
+    df = pd.DataFrame(records, columns=["output_path", "hash", "status", "render_ms", "error"])
+    counts = df["status"].value_counts().to_dict()
+    rendered = df[df["status"] == "rendered"]
+
+    print(f"Figures: {len(df)} ({', '.join(f'{status} {count}' for status, count in sorted(counts.items()))}) in {wall_seconds:.1f}s")
+    if not rendered.empty:
+        print(f"Render time per figure: mean {rendered['render_ms'].mean():.0f} ms, total {rendered['render_ms'].sum() / 1000:.1f} s")
+        for _, row in rendered.nlargest(5, "render_ms").iterrows():
+            print(f"  {row['render_ms']:8.0f} ms  {row['output_path']}")
+
+    df.to_csv(os.path.join(cache_dir, TIMINGS_FILE), index=False)
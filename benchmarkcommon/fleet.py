@@ -0,0 +1,347 @@
+"""
+Fleet runs: the EC2 and Azure VM runners on many hosts at once, results collected centrally.
+
+A coordinator holds the shards of the test plan (the runners' --matrix --shard i/n)
+of one or more pools, e.g. one pool per instance type, every pool runs the whole
+plan. Workers claim shards of their pool and run the runner on them, the runner
+sends each finished test case's rows to the coordinator, which appends them to
+the one results store:
+
+    python -m benchmarkcommon.fleet serve --port 8700 --pools t3.micro,c7g.large --shards 4 \\
+        --results-store ./results-store
+    python -m benchmarkcommon.fleet worker --coordinator http://10.0.0.5:8700 --pool t3.micro \\
+        -- python3 benchmarkAWSEC2.py --matrix ../../benchmark-matrix.toml
+
+The worker appends --shard i/n --fleet-url <coordinator> --fleet-pool <pool> to the
+command for every shard it claims, until its pool has none left. The protocol is
+JSON over HTTP:
+
+    POST /claim      {"worker", "pool"}                     -> {"shard": "i/n" | null, "wait": s, "lease_seconds": s}
+    POST /heartbeat  {"worker", "pool", "shard"}            -> {}    extends the lease of a claimed shard
+    POST /results    {"pool", "platform", "case_key", "rows"} -> {"accepted": rows, "duplicate": bool}
+    POST /finish     {"worker", "pool", "shard", "status"}  -> {}    status done or failed
+    GET  /status                                            -> shards of every pool by state
+
+A shard whose lease runs out (the worker died) or that failed goes back to the
+queue, up to --max-attempts claims. Rows are deduplicated by pool and case key (a
+shard run again does not add its finished cases twice, every pool's are kept) and
+written when a shard
+finishes, or every --flush-rows rows. The coordinator exits once every shard is
+done or out of attempts.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import requests
+
+from benchmarkcommon import results_store
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+
+class Coordinator:
+    """
+    Shard queues and the result collector, shared by the request handler threads.
+    """
+
+    def __init__(self, pools: list[str], shard_count: int, results_store_root: str, lease_seconds: float = 600.0, max_attempts: int = 3, flush_rows: int = 50000):
+        self.lock = threading.Lock()
+        # Held while rows are written, so the final flush waits for one in progress
+        self.write_lock = threading.Lock()
+        self.results_store_root = results_store_root
+        # One run id for the whole fleet run, every flush adds its own files to it
+        self.run_id = results_store.new_run_id()
+        self.flushes = 0
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.flush_rows = flush_rows
+        self.shards = {
+            (pool, f"{index}/{shard_count}"): {"state": PENDING, "worker": None, "lease_until": 0.0, "attempts": 0, "error": None}
+            for pool in pools for index in range(1, shard_count + 1)
+        }
+        self.finished = threading.Event()
+        # platform -> buffered rows, and the (pool, platform, case key) already collected
+        self.buffers = {}
+        self.case_keys = set()
+        self.rows_saved = 0
+
+    def expire_leases(self) -> None:
+        now = time.monotonic()
+        for (pool, shard), state in self.shards.items():
+            if state["state"] == CLAIMED and state["lease_until"] < now:
+                print(f"Lease of {pool} shard {shard} ({state['worker']}) ran out")
+                self.release(pool, shard, "lease ran out")
+
+    def release(self, pool: str, shard: str, error: str) -> None:
+        # Back to the queue, or failed for good once out of attempts
+        state = self.shards[(pool, shard)]
+        state["state"] = PENDING if state["attempts"] < self.max_attempts else FAILED
+        state["worker"] = None
+        state["error"] = error
+        self.check_finished()
+
+    def check_finished(self) -> None:
+        if all(state["state"] in (DONE, FAILED) for state in self.shards.values()):
+            self.finished.set()
+
+    def claim(self, worker: str, pool: str) -> dict:
+        with self.lock:
+            if not any(key[0] == pool for key in self.shards):
+                raise ValueError(f"Unknown pool: {pool}")
+            self.expire_leases()
+
+            for (shard_pool, shard), state in self.shards.items():
+                if shard_pool == pool and state["state"] == PENDING:
+                    state.update(state=CLAIMED, worker=worker, lease_until=time.monotonic() + self.lease_seconds, attempts=state["attempts"] + 1)
+                    print(f"{worker} claimed {pool} shard {shard} (attempt {state['attempts']})")
+                    return {"shard": shard, "lease_seconds": self.lease_seconds}
+
+            # Shards still running elsewhere may come back, the worker asks again later
+            running = any(state["state"] == CLAIMED for (shard_pool, _), state in self.shards.items() if shard_pool == pool)
+            return {"shard": None, "wait": min(30.0, self.lease_seconds / 4) if running else 0}
+
+    def heartbeat(self, worker: str, pool: str, shard: str) -> dict:
+        with self.lock:
+            state = self.shards[(pool, shard)]
+            if state["state"] == CLAIMED and state["worker"] == worker:
+                state["lease_until"] = time.monotonic() + self.lease_seconds
+        return {}
+
+    def collect(self, pool: str, platform: str, case_key: str, rows: list[dict]) -> dict:
+        with self.lock:
+            # Every pool runs the whole plan, the same case key of another pool is not a duplicate
+            if (pool, platform, case_key) in self.case_keys:
+                return {"accepted": 0, "duplicate": True}
+            self.case_keys.add((pool, platform, case_key))
+            self.buffers.setdefault(platform, []).extend(rows)
+            full = sum(len(buffer) for buffer in self.buffers.values()) >= self.flush_rows
+        if full:
+            self.flush()
+        return {"accepted": len(rows), "duplicate": False}
+
+    def flush(self) -> None:
+        # Called without the lock, claims and heartbeats are not held up by the Parquet write
+        with self.write_lock:
+            with self.lock:
+                buffers, self.buffers = self.buffers, {}
+                self.flushes += 1
+                part = self.flushes
+
+            for platform, rows in buffers.items():
+                if rows:
+                    results_store.append(pd.DataFrame(rows), platform, self.results_store_root, self.run_id, part=f"{part}")
+                    with self.lock:
+                        self.rows_saved += len(rows)
+
+    def finish(self, worker: str, pool: str, shard: str, status: str, error: str = None) -> dict:
+        with self.lock:
+            state = self.shards[(pool, shard)]
+            if state["worker"] == worker:
+                if status == DONE:
+                    state.update(state=DONE, worker=None, error=None)
+                    self.check_finished()
+                else:
+                    self.release(pool, shard, error or "failed")
+                print(f"{worker} finished {pool} shard {shard}: {state['state']}{f' ({error})' if error else ''}")
+        self.flush()
+        return {}
+
+    def status(self) -> dict:
+        with self.lock:
+            self.expire_leases()
+            pools = {}
+            for (pool, shard), state in self.shards.items():
+                pools.setdefault(pool, {}).setdefault(state["state"], []).append(shard)
+            return {"pools": pools, "cases": len(self.case_keys), "rows_saved": self.rows_saved}
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/status":
+            self.send_json(200, self.server.coordinator.status())
+        else:
+            self.send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        try:
+            # A body that is not JSON is a ValueError too
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path == "/claim":
+                response = coordinator.claim(request["worker"], request["pool"])
+            elif self.path == "/heartbeat":
+                response = coordinator.heartbeat(request["worker"], request["pool"], request["shard"])
+            elif self.path == "/results":
+                response = coordinator.collect(request["pool"], request["platform"], request["case_key"], request["rows"])
+            elif self.path == "/finish":
+                response = coordinator.finish(request["worker"], request["pool"], request["shard"], request["status"], request.get("error"))
+            else:
+                self.send_json(404, {"error": f"Unknown path: {self.path}"})
+                return
+        except (KeyError, ValueError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(200, response)
+
+    def log_message(self, format, *args):
+        # Keep the coordinator output readable
+        return
+
+
+def start_coordinator(coordinator: Coordinator, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the coordinator in a daemon thread and return the server.
+    Use server.server_address for the bound port and server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), CoordinatorHandler)
+    server.daemon_threads = True
+    server.coordinator = coordinator
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def post(url: str, path: str, body: dict, timeout_seconds: float = 60.0) -> dict:
+    response = requests.post(url.rstrip("/") + path, json=body, timeout=timeout_seconds)
+    response.raise_for_status()
+    return response.json()
+
+
+def submit_results(fleet_url: str, pool: str, platform: str, case_key: str, rows: list[dict], attempts: int = 3) -> bool:
+    """
+    Send one finished test case's rows to the coordinator, False if it could not be reached
+    (the runner keeps them and tries again at the end).
+    """
+    for attempt in range(attempts):
+        try:
+            response = post(fleet_url, "/results", {"pool": pool, "platform": platform, "case_key": case_key, "rows": rows})
+            break
+        except requests.exceptions.RequestException as e:
+            print(f"Could not send results to the fleet coordinator: {e}")
+            if attempt == attempts - 1:
+                return False
+            time.sleep(2 ** attempt)
+    if response["duplicate"]:
+        print("The fleet coordinator already has this test case, its rows were dropped")
+    return True
+
+
+def run_worker(coordinator_url: str, pool: str, command: list[str], worker: str) -> int:
+    """
+    Claim and run shards of pool until there are none left, returns the number of failed shards.
+    """
+    failed = 0
+    while True:
+        try:
+            claim = post(coordinator_url, "/claim", {"worker": worker, "pool": pool})
+        except requests.exceptions.ConnectionError:
+            # The coordinator exits once every shard is done
+            print("Fleet coordinator is gone, stopping")
+            break
+        shard = claim["shard"]
+        if shard is None:
+            if not claim["wait"]:
+                break
+            time.sleep(claim["wait"])
+            continue
+
+        # Keep the lease while the runner works through the shard
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(claim["lease_seconds"] / 3):
+                try:
+                    post(coordinator_url, "/heartbeat", {"worker": worker, "pool": pool, "shard": shard})
+                except requests.exceptions.RequestException as e:
+                    print(f"Heartbeat failed: {e}")
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        print(f"Running {pool} shard {shard}")
+        try:
+            returncode = subprocess.run(command + ["--shard", shard, "--fleet-url", coordinator_url, "--fleet-pool", pool]).returncode
+        finally:
+            stop.set()
+            thread.join()
+
+        status = DONE if returncode == 0 else FAILED
+        failed += status == FAILED
+        post(coordinator_url, "/finish", {"worker": worker, "pool": pool, "shard": shard, "status": status,
+                                          "error": None if status == DONE else f"exit code {returncode}"})
+    return failed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fleet runs of the EC2 and Azure VM runners")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Run the coordinator and result collector.")
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=8700)
+    serve_parser.add_argument("--pools", default="default", help="Comma separated worker pools, e.g. instance types, each runs every shard")
+    serve_parser.add_argument("--shards", type=int, required=True, help="Shards of the test plan per pool")
+    serve_parser.add_argument("--results-store", default=results_store.DEFAULT_ROOT, help="Parquet results store the collected rows are appended to")
+    serve_parser.add_argument("--lease-seconds", type=float, default=600.0, help="A claimed shard goes back to the queue after this long without a heartbeat")
+    serve_parser.add_argument("--max-attempts", type=int, default=3, help="Claims of a shard before it counts as failed")
+    serve_parser.add_argument("--flush-rows", type=int, default=50000, help="Write the collected rows once this many are buffered")
+
+    worker_parser = subparsers.add_parser("worker", help="Claim shards and run the runner command on them.")
+    worker_parser.add_argument("--coordinator", required=True, help="Coordinator URL, e.g. http://10.0.0.5:8700")
+    worker_parser.add_argument("--pool", default="default")
+    worker_parser.add_argument("--name", default=None, help="Worker name, default host name and process id")
+    worker_parser.add_argument("runner", nargs=argparse.REMAINDER, help="-- followed by the runner command")
+    return parser.parse_args()
+
+
+def main(args):
+    if args.command == "serve":
+        coordinator = Coordinator(args.pools.split(","), args.shards, args.results_store, args.lease_seconds, args.max_attempts, args.flush_rows)
+        server = start_coordinator(coordinator, args.host, args.port)
+        host, port = server.server_address
+        print(f"Fleet coordinator listening on http://{host}:{port}, {len(coordinator.shards)} shards")
+
+        try:
+            # Leases are checked on every claim, and here while the last shards run
+            while not coordinator.finished.wait(10):
+                coordinator.status()
+        except KeyboardInterrupt:
+            pass
+        server.shutdown()
+
+        coordinator.flush()
+        status = coordinator.status()
+        print(f"Fleet run finished: {json.dumps(status['pools'])}, {status['cases']} test cases, {status['rows_saved']} rows saved")
+        exit(1 if any(FAILED in states for states in status["pools"].values()) else 0)
+
+    command = args.runner[1:] if args.runner[:1] == ["--"] else args.runner
+    if not command:
+        print("No runner command given, e.g. -- python3 benchmarkAWSEC2.py --matrix ../../benchmark-matrix.toml")
+        exit(1)
+    worker = args.name or f"{socket.gethostname()}-{os.getpid()}"
+    failed = run_worker(args.coordinator, args.pool, command, worker)
+    exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main(parse_args())
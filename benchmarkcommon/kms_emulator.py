@@ -0,0 +1,783 @@
+"""
+Local stand-in for AWS KMS and Azure Key Vault, so the crypto workloads can run offline.
+
+It implements the calls the workloads make, backed by real `cryptography` keys:
+
+    KMS (JSON protocol, X-Amz-Target: TrentService.<Operation>)
+        Encrypt, Decrypt, GenerateDataKey, Sign, Verify, GenerateMac, VerifyMac, GetPublicKey
+    Key Vault (REST, the api-version is ignored)
+        GET  /keys/<name>[/<version>]
+        POST /keys/<name>/<version>/encrypt|decrypt|sign|verify
+
+Every response is delayed by --latency-ms plus a uniform random 0..--jitter-ms to
+model the network round trip. The x-emulator-delay-ms and x-emulator-crypto-ms
+headers report the injected delay and the time spent on the crypto itself, per
+operation totals are printed on shutdown.
+
+The Azure SDK only sends bearer tokens over https, so the Key Vault workloads
+need --tls. A self-signed certificate for 127.0.0.1 and localhost is written to
+--cert-file and the env file points REQUESTS_CA_BUNDLE and AWS_CA_BUNDLE at it.
+Any bearer token is accepted.
+
+Usage:
+    python -m benchmarkcommon.kms_emulator serve --port 8443 --tls --latency-ms 8 --jitter-ms 4 \\
+        --keys-file kms-emulator-keys.json --write-env kms-emulator.env
+    set -a; . ./kms-emulator.env; set +a
+
+The decrypt and verify inputs in TestArtifacts were made with the cloud keys,
+prepare-inputs makes them again with the emulator keys by running the encrypt
+and sign workloads against the emulator:
+
+    python -m benchmarkcommon.kms_emulator prepare-inputs --env-file kms-emulator.env \\
+        --workloads AWS/iac-microbenchmark/ec2/python --inputs TestArtifacts/AWS/inputs \\
+        --out emulator-inputs/AWS
+
+The workloads' local crypto mode (local_crypto.py next to them) reads the same
+keys file format and makes the same ciphertext blobs:
+
+    python -m benchmarkcommon.kms_emulator generate-keys --keys-file local_keys.json
+"""
+import argparse
+import base64
+import datetime
+import importlib
+import ipaddress
+import json
+import os
+import random
+import secrets
+import ssl
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from cryptography.hazmat.primitives import hashes, hmac, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed, decode_dss_signature, encode_dss_signature
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.x509.oid import NameOID
+
+REGION = "us-east-1"
+ACCOUNT_ID = "000000000000"
+
+# key name -> KMS key spec
+KEY_SPECS = {
+    "aes": "SYMMETRIC_DEFAULT",
+    "rsa2048": "RSA_2048",
+    "rsa3072": "RSA_3072",
+    "rsa4096": "RSA_4096",
+    "ecc256": "ECC_NIST_P256",
+    "ecc384": "ECC_NIST_P384",
+    "sha256": "HMAC_256",
+    "sha384": "HMAC_384",
+}
+
+# Environment variables of the workloads -> key name
+KMS_KEY_ARN_VARIABLES = {
+    "AES_KMS_KEY_ARN": "aes",
+    "RSA2048_KMS_KEY_ARN": "rsa2048",
+    "RSA3072_KMS_KEY_ARN": "rsa3072",
+    "RSA4096_KMS_KEY_ARN": "rsa4096",
+    "ECC256_KMS_KEY_ARN": "ecc256",
+    "ECC384_KMS_KEY_ARN": "ecc384",
+    "SHA256_KMS_KEY_ARN": "sha256",
+    "SHA384_KMS_KEY_ARN": "sha384",
+}
+
+KEY_VAULT_KEY_NAME_VARIABLES = {
+    "RSA2048_KEY_NAME": "rsa2048",
+    "RSA3072_KEY_NAME": "rsa3072",
+    "RSA4096_KEY_NAME": "rsa4096",
+    "ECC256_KEY_NAME": "ecc256",
+    "ECC384_KEY_NAME": "ecc384",
+}
+
+CURVES = {
+    "ECC_NIST_P256": (ec.SECP256R1, "P-256"),
+    "ECC_NIST_P384": (ec.SECP384R1, "P-384"),
+}
+
+HMAC_KEY_BYTES = {"HMAC_256": 32, "HMAC_384": 48}
+
+HASHES = {"SHA_1": hashes.SHA1, "SHA_256": hashes.SHA256, "SHA_384": hashes.SHA384, "SHA_512": hashes.SHA512}
+
+KMS_ENCRYPTION_HASHES = {"RSAES_OAEP_SHA_1": "SHA_1", "RSAES_OAEP_SHA_256": "SHA_256"}
+KMS_MAC_HASHES = {"HMAC_SHA_256": "SHA_256", "HMAC_SHA_384": "SHA_384", "HMAC_SHA_512": "SHA_512"}
+
+KEY_VAULT_ENCRYPTION = {"RSA-OAEP": "SHA_1", "RSA-OAEP-256": "SHA_256", "RSA1_5": None}
+KEY_VAULT_SIGNING = {
+    "ES256": ("ECDSA", "SHA_256"), "ES384": ("ECDSA", "SHA_384"), "ES512": ("ECDSA", "SHA_512"),
+    "PS256": ("PSS", "SHA_256"), "PS384": ("PSS", "SHA_384"), "PS512": ("PSS", "SHA_512"),
+    "RS256": ("PKCS1", "SHA_256"), "RS384": ("PKCS1", "SHA_384"), "RS512": ("PKCS1", "SHA_512"),
+}
+
+# Version byte of the emulator's symmetric ciphertext blobs
+SYMMETRIC_BLOB_VERSION = 1
+
+
+class KmsError(Exception):
+    def __init__(self, error_type: str, message: str):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+class KeyVaultError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+class EmulatedKey:
+    """
+    One key: `material` is the private key object, or the secret bytes of symmetric and HMAC keys.
+    """
+
+    def __init__(self, name: str, spec: str, material, version: str = None):
+        self.name = name
+        self.spec = spec
+        self.material = material
+        self.version = version or uuid.uuid4().hex
+
+    @property
+    def arn(self) -> str:
+        return f"arn:aws:kms:{REGION}:{ACCOUNT_ID}:key/{self.name}"
+
+    @property
+    def kind(self) -> str:
+        if self.spec == "SYMMETRIC_DEFAULT":
+            return "symmetric"
+        if self.spec.startswith("HMAC_"):
+            return "hmac"
+        return "rsa" if self.spec.startswith("RSA_") else "ec"
+
+
+def generate_key(name: str, spec: str) -> EmulatedKey:
+    if spec == "SYMMETRIC_DEFAULT":
+        material = secrets.token_bytes(32)
+    elif spec in HMAC_KEY_BYTES:
+        material = secrets.token_bytes(HMAC_KEY_BYTES[spec])
+    elif spec.startswith("RSA_"):
+        material = rsa.generate_private_key(public_exponent=65537, key_size=int(spec.split("_")[1]))
+    elif spec in CURVES:
+        material = ec.generate_private_key(CURVES[spec][0]())
+    else:
+        raise ValueError(f"Unsupported key spec: {spec}")
+    return EmulatedKey(name, spec, material)
+
+
+def save_keys(keys: dict[str, EmulatedKey], file_name: str) -> None:
+    serialized = {}
+    for name, key in keys.items():
+        if isinstance(key.material, bytes):
+            material = base64.b64encode(key.material).decode("utf-8")
+        else:
+            material = key.material.private_bytes(
+                serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+            ).decode("utf-8")
+        serialized[name] = {"spec": key.spec, "version": key.version, "material": material}
+
+    with open(file_name, "w") as file:
+        json.dump(serialized, file, indent=1)
+
+
+def load_keys(file_name: str) -> dict[str, EmulatedKey]:
+    with open(file_name) as file:
+        serialized = json.load(file)
+
+    keys = {}
+    for name, entry in serialized.items():
+        if entry["spec"] == "SYMMETRIC_DEFAULT" or entry["spec"] in HMAC_KEY_BYTES:
+            material = base64.b64decode(entry["material"])
+        else:
+            material = serialization.load_pem_private_key(entry["material"].encode("utf-8"), password=None)
+        keys[name] = EmulatedKey(name, entry["spec"], material, entry["version"])
+    return keys
+
+
+def open_keys(file_name: str = None) -> dict[str, EmulatedKey]:
+    """
+    Keys from file_name when it exists, otherwise a new key per KEY_SPECS (saved to file_name if given),
+    so inputs prepared against one emulator run still decrypt in the next.
+    """
+    if file_name and os.path.exists(file_name):
+        return load_keys(file_name)
+
+    keys = {name: generate_key(name, spec) for name, spec in KEY_SPECS.items()}
+    if file_name:
+        save_keys(keys, file_name)
+    return keys
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("utf-8")
+
+
+def from_b64url(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def int_bytes(value: int, length: int = None) -> bytes:
+    return value.to_bytes(length or (value.bit_length() + 7) // 8, "big")
+
+
+def rsa_padding(hash_name: str | None):
+    if hash_name is None:
+        return padding.PKCS1v15()
+    return padding.OAEP(mgf=padding.MGF1(HASHES[hash_name]()), algorithm=HASHES[hash_name](), label=None)
+
+
+def signature_padding(scheme: str, hash_name: str):
+    if scheme == "PSS":
+        return padding.PSS(mgf=padding.MGF1(HASHES[hash_name]()), salt_length=HASHES[hash_name].digest_size)
+    return padding.PKCS1v15()
+
+
+# AWS KMS
+
+def resolve_kms_key(keys: dict[str, EmulatedKey], key_id: str) -> EmulatedKey:
+    # Key ARN, alias ARN, alias/<name> or the plain name
+    name = key_id.rsplit("/", 1)[-1] if key_id else None
+    if name not in keys:
+        raise KmsError("NotFoundException", f"Key '{key_id}' does not exist")
+    return keys[name]
+
+
+def kms_blob(request: dict, field: str) -> bytes:
+    try:
+        return base64.b64decode(request[field])
+    except (KeyError, ValueError):
+        raise KmsError("ValidationException", f"Missing or invalid {field}")
+
+
+def encryption_context_aad(request: dict) -> bytes:
+    return json.dumps(request.get("EncryptionContext") or {}, sort_keys=True).encode("utf-8")
+
+
+def seal_symmetric(key: EmulatedKey, plaintext: bytes, aad: bytes) -> bytes:
+    # version | name length | name | nonce | AES-GCM ciphertext and tag, the key name makes the blob self-describing like KMS
+    name = key.name.encode("utf-8")
+    nonce = secrets.token_bytes(12)
+    return bytes([SYMMETRIC_BLOB_VERSION, len(name)]) + name + nonce + AESGCM(key.material).encrypt(nonce, plaintext, aad)
+
+
+def open_symmetric(keys: dict[str, EmulatedKey], blob: bytes, aad: bytes) -> tuple[EmulatedKey, bytes]:
+    try:
+        if blob[0] != SYMMETRIC_BLOB_VERSION:
+            raise ValueError()
+        name_end = 2 + blob[1]
+        name = blob[2:name_end].decode("utf-8")
+        nonce = blob[name_end:name_end + 12]
+        key = keys[name]
+        return key, AESGCM(key.material).decrypt(nonce, blob[name_end + 12:], aad)
+    except (IndexError, KeyError, ValueError, UnicodeDecodeError, InvalidTag):
+        raise KmsError("InvalidCiphertextException", "The ciphertext is invalid or was not made by this key")
+
+
+def kms_signing(algorithm: str) -> tuple[str, str]:
+    # ECDSA_SHA_256, RSASSA_PSS_SHA_256, RSASSA_PKCS1_V1_5_SHA_256 -> (scheme, hash)
+    for prefix, scheme in (("ECDSA_", "ECDSA"), ("RSASSA_PSS_", "PSS"), ("RSASSA_PKCS1_V1_5_", "PKCS1")):
+        if algorithm and algorithm.startswith(prefix) and algorithm[len(prefix):] in HASHES:
+            return scheme, algorithm[len(prefix):]
+    raise KmsError("ValidationException", f"Unsupported SigningAlgorithm: {algorithm}")
+
+
+def check_key_kind(key: EmulatedKey, kinds: tuple, operation: str) -> None:
+    if key.kind not in kinds:
+        raise KmsError("InvalidKeyUsageException", f"{operation} is not supported by {key.spec} key {key.arn}")
+
+
+def kms_sign_args(request: dict, scheme: str, hash_name: str):
+    message = kms_blob(request, "Message")
+    if request.get("MessageType", "RAW") == "DIGEST":
+        algorithm = Prehashed(HASHES[hash_name]())
+    else:
+        algorithm = HASHES[hash_name]()
+    return message, algorithm
+
+
+def kms_call(keys: dict[str, EmulatedKey], operation: str, request: dict) -> dict:
+    """
+    One KMS operation. Blobs are base64 in the request and the response, like the JSON protocol.
+    """
+    if operation == "Decrypt":
+        blob = kms_blob(request, "CiphertextBlob")
+        algorithm = request.get("EncryptionAlgorithm", "SYMMETRIC_DEFAULT")
+        if algorithm == "SYMMETRIC_DEFAULT":
+            key, plaintext = open_symmetric(keys, blob, encryption_context_aad(request))
+            if request.get("KeyId") and resolve_kms_key(keys, request["KeyId"]) is not key:
+                raise KmsError("IncorrectKeyException", "The ciphertext was made by a different key")
+        else:
+            key = resolve_kms_key(keys, request.get("KeyId"))
+            check_key_kind(key, ("rsa",), operation)
+            if algorithm not in KMS_ENCRYPTION_HASHES:
+                raise KmsError("ValidationException", f"Unsupported EncryptionAlgorithm: {algorithm}")
+            try:
+                plaintext = key.material.decrypt(blob, rsa_padding(KMS_ENCRYPTION_HASHES[algorithm]))
+            except ValueError:
+                raise KmsError("InvalidCiphertextException", "The ciphertext is invalid")
+        return {"KeyId": key.arn, "Plaintext": base64.b64encode(plaintext).decode("utf-8"), "EncryptionAlgorithm": algorithm}
+
+    key = resolve_kms_key(keys, request.get("KeyId"))
+
+    if operation == "Encrypt":
+        plaintext = kms_blob(request, "Plaintext")
+        algorithm = request.get("EncryptionAlgorithm", "SYMMETRIC_DEFAULT")
+        if algorithm == "SYMMETRIC_DEFAULT":
+            check_key_kind(key, ("symmetric",), operation)
+            blob = seal_symmetric(key, plaintext, encryption_context_aad(request))
+        else:
+            check_key_kind(key, ("rsa",), operation)
+            if algorithm not in KMS_ENCRYPTION_HASHES:
+                raise KmsError("ValidationException", f"Unsupported EncryptionAlgorithm: {algorithm}")
+            blob = key.material.public_key().encrypt(plaintext, rsa_padding(KMS_ENCRYPTION_HASHES[algorithm]))
+        return {"KeyId": key.arn, "CiphertextBlob": base64.b64encode(blob).decode("utf-8"), "EncryptionAlgorithm": algorithm}
+
+    if operation in ("GenerateDataKey", "GenerateDataKeyWithoutPlaintext"):
+        check_key_kind(key, ("symmetric",), operation)
+        if "NumberOfBytes" in request:
+            size = int(request["NumberOfBytes"])
+        else:
+            size = {"AES_256": 32, "AES_128": 16}.get(request.get("KeySpec"))
+            if size is None:
+                raise KmsError("ValidationException", "KeySpec must be AES_256 or AES_128, or NumberOfBytes given")
+        data_key = secrets.token_bytes(size)
+        response = {"KeyId": key.arn, "CiphertextBlob": base64.b64encode(seal_symmetric(key, data_key, encryption_context_aad(request))).decode("utf-8")}
+        if operation == "GenerateDataKey":
+            response["Plaintext"] = base64.b64encode(data_key).decode("utf-8")
+        return response
+
+    if operation == "Sign":
+        check_key_kind(key, ("rsa", "ec"), operation)
+        scheme, hash_name = kms_signing(request.get("SigningAlgorithm"))
+        message, algorithm = kms_sign_args(request, scheme, hash_name)
+        if key.kind == "ec":
+            # DER encoded, like KMS
+            signature = key.material.sign(message, ec.ECDSA(algorithm))
+        else:
+            signature = key.material.sign(message, signature_padding(scheme, hash_name), algorithm)
+        return {"KeyId": key.arn, "Signature": base64.b64encode(signature).decode("utf-8"), "SigningAlgorithm": request["SigningAlgorithm"]}
+
+    if operation == "Verify":
+        check_key_kind(key, ("rsa", "ec"), operation)
+        scheme, hash_name = kms_signing(request.get("SigningAlgorithm"))
+        message, algorithm = kms_sign_args(request, scheme, hash_name)
+        signature = kms_blob(request, "Signature")
+        try:
+            if key.kind == "ec":
+                key.material.public_key().verify(signature, message, ec.ECDSA(algorithm))
+            else:
+                key.material.public_key().verify(signature, message, signature_padding(scheme, hash_name), algorithm)
+        except (InvalidSignature, ValueError):
+            raise KmsError("KMSInvalidSignatureException", "The signature is not valid")
+        return {"KeyId": key.arn, "SignatureValid": True, "SigningAlgorithm": request["SigningAlgorithm"]}
+
+    if operation in ("GenerateMac", "VerifyMac"):
+        check_key_kind(key, ("hmac",), operation)
+        algorithm = request.get("MacAlgorithm")
+        if algorithm not in KMS_MAC_HASHES:
+            raise KmsError("ValidationException", f"Unsupported MacAlgorithm: {algorithm}")
+        mac = hmac.HMAC(key.material, HASHES[KMS_MAC_HASHES[algorithm]]())
+        mac.update(kms_blob(request, "Message"))
+        if operation == "GenerateMac":
+            return {"KeyId": key.arn, "Mac": base64.b64encode(mac.finalize()).decode("utf-8"), "MacAlgorithm": algorithm}
+        try:
+            mac.verify(kms_blob(request, "Mac"))
+        except InvalidSignature:
+            raise KmsError("KMSInvalidMacException", "The MAC is not valid")
+        return {"KeyId": key.arn, "MacValid": True, "MacAlgorithm": algorithm}
+
+    if operation == "GetPublicKey":
+        check_key_kind(key, ("rsa", "ec"), operation)
+        public_key = key.material.public_key().public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+        response = {"KeyId": key.arn, "PublicKey": base64.b64encode(public_key).decode("utf-8"), "KeySpec": key.spec}
+        if key.kind == "ec":
+            response["KeyUsage"] = "SIGN_VERIFY"
+            response["SigningAlgorithms"] = [f"ECDSA_SHA_{key.spec[-3:]}"]
+        else:
+            response["KeyUsage"] = "ENCRYPT_DECRYPT"
+            response["EncryptionAlgorithms"] = list(KMS_ENCRYPTION_HASHES)
+        return response
+
+    raise KmsError("UnknownOperationException", f"Operation {operation} is not emulated")
+
+
+# Azure Key Vault
+
+def key_vault_jwk(key: EmulatedKey, base_url: str) -> dict:
+    jwk = {"kid": f"{base_url}/keys/{key.name}/{key.version}"}
+    numbers = key.material.public_key().public_numbers()
+    if key.kind == "rsa":
+        jwk.update(kty="RSA", key_ops=["encrypt", "decrypt", "sign", "verify", "wrapKey", "unwrapKey"],
+                   n=b64url(int_bytes(numbers.n)), e=b64url(int_bytes(numbers.e)))
+    else:
+        size = (key.material.curve.key_size + 7) // 8
+        jwk.update(kty="EC", key_ops=["sign", "verify"], crv=CURVES[key.spec][1],
+                   x=b64url(int_bytes(numbers.x, size)), y=b64url(int_bytes(numbers.y, size)))
+    return jwk
+
+
+def key_vault_call(keys: dict[str, EmulatedKey], method: str, path: str, request: dict, base_url: str) -> dict:
+    """
+    One Key Vault keys operation on /keys/<name>[/<version>[/<operation>]].
+    """
+    parts = [part for part in path.split("/") if part]
+    if len(parts) < 2 or parts[0] != "keys":
+        raise KeyVaultError(404, "NotFound", f"Unknown path {path}")
+
+    key = keys.get(parts[1])
+    if key is None or key.kind not in ("rsa", "ec"):
+        raise KeyVaultError(404, "KeyNotFound", f"A key with (name/id) {parts[1]} was not found in this key vault")
+    if len(parts) >= 3 and parts[2] != key.version:
+        raise KeyVaultError(404, "KeyNotFound", f"Version {parts[2]} of key {key.name} was not found")
+
+    if method == "GET" and len(parts) <= 3:
+        now = int(time.time())
+        return {
+            "key": key_vault_jwk(key, base_url),
+            "attributes": {"enabled": True, "created": now, "updated": now, "recoveryLevel": "Purgeable"},
+        }
+
+    if method != "POST" or len(parts) != 4:
+        raise KeyVaultError(405, "BadRequest", f"{method} {path} is not emulated")
+
+    operation = parts[3]
+    algorithm = request.get("alg")
+    kid = f"{base_url}/keys/{key.name}/{key.version}"
+    try:
+        value = from_b64url(request.get("value", ""))
+    except ValueError:
+        raise KeyVaultError(400, "BadParameter", "value is not base64url")
+
+    if operation in ("encrypt", "decrypt", "wrapkey", "unwrapkey"):
+        if key.kind != "rsa" or algorithm not in KEY_VAULT_ENCRYPTION:
+            raise KeyVaultError(400, "BadParameter", f"Algorithm {algorithm} is not supported by key {key.name}")
+        rsa_pad = rsa_padding(KEY_VAULT_ENCRYPTION[algorithm])
+        if operation in ("encrypt", "wrapkey"):
+            result = key.material.public_key().encrypt(value, rsa_pad)
+        else:
+            try:
+                result = key.material.decrypt(value, rsa_pad)
+            except ValueError:
+                raise KeyVaultError(400, "BadParameter", "The ciphertext is invalid")
+        return {"kid": kid, "value": b64url(result)}
+
+    if operation in ("sign", "verify"):
+        if algorithm not in KEY_VAULT_SIGNING or (KEY_VAULT_SIGNING[algorithm][0] == "ECDSA") != (key.kind == "ec"):
+            raise KeyVaultError(400, "BadParameter", f"Algorithm {algorithm} is not supported by key {key.name}")
+        scheme, hash_name = KEY_VAULT_SIGNING[algorithm]
+        prehashed = Prehashed(HASHES[hash_name]())
+        size = (key.material.curve.key_size + 7) // 8 if key.kind == "ec" else None
+
+        if operation == "sign":
+            if key.kind == "ec":
+                # Key Vault returns r || s (IEEE P1363), not DER
+                r, s = decode_dss_signature(key.material.sign(value, ec.ECDSA(prehashed)))
+                signature = int_bytes(r, size) + int_bytes(s, size)
+            else:
+                signature = key.material.sign(value, signature_padding(scheme, hash_name), prehashed)
+            return {"kid": kid, "value": b64url(signature)}
+
+        digest = from_b64url(request.get("digest", ""))
+        try:
+            if key.kind == "ec":
+                signature = encode_dss_signature(int.from_bytes(value[:size], "big"), int.from_bytes(value[size:], "big"))
+                key.material.public_key().verify(signature, digest, ec.ECDSA(prehashed))
+            else:
+                key.material.public_key().verify(value, digest, signature_padding(scheme, hash_name), prehashed)
+            valid = True
+        except (InvalidSignature, ValueError):
+            valid = False
+        return {"value": valid}
+
+    raise KeyVaultError(400, "BadParameter", f"Operation {operation} is not emulated")
+
+
+# Server
+
+class EmulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, without TCP_NODELAY the body waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.handle_call("GET")
+
+    def do_POST(self):
+        self.handle_call("POST")
+
+    def handle_call(self, method: str):
+        length = int(self.headers.get("Content-Length", 0))
+        raw_body = self.rfile.read(length) if length else b""
+        target = self.headers.get("X-Amz-Target")
+
+        crypto_start = time.perf_counter()
+        headers = {}
+        if target:
+            operation = f"kms.{target.split('.')[-1]}"
+            status, body, headers = self.kms_response(target.split(".")[-1], raw_body)
+        else:
+            path = urlsplit(self.path).path
+            parts = [part for part in path.split("/") if part]
+            operation = f"keyvault.{parts[3] if len(parts) >= 4 else 'get_key'}"
+            status, body, headers = self.key_vault_response(method, path, raw_body)
+        crypto_ms = (time.perf_counter() - crypto_start) * 1000
+
+        delay_ms = self.server.latency_ms + random.uniform(0, self.server.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+        with self.server.lock:
+            totals = self.server.operation_stats.setdefault(operation, {"count": 0, "crypto_ms": 0.0, "delay_ms": 0.0})
+            totals["count"] += 1
+            totals["crypto_ms"] += crypto_ms
+            totals["delay_ms"] += delay_ms
+
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("x-emulator-crypto-ms", f"{crypto_ms:.3f}")
+        self.send_header("x-emulator-delay-ms", f"{delay_ms:.3f}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def kms_response(self, operation: str, raw_body: bytes) -> tuple[int, dict, dict]:
+        headers = {"Content-Type": "application/x-amz-json-1.1", "x-amzn-RequestId": str(uuid.uuid4())}
+        try:
+            request = json.loads(raw_body or b"{}")
+            return 200, kms_call(self.server.keys, operation, request), headers
+        except KmsError as e:
+            headers["x-amzn-ErrorType"] = e.error_type
+            return 400, {"__type": e.error_type, "message": str(e)}, headers
+        except json.JSONDecodeError:
+            return 400, {"__type": "SerializationException", "message": "Request body is not JSON"}, headers
+
+    def key_vault_response(self, method: str, path: str, raw_body: bytes) -> tuple[int, dict, dict]:
+        headers = {"Content-Type": "application/json; charset=utf-8", "x-ms-request-id": str(uuid.uuid4())}
+
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            # The SDK discovers the token scope from this challenge, any token is accepted afterwards
+            headers["WWW-Authenticate"] = (
+                'Bearer authorization="https://login.microsoftonline.com/00000000-0000-0000-0000-000000000000", '
+                'resource="https://vault.azure.net"'
+            )
+            return 401, {"error": {"code": "Unauthorized", "message": "AKV10000: Request is missing a Bearer or PoP token."}}, headers
+
+        scheme = "https" if self.server.tls else "http"
+        base_url = f"{scheme}://{self.headers.get('Host', '%s:%d' % self.server.server_address[:2])}"
+        try:
+            request = json.loads(raw_body or b"{}")
+            return 200, key_vault_call(self.server.keys, method, path, request, base_url), headers
+        except KeyVaultError as e:
+            return e.status, {"error": {"code": e.code, "message": str(e)}}, headers
+        except json.JSONDecodeError:
+            return 400, {"error": {"code": "BadParameter", "message": "Request body is not JSON"}}, headers
+
+    def log_message(self, format, *args):
+        # Keep the runner output readable
+        return
+
+
+def write_self_signed_certificate(cert_file: str, key_file: str, host: str) -> None:
+    """
+    Self-signed certificate for host, 127.0.0.1 and localhost (valid for a year).
+    """
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "kms-emulator")])
+    alternative_names = [x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]
+    try:
+        if ipaddress.ip_address(host) != ipaddress.ip_address("127.0.0.1"):
+            alternative_names.append(x509.IPAddress(ipaddress.ip_address(host)))
+    except ValueError:
+        alternative_names.append(x509.DNSName(host))
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .add_extension(x509.SubjectAlternativeName(alternative_names), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(private_key, hashes.SHA256())
+    )
+
+    with open(cert_file, "wb") as file:
+        file.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_file, "wb") as file:
+        file.write(private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+
+
+def start_emulator(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                   keys: dict[str, EmulatedKey] = None, tls_cert_file: str = None, tls_key_file: str = None) -> ThreadingHTTPServer:
+    """
+    Start the emulator in a daemon thread and return the server.
+    Use server.server_address for the bound port and server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), EmulatorHandler)
+    server.daemon_threads = True
+    server.latency_ms = latency_ms
+    server.jitter_ms = jitter_ms
+    server.keys = keys if keys is not None else open_keys()
+    server.lock = threading.Lock()
+    server.operation_stats = {}
+    server.tls = tls_cert_file is not None
+
+    if server.tls:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(tls_cert_file, tls_key_file)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def emulator_environment(server: ThreadingHTTPServer, cert_file: str = None) -> dict[str, str]:
+    """
+    Environment of the workloads to use the emulator: endpoints, dummy credentials and key ids.
+    """
+    host, port = server.server_address[:2]
+    url = f"{'https' if server.tls else 'http'}://{host}:{port}"
+
+    environment = {
+        "AWS_ENDPOINT_URL_KMS": url,
+        "AWS_ACCESS_KEY_ID": "emulator",
+        "AWS_SECRET_ACCESS_KEY": "emulator",
+        "AWS_DEFAULT_REGION": REGION,
+        "AZURE_KEY_VAULT_URL": url,
+        "AZURE_KEY_VAULT_EMULATOR": "1",
+    }
+    if cert_file:
+        environment["AWS_CA_BUNDLE"] = os.path.abspath(cert_file)
+        environment["REQUESTS_CA_BUNDLE"] = os.path.abspath(cert_file)
+
+    for variable, name in KMS_KEY_ARN_VARIABLES.items():
+        environment[variable] = server.keys[name].arn
+    for variable, name in KEY_VAULT_KEY_NAME_VARIABLES.items():
+        environment[variable] = name
+
+    return environment
+
+
+def read_env_file(file_name: str) -> dict[str, str]:
+    environment = {}
+    with open(file_name) as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                name, value = line.split("=", 1)
+                environment[name] = value
+    return environment
+
+
+def prepare_inputs(workloads_dir: str, inputs_dir: str, out_dir: str) -> None:
+    """
+    Copy the inputs of every operation, making the decrypt and verify inputs again from the
+    output of the matching encrypt and sign workload (run against the emulator from the environment).
+    """
+    sys.path.insert(0, os.path.abspath(workloads_dir))
+    os.makedirs(out_dir, exist_ok=True)
+
+    for file_name in sorted(os.listdir(inputs_dir)):
+        if not file_name.endswith(".json"):
+            continue
+        operation = file_name[:-len(".json")]
+
+        source_operation = operation
+        if operation.endswith("_decrypt"):
+            source_operation = operation[:-len("_decrypt")] + "_encrypt"
+        elif operation.endswith("_verify"):
+            source_operation = operation[:-len("_verify")] + "_sign"
+
+        with open(os.path.join(inputs_dir, f"{source_operation}.json")) as file:
+            request_json = json.load(file)
+
+        if source_operation != operation:
+            workload = importlib.import_module(source_operation)
+            # The decrypt/verify workloads read the encrypt/sign output, plus the message for verify
+            request_json = {**request_json, **workload.handle(request_json, workload.create_clients())}
+            print(f"{operation}: made from {source_operation}")
+
+        with open(os.path.join(out_dir, file_name), "w") as file:
+            json.dump(request_json, file)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local stand-in for AWS KMS and Azure Key Vault")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Run the emulator.")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8443)
+    serve_parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response")
+    serve_parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform random 0..jitter-ms added to the delay")
+    serve_parser.add_argument("--keys-file", help="Keys are loaded from this file, or generated and saved to it")
+    serve_parser.add_argument("--tls", action="store_true", help="Serve https (required by the Azure SDK)")
+    serve_parser.add_argument("--cert-file", default="kms-emulator-cert.pem")
+    serve_parser.add_argument("--cert-key-file", default="kms-emulator-cert-key.pem")
+    serve_parser.add_argument("--write-env", help="Write the workload environment to this file (KEY=value lines)")
+
+    keys_parser = subparsers.add_parser("generate-keys", help="Write new keys, e.g. for the workloads' local crypto mode.")
+    keys_parser.add_argument("--keys-file", required=True)
+
+    inputs_parser = subparsers.add_parser("prepare-inputs", help="Make decrypt and verify inputs with the emulator keys.")
+    inputs_parser.add_argument("--env-file", help="Environment written by serve --write-env")
+    inputs_parser.add_argument("--workloads", required=True, help="Directory of the Python workloads (e.g. AWS/iac-microbenchmark/ec2/python)")
+    inputs_parser.add_argument("--inputs", required=True, help="Directory of the original inputs (e.g. TestArtifacts/AWS/inputs)")
+    inputs_parser.add_argument("--out", required=True)
+
+    return parser.parse_args()
+
+
+def main(args):
+    if args.command == "prepare-inputs":
+        if args.env_file:
+            os.environ.update(read_env_file(args.env_file))
+        prepare_inputs(args.workloads, args.inputs, args.out)
+        return
+
+    if args.command == "generate-keys":
+        save_keys({name: generate_key(name, spec) for name, spec in KEY_SPECS.items()}, args.keys_file)
+        print(f"Wrote {len(KEY_SPECS)} keys to {args.keys_file}")
+        return
+
+    keys = open_keys(args.keys_file)
+    cert_file = key_file = None
+    if args.tls:
+        cert_file, key_file = args.cert_file, args.cert_key_file
+        write_self_signed_certificate(cert_file, key_file, args.host)
+
+    server = start_emulator(args.host, args.port, args.latency_ms, args.jitter_ms, keys, cert_file, key_file)
+    host, port = server.server_address[:2]
+    print(f"KMS / Key Vault emulator listening on {'https' if server.tls else 'http'}://{host}:{port}")
+
+    if args.write_env:
+        with open(args.write_env, "w") as file:
+            for name, value in emulator_environment(server, cert_file).items():
+                file.write(f"{name}={value}\n")
+        print(f"Wrote the workload environment to {args.write_env}")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("Operation            count   crypto ms/call   delay ms/call")
+        for operation, totals in sorted(server.operation_stats.items()):
+            count = totals["count"]
+            print(f"{operation:20} {count:6d} {totals['crypto_ms'] / count:16.3f} {totals['delay_ms'] / count:15.3f}")
+
+
+if __name__ == "__main__":
+    main(parse_args())
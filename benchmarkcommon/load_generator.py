@@ -0,0 +1,295 @@
+"""
+Open-loop load generation against FaaS function URLs.
+
+Unlike the closed-loop runners (one request, wait, next) requests are sent on
+a precomputed arrival schedule whether or not earlier ones have returned, so
+latency under load and scale-out behaviour become visible. Latency is measured
+from each request's scheduled send time, which keeps a slow endpoint from
+hiding its own queueing delay (coordinated omission).
+
+Two modes:
+    rate         constant or Poisson arrivals at a target rate, optionally ramped
+                 linearly from a start rate
+    concurrency  closed-loop workers, stepped through increasing concurrency levels
+
+Latencies go into log-bucketed histograms (HDR style, bounded relative error).
+"""
+import asyncio
+import math
+import random
+import time
+
+import aiohttp
+
+from benchmarkcommon import async_runner
+
+PERCENTILES = [50.0, 90.0, 99.0, 99.9]
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram. Every recorded value lands in a bucket whose
+    width is at most `10 ** -significant_digits` of its lower bound, so reported
+    percentiles are within that relative error regardless of the range.
+    """
+
+    def __init__(self, significant_digits: int = 2, lowest_ms: float = 0.001):
+        self.lowest_ms = lowest_ms
+        self.log_base = math.log1p(10 ** -significant_digits)
+        self.counts = {}
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+
+    def _bucket(self, value_ms: float) -> int:
+        return int(math.log(max(value_ms, self.lowest_ms) / self.lowest_ms) / self.log_base)
+
+    def bucket_bounds(self, bucket: int) -> tuple[float, float]:
+        return (self.lowest_ms * math.exp(bucket * self.log_base), self.lowest_ms * math.exp((bucket + 1) * self.log_base))
+
+    def record(self, value_ms: float) -> None:
+        bucket = self._bucket(value_ms)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.min_ms = value_ms if self.min_ms is None else min(self.min_ms, value_ms)
+        self.max_ms = value_ms if self.max_ms is None else max(self.max_ms, value_ms)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total_ms += other.total_ms
+        for value in (other.min_ms, other.max_ms):
+            if value is not None:
+                self.min_ms = value if self.min_ms is None else min(self.min_ms, value)
+                self.max_ms = value if self.max_ms is None else max(self.max_ms, value)
+
+    def percentile(self, percentile: float) -> float | None:
+        """
+        Upper bound of the bucket holding the given percentile (capped at the exact max).
+        """
+        if self.count == 0:
+            return None
+
+        rank = math.ceil(percentile / 100.0 * self.count)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.bucket_bounds(bucket)[1], self.max_ms)
+        return self.max_ms
+
+    def mean(self) -> float | None:
+        return self.total_ms / self.count if self.count else None
+
+    def buckets(self) -> list[dict]:
+        """
+        Non-empty buckets in ascending order, for saving or plotting the distribution.
+        """
+        rows = []
+        for bucket in sorted(self.counts):
+            lower, upper = self.bucket_bounds(bucket)
+            rows.append({"lower_ms": lower, "upper_ms": upper, "count": self.counts[bucket]})
+        return rows
+
+    def summary(self, prefix: str = "") -> dict:
+        row = {
+            f"{prefix}count": self.count,
+            f"{prefix}mean_ms": self.mean(),
+            f"{prefix}min_ms": self.min_ms,
+            f"{prefix}max_ms": self.max_ms,
+        }
+        for percentile in PERCENTILES:
+            row[f"{prefix}p{percentile:g}_ms".replace(".", "_")] = self.percentile(percentile)
+        return row
+
+
+def arrival_offsets(target_rps: float, duration_seconds: float, arrivals: str = "constant", start_rps: float = None, seed: int = None) -> list[float]:
+    """
+    Send times (seconds from the start) for an open-loop run.
+
+    The rate ramps linearly from start_rps to target_rps over the run (no ramp when
+    start_rps is None). "constant" spaces requests evenly under that rate, "poisson"
+    draws exponential inter-arrival times.
+    """
+    if arrivals not in ("constant", "poisson"):
+        raise ValueError(f"Unknown arrival process: {arrivals}")
+
+    start_rps = target_rps if start_rps is None else start_rps
+    if start_rps <= 0 and target_rps <= 0:
+        raise ValueError("The request rate must be positive")
+
+    # rate(t) = a + b t, cumulative expected arrivals L(t) = a t + b t^2 / 2
+    a = start_rps
+    b = (target_rps - start_rps) / duration_seconds
+    expected_total = a * duration_seconds + b * duration_seconds ** 2 / 2
+
+    rng = random.Random(seed)
+    offsets = []
+    cumulative = 0.0
+    while True:
+        # The k-th arrival happens where L(t) reaches k (constant) or a unit-rate Poisson arrival (poisson)
+        cumulative += rng.expovariate(1.0) if arrivals == "poisson" else 1.0
+        if cumulative > expected_total:
+            break
+
+        if b == 0:
+            offset = cumulative / a
+        else:
+            offset = (-a + math.sqrt(a * a + 2 * b * cumulative)) / b
+        offsets.append(offset)
+
+    return offsets
+
+
+def new_result() -> dict:
+    return {
+        "latency": LatencyHistogram(),  # from the scheduled send time
+        "service": LatencyHistogram(),  # from the actual send time
+        "requests": 0,
+        "errors": 0,
+        "status_counts": {},
+        "request_ids": [],
+        "max_schedule_lag_ms": 0.0,
+        # Summed over the requests of functions that report them (see client_timing.COUNTER_HEADERS)
+        "data_key_hits": None,
+        "data_key_misses": None,
+    }
+
+
+def record_invocation(result: dict, invocation: dict, latency_ms: float, service_ms: float) -> None:
+    result["requests"] += 1
+    status = str(invocation["status"])
+    result["status_counts"][status] = result["status_counts"].get(status, 0) + 1
+
+    if invocation["error"] is not None:
+        result["errors"] += 1
+        return
+
+    result["latency"].record(latency_ms)
+    result["service"].record(service_ms)
+    if invocation["request_id"] is not None:
+        result["request_ids"].append(invocation["request_id"])
+
+    for field in ("data_key_hits", "data_key_misses"):
+        if invocation["timings"][field] is not None:
+            result[field] = (result[field] or 0) + invocation["timings"][field]
+
+
+async def run_rate_async(url: str, payload_body: dict, offsets: list[float], headers: dict, max_connections: int, timeout_seconds: float) -> dict:
+    result = new_result()
+    connector = aiohttp.TCPConnector(limit=max_connections, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        in_flight = set()
+        start = time.perf_counter()
+        result["start_ms"] = async_runner.epoch_ms()
+
+        async def fire(intended: float) -> None:
+            sent = time.perf_counter()
+            result["max_schedule_lag_ms"] = max(result["max_schedule_lag_ms"], (sent - intended) * 1000)
+            invocation = await async_runner.post_json(session, url, payload_body, headers)
+            done = time.perf_counter()
+            record_invocation(result, invocation, (done - intended) * 1000, (done - sent) * 1000)
+
+        # Tasks are created as their send time comes up instead of all at once
+        for offset in offsets:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            task = asyncio.create_task(fire(start + offset))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+        result["end_ms"] = async_runner.epoch_ms()
+        result["duration_seconds"] = time.perf_counter() - start
+
+    return result
+
+
+async def run_concurrency_async(url: str, payload_body: dict, concurrency: int, step_seconds: float, headers: dict, timeout_seconds: float) -> dict:
+    result = new_result()
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        start = time.perf_counter()
+        deadline = start + step_seconds
+        result["start_ms"] = async_runner.epoch_ms()
+
+        async def worker() -> None:
+            while time.perf_counter() < deadline:
+                sent = time.perf_counter()
+                invocation = await async_runner.post_json(session, url, payload_body, headers)
+                elapsed_ms = (time.perf_counter() - sent) * 1000
+                # Closed loop: there is no schedule, latency and service time are the same
+                record_invocation(result, invocation, elapsed_ms, elapsed_ms)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+        result["end_ms"] = async_runner.epoch_ms()
+        result["duration_seconds"] = time.perf_counter() - start
+
+    return result
+
+
+def finish(result: dict) -> dict:
+    duration = result["duration_seconds"]
+    result["achieved_rps"] = result["requests"] / duration if duration > 0 else 0.0
+    return result
+
+
+def run_rate(url: str, payload_body: dict, target_rps: float, duration_seconds: float, arrivals: str = "constant", start_rps: float = None, seed: int = None, headers: dict = None, max_connections: int = 1000, timeout_seconds: float = 900) -> dict:
+    """
+    Drive one URL open-loop at target_rps for duration_seconds.
+
+    :param max_connections: Pool size, requests beyond it wait for a connection (and the wait counts as latency).
+    :return: Histograms, counters, RequestIds and the start/end (epoch ms) of the run.
+    """
+    if headers is None:
+        headers = {"Content-Type": "application/json"}
+
+    offsets = arrival_offsets(target_rps, duration_seconds, arrivals, start_rps, seed)
+    result = asyncio.run(run_rate_async(url, payload_body, offsets, headers, max_connections, timeout_seconds))
+    result["scheduled"] = len(offsets)
+    return finish(result)
+
+
+def run_concurrency_steps(url: str, payload_body: dict, concurrency_steps: list[int], step_seconds: float, headers: dict = None, timeout_seconds: float = 900) -> list[dict]:
+    """
+    Closed-loop concurrency ramp: one result per concurrency level, run back to back.
+    """
+    if headers is None:
+        headers = {"Content-Type": "application/json"}
+
+    results = []
+    for concurrency in concurrency_steps:
+        result = asyncio.run(run_concurrency_async(url, payload_body, concurrency, step_seconds, headers, timeout_seconds))
+        result["concurrency"] = concurrency
+        results.append(finish(result))
+    return results
+
+
+def summarize(result: dict) -> dict:
+    """
+    Flat row (counters, achieved rate, latency percentiles) for a results csv.
+    """
+    row = {
+        "requests": result["requests"],
+        "errors": result["errors"],
+        "duration_s": result["duration_seconds"],
+        "achieved_rps": result["achieved_rps"],
+        "max_schedule_lag_ms": result["max_schedule_lag_ms"],
+        "data_key_hits": result["data_key_hits"],
+        "data_key_misses": result["data_key_misses"],
+    }
+    row.update(result["latency"].summary("latency_"))
+    row.update(result["service"].summary("service_"))
+    return row
@@ -0,0 +1,314 @@
+"""
+Declarative benchmark matrix and execution planner shared by the four runners.
+
+A matrix spec (TOML, see benchmark-matrix.toml at the repository root) replaces
+the lists the runners select test cases with by commenting lines in and out.
+Each platform has a table, anything it leaves out keeps the runner's default:
+
+    [lambda]
+    languages = ["go", "python"]
+    operations = ["aes256_encrypt", "sha256"]
+    start_types = ["cold", "warm"]
+    memory_sizes = [128, 1024]
+    architectures = ["x86", "arm"]
+    iterations = 30
+    exclude = [{ language = "go", memory_size = 128 }]
+    include = []
+
+A filter matches a case when every key does (a list matches any of its values)
+and may name any dimension of the case: language, operation, start_type,
+memory_size, architecture, crypto_mode, batch_size, ... A case runs when it
+matches no exclude filter and, if there are include filters, at least one of them.
+
+The planner then orders the runner's test cases and estimates the run:
+
+    cold cases only start once their function has been idle for cold_idle_seconds
+    (FaaS default 900 / 1200, 0 on EC2 and VMs, where every cold iteration is a
+    new process). Cold cases are taken round robin across functions, so one
+    function's idle time is spent running the others, and a function's warm cases
+    come after its cold ones.
+
+    the time of a case is (iterations + warmup invocations) x the invocation time:
+    invocation_ms, per operation from [<platform>.operation_ms], or the median
+    execution time of the same language and operation in the results store given
+    as history (plus overhead_ms).
+
+    the cost is GB-seconds and requests on Lambda and Azure Functions, the host's
+    hourly_price over the run on EC2 and VMs (not estimated when 0).
+
+--shard i/n gives each runner host the i-th of n shards. All cases of a function
+stay on one host, functions are spread by estimated time, the same on every host.
+
+    matrix = matrix_plan.load_matrix(path, "lambda", defaults)
+    matrix_plan.selected(matrix, case)                  include / exclude filters
+    test_cases = matrix_plan.plan_run(test_cases, matrix, function_key, shard)
+    timer = matrix_plan.IdleTimer(matrix, function_key) wait(test_case) before a cold case
+"""
+import time
+import tomllib
+
+# Dimensions a spec may set, and which of them are lists
+LIST_KEYS = ("languages", "operations", "start_types", "memory_sizes", "architectures")
+
+PLATFORM_DEFAULTS = {
+    "lambda": {
+        "cold_idle_seconds": 900,
+        "invocation_ms": 150,
+        "overhead_ms": 50,
+        # Per GB-second by architecture and per request, us-east-1
+        "gb_second_price": {"x86": 0.0000166667, "arm": 0.0000133334},
+        "request_price": 0.0000002,
+    },
+    "azure_function": {
+        "cold_idle_seconds": 1200,
+        "invocation_ms": 200,
+        "overhead_ms": 50,
+        "gb_second_price": {"x86": 0.000016},
+        "request_price": 0.0000002,
+        # The consumption plan bills the memory actually used
+        "memory_mb": 512,
+    },
+    "ec2": {
+        "cold_idle_seconds": 0,
+        "invocation_ms": 100,
+        "overhead_ms": 0,
+        "hourly_price": 0.0,
+    },
+    "azure_vm": {
+        "cold_idle_seconds": 0,
+        "invocation_ms": 100,
+        "overhead_ms": 0,
+        "hourly_price": 0.0,
+    },
+}
+
+COMMON_DEFAULTS = {
+    "iterations": 30,
+    # The runners warm up warm cases with 10 invocations
+    "warmup_invocations": 10,
+    "operation_ms": {},
+    "history": None,
+    "include": [],
+    "exclude": [],
+}
+
+
+def load_matrix(path: str, platform: str, defaults: dict) -> dict:
+    """
+    The platform's table of the spec at path over the runner's defaults (the lists and
+    iterations it would run without a spec) and the planner defaults.
+    """
+    with open(path, "rb") as file:
+        spec = tomllib.load(file)
+
+    if platform not in spec:
+        raise ValueError(f"{path} has no [{platform}] table")
+
+    matrix = {**COMMON_DEFAULTS, **PLATFORM_DEFAULTS[platform], **defaults, **spec[platform], "platform": platform}
+    for key in LIST_KEYS:
+        if key in matrix and not isinstance(matrix[key], list):
+            raise ValueError(f"[{platform}] {key} must be a list")
+    for key in ("include", "exclude"):
+        if not all(isinstance(case_filter, dict) for case_filter in matrix[key]):
+            raise ValueError(f"[{platform}] {key} must be a list of tables, e.g. [{{ language = \"go\" }}]")
+
+    matrix["history_ms"] = history_ms(platform, matrix["history"]) if matrix["history"] else {}
+    return matrix
+
+
+def history_ms(platform: str, root: str) -> dict[tuple, float]:
+    """
+    Median execution time per (language, operation) of the results store at root.
+    """
+    from benchmarkcommon import results_store
+
+    df = results_store.load_results(platform, root=root, columns=["language", "operation", "execution_time_ms"])
+    if df.empty:
+        return {}
+    return df.groupby(["language", "operation"], observed=True)["execution_time_ms"].median().to_dict()
+
+
+def matches(case_filter: dict, case: dict) -> bool:
+    for key, value in case_filter.items():
+        values = value if isinstance(value, list) else [value]
+        if case.get(key) not in values:
+            return False
+    return True
+
+
+def selected(matrix: dict, case: dict) -> bool:
+    # Every case runs without a matrix
+    if matrix is None:
+        return True
+    if any(matches(case_filter, case) for case_filter in matrix["exclude"]):
+        return False
+    return not matrix["include"] or any(matches(case_filter, case) for case_filter in matrix["include"])
+
+
+def invocation_seconds(matrix: dict, test_case: dict) -> float:
+    operation = test_case.get("operation")
+    invocation_ms = matrix["history_ms"].get((test_case.get("language"), operation))
+    if invocation_ms is None:
+        invocation_ms = matrix["operation_ms"].get(operation, matrix["invocation_ms"])
+    # The inputs of a batch are counted one after another, an upper bound
+    return (invocation_ms * test_case.get("batch_size", 1) + matrix["overhead_ms"]) / 1000
+
+
+def invocations(matrix: dict, test_case: dict) -> int:
+    warmup = matrix["warmup_invocations"] if test_case.get("start_type") == "warm" else 0
+    return test_case["iterations"] + warmup
+
+
+def case_seconds(matrix: dict, test_case: dict) -> float:
+    return invocations(matrix, test_case) * invocation_seconds(matrix, test_case)
+
+
+def case_cost(matrix: dict, test_case: dict) -> float:
+    """
+    FaaS cost of a test case, GB-seconds of the execution time and the requests.
+    """
+    if "gb_second_price" not in matrix:
+        return 0.0
+    prices = matrix["gb_second_price"]
+    gb_second_price = prices.get(test_case.get("architecture"), next(iter(prices.values())))
+    memory_gb = int(test_case.get("memory") or matrix.get("memory_mb", 128)) / 1024
+    execution_seconds = invocation_seconds(matrix, test_case) - matrix["overhead_ms"] / 1000
+    count = invocations(matrix, test_case)
+    return count * (execution_seconds * memory_gb * gb_second_price + matrix["request_price"])
+
+
+def schedule(test_cases: list[dict], matrix: dict, function_key) -> tuple[list[dict], dict]:
+    """
+    Order test cases so cold ones find their function idle, simulating the run with the
+    estimated case times. Returns the order and {"seconds", "idle_wait_seconds"}.
+    """
+    idle_seconds = matrix["cold_idle_seconds"]
+
+    # Cold cases round robin across functions: the first of every function, then the second, ...
+    cold_rank = {}
+    ranks = {}
+    for test_case in test_cases:
+        if test_case.get("start_type") == "cold":
+            key = function_key(test_case)
+            cold_rank[id(test_case)] = ranks.get(key, 0)
+            ranks[key] = ranks.get(key, 0) + 1
+    cold = sorted((test_case for test_case in test_cases if id(test_case) in cold_rank), key=lambda test_case: cold_rank[id(test_case)])
+    warm = [test_case for test_case in test_cases if id(test_case) not in cold_rank]
+
+    remaining_cold = {}
+    for test_case in cold:
+        remaining_cold[function_key(test_case)] = remaining_cold.get(function_key(test_case), 0) + 1
+
+    now = 0.0
+    idle_wait = 0.0
+    last_used = {}
+    ordered = []
+
+    def run(test_case):
+        nonlocal now
+        key = function_key(test_case)
+        ordered.append(test_case)
+        now += case_seconds(matrix, test_case)
+        last_used[key] = now
+
+    def ready_at(test_case) -> float:
+        key = function_key(test_case)
+        return last_used[key] + idle_seconds if key in last_used else 0.0
+
+    while cold or warm:
+        # 1. a cold case whose function is idle
+        ready = next((test_case for test_case in cold if ready_at(test_case) <= now), None)
+        if ready is not None:
+            cold.remove(ready)
+            remaining_cold[function_key(ready)] -= 1
+            run(ready)
+            continue
+
+        # 2. a warm case of a function without cold cases left (an earlier one would restart its idle time)
+        warm_case = next((test_case for test_case in warm if not remaining_cold.get(function_key(test_case))), None)
+        if warm_case is not None:
+            warm.remove(warm_case)
+            run(warm_case)
+            continue
+
+        # 3. nothing to run, wait for the first function to become idle
+        next_ready = min(ready_at(test_case) for test_case in cold)
+        idle_wait += next_ready - now
+        now = next_ready
+
+    return ordered, {"seconds": now, "idle_wait_seconds": idle_wait}
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    index, count = (int(part) for part in shard.split("/"))
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {shard}, expected i/n with 1 <= i <= n")
+    return index, count
+
+
+def shards(test_cases: list[dict], matrix: dict, function_key, count: int) -> list[list[dict]]:
+    """
+    Test cases split into count shards by function, the longest functions first onto the
+    least loaded shard. Deterministic, every host computes the same shards.
+    """
+    functions = {}
+    for test_case in test_cases:
+        functions.setdefault(function_key(test_case), []).append(test_case)
+
+    totals = {key: sum(case_seconds(matrix, test_case) for test_case in cases) for key, cases in functions.items()}
+    loads = [0.0] * count
+    result = [[] for _ in range(count)]
+    for key in sorted(functions, key=lambda key: (-totals[key], str(key))):
+        target = loads.index(min(loads))
+        result[target].extend(functions[key])
+        loads[target] += totals[key]
+    return result
+
+
+def format_seconds(seconds: float) -> str:
+    hours, rest = divmod(int(round(seconds)), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s"
+
+
+def plan_run(test_cases: list[dict], matrix: dict, function_key, shard: str = None) -> list[dict]:
+    """
+    This host's test cases in execution order, printing the estimate of every shard.
+    """
+    index, count = parse_shard(shard) if shard else (1, 1)
+
+    print(f"Plan: {len(test_cases)} test cases, {len({function_key(test_case) for test_case in test_cases})} functions, {count} shard(s)")
+    planned = []
+    for shard_index, shard_cases in enumerate(shards(test_cases, matrix, function_key, count), start=1):
+        ordered, estimate = schedule(shard_cases, matrix, function_key)
+        cost = sum(case_cost(matrix, test_case) for test_case in ordered) + matrix.get("hourly_price", 0.0) * estimate["seconds"] / 3600
+        marker = " <- this host" if shard_index == index else ""
+        print(f"  shard {shard_index}/{count}: {len(ordered)} test cases, ~{format_seconds(estimate['seconds'])} "
+              f"(idle waits {format_seconds(estimate['idle_wait_seconds'])}), ~${cost:.4f}{marker}")
+        if shard_index == index:
+            planned = ordered
+
+    return planned
+
+
+class IdleTimer:
+    """
+    Holds a cold case back until its function has been idle for cold_idle_seconds since
+    its last test case in this run.
+    """
+
+    def __init__(self, matrix: dict, function_key):
+        self.idle_seconds = matrix["cold_idle_seconds"]
+        self.function_key = function_key
+        self.last_used = {}
+
+    def wait(self, test_case: dict) -> None:
+        last_used = self.last_used.get(self.function_key(test_case))
+        if test_case.get("start_type") == "cold" and last_used is not None:
+            remaining = last_used + self.idle_seconds - time.monotonic()
+            if remaining > 0:
+                print(f"Waiting {remaining:.0f}s for the function to go idle")
+                time.sleep(remaining)
+
+    def used(self, test_case: dict) -> None:
+        self.last_used[self.function_key(test_case)] = time.monotonic()
@@ -0,0 +1,87 @@
+"""
+Payloads of a given size for the streaming AES test cases.
+
+Payloads repeat the text of TestArtifacts/4kb_file up to the requested size, so
+every size has the same content as the standard AES input. Sizes are written
+like 1KB, 64KB, 1MB or 1GB (powers of 1024) or as plain bytes.
+
+    payload_file(size, directory)   path of a payload file, written on first use
+                                    with bounded memory
+    payload_text(size)              the payload as a string (for request bodies)
+    variants(sizes, stream_modes)   (payload bytes, stream mode) of the runners'
+                                    --payload-sizes and --stream-modes
+"""
+import os
+import re
+
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TestArtifacts", "4kb_file")
+
+UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+# Payload files are written in blocks of about this size
+WRITE_BLOCK_BYTES = 1024 * 1024
+
+
+def parse_size(size: str) -> int:
+    match = re.fullmatch(r"\s*(\d+)\s*([KMG]?B?)\s*", size.upper())
+    if match is None:
+        raise ValueError(f"Invalid payload size: {size}, expected e.g. 1KB, 64KB, 1MB or 1GB")
+    return int(match.group(1)) * UNITS[match.group(2)]
+
+
+def format_size(size_bytes: int) -> str:
+    for unit in ("GB", "MB", "KB"):
+        if size_bytes >= UNITS[unit] and size_bytes % UNITS[unit] == 0:
+            return f"{size_bytes // UNITS[unit]}{unit}"
+    return f"{size_bytes}B"
+
+
+def seed() -> bytes:
+    with open(SEED_FILE, "rb") as file:
+        return file.read().strip()
+
+
+def payload_text(size_bytes: int) -> str:
+    text = seed()
+    repeats = size_bytes // len(text) + 1
+    return (text * repeats)[:size_bytes].decode("ascii")
+
+
+def variants(payload_sizes: str, stream_modes: str) -> list[tuple[int, str]]:
+    """
+    (payload bytes, stream mode) of comma separated sizes and stream modes. "input" is
+    the operation's own TestArtifacts input, as (0, "none").
+    """
+    result = []
+    for size in payload_sizes.split(","):
+        if size.strip() == "input":
+            result.append((0, "none"))
+        else:
+            result.extend((parse_size(size), stream_mode) for stream_mode in stream_modes.split(","))
+    return result
+
+
+def payload_path(size_bytes: int, directory: str) -> str:
+    return os.path.join(directory, f"payload-{format_size(size_bytes)}.bin")
+
+
+def payload_file(size_bytes: int, directory: str) -> str:
+    path = payload_path(size_bytes, directory)
+    if os.path.exists(path) and os.path.getsize(path) == size_bytes:
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    text = seed()
+    block = text * max(1, WRITE_BLOCK_BYTES // len(text))
+
+    # Written next to the final name first, so an interrupted write is not taken for a payload
+    partial_path = path + ".partial"
+    with open(partial_path, "wb") as file:
+        remaining = size_bytes
+        while remaining > 0:
+            part = block[:remaining]
+            file.write(part)
+            remaining -= len(part)
+    os.replace(partial_path, path)
+
+    return path
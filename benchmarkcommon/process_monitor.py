@@ -0,0 +1,143 @@
+"""
+Low-overhead resource monitor for benchmarked subprocesses.
+
+Replaces polling psutil in a tight loop (which burns a core on the measuring
+side and inflates system-wide CPU numbers) with:
+
+- a sampler thread reading /proc/<pid>/statm at a fixed interval for RSS over time
+- os.wait4 rusage for the child's exact user/system CPU time and peak RSS
+- reader threads draining stdout/stderr so the child never blocks on a full pipe
+- the sampler thread's own CPU time, reported as the monitor overhead
+"""
+import os
+import subprocess
+import threading
+import time
+
+import psutil
+
+PROC_ROOT = "/proc"
+
+
+def read_rss_bytes(pid: int) -> int | None:
+    """
+    Resident set size of a process, None once it has exited.
+    """
+    try:
+        with open(f"{PROC_ROOT}/{pid}/statm") as file:
+            resident_pages = int(file.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except FileNotFoundError:
+        return None
+    except OSError:
+        # No procfs (e.g. macOS), fall back to psutil
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+
+
+class RssSampler:
+    """
+    Samples a process' RSS every interval_seconds on a background thread.
+    """
+
+    def __init__(self, pid: int, interval_seconds: float = 0.005):
+        self.pid = pid
+        self.interval_seconds = interval_seconds
+        self.samples = []
+        self.own_cpu_seconds = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def _run(self) -> None:
+        cpu_start = time.thread_time()
+        while not self.stopped.is_set():
+            rss = read_rss_bytes(self.pid)
+            if rss is None:
+                break
+            # An exited child not yet reaped by wait4 is a zombie with no resident pages
+            if rss > 0:
+                self.samples.append(rss)
+            self.stopped.wait(self.interval_seconds)
+        self.own_cpu_seconds = time.thread_time() - cpu_start
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+
+def _drain(stream, chunks: list) -> None:
+    for chunk in iter(lambda: stream.read(65536), b""):
+        chunks.append(chunk)
+    stream.close()
+
+
+def run_monitored(subprocess_input: list[str], interval_seconds: float = 0.005, env: dict = None) -> dict:
+    """
+    Run a command to completion while monitoring it.
+
+    :param subprocess_input: Command line of the process to run.
+    :param interval_seconds: RSS sampling interval.
+    :param env: Environment of the process, the runner's own when None.
+    :return: Timings and resource usage of the process plus its stdout/stderr (bytes).
+    """
+    start_time = time.perf_counter()
+
+    process = subprocess.Popen(
+        subprocess_input,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        shell=False
+    )
+
+    sampler = RssSampler(process.pid, interval_seconds)
+    sampler.start()
+
+    stdout_chunks = []
+    stderr_chunks = []
+    readers = [
+        threading.Thread(target=_drain, args=(process.stdout, stdout_chunks), daemon=True),
+        threading.Thread(target=_drain, args=(process.stderr, stderr_chunks), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    # wait4 reaps the child and returns its own rusage, unaffected by anything else on the machine
+    _, status, rusage = os.wait4(process.pid, 0)
+    end_time = time.perf_counter()
+
+    # The child is already reaped, tell Popen so it does not wait on it again
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    sampler.stop()
+    for reader in readers:
+        reader.join()
+
+    wall_seconds = end_time - start_time
+    cpu_seconds = rusage.ru_utime + rusage.ru_stime
+    samples = sampler.samples
+
+    result = {
+        "returncode": process.returncode,
+        "stdout": b"".join(stdout_chunks),
+        "stderr": b"".join(stderr_chunks),
+        "wall_ms": wall_seconds * 1000,
+        "user_cpu_ms": rusage.ru_utime * 1000,
+        "system_cpu_ms": rusage.ru_stime * 1000,
+        # CPU time of the process over its lifetime, as a percentage of one core
+        "cpu_percent": 100.0 * cpu_seconds / wall_seconds if wall_seconds > 0 else 0.0,
+        # ru_maxrss is reported in KB on Linux
+        "peak_rss_mb": rusage.ru_maxrss / 1024,
+        "avg_rss_mb": (sum(samples) / len(samples)) / (1024 ** 2) if samples else None,
+        "rss_samples": len(samples),
+        "monitor_cpu_ms": sampler.own_cpu_seconds * 1000,
+        "monitor_overhead_percent": 100.0 * sampler.own_cpu_seconds / wall_seconds if wall_seconds > 0 else 0.0,
+    }
+
+    return result
@@ -0,0 +1,402 @@
+"""
+Columnar results store shared by the runners and the analysis scripts.
+
+Results are kept as a hive partitioned Parquet dataset
+
+    <root>/provider=aws/platform=lambda/architecture=arm/language=go/operation=sha256/part-<run_id>-0.parquet
+
+with a fixed schema per platform, so every column has the same type in every
+file and there are no repeated header rows. Each append writes new files named
+after its run id and never touches existing ones. load_results() is the one
+loader used by the analysis scripts, filters on the partition columns only
+read the matching directories.
+
+Existing csv results are imported with
+
+    python3 -m benchmarkcommon.results_store import <platform> <csv files...> [--root ./results-store]
+"""
+import argparse
+import glob
+import os
+import uuid
+from urllib.parse import unquote
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+DEFAULT_ROOT = "./results-store"
+
+# platform -> provider
+PLATFORMS = {
+    "lambda": "aws",
+    "ec2": "aws",
+    "azure_function": "azure",
+    "azure_vm": "azure",
+}
+
+PARTITION_FIELDS = [
+    pa.field("provider", pa.string()),
+    pa.field("platform", pa.string()),
+    pa.field("architecture", pa.string()),
+    pa.field("language", pa.string()),
+    pa.field("operation", pa.string()),
+]
+
+PARTITIONING = ds.partitioning(pa.schema(PARTITION_FIELDS), flavor="hive")
+
+LAMBDA_FIELDS = [
+    pa.field("start_type", pa.string()),
+    pa.field("memory_size", pa.int64()),
+    pa.field("execution_time_ms", pa.float64()),
+    pa.field("max_memory_usage_mb", pa.float64()),
+    pa.field("init_duration_ms", pa.float64()),
+    pa.field("billed_duration_ms", pa.float64()),
+    pa.field("request_id", pa.string()),
+    pa.field("client_dns_ms", pa.float64()),
+    pa.field("client_connect_ms", pa.float64()),
+    pa.field("client_tls_ms", pa.float64()),
+    pa.field("client_ttfb_ms", pa.float64()),
+    pa.field("client_total_ms", pa.float64()),
+    pa.field("client_overhead_ms", pa.float64()),
+    # Request and response body sizes as sent over the network
+    pa.field("client_request_bytes", pa.int64()),
+    pa.field("client_response_bytes", pa.int64()),
+    # remote (KMS / Key Vault), local (in process) or public_key (public key operations in process)
+    pa.field("crypto_mode", pa.string()),
+    # Inputs per request, execution times are per request
+    pa.field("batch_size", pa.int64()),
+    # off or on (data keys reused across messages, AES only), with the hits and misses of the invocation
+    pa.field("data_key_cache", pa.string()),
+    pa.field("data_key_hits", pa.int64()),
+    pa.field("data_key_misses", pa.int64()),
+    # Streamed AES payload (aes_stream.py) and its stream mode, 0 and none for the operation's own input
+    pa.field("payload_bytes", pa.int64()),
+    pa.field("stream_mode", pa.string()),
+    # json or binary (wire_format.py) request and response bodies
+    pa.field("wire_format", pa.string()),
+    # How cold samples got a new execution environment: sequential, rotate or fanout (cold_start_driver.py)
+    pa.field("cold_strategy", pa.string()),
+]
+
+# EC2 and Azure VM runners save the same columns
+IAAS_FIELDS = [
+    pa.field("id", pa.string()),
+    pa.field("instance_type", pa.string()),
+    pa.field("start_type", pa.string()),
+    pa.field("iteration", pa.int64()),
+    pa.field("execution_time_ms", pa.float64()),
+    pa.field("avg_cpu_usage_percent", pa.float64()),
+    pa.field("max_memory_usage_mb", pa.float64()),
+    pa.field("avg_memory_usage_mb", pa.float64()),
+    pa.field("user_cpu_ms", pa.float64()),
+    pa.field("system_cpu_ms", pa.float64()),
+    pa.field("rss_samples", pa.int64()),
+    pa.field("monitor_overhead_percent", pa.float64()),
+    pa.field("execution_mode", pa.string()),
+    pa.field("startup_ms", pa.float64()),
+    pa.field("import_ms", pa.float64()),
+    pa.field("client_init_ms", pa.float64()),
+    pa.field("remote_ms", pa.float64()),
+    pa.field("local_ms", pa.float64()),
+    pa.field("crypto_mode", pa.string()),
+    pa.field("batch_size", pa.int64()),
+    pa.field("data_key_cache", pa.string()),
+    pa.field("data_key_hits", pa.int64()),
+    pa.field("data_key_misses", pa.int64()),
+    pa.field("payload_bytes", pa.int64()),
+    pa.field("stream_mode", pa.string()),
+]
+
+AZURE_FUNCTION_FIELDS = [
+    pa.field("start_type", pa.string()),
+    pa.field("memory_size", pa.int64()),
+    pa.field("execution_time_ms", pa.float64()),
+    pa.field("crypto_mode", pa.string()),
+    pa.field("batch_size", pa.int64()),
+    # Always off, 0 and none, there are no Azure AES functions
+    pa.field("data_key_cache", pa.string()),
+    pa.field("payload_bytes", pa.int64()),
+    pa.field("stream_mode", pa.string()),
+    # Always json, only the Lambda functions have a binary wire format
+    pa.field("wire_format", pa.string()),
+    # App Insights request id, only on rows queried from Log Analytics (app_insights_query.py)
+    pa.field("request_id", pa.string()),
+]
+
+PLATFORM_FIELDS = {
+    "lambda": LAMBDA_FIELDS,
+    "ec2": IAAS_FIELDS,
+    "azure_function": AZURE_FUNCTION_FIELDS,
+    "azure_vm": IAAS_FIELDS,
+}
+
+RUN_ID_FIELD = pa.field("run_id", pa.string())
+
+# Columns added after results were first saved -> value of the rows saved before, filled in on load
+COLUMN_DEFAULTS = {
+    "crypto_mode": "remote",
+    "batch_size": 1,
+    "data_key_cache": "off",
+    "payload_bytes": 0,
+    "stream_mode": "none",
+    "wire_format": "json",
+    "cold_strategy": "sequential",
+}
+
+# The operations the public_key crypto mode does in process, the others go to KMS / Key Vault as in remote mode
+PUBLIC_KEY_OPERATIONS = ["ecc256_verify", "ecc384_verify", "rsa2048_encrypt", "rsa3072_encrypt", "rsa4096_encrypt"]
+
+# Azure Python verify and RSA encrypt rows saved before crypto_mode existed ran with the fetched key's
+# local operations of CryptographyClient (in process, with the public key), which is the public_key mode
+LEGACY_PUBLIC_KEY_OPERATIONS = PUBLIC_KEY_OPERATIONS
+
+
+def platform_schema(platform: str) -> pa.Schema:
+    """
+    Full schema of a platform's rows: partition columns, measurements, then run_id.
+    """
+    if platform not in PLATFORMS:
+        raise ValueError(f"Unknown platform: {platform}, expected one of {list(PLATFORMS)}")
+    return pa.schema(PARTITION_FIELDS + PLATFORM_FIELDS[platform] + [RUN_ID_FIELD])
+
+
+def new_run_id() -> str:
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{uuid.uuid4().hex[:8]}"
+
+
+def conform(df: pd.DataFrame, platform: str, run_id: str) -> pa.Table:
+    """
+    Coerce a results DataFrame to the platform schema. Repeated header rows (from csv
+    files appended to with a header each time) are dropped, unparseable numbers become
+    null, missing columns are null and unknown columns are dropped with a warning.
+    """
+    schema = platform_schema(platform)
+    df = df.copy()
+
+    header_rows = (df.astype(str) == df.columns.astype(str)).all(axis=1)
+    if header_rows.any():
+        df = df[~header_rows]
+
+    unknown = [column for column in df.columns if column not in schema.names]
+    if unknown:
+        print(f"Dropping columns not in the {platform} schema: {unknown}")
+
+    df["provider"] = PLATFORMS[platform]
+    df["platform"] = platform
+    df["run_id"] = run_id
+
+    columns = {}
+    for field in schema:
+        values = df[field.name] if field.name in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+        if pa.types.is_integer(field.type):
+            values = pd.to_numeric(values, errors="coerce").round().astype("Int64")
+        elif pa.types.is_floating(field.type):
+            values = pd.to_numeric(values, errors="coerce").astype("float64")
+        else:
+            values = values.astype("string")
+        columns[field.name] = values
+
+    return pa.Table.from_pandas(pd.DataFrame(columns), schema=schema, preserve_index=False)
+
+
+def append(df: pd.DataFrame, platform: str, root: str = DEFAULT_ROOT, run_id: str = None, part: str = None) -> str:
+    """
+    Append result rows to the store as new Parquet files.
+
+    :param df: One row per measurement, column names as in the platform schema.
+    :param platform: One of PLATFORMS.
+    :param root: Store directory, created if missing.
+    :param run_id: Names the new files and fills the run_id column, generated when None.
+    :param part: Added to the file names, for several appends of one run (files of the same name are replaced).
+    :return: The run id.
+    """
+    if run_id is None:
+        run_id = new_run_id()
+
+    table = conform(df, platform, run_id)
+    if table.num_rows == 0:
+        print(f"No {platform} rows to save.")
+        return run_id
+
+    ds.write_dataset(
+        table,
+        root,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template=f"part-{run_id}-{part}-{{i}}.parquet" if part is not None else f"part-{run_id}-{{i}}.parquet",
+        # New files only, existing partitions are left as they are
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+    print(f"Saved {table.num_rows} {platform} rows to {root} (run {run_id})")
+    return run_id
+
+
+def runs_crypto_mode(crypto_mode: str, operation: str) -> bool:
+    """
+    False for public_key test cases of operations it does not change, they would measure remote mode again.
+    """
+    return crypto_mode != "public_key" or operation in PUBLIC_KEY_OPERATIONS
+
+
+def legacy_crypto_mode(platform: str, language: str, operation: str) -> str:
+    """
+    crypto_mode of a row saved before the column existed.
+    """
+    if PLATFORMS[platform] == "azure" and language == "python" and operation in LEGACY_PUBLIC_KEY_OPERATIONS:
+        return "public_key"
+    return COLUMN_DEFAULTS["crypto_mode"]
+
+
+def fill_legacy_crypto_mode(df: pd.DataFrame, platform: str) -> pd.DataFrame:
+    """
+    Set the public_key crypto mode on legacy Azure rows (LEGACY_PUBLIC_KEY_OPERATIONS) without one.
+    """
+    if PLATFORMS[platform] != "azure" or not {"language", "operation"} <= set(df.columns):
+        return df
+    if "crypto_mode" not in df.columns:
+        df["crypto_mode"] = None
+    legacy = df["crypto_mode"].isna() & (df["language"] == "python") & df["operation"].isin(LEGACY_PUBLIC_KEY_OPERATIONS)
+    df.loc[legacy, "crypto_mode"] = "public_key"
+    return df
+
+
+def filter_expression(filters: dict, platform: str = None):
+    expression = None
+    for column, value in filters.items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        condition = ds.field(column).isin(values) if len(values) > 1 else ds.field(column) == values[0]
+        # Older files have no value for a newer column, they match its default
+        if column == "crypto_mode" and platform is not None and PLATFORMS[platform] == "azure":
+            legacy_public_key = (ds.field("language") == "python") & ds.field("operation").isin(LEGACY_PUBLIC_KEY_OPERATIONS)
+            if "public_key" in values:
+                condition = condition | (ds.field(column).is_null() & legacy_public_key)
+            if COLUMN_DEFAULTS[column] in values:
+                condition = condition | (ds.field(column).is_null() & ~legacy_public_key)
+        elif column in COLUMN_DEFAULTS and COLUMN_DEFAULTS[column] in values:
+            condition = condition | ds.field(column).is_null()
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def platform_dir(platform: str, root: str = DEFAULT_ROOT) -> str:
+    return os.path.join(root, f"provider={PLATFORMS[platform]}", f"platform={platform}")
+
+
+def partition_dirs(platform: str, root: str = DEFAULT_ROOT, filters: dict = None) -> dict[tuple, str]:
+    """
+    Leaf directories of a platform, keyed by their (architecture, language, operation) values.
+    Only filters on those three columns are applied.
+    """
+    platform_schema(platform)
+    names = [field.name for field in PARTITION_FIELDS[2:]]
+    filters = filters or {}
+
+    dirs = {}
+    pattern = os.path.join(platform_dir(platform, root), *(f"{name}=*" for name in names))
+    for directory in sorted(glob.glob(pattern)):
+        # Hive directory names are url encoded (c# is language=c%23)
+        key = tuple(unquote(part.split("=", 1)[1]) for part in directory.split(os.sep)[-len(names):])
+
+        matches = True
+        for name, value in zip(names, key):
+            if name in filters:
+                wanted = filters[name]
+                matches &= value in wanted if isinstance(wanted, (list, tuple, set)) else value == wanted
+        if matches:
+            dirs[key] = directory
+
+    return dirs
+
+
+def _load_dataset(path: str, platform: str, root: str, columns: list[str], filters: dict) -> pd.DataFrame:
+    dataset = ds.dataset(path, schema=platform_schema(platform), format="parquet", partitioning=PARTITIONING, partition_base_dir=root)
+    read_columns = columns
+    if columns is not None and "crypto_mode" in columns:
+        # The default crypto mode of older rows depends on their language and operation
+        read_columns = columns + [column for column in ["language", "operation"] if column not in columns]
+    df = dataset.to_table(columns=read_columns, filter=filter_expression(filters or {}, platform)).to_pandas()
+    df = fill_legacy_crypto_mode(df, platform)[columns if columns is not None else df.columns]
+    for column, default in COLUMN_DEFAULTS.items():
+        if column in df.columns:
+            df[column] = df[column].fillna(default)
+    return df
+
+
+def load_partition(platform: str, directory: str, root: str = DEFAULT_ROOT, columns: list[str] = None, filters: dict = None) -> pd.DataFrame:
+    """
+    Load the rows of one partition directory (from partition_dirs()), with the partition columns filled in.
+    """
+    return _load_dataset(directory, platform, root, columns, filters)
+
+
+def load_results(platform: str | list[str], root: str = DEFAULT_ROOT, columns: list[str] = None, filters: dict = None) -> pd.DataFrame:
+    """
+    Load results from the store.
+
+    :param platform: A platform or a list of them (e.g. ["ec2", "azure_vm"]). Rows of several
+                     platforms are concatenated, columns missing on a platform are NaN.
+    :param root: Store directory.
+    :param columns: Columns to read, all when None.
+    :param filters: Column -> value or list of values, e.g. {"language": ["go", "rust"], "start_type": "warm"}.
+    :return: The matching rows.
+    """
+    platforms = [platform] if isinstance(platform, str) else list(platform)
+
+    frames = []
+    for name in platforms:
+        platform_schema(name)
+        path = platform_dir(name, root)
+        if not os.path.isdir(path):
+            print(f"No {name} results in {root}")
+            continue
+
+        frames.append(_load_dataset(path, name, root, columns, filters))
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def import_csvs(platform: str, file_names: list[str], root: str = DEFAULT_ROOT) -> str:
+    """
+    Import result csv files (as written by the runners) into the store as one run.
+    """
+    frames = []
+    for file_name in file_names:
+        if os.path.exists(file_name):
+            # Read everything as text, conform() does the typing and drops repeated headers
+            frames.append(pd.read_csv(file_name, dtype=str, keep_default_na=False, na_values=[""]))
+        else:
+            print(f"File not found: {file_name}")
+
+    if not frames:
+        print("Nothing to import.")
+        return None
+
+    return append(pd.concat(frames, ignore_index=True), platform, root)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Results store tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Import result csv files into the store.")
+    import_parser.add_argument("platform", choices=list(PLATFORMS))
+    import_parser.add_argument("files", nargs="+")
+    import_parser.add_argument("--root", default=DEFAULT_ROOT)
+
+    return parser.parse_args()
+
+
+def main(args):
+    if args.command == "import":
+        import_csvs(args.platform, args.files, args.root)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,135 @@
+"""
+Persistent run journal for benchmark test case matrices.
+
+Every test case is identified by a stable key built from its identifying fields
+and moves through the states below. Raw results are stored as JSON as soon as
+they exist, so a restarted runner skips finished cases and resumes mid-matrix.
+
+    pending -> running -> executed -> done
+    pending -> running -> failed (runs again on the next start)
+
+"executed" is only used by runners whose results arrive after execution
+(e.g. Lambda REPORT lines harvested from CloudWatch).
+"""
+import json
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+RUNNING = "running"
+EXECUTED = "executed"
+DONE = "done"
+FAILED = "failed"
+
+
+def case_key(test_case: dict, fields: list[str]) -> str:
+    """
+    Stable identifier of a test case across runs, built from the given fields only
+    (generated ids such as uuid4 must not be part of it).
+    """
+    return json.dumps({field: test_case.get(field) for field in fields}, sort_keys=True)
+
+
+class RunJournal:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # Results are recorded from tracker / event loop threads as well as the main thread
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS test_cases (
+                case_key TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                execution TEXT,
+                results TEXT,
+                error TEXT,
+                exported INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.commit()
+
+    def _execute(self, sql: str, parameters: tuple = ()) -> list:
+        with self.lock:
+            rows = self.connection.execute(sql, parameters).fetchall()
+            self.connection.commit()
+        return rows
+
+    def register(self, case_keys: list[str]) -> None:
+        """
+        Add the matrix to the journal. Keys already present keep their state.
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO test_cases (case_key, position, state, updated_at) VALUES (?, ?, ?, ?)",
+                [(key, position, PENDING, now) for position, key in enumerate(case_keys)]
+            )
+            self.connection.commit()
+
+    def state(self, key: str) -> str | None:
+        rows = self._execute("SELECT state FROM test_cases WHERE case_key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def needs_execution(self, key: str) -> bool:
+        # A case left "running" means the previous run died mid-case, so it runs again
+        return self.state(key) in (None, PENDING, RUNNING, FAILED)
+
+    def mark_running(self, key: str) -> None:
+        self._execute(
+            "UPDATE test_cases SET state = ?, attempts = attempts + 1, error = NULL, updated_at = ? WHERE case_key = ?",
+            (RUNNING, time.time(), key)
+        )
+
+    def mark_executed(self, key: str, execution: dict) -> None:
+        self._execute(
+            "UPDATE test_cases SET state = ?, execution = ?, updated_at = ? WHERE case_key = ?",
+            (EXECUTED, json.dumps(execution), time.time(), key)
+        )
+
+    def mark_done(self, key: str, results) -> None:
+        self._execute(
+            "UPDATE test_cases SET state = ?, results = ?, updated_at = ? WHERE case_key = ?",
+            (DONE, json.dumps(results), time.time(), key)
+        )
+
+    def mark_failed(self, key: str, error: str) -> None:
+        self._execute(
+            "UPDATE test_cases SET state = ?, error = ?, updated_at = ? WHERE case_key = ?",
+            (FAILED, error, time.time(), key)
+        )
+
+    def is_exported(self, key: str) -> bool:
+        rows = self._execute("SELECT exported FROM test_cases WHERE case_key = ?", (key,))
+        return bool(rows and rows[0][0])
+
+    def mark_exported(self, keys: list[str]) -> None:
+        """
+        Record that these results were written to an append-mode output file.
+        """
+        with self.lock:
+            self.connection.executemany("UPDATE test_cases SET exported = 1 WHERE case_key = ?", [(key,) for key in keys])
+            self.connection.commit()
+
+    def execution(self, key: str) -> dict | None:
+        rows = self._execute("SELECT execution FROM test_cases WHERE case_key = ?", (key,))
+        return json.loads(rows[0][0]) if rows and rows[0][0] is not None else None
+
+    def results(self, key: str):
+        rows = self._execute("SELECT results FROM test_cases WHERE case_key = ?", (key,))
+        return json.loads(rows[0][0]) if rows and rows[0][0] is not None else None
+
+    def summary(self) -> dict[str, int]:
+        rows = self._execute("SELECT state, COUNT(*) FROM test_cases GROUP BY state")
+        return {state: count for state, count in rows}
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,196 @@
+"""
+Vectorized per-group statistics for the analysis scripts.
+
+Every function sorts the rows once by (group, value) and then reads quantiles
+straight from each group's slice of the sorted array, so there is no Python
+level loop or groupby().apply() over the groups. Quantiles use linear
+interpolation like np.percentile / Series.quantile, NaN values are ignored.
+
+    trim_mask      rows inside each group's [lower, upper] quantile range (the "middle 95%")
+    trimmed_mean   mean of those rows per group
+    quantiles      any quantiles per group
+    iqr            interquartile range per group
+    bootstrap_ci   percentile bootstrap confidence interval of the (trimmed) mean per group
+    summarize      all of the above as one table
+"""
+import numpy as np
+import pandas as pd
+
+LOWER = 0.025
+UPPER = 0.975
+
+
+class SortedGroups:
+    """
+    Values sorted by group and then value.
+
+    values          sorted values
+    sorted_codes    group number of each sorted value
+    starts, counts  slice of each group in `values`
+    codes           group number of each input row (-1 where the value or a key is NaN)
+    index           group keys, in group number order
+    """
+
+    def __init__(self, values: np.ndarray, codes: np.ndarray, n_groups: int, index: pd.Index = None):
+        valid = ~np.isnan(values) & (codes >= 0)
+        self.codes = np.where(valid, codes, -1)
+        self.index = index
+
+        kept = np.flatnonzero(valid)
+        order = kept[np.lexsort((values[kept], codes[kept]))]
+        self.values = values[order]
+        self.sorted_codes = codes[order]
+
+        self.counts = np.bincount(self.sorted_codes, minlength=n_groups)
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+
+    def quantile(self, q: float) -> np.ndarray:
+        """
+        q-th quantile of every group (NaN for empty groups).
+        """
+        result = np.full(len(self.counts), np.nan)
+        nonempty = self.counts > 0
+        position = q * (self.counts[nonempty] - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        starts = self.starts[nonempty]
+        low_values = self.values[starts + lower]
+        high_values = self.values[starts + upper]
+        result[nonempty] = low_values + (high_values - low_values) * (position - lower)
+        return result
+
+    def trimmed_sums(self, lower: float, upper: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Per group sum and count of the sorted values within the [lower, upper] quantiles.
+        """
+        low_bounds = self.quantile(lower)[self.sorted_codes]
+        high_bounds = self.quantile(upper)[self.sorted_codes]
+        inside = (self.values >= low_bounds) & (self.values <= high_bounds)
+        sums = np.bincount(self.sorted_codes, weights=np.where(inside, self.values, 0.0), minlength=len(self.counts))
+        counts = np.bincount(self.sorted_codes, weights=inside, minlength=len(self.counts))
+        return sums, counts
+
+
+def sort_groups(df: pd.DataFrame, by, value: str) -> SortedGroups:
+    """
+    Sort the rows of `df` by the `by` columns and `value`. `by=None` is one group of all rows.
+    """
+    values = df[value].to_numpy(dtype=float)
+
+    if by is None:
+        return SortedGroups(values, np.zeros(len(df), dtype=np.int64), 1, pd.Index([value]))
+
+    grouped = df.groupby([by] if isinstance(by, str) else list(by), sort=True, observed=True)
+    # Rows with a NaN key belong to no group
+    codes = np.nan_to_num(grouped.ngroup().to_numpy(dtype=float), nan=-1).astype(np.int64)
+    index = grouped.size().index
+    return SortedGroups(values, codes, len(index), index)
+
+
+def _mean(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def trim_mask(df: pd.DataFrame, by, value: str, lower: float = LOWER, upper: float = UPPER) -> pd.Series:
+    """
+    Boolean mask of the rows whose value lies within its group's [lower, upper] quantiles
+    (inclusive). `by=None` trims over the whole frame.
+    """
+    groups = sort_groups(df, by, value)
+    low_bounds = groups.quantile(lower)
+    high_bounds = groups.quantile(upper)
+
+    values = df[value].to_numpy(dtype=float)
+    valid = groups.codes >= 0
+    codes = np.where(valid, groups.codes, 0)
+    with np.errstate(invalid="ignore"):
+        inside = valid & (values >= low_bounds[codes]) & (values <= high_bounds[codes])
+    return pd.Series(inside, index=df.index)
+
+
+def trimmed_mean(df: pd.DataFrame, by, value: str, lower: float = LOWER, upper: float = UPPER) -> pd.Series:
+    """
+    Mean of each group's values within its [lower, upper] quantiles, indexed by the group keys.
+    """
+    groups = sort_groups(df, by, value)
+    sums, counts = groups.trimmed_sums(lower, upper)
+    return pd.Series(_mean(sums, counts), index=groups.index, name=value)
+
+
+def quantiles(df: pd.DataFrame, by, value: str, qs: list[float]) -> pd.DataFrame:
+    """
+    Quantiles per group, one column per q.
+    """
+    groups = sort_groups(df, by, value)
+    return pd.DataFrame({q: groups.quantile(q) for q in qs}, index=groups.index)
+
+
+def iqr(df: pd.DataFrame, by, value: str) -> pd.Series:
+    groups = sort_groups(df, by, value)
+    return pd.Series(groups.quantile(0.75) - groups.quantile(0.25), index=groups.index, name=value)
+
+
+def _bootstrap(groups: SortedGroups, n_resamples: int, confidence: float, trimmed: bool, lower: float, upper: float, seed: int = None, max_batch_values: int = 2_000_000) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    n_groups = len(groups.counts)
+    n_values = len(groups.values)
+    estimates = np.empty((n_resamples, n_groups))
+
+    # Several resamples are drawn and sorted together, group numbers are offset per resample
+    batch_size = max(1, min(n_resamples, max_batch_values // max(n_values, 1)))
+    row_starts = groups.starts[groups.sorted_codes]
+    row_counts = groups.counts[groups.sorted_codes]
+
+    for batch_start in range(0, n_resamples, batch_size):
+        batch = min(batch_size, n_resamples - batch_start)
+        # Resample within each group: every value is replaced by a random value of its own group
+        picks = row_starts + np.floor(rng.random((batch, n_values)) * row_counts).astype(np.int64)
+        sampled = groups.values[picks].ravel()
+        sampled_codes = (groups.sorted_codes + n_groups * np.arange(batch)[:, None]).ravel()
+
+        if not trimmed:
+            sums = np.bincount(sampled_codes, weights=sampled, minlength=batch * n_groups)
+            counts = np.bincount(sampled_codes, minlength=batch * n_groups)
+        else:
+            sums, counts = SortedGroups(sampled, sampled_codes, batch * n_groups).trimmed_sums(lower, upper)
+
+        estimates[batch_start:batch_start + batch] = _mean(sums, counts).reshape(batch, n_groups)
+
+    alpha = (1.0 - confidence) / 2
+    with np.errstate(invalid="ignore"):
+        return np.nanquantile(estimates, alpha, axis=0), np.nanquantile(estimates, 1.0 - alpha, axis=0)
+
+
+def bootstrap_ci(df: pd.DataFrame, by, value: str, n_resamples: int = 1000, confidence: float = 0.95, trimmed: bool = True, lower: float = LOWER, upper: float = UPPER, seed: int = None) -> pd.DataFrame:
+    """
+    Percentile bootstrap confidence interval of each group's trimmed mean (or plain mean
+    with trimmed=False). Columns ci_low and ci_high.
+    """
+    groups = sort_groups(df, by, value)
+    ci_low, ci_high = _bootstrap(groups, n_resamples, confidence, trimmed, lower, upper, seed)
+    return pd.DataFrame({"ci_low": ci_low, "ci_high": ci_high}, index=groups.index)
+
+
+def summarize(df: pd.DataFrame, by, value: str, lower: float = LOWER, upper: float = UPPER, n_resamples: int = 0, confidence: float = 0.95, seed: int = None) -> pd.DataFrame:
+    """
+    One row per group: count, mean, trimmed mean, p2.5/p25/p50/p75/p97.5 (for the default
+    bounds), IQR and, when n_resamples > 0, a bootstrap CI of the trimmed mean.
+    """
+    groups = sort_groups(df, by, value)
+    counts = groups.counts
+    sums = np.bincount(groups.sorted_codes, weights=groups.values, minlength=len(counts))
+    trimmed_sums, trimmed_counts = groups.trimmed_sums(lower, upper)
+
+    summary = pd.DataFrame(index=groups.index)
+    summary["count"] = counts
+    summary["mean"] = _mean(sums, counts)
+    summary["trimmed_mean"] = _mean(trimmed_sums, trimmed_counts)
+    for q in sorted({lower, 0.25, 0.5, 0.75, upper}):
+        summary[f"p{q * 100:g}".replace(".", "_")] = groups.quantile(q)
+    summary["iqr"] = summary["p75"] - summary["p25"]
+
+    if n_resamples > 0:
+        summary["ci_low"], summary["ci_high"] = _bootstrap(groups, n_resamples, confidence, True, lower, upper, seed)
+
+    return summary
@@ -0,0 +1,207 @@
+"""
+Local stand-in for a FaaS function URL, used to exercise the runners offline.
+
+Every POST is answered with a small JSON body and a fresh x-amzn-RequestId
+header after an optional delay. Connections are kept alive (HTTP/1.1).
+
+Every request is also recorded like App Insights would (timestamp, function name
+from the path, request id, url, the delay as FunctionExecutionTimeMs), and POST
+/v1/$batch answers the Log Analytics batch queries of app_insights_query.py from
+them, rows become visible --ingestion-delay seconds after their request. The Azure
+SDK only sends bearer tokens over https, so the query endpoint needs --tls (a
+self-signed certificate, point REQUESTS_CA_BUNDLE at --cert-file).
+
+Usage:
+    python -m benchmarkcommon.stub_server --port 8080 --delay-ms 20 \
+        --urls-template AWS/benchmarkrunner/lambda_benchmark_urls.json \
+        --write-urls AWS/benchmarkrunner/stub_urls.json
+"""
+import argparse
+import json
+import random
+import re
+import ssl
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# The parts of the app_insights_query.py queries the stub filters on
+QUERY_RANGE = re.compile(r"TimeGenerated between \(datetime\((?P<start>[^)]+)\) \.\. datetime\((?P<end>[^)]+)\)\)")
+QUERY_NAMES = re.compile(r"Name in \((?P<names>[^)]*)\)")
+QUERY_CURSOR = re.compile(r'TimeGenerated > datetime\((?P<timestamp>[^)]+)\) or \(TimeGenerated == datetime\([^)]+\) and strcmp\(Id, (?P<request_id>"[^"]*")\) > 0\)')
+QUERY_TOP = re.compile(r"top (?P<rows>\d+) by")
+
+QUERY_COLUMNS = [
+    {"name": "timestamp", "type": "datetime"},
+    {"name": "name", "type": "string"},
+    {"name": "customDimensions", "type": "dynamic"},
+    {"name": "request_id", "type": "string"},
+    {"name": "url", "type": "string"},
+]
+
+
+def query_rows(query: str, telemetry: list[dict], visible_before: datetime) -> list[list]:
+    """
+    Rows of the recorded requests matching an app_insights_query.py query.
+    """
+    start, end = (datetime.fromisoformat(QUERY_RANGE.search(query)[group]) for group in ("start", "end"))
+    names = json.loads(f"[{QUERY_NAMES.search(query)['names']}]")
+    cursor = QUERY_CURSOR.search(query)
+    if cursor is None and "TimeGenerated >" in query:
+        # A page cursor in another form would return the first page again
+        raise ValueError("page cursor not in the form TimeGenerated > t or (TimeGenerated == t and strcmp(Id, id) > 0)")
+    if cursor:
+        cursor = (datetime.fromisoformat(cursor["timestamp"]), json.loads(cursor["request_id"]))
+
+    rows = []
+    for request in telemetry:
+        key = (request["timestamp"], request["request_id"])
+        if request["timestamp"] > visible_before or not start <= request["timestamp"] <= end or request["name"] not in names:
+            continue
+        if cursor and key <= cursor:
+            continue
+        rows.append(key + (request,))
+    rows.sort(key=lambda row: row[:2])
+
+    return [[timestamp.isoformat().replace("+00:00", "Z"), request["name"], request["customDimensions"], request_id, request["url"]]
+            for timestamp, request_id, request in rows[:int(QUERY_TOP.search(query)["rows"])]]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, without TCP_NODELAY the body waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw_body = self.rfile.read(length)
+
+        if self.path.endswith("/$batch"):
+            self.send_json({"responses": [self.query_response(request) for request in json.loads(raw_body)["requests"]]})
+            return
+
+        delay_ms = self.server.delay_ms + random.uniform(0, self.server.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+        # Query parameters (like the Azure Function runner's case id) are not part of the function
+        path = urlsplit(self.path).path
+        with self.server.lock:
+            self.server.request_counts[path] = self.server.request_counts.get(path, 0) + 1
+
+        request_id = str(uuid.uuid4())
+        with self.server.lock:
+            self.server.telemetry.append({
+                "timestamp": datetime.now(timezone.utc),
+                "name": path.strip("/").split("/")[-1],
+                "customDimensions": json.dumps({"FunctionExecutionTimeMs": f"{delay_ms:.4f}", "InvocationId": request_id}),
+                "request_id": request_id,
+                "url": self.path,
+            })
+
+        self.send_json({"ok": True, "path": self.path}, {"x-amzn-RequestId": request_id})
+
+    def query_response(self, request: dict) -> dict:
+        visible_before = datetime.now(timezone.utc) - timedelta(seconds=self.server.ingestion_delay)
+        with self.server.lock:
+            telemetry = list(self.server.telemetry)
+        try:
+            rows = query_rows(request["body"]["query"], telemetry, visible_before)
+        except (TypeError, ValueError) as e:
+            return {"id": request["id"], "status": 400, "body": {"error": {"code": "BadArgumentError", "message": f"Query not understood by the stub: {e}"}}}
+        return {"id": request["id"], "status": 200, "body": {"tables": [{"name": "PrimaryResult", "columns": QUERY_COLUMNS, "rows": rows}]}}
+
+    def send_json(self, body: dict, headers: dict = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Keep the runner output readable
+        return
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, delay_ms: float = 0.0, jitter_ms: float = 0.0,
+                      ingestion_delay: float = 0.0, tls_cert_file: str = None, tls_key_file: str = None) -> ThreadingHTTPServer:
+    """
+    Start the stub in a daemon thread and return the server.
+    Use server.server_address for the bound port and server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.delay_ms = delay_ms
+    server.jitter_ms = jitter_ms
+    server.lock = threading.Lock()
+    server.request_counts = {}
+    server.telemetry = []
+    server.ingestion_delay = ingestion_delay
+
+    if tls_cert_file:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(tls_cert_file, tls_key_file)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stub_urls_for(template_file: str, host: str, port: int, scheme: str = "http") -> dict[str, str]:
+    """
+    Map every key of a runner url file (e.g. lambda_benchmark_urls.json) onto the stub.
+    """
+    with open(template_file) as file:
+        keys = json.load(file).keys()
+
+    return {key: f"{scheme}://{host}:{port}/{key}" for key in keys}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub for benchmark function URLs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--urls-template", help="Runner url file whose keys should point at the stub")
+    parser.add_argument("--write-urls", help="Where to write the rewritten url file")
+    parser.add_argument("--ingestion-delay", type=float, default=0.0, help="Seconds before a request shows up in query results")
+    parser.add_argument("--tls", action="store_true", help="Serve https with a self-signed certificate (needed by the query endpoint)")
+    parser.add_argument("--cert-file", default="stub-server-cert.pem")
+    parser.add_argument("--key-file", default="stub-server-key.pem")
+    args = parser.parse_args()
+
+    if args.tls:
+        from benchmarkcommon.kms_emulator import write_self_signed_certificate
+        write_self_signed_certificate(args.cert_file, args.key_file, args.host)
+
+    server = start_stub_server(args.host, args.port, args.delay_ms, args.jitter_ms, args.ingestion_delay,
+                               args.cert_file if args.tls else None, args.key_file)
+    host, port = server.server_address
+    scheme = "https" if args.tls else "http"
+    print(f"Stub function URL server listening on {scheme}://{host}:{port}")
+    if args.tls:
+        print(f"Log Analytics query endpoint {scheme}://{host}:{port}/v1, certificate in {args.cert_file}")
+
+    if args.urls_template and args.write_urls:
+        with open(args.write_urls, "w") as file:
+            json.dump(stub_urls_for(args.urls_template, host, port, scheme), file, indent=4)
+        print(f"Wrote stub urls to {args.write_urls}")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Requests served per path: {server.request_counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Binary wire format of the Python functions, next to the usual JSON bodies.
+
+JSON requests and responses carry iv, tag, ciphertext, keys and signatures
+base64 encoded, a third larger than the bytes and copied a few times on the way.
+A binary request is one frame of named fields with the bytes as they are:
+
+    "KBF1" | field count (u16)
+    per field: name length (u8) | kind (u8) | value length (u32) | name | value
+
+    kind 0  bytes, handed to the handler as a memoryview slice of the body (no copy)
+    kind 1  UTF-8 text (messages, crypto_mode, ...)
+    kind 2  JSON of any other value (chunk_size, ...)
+
+It is sent with Content-Type CONTENT_TYPE and answered in the same format. Function
+URLs hand a binary body to Lambda base64 encoded in the event (isBase64Encoded) and
+decode a binary response the same way, so inside Lambda the whole body is decoded
+once instead of every field, and the client and network see the raw frame.
+
+    body = request_body(event)              the request's fields, "wire_format" set
+    field_bytes(body, name)                 a bytes field of either format
+    response(body, fields, headers)         Lambda response in the request's format
+    encode(fields) / decode(data)           the frame itself
+    encode_request(input)                   a JSON test case input as a frame (runners)
+
+The same file is used by lambdas/python and benchmarkcommon (the runners), keep
+the copies identical.
+"""
+import base64
+import json
+import struct
+
+WIRE_FORMATS = ("json", "binary")
+
+CONTENT_TYPE = "application/x-kms-benchmark-frame"
+MAGIC = b"KBF1"
+
+BYTES = 0
+TEXT = 1
+JSON = 2
+
+# magic, field count
+HEADER = struct.Struct(">4sH")
+# name length, kind, value length
+FIELD = struct.Struct(">BBI")
+
+# Fields the JSON bodies carry base64 encoded, sent as bytes in a binary request
+BINARY_FIELDS = ("encrypted_data_key", "iv", "tag", "encrypted_message", "ciphertext", "encrypted_aes_key", "signature", "stream")
+
+
+def encode(fields: dict) -> bytes:
+    parts = [HEADER.pack(MAGIC, len(fields))]
+    for name, value in fields.items():
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            kind = BYTES
+        elif isinstance(value, str):
+            kind, value = TEXT, value.encode("utf-8")
+        else:
+            kind, value = JSON, json.dumps(value).encode("utf-8")
+        name_bytes = name.encode("utf-8")
+        parts.append(FIELD.pack(len(name_bytes), kind, len(value)))
+        parts.append(name_bytes)
+        parts.append(value)
+    return b"".join(parts)
+
+
+def decode(data) -> dict:
+    """
+    Fields of a frame. Bytes fields are memoryview slices of data, valid as long as data is.
+    """
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise ValueError("Truncated binary request")
+    magic, count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Not a binary request frame")
+
+    fields = {}
+    offset = HEADER.size
+    for _ in range(count):
+        if offset + FIELD.size > len(view):
+            raise ValueError("Truncated binary request")
+        name_length, kind, value_length = FIELD.unpack_from(view, offset)
+        offset += FIELD.size
+        end = offset + name_length + value_length
+        if end > len(view):
+            raise ValueError("Truncated binary request")
+
+        name = str(view[offset:offset + name_length], "utf-8")
+        value = view[offset + name_length:end]
+        if kind == TEXT:
+            value = str(value, "utf-8")
+        elif kind == JSON:
+            value = json.loads(str(value, "utf-8"))
+        elif kind != BYTES:
+            raise ValueError(f"Unknown field kind: {kind}")
+        fields[name] = value
+        offset = end
+
+    if offset != len(view):
+        raise ValueError("Data after the last field of the binary request")
+    return fields
+
+
+def is_binary(body: dict) -> bool:
+    return body.get("wire_format") == "binary"
+
+
+def request_body(event: dict) -> dict:
+    """
+    The fields of a Lambda request, JSON or a binary frame (told apart by its content type).
+    """
+    headers = {name.lower(): value for name, value in (event.get("headers") or {}).items()}
+    if headers.get("content-type", "").split(";")[0].strip() != CONTENT_TYPE:
+        return json.loads(event["body"])
+
+    body = event["body"]
+    data = base64.b64decode(body) if event.get("isBase64Encoded") else body.encode("latin-1") if isinstance(body, str) else body
+    return {**decode(data), "wire_format": "binary"}
+
+
+def field_bytes(body: dict, name: str):
+    # Base64 in a JSON request, the frame's own bytes in a binary one
+    value = body.get(name)
+    if isinstance(value, str):
+        return base64.b64decode(value)
+    return value
+
+
+def response(body: dict, fields: dict, headers: dict = None, status_code: int = 200) -> dict:
+    """
+    Lambda response of fields, bytes values base64 encoded for a JSON request and as they are
+    in the frame for a binary one.
+    """
+    headers = {"Access-Control-Allow-Origin": "*", **(headers or {})}
+    if is_binary(body):
+        return {
+            'statusCode': status_code,
+            'headers': {**headers, "content-type": CONTENT_TYPE},
+            'isBase64Encoded': True,
+            'body': base64.b64encode(encode(fields)).decode('ascii'),
+        }
+
+    return {
+        'statusCode': status_code,
+        'headers': {**headers, "content-type": "application/json"},
+        'body': json.dumps({
+            name: base64.b64encode(value).decode('utf-8') if isinstance(value, (bytes, bytearray, memoryview)) else value
+            for name, value in fields.items()
+        }),
+    }
+
+
+def encode_request(request_json: dict) -> bytes:
+    """
+    A JSON request as a frame, its base64 BINARY_FIELDS decoded to their bytes.
+    """
+    return encode({
+        name: base64.b64decode(value) if name in BINARY_FIELDS and isinstance(value, str) else value
+        for name, value in request_json.items()
+    })
+
+
+def decode_response(data: bytes) -> dict:
+    """
+    A binary response as the JSON response it stands for, bytes fields base64 encoded.
+    """
+    return {
+        name: base64.b64encode(value).decode("utf-8") if isinstance(value, memoryview) else value
+        for name, value in decode(data).items()
+    }
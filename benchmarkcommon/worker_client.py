@@ -0,0 +1,143 @@
+"""
+Runner side of the persistent workload worker (benchmark_worker.py in
+ec2/python and vmc/python).
+
+A worker is spawned once, imports its operation module and then answers
+JSON line requests over its stdin/stdout pipe, reporting per-phase timings.
+execute_tc_worker() runs a test case of the EC2 and Azure VM runners against it.
+"""
+import json
+import subprocess
+import time
+
+
+class WorkerError(Exception):
+    pass
+
+
+class WorkerProcess:
+
+    def __init__(self, worker_input: list[str], env: dict = None):
+        """
+        Spawn the worker and block until it is ready.
+
+        :param worker_input: Command line, e.g. ["python3.11", ".../benchmark_worker.py", "sha256"].
+        :param env: Environment of the worker, the runner's own when None.
+        """
+        spawn_start = time.perf_counter()
+        self.process = subprocess.Popen(
+            worker_input,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env=env,
+            shell=False
+        )
+
+        ready = self._read_message()
+        if not ready.get("ready"):
+            raise WorkerError(f"Worker did not start: {ready}")
+
+        # Interpreter startup + imports, as seen from the runner
+        self.startup_ms = (time.perf_counter() - spawn_start) * 1000
+        self.import_ms = ready.get("import_ms")
+
+    def _read_message(self) -> dict:
+        line = self.process.stdout.readline()
+        if not line:
+            self.process.wait()
+            raise WorkerError(f"Worker exited with code {self.process.returncode}")
+        return json.loads(line)
+
+    def request(self, request_input: dict, reinit_clients: bool = False) -> dict:
+        """
+        Send one request and return the worker's response with the runner side
+        round trip added as "round_trip_ms".
+        """
+        start = time.perf_counter()
+        self.process.stdin.write(json.dumps({"input": request_input, "reinit_clients": reinit_clients}) + "\n")
+        self.process.stdin.flush()
+        response = self._read_message()
+        response["round_trip_ms"] = (time.perf_counter() - start) * 1000
+        return response
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process.stdout.close()
+
+
+def worker_result(response: dict, execution_time: float, iteration: int, test_case: dict) -> dict:
+    phases = response["phases"]
+
+    return {
+        "execution_time": execution_time,  # ms
+        # CPU time of the worker over the request, as a percentage of one core
+        "avg_cpu_usage": round(100.0 * response["cpu_ms"] / execution_time, 2) if execution_time > 0 else 0.0,
+        "max_memory_usage": response["max_rss_mb"],
+        # RSS right after the request, the worker is not sampled while it runs
+        "avg_memory_usage": response["rss_mb"],
+        "iteration": iteration,
+        "test_case_id": test_case["id"],
+        "client_init_ms": phases["client_init_ms"],
+        "remote_ms": phases["remote_ms"],
+        "local_ms": phases["local_ms"],
+        "data_key_hits": response["data_keys"]["hits"] if response.get("data_keys") else None,
+        "data_key_misses": response["data_keys"]["misses"] if response.get("data_keys") else None,
+    }
+
+
+def execute_tc_worker(test_case: dict, env: dict = None) -> list:
+    """
+    Worker mode: cold iterations each get a freshly spawned worker (startup, imports and
+    client init are part of the measurement), warm iterations reuse one worker whose
+    clients were created during the warmup.
+
+    :param env: Environment of the workers (crypto mode, emulator endpoints), the runner's own when None.
+    """
+    worker_input = test_case["worker_input"]
+    worker_request = test_case["worker_request"]
+    test_case_results = []
+
+    def checked(response: dict) -> dict:
+        if response["error"] is not None:
+            raise WorkerError(f"Worker request failed: {response['error']} (test case {test_case['operation']} {test_case['language']})")
+        return response
+
+    if test_case["start_type"] == "warm":
+        worker = WorkerProcess(worker_input, env)
+        try:
+            print("Begin Warmup")
+            for i in range(0, 10):
+                checked(worker.request(worker_request))
+            print("Finished Warmup")
+
+            for iteration in range(test_case["iterations"]):
+                response = checked(worker.request(worker_request))
+                result = worker_result(response, response["round_trip_ms"], iteration, test_case)
+                test_case_results.append(result)
+        finally:
+            worker.close()
+    else:
+        print("No Warmup")
+        for iteration in range(test_case["iterations"]):
+            worker = WorkerProcess(worker_input, env)
+            try:
+                response = checked(worker.request(worker_request))
+            finally:
+                worker.close()
+
+            result = worker_result(response, worker.startup_ms + response["round_trip_ms"], iteration, test_case)
+            result["startup_ms"] = worker.startup_ms
+            result["import_ms"] = worker.import_ms
+            test_case_results.append(result)
+
+    print(f"Finished {len(test_case_results)} iterations in worker mode")
+
+    return test_case_results
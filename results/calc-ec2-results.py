@@ -3,6 +3,36 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import seaborn as sns
+import sys
+
+# Shared helpers live in benchmarkcommon at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarkcommon import analysis_cache
+from benchmarkcommon import figure_pipeline
+from benchmarkcommon import results_store
+from benchmarkcommon import stats
+
+# Built by cleanup-results.py, runners append to their own copy of the store
+results_store_root = "results-store"
+
+# Rendered figures by content hash, unchanged figures are not rendered again
+figure_cache_dir = ".figure-cache"
+
+# Intermediate results by results store fingerprint, only partitions with new results are recomputed
+analysis_cache_dir = ".analysis-cache"
+
+# remote is the KMS results, local the same crypto done in process (Python only, see local_crypto.py)
+crypto_mode = "remote"
+
+# Inputs per request, 1 is the single request results (batches are Python only, see request_batch.py)
+batch_size = 1
+
+# off is a data key per message, on the AES results with cached data keys (Python only, see data_key_cache.py)
+data_key_cache = "off"
+
+# Payload sizes streamed by the Python AES workloads are charted as throughput, the other figures use the operations' own inputs
+stream_modes = ["gcm", "ctr"]
+
 architectures = [
     "x86",
     "arm"
@@ -79,10 +109,14 @@ output_dir_ec2 = "assets/aws/ec2/"
 
 os.makedirs(output_dir_ec2,exist_ok=True)
 
-# Load CSV data
-def load_data(file_path: str)->pd.DataFrame:
-    """Load benchmark data from a CSV file."""
-    return pd.read_csv(file_path)
+# Load benchmark data
+def load_data(platform: str)->pd.DataFrame:
+    """Load a platform's benchmark data from the results store."""
+    return results_store.load_results(platform, root=results_store_root, filters={"crypto_mode": crypto_mode, "batch_size": batch_size, "data_key_cache": data_key_cache, "payload_bytes": 0})
+
+def load_stream_data(platform: str) -> pd.DataFrame:
+    """Load the streamed AES payload results (see aes_stream.py) from the results store."""
+    return results_store.load_results(platform, root=results_store_root, filters={"crypto_mode": crypto_mode, "data_key_cache": data_key_cache, "stream_mode": stream_modes})
 
 def lighten_color(color, factor=0.6):
     """
@@ -96,40 +130,21 @@ def lighten_color(color, factor=0.6):
 
 
 
-def ec2_gen_blox_plot(ec2_results_df: pd.DataFrame, operation: str, instance_type: str):
+def ec2_gen_blox_plot(filtered_df: pd.DataFrame, output_path: str, operation: str, instance_type: str):
     """
     Create a box plot for execution times, grouped by architecture, instance_type, operation,
     and comparing cold start and warm start across all languages.
-    """
 
-    # Filter the dataframe for the given parameters
-    filtered_df = ec2_results_df[
-        (ec2_results_df['operation'] == operation) &
-        (ec2_results_df['instance_type'] == instance_type)
-    ]
-
-    if filtered_df.empty:
-        print(f"No data available for  operation={operation}, instance_type={instance_type}")
-        return
+    filtered_df holds the rows of this operation and instance type, already trimmed to the
+    middle 95% (see ec2_gen_blox_plots).
+    """
 
     # Prepare the data for plotting
     data_by_language_and_start = {language: {'cold': [], 'warm': []} for language in languages}
 
-    for language in languages:
-        for start_option in start_options:
-            # Collect execution times for each language and start_option
-            execution_times = filtered_df[
-                (filtered_df['language'] == language) & 
-                (filtered_df['start_type'] == start_option)
-            ]['execution_time_ms']
-
-            # Filter to only the middle 95% (remove extreme outliers)
-            if not execution_times.empty:
-                lower_bound, upper_bound = np.percentile(execution_times, [2.5, 97.5])
-                execution_times = execution_times[(execution_times >= lower_bound) & (execution_times <= upper_bound)]
-
-           
-            # Append the execution times to the respective start_option list
+    # Collect execution times for each language and start_option
+    for (language, start_option), execution_times in filtered_df.groupby(['language', 'start_type'])['execution_time_ms']:
+        if language in data_by_language_and_start and start_option in start_options:
             data_by_language_and_start[language][start_option] = execution_times.tolist()
 
     # Create the box plot
@@ -176,37 +191,51 @@ def ec2_gen_blox_plot(ec2_results_df: pd.DataFrame, operation: str, instance_typ
     plt.grid(axis='y', linestyle='--', alpha=0.7)
 
     # Save the plot
-    filename = f"{output_dir_ec2}boxplot/{instance_type}_{operation}_cold_warm.png"
-    plt.savefig(filename, bbox_inches='tight')
+    plt.savefig(output_path, bbox_inches='tight')
+    plt.close()
+
+def ec2_middle_95_rows(ec2_results_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows within the middle 95% of their box (remove extreme outliers), in one pass.
+    """
+    box_columns = ['operation', 'instance_type', 'language', 'start_type']
+    trimmed_df = ec2_results_df[stats.trim_mask(ec2_results_df, box_columns, 'execution_time_ms')]
+    return trimmed_df[box_columns + ['execution_time_ms']].reset_index(drop=True)
 
-def ec2_gen_blox_plots(ec2_results_df: pd.DataFrame)->None:
+def ec2_gen_blox_plots(ec2_results_df: pd.DataFrame, trimmed_df: pd.DataFrame = None)->None:
     """
     Generate box plots for all combinations of instance_type, and operation.
     """
+    # Filter every box to only the middle 95%
+    if trimmed_df is None:
+        trimmed_df = ec2_middle_95_rows(ec2_results_df)
+
+    # One figure job per box plot, with only the rows and columns it draws
+    boxes = trimmed_df.groupby(['instance_type', 'operation'])[['language', 'start_type', 'execution_time_ms']]
+    jobs = []
     for instance_type in x86_instances + arm_instances:  # Iterate over all instance types
         for operation in operations:
-            ec2_gen_blox_plot(ec2_results_df, operation, instance_type)
+            if (instance_type, operation) not in boxes.groups:
+                print(f"No data available for  operation={operation}, instance_type={instance_type}")
+                continue
+
+            filename = f"{output_dir_ec2}boxplot/{instance_type}_{operation}_cold_warm.png"
+            jobs.append(figure_pipeline.figure_job(
+                filename, ec2_gen_blox_plot, boxes.get_group((instance_type, operation)),
+                operation=operation, instance_type=instance_type
+            ))
 
-def ec2_gen_bar_plot(ec2_results: pd.DataFrame, architecture: str, operation: str, instance_types: list) -> None:
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
+
+def ec2_gen_bar_plot(middle_95_means: pd.Series, output_path: str, architecture: str, operation: str, instance_types: list) -> None:
     '''
     Create a bar plot for EC2 instances where the Y value is the execution time in ms.
 
     X will represent the EC2 instance types. Pair of bars for each language with darker color for cold start and lighter for warm start.
     Each bar will be colored according to the language key.
-    '''
-    # Filter the dataframe for the given parameters
-    filtered_df = ec2_results[
-        (ec2_results['architecture'] == architecture) &
-        (ec2_results['operation'] == operation)
-    ]
-
-    if filtered_df.empty:
-        print(f"No data available for architecture={architecture}, operation={operation}")
-        return
-
-    # Set up the plot file path
-    filename = f"{output_dir_ec2}barplot/{architecture}_{operation}_cold_warm_ec2.png"
 
+    middle_95_means is the mean of the middle 95% of this architecture and operation, indexed by (instance type, language, start type).
+    '''
     # Begin plotting
     fig, ax = plt.subplots(figsize=(16, 10))
 
@@ -227,39 +256,9 @@ def ec2_gen_bar_plot(ec2_results: pd.DataFrame, architecture: str, operation: st
             continue  # Skip if instance type doesn't match architecture
 
         for language in languages:
-            cold_filter = filtered_df[
-                (filtered_df['instance_type'] == instance_type) & 
-                (filtered_df['language'] == language) & 
-                (filtered_df['start_type'] == 'cold') 
-            ]
-
-            cold_times = cold_filter['execution_time_ms']
-
-            # Compute the 2.5th and 97.5th percentiles to remove extreme low and high values
-            lower_bound, upper_bound = np.percentile(cold_times, [2.5, 97.5])
-
-            # Keep only the values within this range (middle 95%)
-            cold_time = cold_times[(cold_times >= lower_bound) & (cold_times <= upper_bound)]
-
-            # Get the mean of the middle 95% of cold start cases
-            cold_time_mean = cold_time.mean()
-
-            warm_filter = filtered_df[
-                (filtered_df['instance_type'] == instance_type) & 
-                (filtered_df['language'] == language) & 
-                (filtered_df['start_type'] == 'warm') 
-            ]
-
-            warm_times = warm_filter['execution_time_ms']
-
-            # Compute the 2.5th and 97.5th percentiles to remove extreme low and high values
-            lower_bound, upper_bound = np.percentile(warm_times, [2.5, 97.5])
-
-            # Keep only the values within this range (middle 95%)
-            warm_time = warm_times[(warm_times >= lower_bound) & (warm_times <= upper_bound)]
-
-            # Get the mean of the middle 95% of warm start cases
-            warm_time_mean = warm_time.mean()
+            # Get the mean of the middle 95% of cold and warm start cases
+            cold_time_mean = middle_95_means.get((instance_type, language, 'cold'), np.nan)
+            warm_time_mean = middle_95_means.get((instance_type, language, 'warm'), np.nan)
 
             # Plot cold start bar
             if not pd.isna(cold_time_mean):
@@ -293,21 +292,43 @@ def ec2_gen_bar_plot(ec2_results: pd.DataFrame, architecture: str, operation: st
 
     # Save and show the plot
     plt.tight_layout()
-    plt.savefig(filename, bbox_inches='tight')
+    plt.savefig(output_path, bbox_inches='tight')
     plt.close()
 
-def gen_bar_plots_for_ec2(ec2_results_df: pd.DataFrame) -> None:
+def ec2_middle_95_bar_means(ec2_results_df: pd.DataFrame) -> pd.Series:
+    """
+    Mean of the middle 95% of every bar of every plot at once.
+    """
+    return stats.trimmed_mean(
+        ec2_results_df, ['architecture', 'operation', 'instance_type', 'language', 'start_type'], 'execution_time_ms'
+    )
+
+def gen_bar_plots_for_ec2(ec2_results_df: pd.DataFrame, middle_95_means: pd.Series = None) -> None:
     """
     Generate bar plots for both x86 and ARM EC2 instance types for each operation.
     """
+    if middle_95_means is None:
+        middle_95_means = ec2_middle_95_bar_means(ec2_results_df)
+    measured = set(middle_95_means.index.droplevel(['instance_type', 'language', 'start_type']))
+
+    jobs = []
     for architecture in architectures:
         for operation in operations:
-            if architecture == "x86":
-                # Generate plots for x86 EC2 instances only
-                ec2_gen_bar_plot(ec2_results_df, architecture, operation, x86_instances)
-            elif architecture == "arm":
-                # Generate plots for ARM EC2 instances only
-                ec2_gen_bar_plot(ec2_results_df, architecture, operation, arm_instances)
+            if (architecture, operation) not in measured:
+                print(f"No data available for architecture={architecture}, operation={operation}")
+                continue
+
+            # Set up the plot file path
+            filename = f"{output_dir_ec2}barplot/{architecture}_{operation}_cold_warm_ec2.png"
+
+            # Generate plots for the x86 or ARM EC2 instances only
+            instance_types = x86_instances if architecture == "x86" else arm_instances
+            jobs.append(figure_pipeline.figure_job(
+                filename, ec2_gen_bar_plot, middle_95_means.loc[(architecture, operation)],
+                architecture=architecture, operation=operation, instance_types=instance_types
+            ))
+
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
 
 
 
@@ -325,32 +346,15 @@ def gen_instance_type_comparison(ec2_results_df: pd.DataFrame):
         x86_data = ec2_results_df[(ec2_results_df['instance_type'].isin([f"t2.{size}", f"t2.{size}xlarge"])) & (ec2_results_df['architecture'] == 'x86')]
         arm_data = ec2_results_df[(ec2_results_df['instance_type'].isin([f"t4g.{size}", f"t4g.{size}xlarge"])) & (ec2_results_df['architecture'] == 'arm')]
         
-        # Calculate the 2.5th and 97.5th percentiles for execution time for each operation
         if not x86_data.empty:
-            x86_percentiles = x86_data.groupby('operation')['execution_time_ms'].quantile([0.025, 0.975]).unstack()
-            # Filter the data to keep only the middle 95%
-            x86_filtered = x86_data[
-                x86_data.apply(
-                    lambda row: x86_percentiles.loc[row['operation'], 0.025] <= row['execution_time_ms'] <= x86_percentiles.loc[row['operation'], 0.975],
-                    axis=1
-                )
-            ]
-            # Calculate the mean of the middle 95% for x86
-            x86_middle_95_means.append(x86_filtered.groupby('operation')['execution_time_ms'].mean().mean())
+            # Calculate the mean of the middle 95% per operation for x86
+            x86_middle_95_means.append(stats.trimmed_mean(x86_data, 'operation', 'execution_time_ms').mean())
         else:
             x86_middle_95_means.append(np.nan)
 
         if not arm_data.empty:
-            arm_percentiles = arm_data.groupby('operation')['execution_time_ms'].quantile([0.025, 0.975]).unstack()
-            # Filter the data to keep only the middle 95%
-            arm_filtered = arm_data[
-                arm_data.apply(
-                    lambda row: arm_percentiles.loc[row['operation'], 0.025] <= row['execution_time_ms'] <= arm_percentiles.loc[row['operation'], 0.975],
-                    axis=1
-                )
-            ]
-            # Calculate the mean of the middle 95% for arm
-            arm_middle_95_means.append(arm_filtered.groupby('operation')['execution_time_ms'].mean().mean())
+            # Calculate the mean of the middle 95% per operation for arm
+            arm_middle_95_means.append(stats.trimmed_mean(arm_data, 'operation', 'execution_time_ms').mean())
         else:
             arm_middle_95_means.append(np.nan)
 
@@ -391,6 +395,22 @@ def gen_instance_type_comparison(ec2_results_df: pd.DataFrame):
     print(f"Plot saved to {filename}")
     plt.close()  # Close the plot to free up memory
 
+def render_instance_size_heatmap(df_start: pd.DataFrame, output_path: str, title: str, vmin: float = None, vmax: float = None):
+    plt.figure(figsize=(12, 8))
+
+    # Pivot for heatmap (instance_size on Y-axis, language on X-axis)
+    heatmap_data = df_start.pivot_table(index='instance_size', columns='language', values='percentage_diff')
+
+    # Plot heatmap
+    sns.heatmap(heatmap_data, annot=True, cmap="coolwarm", center=0, fmt=".1f", vmin=vmin, vmax=vmax)
+    plt.title(title)
+    plt.xlabel('Programming Language')
+    plt.ylabel('Instance Size')
+
+    # Save to disk
+    plt.savefig(output_path, dpi=300, bbox_inches="tight")
+    plt.close()
+
 def generate_arm_vs_x86_heatmaps(df):
     """
     This function generates heatmaps comparing ARM vs x86 architectures based on execution time
@@ -404,7 +424,6 @@ def generate_arm_vs_x86_heatmaps(df):
         output_dir_lambda (str): Path to the output directory where heatmaps will be saved.
     """
     output_dir = f"{output_dir_ec2}ec2_heatmaps"
-    os.makedirs(output_dir, exist_ok=True)  # Ensure output directory exists
 
     # Extract instance size (e.g., medium, xlarge, 2xlarge) from instance_type
     df['instance_size'] = df['instance_type'].str.extract(r'(medium|xlarge|2xlarge)', expand=False)
@@ -434,12 +453,7 @@ def generate_arm_vs_x86_heatmaps(df):
         return
 
     # Remove extreme cases (keep only the 95% most common cases)
-    try:
-        lower_bound, upper_bound = np.percentile(pivot_df['percentage_diff'], [2.5, 97.5])
-        pivot_df = pivot_df[(pivot_df['percentage_diff'] >= lower_bound) & (pivot_df['percentage_diff'] <= upper_bound)]
-    except ValueError:
-        print("Error during percentile calculation. Likely due to insufficient data.")
-        return
+    pivot_df = pivot_df[stats.trim_mask(pivot_df, None, 'percentage_diff')]
 
     # Check if the filtered DataFrame still contains data
     if pivot_df.empty:
@@ -447,29 +461,19 @@ def generate_arm_vs_x86_heatmaps(df):
         return
 
     # Save heatmaps for cold and warm starts
+    jobs = []
     for start in ["cold", "warm"]:
-        plt.figure(figsize=(12, 8))
-
         # Filter by start type
         df_start = pivot_df[pivot_df['start_type'] == start]
 
-        if start == "cold":
-            print(df_start)
-
-        # Pivot for heatmap (instance_size on Y-axis, language on X-axis)
-        heatmap_data = df_start.pivot_table(index='instance_size', columns='language', values='percentage_diff')
-
-        # Plot heatmap
-        sns.heatmap(heatmap_data, annot=True, cmap="coolwarm", center=0, fmt=".1f", vmin=-30, vmax=100)
-        plt.title(f'ARM vs x86 Execution Time Difference (%) All Operations (95%) - {start.capitalize()} Start \n Negative Means x86 is Faster')
-        plt.xlabel('Programming Language')
-        plt.ylabel('Instance Size')
-
-        # Save to disk
-        filename = f"{output_dir}/execution_time_diff_{start}.png"
-        plt.savefig(filename, dpi=300, bbox_inches="tight")
-        plt.close()
+        jobs.append(figure_pipeline.figure_job(
+            f"{output_dir}/execution_time_diff_{start}.png", render_instance_size_heatmap,
+            df_start[['instance_size', 'language', 'percentage_diff']],
+            title=f'ARM vs x86 Execution Time Difference (%) All Operations (95%) - {start.capitalize()} Start \n Negative Means x86 is Faster',
+            vmin=-30, vmax=100
+        ))
 
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
     print(f"Heatmaps saved in '{output_dir}' directory.")
 
 def ec2_gen_architecture_cost_comparison(ec2_results_df: pd.DataFrame):
@@ -491,7 +495,6 @@ def generate_arm_vs_x86_heatmaps_for_operations(df):
         output_dir_ec2 (str): Path to the output directory where heatmaps will be saved.
     """
     output_dir = f"{output_dir_ec2}ec2_heatmap_per_op"
-    os.makedirs(output_dir, exist_ok=True)  # Ensure output directory exists
 
     # Extract instance size (e.g., medium, xlarge, 2xlarge) from instance_type
     df['instance_size'] = df['instance_type'].str.extract(r'(medium|xlarge|2xlarge)', expand=False)
@@ -501,6 +504,7 @@ def generate_arm_vs_x86_heatmaps_for_operations(df):
 
 
     # Iterate through each operation and generate heatmap
+    jobs = []
     for operation in operations:
         # Filter DataFrame by operation
         df_operation = df_filtered[df_filtered['operation'] == operation]
@@ -526,12 +530,7 @@ def generate_arm_vs_x86_heatmaps_for_operations(df):
             continue
 
         # Remove extreme cases (keep only the 95% most common cases)
-        try:
-            lower_bound, upper_bound = np.percentile(pivot_df['percentage_diff'], [2.5, 97.5])
-            pivot_df = pivot_df[(pivot_df['percentage_diff'] >= lower_bound) & (pivot_df['percentage_diff'] <= upper_bound)]
-        except ValueError:
-            print(f"Error during percentile calculation for {operation}. Likely due to insufficient data.")
-            continue
+        pivot_df = pivot_df[stats.trim_mask(pivot_df, None, 'percentage_diff')]
 
         # Check if the filtered DataFrame still contains data
         if pivot_df.empty:
@@ -540,39 +539,84 @@ def generate_arm_vs_x86_heatmaps_for_operations(df):
 
         # Save heatmaps for cold and warm starts for each operation
         for start in ["cold", "warm"]:
-            plt.figure(figsize=(12, 8))
-
             # Filter by start type
             df_start = pivot_df[pivot_df['start_type'] == start]
 
-            # Pivot for heatmap (instance_size on Y-axis, language on X-axis)
-            heatmap_data = df_start.pivot_table(index='instance_size', columns='language', values='percentage_diff')
+            jobs.append(figure_pipeline.figure_job(
+                f"{output_dir}/execution_time_diff_{operation}_{start}.png", render_instance_size_heatmap,
+                df_start[['instance_size', 'language', 'percentage_diff']],
+                title=f'ARM vs x86 Execution Time Difference (%) - {operation} ({start.capitalize()} Start) \n Negative Means x86 is Faster'
+            ))
+
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
+    print(f"Heatmaps saved in '{output_dir}' directory.")
+
+def stream_throughput(stream_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Throughput in MB/s of every instance type, start type, operation, stream mode and payload size,
+    from the mean of the middle 95% of the execution times.
+    """
+    summary = stats.summarize(stream_df, ['instance_type', 'start_type', 'operation', 'stream_mode', 'payload_bytes'], 'execution_time_ms').reset_index()
+    summary['throughput_mb_s'] = summary['payload_bytes'] / (1024 ** 2) / (summary['trimmed_mean'] / 1000)
+    return summary[['instance_type', 'start_type', 'operation', 'stream_mode', 'payload_bytes', 'throughput_mb_s']]
+
+def render_throughput_plot(throughput_df: pd.DataFrame, output_path: str, title: str):
+    plt.figure(figsize=(12, 8))
+
+    # One line per operation and stream mode, payload sizes on a log scale
+    for (operation, stream_mode), line in throughput_df.groupby(['operation', 'stream_mode']):
+        line = line.sort_values('payload_bytes')
+        plt.plot(line['payload_bytes'], line['throughput_mb_s'], marker='o', label=f"{operation} ({stream_mode})")
+
+    plt.xscale('log', base=2)
+    plt.title(title)
+    plt.xlabel('Payload Size (bytes)')
+    plt.ylabel('Throughput (MB/s)')
+    plt.legend()
+    plt.grid(linestyle='--', alpha=0.7)
+
+    plt.savefig(output_path, dpi=300, bbox_inches="tight")
+    plt.close()
+
+def gen_throughput_plots(stream_df: pd.DataFrame):
+    """
+    Throughput over the payload size of the streamed AES results, per instance type and start type.
+    """
+    if stream_df.empty:
+        print("No streamed payload results, run the EC2 runner with --payload-sizes.")
+        return
+
+    output_dir = f"{output_dir_ec2}throughput"
+    throughput_df = stream_throughput(stream_df)
 
-            # Plot heatmap
-            sns.heatmap(heatmap_data, annot=True, cmap="coolwarm", center=0, fmt=".1f")
-            plt.title(f'ARM vs x86 Execution Time Difference (%) - {operation} ({start.capitalize()} Start) \n Negative Means x86 is Faster')
-            plt.xlabel('Programming Language')
-            plt.ylabel('Instance Size')
+    jobs = []
+    for (instance_type, start), throughput in throughput_df.groupby(['instance_type', 'start_type']):
+        jobs.append(figure_pipeline.figure_job(
+            f"{output_dir}/{instance_type}_{start}_throughput.png", render_throughput_plot,
+            throughput[['operation', 'stream_mode', 'payload_bytes', 'throughput_mb_s']].reset_index(drop=True),
+            title=f'AES Stream Throughput - {instance_type} ({start.capitalize()} Start)'
+        ))
 
-            # Save to disk
-            filename = f"{output_dir}/execution_time_diff_{operation}_{start}.png"
-            plt.savefig(filename, dpi=300, bbox_inches="tight")
-            plt.close()
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
+    print(f"Throughput plots saved in '{output_dir}' directory.")
 
-        print(f"Heatmaps for {operation} saved in '{output_dir}' directory.")
+def cached_partitions(name: str, func):
+    """
+    func of every results store partition, from the analysis cache where the partition did not change.
+    """
+    return analysis_cache.map_partitions(name, func, "ec2", results_store_root, filters={"crypto_mode": crypto_mode, "batch_size": batch_size, "data_key_cache": data_key_cache, "payload_bytes": 0}, cache_dir=analysis_cache_dir)
 
 def analyze_ec2():
     print("Running Analyzation For EC2")
     # Load the dataset
-    aws_ec2_results_file_path = "cleaned-results-aws/EC2-Results.csv"
-
-    ec2_r = load_data(aws_ec2_results_file_path)
+    ec2_r = load_data("ec2")
 
-    #ec2_gen_blox_plots(ec2_r)
-    #gen_bar_plots_for_ec2(ec2_r)
+    #ec2_gen_blox_plots(ec2_r, cached_partitions("ec2-middle-95-rows", ec2_middle_95_rows))
+    #gen_bar_plots_for_ec2(ec2_r, cached_partitions("ec2-bar-means", ec2_middle_95_bar_means))
     #gen_instance_type_comparison(ec2_r)
     #generate_arm_vs_x86_heatmaps_for_operations(ec2_r)
     generate_arm_vs_x86_heatmaps(ec2_r)
+    gen_throughput_plots(load_stream_data("ec2"))
 
 # Main execution
 if __name__ == "__main__":
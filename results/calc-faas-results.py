@@ -3,24 +3,41 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import seaborn as sns
+import sys
 
+# Shared helpers live in benchmarkcommon at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarkcommon import analysis_cache
+from benchmarkcommon import results_store
+from benchmarkcommon import stats
 
+# Built by cleanup-results.py, runners append to their own copy of the store
+results_store_root = "results-store"
 
-def load_csvs(file_names: list) -> pd.DataFrame:
-    combined_df = pd.DataFrame()
+# Intermediate results by results store fingerprint, recomputed when results are added
+analysis_cache_dir = ".analysis-cache"
 
 
 
+def load_results(platforms: list) -> pd.DataFrame:
 
-    return combined_df
+    return results_store.load_results(platforms, root=results_store_root)
+
+def execution_time_summary(faas_df: pd.DataFrame) -> pd.DataFrame:
+    return stats.summarize(faas_df, ['platform', 'architecture', 'memory_size', 'crypto_mode', 'batch_size', 'data_key_cache', 'payload_bytes', 'stream_mode', 'wire_format', 'start_type'], 'execution_time_ms')
 
 # Main execution
 if __name__ == "__main__":
     print("Analyzing FaaS")
 
-    faas_result_file_locs = ["./cleaned-results-aws/Lambda-Results.csv", "./cleaned-results-azure/Azure-Functions-Results.csv"]
-    iaas_result_file_locs = ["./cleaned-results-aws/EC2-Results.csv", "./cleaned-results-azure/Azure-VM-Results.csv"]
-    print("Loading of faas")
+    faas_platforms = ["lambda", "azure_function"]
+
+    # Execution time per platform, architecture, memory size, crypto mode, batch size, data key cache, payload, wire format and start type (trimmed mean is the middle 95%),
+    # the results are only loaded when they changed since the last run
+    faas_summary = analysis_cache.cached(
+        "faas-summary", execution_time_summary, faas_platforms, results_store_root, cache_dir=analysis_cache_dir
+    )
+    print(faas_summary.to_string(float_format="%.2f"))
 
     print("Finished Analyzing FaaS")
 
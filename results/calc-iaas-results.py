@@ -3,6 +3,19 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import seaborn as sns
+import sys
+
+# Shared helpers live in benchmarkcommon at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarkcommon import analysis_cache
+from benchmarkcommon import results_store
+from benchmarkcommon import stats
+
+# Built by cleanup-results.py, runners append to their own copy of the store
+results_store_root = "results-store"
+
+# Intermediate results by results store fingerprint, recomputed when results are added
+analysis_cache_dir = ".analysis-cache"
 
 architectures = [
     "x86",
@@ -81,28 +94,24 @@ ec2 csv header
 id,instance_type,architecture,start_type,operation,language,iteration,execution_time_ms,avg_cpu_usage_percent,max_memory_usage_mb,avg_memory_usage_mb
 '''
 
-def load_csvs(file_names: list) -> pd.DataFrame:
+def load_results(platforms: list) -> pd.DataFrame:
 
-    combined_df = pd.DataFrame()
+    return results_store.load_results(platforms, root=results_store_root)
 
-    for file in file_names:
-        if os.path.exists(file):
-            df = pd.read_csv(file)
-            combined_df = pd.concat([combined_df, df], ignore_index=True)
-        else:
-            print(f"File not found: {file}")
-
-
-    return combined_df
+def execution_time_summary(iaas_df: pd.DataFrame) -> pd.DataFrame:
+    return stats.summarize(iaas_df, ['platform', 'instance_type', 'crypto_mode', 'batch_size', 'data_key_cache', 'payload_bytes', 'stream_mode', 'start_type'], 'execution_time_ms')
 
 # Main execution
 if __name__ == "__main__":
     print("Begin Analysis of IaaS")
-    iaas_result_file_locs = ["./cleaned-results-aws/EC2-Results.csv", "./cleaned-results-azure/Azure-VM-Results.csv"]
-    print("Loading of Iaas result csvs")
-    iaas_df = load_csvs(iaas_result_file_locs)
-
-    print("Finished Loading of result csvs")
+    iaas_platforms = ["ec2", "azure_vm"]
+
+    # Execution time per platform, instance type, crypto mode, batch size, data key cache, payload and start type (trimmed mean is the middle 95%),
+    # the results are only loaded when they changed since the last run
+    iaas_summary = analysis_cache.cached(
+        "iaas-summary", execution_time_summary, iaas_platforms, results_store_root, cache_dir=analysis_cache_dir
+    )
+    print(iaas_summary.to_string(float_format="%.2f"))
 
     print("Finished Analyzing IaaS")
 
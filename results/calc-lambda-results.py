@@ -3,6 +3,39 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import seaborn as sns
+import sys
+
+# Shared helpers live in benchmarkcommon at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarkcommon import analysis_cache
+from benchmarkcommon import figure_pipeline
+from benchmarkcommon import results_store
+from benchmarkcommon import stats
+
+# Built by cleanup-results.py, runners append to their own copy of the store
+results_store_root = "results-store"
+
+# Rendered figures by content hash, unchanged figures are not rendered again
+figure_cache_dir = ".figure-cache"
+
+# Intermediate results by results store fingerprint, only partitions with new results are recomputed
+analysis_cache_dir = ".analysis-cache"
+
+# remote is the KMS results, local the same crypto done in process (Python only, see local_crypto.py)
+crypto_mode = "remote"
+
+# Inputs per request, 1 is the single request results (batches are Python only, see request_batch.py)
+batch_size = 1
+
+# off is a data key per message, on the AES results with cached data keys (Python only, see data_key_cache.py)
+data_key_cache = "off"
+
+# json is the usual base64 in JSON bodies, binary the raw bytes in a frame (Python only, see wire_format.py)
+wire_format = "json"
+
+# Payload sizes streamed by the Python AES functions are charted as throughput, the other figures use the operations' own inputs
+stream_modes = ["gcm", "ctr"]
+
 architectures = [
     "x86",
     "arm"
@@ -82,10 +115,21 @@ architecture,start_type,operation,language,memory_size,execution_time_ms,max_mem
 output_dir_lambda = "assets/aws/lambda/"
 os.makedirs(output_dir_lambda, exist_ok=True)
 
-def save_architecture_comparison_heatmaps(df):
-    output_dir = f"{output_dir_lambda}heatmaps"
-    os.makedirs(output_dir, exist_ok=True)  # Ensure output directory exists
+def execution_time_means(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mean execution time per architecture, start type, operation, language and memory size.
+    """
+    return df.groupby(
+        ['architecture', 'start_type', 'operation', 'language', 'memory_size'], observed=True
+    )['execution_time_ms'].mean().reset_index()
+
+def architecture_percentage_diff(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mean x86 vs ARM execution time difference (%) per start type, operation, language and
+    memory size, middle 95% of the differences. Shared by the heatmap functions.
 
+    df holds the results or their execution_time_means().
+    """
     # Filter relevant columns
     df_filtered = df[['architecture', 'start_type', 'operation', 'language', 'memory_size', 'execution_time_ms']]
     
@@ -100,87 +144,70 @@ def save_architecture_comparison_heatmaps(df):
     pivot_df['percentage_diff'] = ((pivot_df['x86'] - pivot_df['arm']) / pivot_df['arm']) * 100
 
     # Remove extreme cases (keep only the 95% most common cases)
-    lower_bound, upper_bound = np.percentile(pivot_df['percentage_diff'], [2.5, 97.5])
-    pivot_df = pivot_df[(pivot_df['percentage_diff'] >= lower_bound) & (pivot_df['percentage_diff'] <= upper_bound)]
+    return pivot_df[stats.trim_mask(pivot_df, None, 'percentage_diff')]
 
-    # Save heatmaps for cold and warm starts
-    for start in ["cold", "warm"]:
-        plt.figure(figsize=(12, 8))
-        
-        # Filter by start type
-        df_start = pivot_df[pivot_df['start_type'] == start]
-        
-        # Pivot for heatmap
-        heatmap_data = df_start.pivot_table(index='memory_size', columns='language', values='percentage_diff')
-
-        # Plot heatmap
-        sns.heatmap(heatmap_data, annot=True, cmap="coolwarm", center=0, fmt=".1f")
-        plt.title(f'ARM vs x86 Execution Time Difference (%) All Operations (95%) - {start.capitalize()} Start \n Negative Means x86 is Faster')
-        plt.xlabel('Programming Language')
-        plt.ylabel('Memory Size (MB)')
-
-        # Save to disk
-        filename = f"{output_dir}/execution_time_diff_{start}.png"
-        plt.savefig(filename, dpi=300, bbox_inches="tight")
-        plt.close()
+def render_percentage_diff_heatmap(df_start: pd.DataFrame, output_path: str, title: str):
+    plt.figure(figsize=(12, 8))
 
-    print(f"Heatmaps saved in '{output_dir}' directory.")
-
-def save_operation_specific_heatmaps(df):
-    output_dir = f"{output_dir_lambda}heatmap_per_op"
-    os.makedirs(output_dir, exist_ok=True)  # Ensure output directory exists
+    # Pivot for heatmap
+    heatmap_data = df_start.pivot_table(index='memory_size', columns='language', values='percentage_diff')
 
-    # Filter relevant columns
-    df_filtered = df[['architecture', 'start_type', 'operation', 'language', 'memory_size', 'execution_time_ms']]
-    
-    # Pivot to compare x86 and ARM times
-    pivot_df = df_filtered.pivot_table(
-        index=['start_type', 'operation', 'language', 'memory_size'],
-        columns='architecture',
-        values='execution_time_ms'
-    ).reset_index()
+    # Plot heatmap
+    sns.heatmap(heatmap_data, annot=True, cmap="coolwarm", center=0, fmt=".1f")
+    plt.title(title)
+    plt.xlabel('Programming Language')
+    plt.ylabel('Memory Size (MB)')
 
-    # Compute percentage difference
-    pivot_df['percentage_diff'] = ((pivot_df['x86'] - pivot_df['arm']) / pivot_df['arm']) * 100
+    # Save to disk
+    plt.savefig(output_path, dpi=300, bbox_inches="tight")
+    plt.close()
 
-    # Remove extreme cases (keep only the 95% most common cases)
-    lower_bound, upper_bound = np.percentile(pivot_df['percentage_diff'], [2.5, 97.5])
-    pivot_df = pivot_df[(pivot_df['percentage_diff'] >= lower_bound) & (pivot_df['percentage_diff'] <= upper_bound)]
+def save_architecture_comparison_heatmaps(df, pivot_df: pd.DataFrame = None):
+    output_dir = f"{output_dir_lambda}heatmaps"
 
-    # Generate heatmaps for each operation and start type
-    for operation in pivot_df['operation'].unique():
-        for start in ["cold", "warm"]:
-            plt.figure(figsize=(12, 8))
+    if pivot_df is None:
+        pivot_df = architecture_percentage_diff(df)
 
-           
+    # Save heatmaps for cold and warm starts
+    jobs = []
+    for start in ["cold", "warm"]:
+        # Filter by start type
+        df_start = pivot_df[pivot_df['start_type'] == start][['memory_size', 'language', 'percentage_diff']]
 
-            # Filter data for operation and start type
-            df_op = pivot_df[(pivot_df['operation'] == operation) & (pivot_df['start_type'] == start)]
+        jobs.append(figure_pipeline.figure_job(
+            f"{output_dir}/execution_time_diff_{start}.png", render_percentage_diff_heatmap, df_start,
+            title=f'ARM vs x86 Execution Time Difference (%) All Operations (95%) - {start.capitalize()} Start \n Negative Means x86 is Faster'
+        ))
 
-            if operation == "sha384":
-                print(df_op)
-            
-            # Pivot for heatmap
-            heatmap_data = df_op.pivot_table(index='memory_size', columns='language', values='percentage_diff')
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
+    print(f"Heatmaps saved in '{output_dir}' directory.")
 
-            # Plot heatmap
-            sns.heatmap(heatmap_data, annot=True, cmap="coolwarm", center=0, fmt=".1f")
-            plt.title(f'ARM vs x86 Execution Time Diff (%) - {operation} - {start.capitalize()} Start \n Negative Means x86 is Faster')
-            plt.xlabel('Programming Language')
-            plt.ylabel('Memory Size (MB)')
+def save_operation_specific_heatmaps(df, pivot_df: pd.DataFrame = None):
+    output_dir = f"{output_dir_lambda}heatmap_per_op"
 
-            # Save to disk
-            filename = f"{output_dir}/execution_time_diff_{operation}_{start}.png"
-            plt.savefig(filename, dpi=300, bbox_inches="tight")
-            plt.close()
+    if pivot_df is None:
+        pivot_df = architecture_percentage_diff(df)
 
+    # Generate heatmaps for each operation and start type
+    jobs = []
+    for (operation, start), df_op in pivot_df.groupby(['operation', 'start_type']):
+        jobs.append(figure_pipeline.figure_job(
+            f"{output_dir}/execution_time_diff_{operation}_{start}.png", render_percentage_diff_heatmap,
+            df_op[['memory_size', 'language', 'percentage_diff']],
+            title=f'ARM vs x86 Execution Time Diff (%) - {operation} - {start.capitalize()} Start \n Negative Means x86 is Faster'
+        ))
+
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
     print(f"Heatmaps saved in '{output_dir}' directory.")
 
+# Load benchmark data
+def load_data(platform: str)->pd.DataFrame:
+    """Load a platform's benchmark data from the results store."""
+    return results_store.load_results(platform, root=results_store_root, filters={"crypto_mode": crypto_mode, "batch_size": batch_size, "data_key_cache": data_key_cache, "payload_bytes": 0, "wire_format": wire_format})
 
-# Load CSV data
-def load_data(file_path: str)->pd.DataFrame:
-    """Load benchmark data from a CSV file."""
-    return pd.read_csv(file_path)
+def load_stream_data(platform: str) -> pd.DataFrame:
+    """Load the streamed AES payload results (see aes_stream.py) from the results store."""
+    return results_store.load_results(platform, root=results_store_root, filters={"crypto_mode": crypto_mode, "data_key_cache": data_key_cache, "stream_mode": stream_modes, "wire_format": wire_format})
 
 def lighten_color(color, factor=0.6):
     """
@@ -192,42 +219,21 @@ def lighten_color(color, factor=0.6):
     rgb = [int(c * factor) for c in rgb]  # Apply factor to lighten
     return f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"  # Convert back to hex
 
-def gen_blox_plot(lambda_results_df: pd.DataFrame, architecture: str, operation: str, memory_size: int):
+def gen_blox_plot(filtered_df: pd.DataFrame, output_path: str, architecture: str, operation: str, memory_size: int):
     """
     Create a box plot for execution times, grouped by architecture, memory size, operation,
     and comparing cold start and warm start across all languages.
-    """
 
-    # Filter the dataframe for the given parameters
-    filtered_df = lambda_results_df[
-        (lambda_results_df['architecture'] == architecture) &
-        (lambda_results_df['operation'] == operation) &
-        (lambda_results_df['memory_size'] == memory_size)
-    ]
-
-    if filtered_df.empty:
-        print(f"No data available for architecture={architecture}, operation={operation}, memory_size={memory_size}")
-        return
+    filtered_df holds the rows of this architecture, memory size and operation, already
+    trimmed to the middle 95% (see gen_blox_plots).
+    """
 
     # Prepare the data for plotting
     data_by_language_and_start = {language: {'cold': [], 'warm': []} for language in languages}
 
-    for language in languages:
-        for start_option in start_options:
-            # Collect execution times for each language and start_option
-            execution_times = filtered_df[
-                (filtered_df['language'] == language) & 
-                (filtered_df['start_type'] == start_option)
-            ]['execution_time_ms']
-
-            # Filter to only the top 95% (remove extreme outliers)
-            if not execution_times.empty:
-
-                lower_bound, upper_bound = np.percentile(execution_times, [2.5, 97.5])
-                execution_times = execution_times[(execution_times >= lower_bound) & (execution_times <= upper_bound)]
-
-            
-            # Append the execution times to the respective start_option list
+    # Collect execution times for each language and start_option
+    for (language, start_option), execution_times in filtered_df.groupby(['language', 'start_type'])['execution_time_ms']:
+        if language in data_by_language_and_start and start_option in start_options:
             data_by_language_and_start[language][start_option] = execution_times.tolist()
 
     # Create the box plot
@@ -274,39 +280,51 @@ def gen_blox_plot(lambda_results_df: pd.DataFrame, architecture: str, operation:
     plt.grid(axis='y', linestyle='--', alpha=0.7)
 
     # Save the plot
-    filename = f"{output_dir_lambda}boxplot/{architecture}_{memory_size}MB_{operation}_cold_warm.png"
-    plt.savefig(filename, bbox_inches='tight')
+    plt.savefig(output_path, bbox_inches='tight')
     plt.close()  # Close the figure to free memory
-    #print(f"Saved box plot (Cold/Warm Comparison with Spacing): {filename}")
 
-def gen_blox_plots(lambda_results_df: pd.DataFrame)->None:
+def middle_95_rows(lambda_results_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows within the middle 95% of their box (remove extreme outliers), in one pass.
+    """
+    box_columns = ['architecture', 'operation', 'memory_size', 'language', 'start_type']
+    trimmed_df = lambda_results_df[stats.trim_mask(lambda_results_df, box_columns, 'execution_time_ms')]
+    return trimmed_df[box_columns + ['execution_time_ms']].reset_index(drop=True)
+
+def gen_blox_plots(lambda_results_df: pd.DataFrame, trimmed_df: pd.DataFrame = None)->None:
+
+    # Filter every box to only the middle 95%
+    if trimmed_df is None:
+        trimmed_df = middle_95_rows(lambda_results_df)
 
+    # One figure job per box plot, with only the rows and columns it draws
+    boxes = trimmed_df.groupby(['architecture', 'memory_size', 'operation'])[['language', 'start_type', 'execution_time_ms']]
+    jobs = []
     for architecture in architectures:
         for memory_size in memory_sizes:
             for operation in operations:
-                gen_blox_plot(lambda_results_df, architecture,operation, memory_size)
+                if (architecture, memory_size, operation) not in boxes.groups:
+                    print(f"No data available for architecture={architecture}, operation={operation}, memory_size={memory_size}")
+                    continue
+
+                filename = f"{output_dir_lambda}boxplot/{architecture}_{memory_size}MB_{operation}_cold_warm.png"
+                jobs.append(figure_pipeline.figure_job(
+                    filename, gen_blox_plot, boxes.get_group((architecture, memory_size, operation)),
+                    architecture=architecture, operation=operation, memory_size=memory_size
+                ))
+
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
     
 
-def gen_bar_plot(lambda_results_df: pd.DataFrame, architecture: str, operation: str)->None:
+def gen_bar_plot(middle_95_means: pd.Series, output_path: str, architecture: str, operation: str)->None:
     '''
     Create a bar plot where the Y value is the execution time in ms.
 
     X should be memory size. Pair of bar plot for each language darker color representing the cold start, lighter color representing the warm start.
     Each bar should be a color relating to language key.
-    '''
-    # Filter the dataframe for the given parameters
-    filtered_df = lambda_results_df[
-        (lambda_results_df['architecture'] == architecture) &
-        (lambda_results_df['operation'] == operation) 
-    ]
-
-    if filtered_df.empty:
-        print(f"No data available for architecture={architecture}, operation={operation}")
-        return
-
-    # Set up the plot file path
-    filename = f"{output_dir_lambda}barplot/{architecture}_{operation}_cold_warm.png"
 
+    middle_95_means is the mean of the middle 95% of this architecture and operation, indexed by (memory size, language, start type).
+    '''
     # Begin plotting
     fig, ax = plt.subplots(figsize=(16, 10))
     
@@ -320,45 +338,17 @@ def gen_bar_plot(lambda_results_df: pd.DataFrame, architecture: str, operation:
         x_pos = x_base  # Starting x position for this memory size group
         for language in languages:
 
-            cold_times = filtered_df[
-                (filtered_df['memory_size'] == memory_size) &
-                (filtered_df['language'] == language) &
-                (filtered_df['start_type'] == 'cold')
-            ]['execution_time_ms']
-
-            # Compute the 2.5th and 97.5th percentiles to remove extreme low and high values
-            lower_bound, upper_bound = np.percentile(cold_times, [2.5, 97.5])
-
-            # Keep only the values within this range (middle 95%)
-            cold_time = cold_times[(cold_times >= lower_bound) & (cold_times <= upper_bound)]
-
-            # Get the mean of the middle 95% of cold start cases
-            cold_time_mean = cold_time.mean()
-
-
-            warm_times = filtered_df[
-                (filtered_df['memory_size'] == memory_size) &
-                (filtered_df['language'] == language) &
-                (filtered_df['start_type'] == 'warm')
-            ]['execution_time_ms']
-            
-
-            # Compute the 2.5th and 97.5th percentiles to remove extreme low and high values
-            lower_bound, upper_bound = np.percentile(warm_times, [2.5, 97.5])
-
-            # Keep only the values within this range (middle 95%)
-            warm_time = warm_times[(warm_times >= lower_bound) & (warm_times <= upper_bound)]
-
-            # Get the mean of the middle 95% of warm start cases
-            warm_time_mean = warm_time.mean()
+            # Get the mean of the middle 95% of cold and warm start cases
+            cold_time_mean = middle_95_means.get((memory_size, language, 'cold'), np.nan)
+            warm_time_mean = middle_95_means.get((memory_size, language, 'warm'), np.nan)
 
             # Plot cold start
             if not pd.isna(cold_time_mean):
-                ax.bar(x_pos, cold_time, width=bar_width, color=lighten_color(languageKey[language]), label=f"{language} (cold)")
+                ax.bar(x_pos, cold_time_mean, width=bar_width, color=lighten_color(languageKey[language]), label=f"{language} (cold)")
             
             # Plot warm start
             if not pd.isna(warm_time_mean):
-                ax.bar(x_pos + bar_width, warm_time, width=bar_width, color=languageKey[language], label=f"{language} (warm)")
+                ax.bar(x_pos + bar_width, warm_time_mean, width=bar_width, color=languageKey[language], label=f"{language} (warm)")
 
             # Move x position for the next language pair
             x_pos += 2 * bar_width
@@ -383,36 +373,48 @@ def gen_bar_plot(lambda_results_df: pd.DataFrame, architecture: str, operation:
 
     # Save and show the plot
     plt.tight_layout()
-    plt.savefig(filename, bbox_inches='tight')
+    plt.savefig(output_path, bbox_inches='tight')
     plt.close()
 
-def gen_bar_plots(lambda_results_df: pd.DataFrame)->None:
+def middle_95_bar_means(lambda_results_df: pd.DataFrame) -> pd.Series:
+    """
+    Mean of the middle 95% of every bar of every plot at once.
+    """
+    return stats.trimmed_mean(
+        lambda_results_df, ['architecture', 'operation', 'memory_size', 'language', 'start_type'], 'execution_time_ms'
+    )
+
+def gen_bar_plots(lambda_results_df: pd.DataFrame, middle_95_means: pd.Series = None)->None:
+
+    if middle_95_means is None:
+        middle_95_means = middle_95_bar_means(lambda_results_df)
+    measured = set(middle_95_means.index.droplevel(['memory_size', 'language', 'start_type']))
 
+    jobs = []
     for architecture in architectures:
         for operation in operations:
-            gen_bar_plot(lambda_results_df, architecture, operation )
+            if (architecture, operation) not in measured:
+                print(f"No data available for architecture={architecture}, operation={operation}")
+                continue
 
+            # Set up the plot file path
+            filename = f"{output_dir_lambda}barplot/{architecture}_{operation}_cold_warm.png"
+            jobs.append(figure_pipeline.figure_job(
+                filename, gen_bar_plot, middle_95_means.loc[(architecture, operation)],
+                architecture=architecture, operation=operation
+            ))
+
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
 
-def gen_architecture_comparison(lambda_results_df: pd.DataFrame):
-    # Step 1: Calculate the 2.5th and 97.5th percentiles for execution time based on architecture and memory size
-    percentiles = lambda_results_df.groupby(['architecture', 'memory_size'])['execution_time_ms'].quantile([0.025, 0.975]).unstack()
-
-    # Step 2: Filter the data to keep only the middle 95% (between 2.5th and 97.5th percentiles)
-    filtered_data = lambda_results_df[
-        lambda_results_df.apply(
-            lambda row: percentiles.loc[row['architecture'], row['memory_size']][0.025] <= row['execution_time_ms'] <= percentiles.loc[row['architecture'], row['memory_size']][0.975],
-            axis=1
-        )
-    ]
 
-    # Step 3: Group by architecture and memory size, then calculate the mean of the middle 95%
+def gen_architecture_comparison(lambda_results_df: pd.DataFrame):
+    # Step 1: Mean of the middle 95% (between 2.5th and 97.5th percentiles) per architecture and memory size
     mean_execution_by_memory = (
-        filtered_data.groupby(['architecture', 'memory_size'])['execution_time_ms']
-        .mean()
+        stats.trimmed_mean(lambda_results_df, ['architecture', 'memory_size'], 'execution_time_ms')
         .reset_index()
     )
 
-    # Step 4: Pivot the table for easier percentage difference calculation
+    # Step 2: Pivot the table for easier percentage difference calculation
     pivot = mean_execution_by_memory.pivot(index='memory_size', columns='architecture', values='execution_time_ms').reset_index()
     # Calculate percentage difference (arm vs x86)
     pivot['percentage_difference'] = ((pivot['x86'] - pivot['arm']) / pivot['arm']) * 100 * -1 # make it positive
@@ -467,41 +469,30 @@ def gen_architecture_comparison(lambda_results_df: pd.DataFrame):
 
     print(f"Plot saved to {output_path}")
 
-def calculate_cost(row):
-
-    if row['architecture'] == 'x86':
-
-        return row['billed_duration_ms'] * lambda_x86_pricing_per_ms[row['memory_size']]
-
-    elif row['architecture'] == 'arm':
-
-        return row['billed_duration_ms'] * lambda_arm_pricing_per_ms[row['memory_size']]
+def calculate_cost(df: pd.DataFrame) -> pd.Series:
+    """
+    Cost of every invocation from its billed duration, architecture and memory size (0 for unknown architectures).
+    """
+    price_per_ms = np.select(
+        [df['architecture'] == 'x86', df['architecture'] == 'arm'],
+        [df['memory_size'].map(lambda_x86_pricing_per_ms), df['memory_size'].map(lambda_arm_pricing_per_ms)],
+        default=0
+    )
 
-    return 0
+    return df['billed_duration_ms'] * price_per_ms
 
 def gen_architecture_cost_comparison(lambda_results_df: pd.DataFrame):
     # Relevant columns to work with
     relevant_columns = ['architecture', 'memory_size', 'billed_duration_ms']
 
     # Filter for relevant columns
-    df_filtered = lambda_results_df[relevant_columns]
+    df_filtered = lambda_results_df[relevant_columns].copy()
 
     # Add a cost column based on architecture and memory size
-    df_filtered['cost'] = df_filtered.apply(calculate_cost, axis=1)
+    df_filtered['cost'] = calculate_cost(df_filtered)
 
-    # Compute the 2.5th and 97.5th percentiles for cost based on architecture and memory size
-    percentiles = df_filtered.groupby(['architecture', 'memory_size'])['cost'].quantile([0.025, 0.975]).unstack()
-
-    # Filter the data to keep only the middle 95% (between 2.5th and 97.5th percentiles)
-    percentile_95_cost = df_filtered[
-        df_filtered.apply(
-            lambda row: percentiles.loc[row['architecture'], row['memory_size']][0.025] <= row['cost'] <= percentiles.loc[row['architecture'], row['memory_size']][0.975],
-            axis=1
-        )
-    ]
-
-    # Pivot for easier plotting
-    cost_pivot = percentile_95_cost.pivot_table(index='memory_size', columns='architecture', values='cost', aggfunc='mean')
+    # Mean of the middle 95% cost (between 2.5th and 97.5th percentiles), pivoted for easier plotting
+    cost_pivot = stats.trimmed_mean(df_filtered, ['memory_size', 'architecture'], 'cost').unstack('architecture')
 
     # Calculate percentage difference (x86 vs ARM)
     cost_pivot['percent_diff'] = (
@@ -544,96 +535,149 @@ def gen_architecture_cost_comparison(lambda_results_df: pd.DataFrame):
     output_path = f"{output_dir_lambda}costs_all_arches_over_all_ops/mean_cost_by_architecture_and_memory_size.png"
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
 
-def gen_architecture_cost_comparison_by_operation_and_language(lambda_results_df: pd.DataFrame):
+def render_cost_comparison(cost_pivot: pd.DataFrame, output_path: str, operation: str, language: str):
+    # Plot the data
+    bar_width = 0.35  # Width of the bars
+    memory_sizes = cost_pivot.index
+    x = np.arange(len(memory_sizes))  # X-axis positions
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    # Plot bars for each architecture
+    ax.bar(x - bar_width / 2, cost_pivot['x86'], bar_width, label='x86', color='blue')
+    ax.bar(x + bar_width / 2, cost_pivot['arm'], bar_width, label='ARM', color='orange')
+
+    # Add percentage difference annotations above the bars
+    for i, memory_size in enumerate(memory_sizes):
+        percent_diff = cost_pivot.loc[memory_size, 'percent_diff']
+        ax.text(
+            x[i],  # X position
+            max(cost_pivot.loc[memory_size, ['x86', 'arm']]),  # Y position (above the taller bar)
+            f'{percent_diff:.1f}%',  # Format as percentage
+            ha='center', va='bottom', fontsize=10, color='black'
+        )
+
+    # Add labels, title, and legend
+    ax.set_xlabel('Memory Size (MB)', fontsize=12)
+    ax.set_ylabel('Mean Cost 1e-6 ($/ms)', fontsize=12)
+    ax.set_title(f'{operation.capitalize()} ({language.capitalize()}) - Mean Cost by Architecture (95%)', fontsize=14)
+    ax.set_xticks(x)
+    ax.set_xticklabels(memory_sizes)
+    plt.legend(title="Architecture")
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+
+    plt.tight_layout()
+
+    # Save the plot to disk
+    plt.savefig(output_path, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+def middle_95_operation_costs(lambda_results_df: pd.DataFrame) -> pd.Series:
+    """
+    Mean of the middle 95% cost for every operation, language, memory size and architecture at once.
+    """
     # Filter relevant columns
     relevant_columns = ['architecture', 'memory_size', 'billed_duration_ms', 'operation', 'language']
-    df_filtered = lambda_results_df[relevant_columns]
+    df_filtered = lambda_results_df[relevant_columns].copy()
 
     # Add a cost column based on architecture and memory size
-    df_filtered['cost'] = df_filtered.apply(calculate_cost, axis=1)
+    df_filtered['cost'] = calculate_cost(df_filtered)
+
+    return stats.trimmed_mean(df_filtered, ['operation', 'language', 'memory_size', 'architecture'], 'cost')
+
+def gen_architecture_cost_comparison_by_operation_and_language(lambda_results_df: pd.DataFrame, middle_95_costs: pd.Series = None):
+    if middle_95_costs is None:
+        middle_95_costs = middle_95_operation_costs(lambda_results_df)
+    measured = set(middle_95_costs.index.droplevel(['memory_size', 'architecture']))
 
     # Iterate through each operation and language
+    jobs = []
     for operation in operations:
         for language in languages:
-            # Filter data for the current operation and language
-            df_subset = df_filtered[(df_filtered['operation'] == operation) & (df_filtered['language'] == language)]
-            
-            if df_subset.empty:
+            if (operation, language) not in measured:
                 continue  # Skip if no data for this combination
 
-
-
-            # Step 3: Compute the 2.5th and 97.5th percentiles for cost based on architecture and memory size
-            percentiles = df_filtered.groupby(['architecture', 'memory_size'])['cost'].quantile([0.025, 0.975]).unstack()
-
-            # Step 4: Filter the data to keep only the middle 95% (between 2.5th and 97.5th percentiles)
-            percentile_95_cost = df_filtered[
-                df_filtered.apply(
-                    lambda row: percentiles.loc[row['architecture'], row['memory_size']][0.025] <= row['cost'] <= percentiles.loc[row['architecture'], row['memory_size']][0.975],
-                    axis=1
-                )
-            ]
-
-
             # Pivot the data for easier plotting
-            cost_pivot = percentile_95_cost.pivot_table(index='memory_size', columns='architecture', values='cost', aggfunc='mean')
+            cost_pivot = middle_95_costs.loc[(operation, language)].unstack('architecture')
 
             # Calculate percentage difference (x86 vs ARM)
             cost_pivot['percent_diff'] = (
                 (cost_pivot['x86'] - cost_pivot['arm']) / cost_pivot['x86'] * 100
             )
 
-            # Plot the data
-            bar_width = 0.35  # Width of the bars
-            memory_sizes = cost_pivot.index
-            x = np.arange(len(memory_sizes))  # X-axis positions
-
-            fig, ax = plt.subplots(figsize=(10, 6))
-
-            # Plot bars for each architecture
-            ax.bar(x - bar_width / 2, cost_pivot['x86'], bar_width, label='x86', color='blue')
-            ax.bar(x + bar_width / 2, cost_pivot['arm'], bar_width, label='ARM', color='orange')
-
-            # Add percentage difference annotations above the bars
-            for i, memory_size in enumerate(memory_sizes):
-                percent_diff = cost_pivot.loc[memory_size, 'percent_diff']
-                ax.text(
-                    x[i],  # X position
-                    max(cost_pivot.loc[memory_size, ['x86', 'arm']]),  # Y position (above the taller bar)
-                    f'{percent_diff:.1f}%',  # Format as percentage
-                    ha='center', va='bottom', fontsize=10, color='black'
-                )
-
-            # Add labels, title, and legend
-            ax.set_xlabel('Memory Size (MB)', fontsize=12)
-            ax.set_ylabel('Mean Cost 1e-6 ($/ms)', fontsize=12)
-            ax.set_title(f'{operation.capitalize()} ({language.capitalize()}) - Mean Cost by Architecture (95%)', fontsize=14)
-            ax.set_xticks(x)
-            ax.set_xticklabels(memory_sizes)
-            plt.legend(title="Architecture")
-            plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-            plt.tight_layout()
-
-            # Save the plot to disk
             output_path = f"{output_dir_lambda}cost_of_ops/{operation}_{language}_cost_comparison.png"
-            plt.savefig(output_path, dpi=300, bbox_inches='tight')
-            print("Done")
+            jobs.append(figure_pipeline.figure_job(output_path, render_cost_comparison, cost_pivot, operation=operation, language=language))
 
-            # Optionally, show the plot
-            plt.close(fig)
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
 
-def analyze_lambda():
-    aws_lambda_results_file_path = "cleaned-results-aws/Lambda-Results.csv"
+def stream_throughput(stream_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Throughput in MB/s of every architecture, memory size, start type, operation, stream mode and payload size,
+    from the mean of the middle 95% of the durations.
+    """
+    summary = stats.summarize(stream_df, ['architecture', 'memory_size', 'start_type', 'operation', 'stream_mode', 'payload_bytes'], 'execution_time_ms').reset_index()
+    summary['throughput_mb_s'] = summary['payload_bytes'] / (1024 ** 2) / (summary['trimmed_mean'] / 1000)
+    return summary[['architecture', 'memory_size', 'start_type', 'operation', 'stream_mode', 'payload_bytes', 'throughput_mb_s']]
+
+def render_throughput_plot(throughput_df: pd.DataFrame, output_path: str, title: str):
+    plt.figure(figsize=(12, 8))
+
+    # One line per memory size, operation and stream mode, payload sizes on a log scale
+    for (memory_size, operation, stream_mode), line in throughput_df.groupby(['memory_size', 'operation', 'stream_mode']):
+        line = line.sort_values('payload_bytes')
+        plt.plot(line['payload_bytes'], line['throughput_mb_s'], marker='o', label=f"{memory_size}MB {operation} ({stream_mode})")
+
+    plt.xscale('log', base=2)
+    plt.title(title)
+    plt.xlabel('Payload Size (bytes)')
+    plt.ylabel('Throughput (MB/s)')
+    plt.legend()
+    plt.grid(linestyle='--', alpha=0.7)
+
+    plt.savefig(output_path, dpi=300, bbox_inches="tight")
+    plt.close()
+
+def gen_throughput_plots(stream_df: pd.DataFrame):
+    """
+    Throughput over the payload size of the streamed AES results, per architecture and start type.
+    """
+    if stream_df.empty:
+        print("No streamed payload results, run the Lambda runner with --payload-sizes.")
+        return
+
+    output_dir = f"{output_dir_lambda}throughput"
+    throughput_df = stream_throughput(stream_df)
+
+    jobs = []
+    for (architecture, start), throughput in throughput_df.groupby(['architecture', 'start_type']):
+        jobs.append(figure_pipeline.figure_job(
+            f"{output_dir}/{architecture}_{start}_throughput.png", render_throughput_plot,
+            throughput[['memory_size', 'operation', 'stream_mode', 'payload_bytes', 'throughput_mb_s']].reset_index(drop=True),
+            title=f'AES Stream Throughput - {architecture} ({start.capitalize()} Start)'
+        ))
+
+    figure_pipeline.render_figures(jobs, figure_cache_dir)
+    print(f"Throughput plots saved in '{output_dir}' directory.")
 
-    lambda_results_df = load_data(aws_lambda_results_file_path)
-    #save_architecture_comparison_heatmaps(lambda_results_df)
-    #save_operation_specific_heatmaps(lambda_results_df)
-    #gen_blox_plots(lambda_results_df)
-    #gen_bar_plots(lambda_results_df)
+def cached_partitions(name: str, func):
+    """
+    func of every results store partition, from the analysis cache where the partition did not change.
+    """
+    return analysis_cache.map_partitions(name, func, "lambda", results_store_root, filters={"crypto_mode": crypto_mode, "batch_size": batch_size, "data_key_cache": data_key_cache, "payload_bytes": 0, "wire_format": wire_format}, cache_dir=analysis_cache_dir)
+
+def analyze_lambda():
+    lambda_results_df = load_data("lambda")
+
+    # Aggregated once, shared by both heatmap functions
+    #percentage_diff_df = architecture_percentage_diff(cached_partitions("lambda-execution-means", execution_time_means))
+    #save_architecture_comparison_heatmaps(lambda_results_df, percentage_diff_df)
+    #save_operation_specific_heatmaps(lambda_results_df, percentage_diff_df)
+    #gen_blox_plots(lambda_results_df, cached_partitions("lambda-middle-95-rows", middle_95_rows))
+    #gen_bar_plots(lambda_results_df, cached_partitions("lambda-bar-means", middle_95_bar_means))
     #gen_architecture_comparison(lambda_results_df)
     #gen_architecture_cost_comparison(lambda_results_df)
-    #gen_architecture_cost_comparison_by_operation_and_language(lambda_results_df)
+    #gen_architecture_cost_comparison_by_operation_and_language(lambda_results_df, cached_partitions("lambda-operation-costs", middle_95_operation_costs))
+    gen_throughput_plots(load_stream_data("lambda"))
 
 
 
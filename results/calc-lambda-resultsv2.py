@@ -3,6 +3,15 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import seaborn as sns
+import sys
+
+# Shared helpers live in benchmarkcommon at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarkcommon import results_store
+from benchmarkcommon import stats
+
+# Built by cleanup-results.py, runners append to their own copy of the store
+results_store_root = "results-store"
 import itertools
 
 architectures = [
@@ -84,10 +93,10 @@ architecture,start_type,operation,language,memory_size,execution_time_ms,max_mem
 # Define output directory for saved plots
 output_dir_lambda = "assets/aws/lambda/"
 os.makedirs(output_dir_lambda, exist_ok=True)
-# Load CSV data
-def load_data(file_path: str)->pd.DataFrame:
-    """Load benchmark data from a CSV file."""
-    return pd.read_csv(file_path)
+# Load benchmark data
+def load_data(platform: str)->pd.DataFrame:
+    """Load a platform's benchmark data from the results store."""
+    return results_store.load_results(platform, root=results_store_root)
 
 def lighten_color(color, factor=0.6):
     """
@@ -99,12 +108,9 @@ def lighten_color(color, factor=0.6):
     rgb = [int(c * factor) for c in rgb]  # Apply factor to lighten
     return f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"  # Convert back to hex
 
-# Define a function to filter middle 95% and compute mean
-def middle_95_mean_execution_time_ms(group):
-    lower = group['execution_time_ms'].quantile(0.025)  # 2.5th percentile
-    upper = group['execution_time_ms'].quantile(0.975)  # 97.5th percentile
-    filtered_group = group[(group['execution_time_ms'] >= lower) & (group['execution_time_ms'] <= upper)]
-    return filtered_group['execution_time_ms'].mean()
+# Middle 95% mean execution time per group, in one vectorized pass over all groups
+def middle_95_mean_execution_time_ms(df: pd.DataFrame, by: list) -> pd.Series:
+    return stats.trimmed_mean(df, by, 'execution_time_ms')
 
 
 def boxplot_per_operation_compare_x86_arm_start_type(df: pd.DataFrame):
@@ -112,9 +118,9 @@ def boxplot_per_operation_compare_x86_arm_start_type(df: pd.DataFrame):
     df_filtered = df[['architecture', 'start_type', 'operation', 'language', 'memory_size', 'execution_time_ms']]
     
     # Compute the middle 95% mean execution time
-    result = df_filtered.groupby(
-        ['architecture', 'start_type', 'operation', 'language', 'memory_size']
-    ).apply(middle_95_mean_execution_time_ms).reset_index(name='mean_execution_time_ms')
+    result = middle_95_mean_execution_time_ms(
+        df_filtered, ['architecture', 'start_type', 'operation', 'language', 'memory_size']
+    ).reset_index(name='mean_execution_time_ms')
 
     # Pivot the data to get x86 and ARM side by side
     pivot_df = result.pivot_table(
@@ -132,9 +138,9 @@ def heat_map_per_operation_compare_x86_arm_start_type(df: pd.DataFrame):
     df_filtered = df[['architecture', 'start_type', 'operation', 'language', 'memory_size', 'execution_time_ms']]
     
     # Compute the middle 95% mean execution time
-    result = df_filtered.groupby(
-        ['architecture', 'start_type', 'operation', 'language', 'memory_size']
-    ).apply(middle_95_mean_execution_time_ms).reset_index(name='mean_execution_time_ms')
+    result = middle_95_mean_execution_time_ms(
+        df_filtered, ['architecture', 'start_type', 'operation', 'language', 'memory_size']
+    ).reset_index(name='mean_execution_time_ms')
 
     # Pivot the data to get x86 and ARM side by side
     pivot_df = result.pivot_table(
@@ -192,9 +198,7 @@ def check_data(df:pd.DataFrame):
 
 
 def analyze_lambda():
-    aws_lambda_results_file_path = "cleaned-results-aws/Lambda-Results.csv"
-
-    lambda_results_df = load_data(aws_lambda_results_file_path)
+    lambda_results_df = load_data("lambda")
     heat_map_per_operation_compare_x86_arm_start_type(lambda_results_df)
     print("Finished Analyzing Lambdas.")
 
@@ -1,72 +1,91 @@
 import pandas as pd
 import os
+import sys
+
+# Shared helpers live in benchmarkcommon at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarkcommon import results_store
+
+results_store_root = "results-store"
 
 # File lists
 lambda_files = [
-    "Lambda-Benchmark-Results-cold-rust-python-typescript.csv",
-    "Lambda-Benchmark-Results-warm-rust-python-typescript.csv",
-    "Lambda-Benchmark-Results-cold-java-csharp-go.csv",
-    "Lambda-Benchmark-Results-warm-java-csharp-go.csv"
+    "raw-results-aws/Lambda-Benchmark-Results-cold-rust-python-typescript.csv",
+    "raw-results-aws/Lambda-Benchmark-Results-warm-rust-python-typescript.csv",
+    "raw-results-aws/Lambda-Benchmark-Results-cold-java-csharp-go.csv",
+    "raw-results-aws/Lambda-Benchmark-Results-warm-java-csharp-go.csv"
 ]
 
 ec2_files = [
-    "aarch64-t4g.2xlarge-AWSEC2-Benchmarkresults.csv",
-    "aarch64-t4g.xlarge-AWSEC2-Benchmarkresults.csv",
-    "x86_64-t2.medium-AWSEC2-Benchmarkresults.csv",
-    "aarch64-t4g.medium-AWSEC2-Benchmarkresults.csv",
-    "x86_64-t2.2xlarge-AWSEC2-Benchmarkresults.csv",
-    "x86_64-t2.xlarge-AWSEC2-Benchmarkresults.csv"
+    "raw-results-aws/aarch64-t4g.2xlarge-AWSEC2-Benchmarkresults.csv",
+    "raw-results-aws/aarch64-t4g.xlarge-AWSEC2-Benchmarkresults.csv",
+    "raw-results-aws/x86_64-t2.medium-AWSEC2-Benchmarkresults.csv",
+    "raw-results-aws/aarch64-t4g.medium-AWSEC2-Benchmarkresults.csv",
+    "raw-results-aws/x86_64-t2.2xlarge-AWSEC2-Benchmarkresults.csv",
+    "raw-results-aws/x86_64-t2.xlarge-AWSEC2-Benchmarkresults.csv"
 ]
 
-
-
-
 azure_vm_files = [
-"aarch64-standard_b2pls_v2-AzureVM-Benchmarkresults.csv",
-"aarch64-standard_b4ps_v2-AzureVM-Benchmarkresults.csv",   
-"aarch64-standard_b8ps_v2-AzureVM-Benchmarkresults.csv",
-"x86_64-standard_b2s-AzureVM-Benchmarkresults.csv",
-"x86_64-standard_b4ms-AzureVM-Benchmarkresults.csv"
-"x86_64-standard_b8ms-AzureVM-Benchmarkresults.csv"
+    "raw-results-azure/aarch64-standard_b2pls_v2-AzureVM-Benchmarkresults.csv",
+    "raw-results-azure/aarch64-standard_b4ps_v2-AzureVM-Benchmarkresults.csv",
+    "raw-results-azure/aarch64-standard_b8ps_v2-AzureVM-Benchmarkresults.csv",
+    "raw-results-azure/x86_64-standard_b2s-AzureVM-Benchmarkresults.csv",
+    "raw-results-azure/x86_64-standard_b4ms-AzureVM-Benchmarkresults.csv",
+    "raw-results-azure/x86_64-standard_b8ms-AzureVM-Benchmarkresults.csv"
+]
+
+# Produced by raw-results-azure/sortAzureFunctionData.py from the App Insights export
+azure_function_files = [
+    "cleaned-results-azure/Azure-Functions-Results.csv"
 ]
 
-# Combine CSV files into one dataframe
-def combine_csv(files, output_file):
-    """Combine multiple CSV files into one and save to output_file."""
-    combined_df = pd.DataFrame()
+def read_csvs(files) -> pd.DataFrame:
+    """Read multiple CSV files into one dataframe (as text, the results store does the typing)."""
+    frames = []
 
     for file in files:
         if os.path.exists(file):
-            df = pd.read_csv(file)
-            combined_df = pd.concat([combined_df, df], ignore_index=True)
+            frames.append(pd.read_csv(file, dtype=str, keep_default_na=False, na_values=[""]))
         else:
             print(f"File not found: {file}")
 
-    combined_df.to_csv(output_file, index=False)
-    print(f"Combined file saved to {output_file}")
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
+def import_results(files, platform, clean=None):
+    """
+    Import result csv files into the results store. The run id is fixed per platform, so
+    running this again replaces the imported files instead of adding duplicates.
+    """
+    df = read_csvs(files)
+    if df.empty:
+        print(f"No {platform} results to import")
+        return
 
+    if clean is not None:
+        df = clean(df)
 
-def azure_clean_cols(file_name):
+    # The Azure Python verify and encrypt rows ran with the public key in process
+    df = results_store.fill_legacy_crypto_mode(df, platform)
 
-    cleaned_df = pd.DataFrame()
+    results_store.append(df, platform, results_store_root, run_id=f"import-{platform}")
 
-    df = pd.read_csv(file_name)
-    cleaned_df = pd.concat([cleaned_df, df], ignore_index=True)
+def azure_clean_cols(df: pd.DataFrame) -> pd.DataFrame:
 
-    cleaned_df["instance_type"] = df["instance_type"].str.replace("standard_", "", regex=True)
+    df["instance_type"] = df["instance_type"].str.replace("standard_", "", regex=True)
 
-    cleaned_df.to_csv("clean-azure-vm.csv", index=False)
+    return df
 
 
 # Main script
 if __name__ == "__main__":
-    # Combine Lambda results
-    #combine_csv(lambda_files, "Lambda-Results.csv")
+    # Import Lambda results
+    import_results(lambda_files, "lambda")
+
+    # Import EC2 results
+    import_results(ec2_files, "ec2")
 
-    # Combine EC2 results
-    #combine_csv(ec2_files, "EC2-Results.csv")
-    
-    # Combine Azure VM results into single file.
+    # Import Azure VM results, without the standard_ prefix on instance types
+    import_results(azure_vm_files, "azure_vm", azure_clean_cols)
 
-    combine_csv(azure_vm_files, "Azure-VM-Results.csv")
+    # Import Azure Functions results
+    import_results(azure_function_files, "azure_function")
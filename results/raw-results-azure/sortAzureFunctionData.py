@@ -1,143 +1,42 @@
-import pandas as pd
-from datetime import datetime
-import json
-import pytz
-def load_benchmark_data(json_file):
-    """Load and parse benchmark JSON file"""
-    benchmark_windows = []
-    with open(json_file, 'r') as f:
-        data = json.load(f)
-        for entry in data:
-            benchmark_windows.append({
-                'operation_name': entry['operationName'],
-                'start_time': entry['benchmarktimes'][0],
-                'end_time': entry['benchmarktimes'][1],
-                'start_type': entry['start_type']
-            })
-    return benchmark_windows
+import argparse
+import os
+import sys
 
+# Shared helpers live in benchmarkcommon at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from benchmarkcommon import app_insights
+from benchmarkcommon import results_store
 
-def load_csv_data(csv_file_name):
 
-    df = pd.read_csv(csv_file_name, encoding='utf-7')
-
-    cleaned_df = df[['timestamp', 'name', 'customDimensions']]
-
-    cleaned_df['timestamp'] = cleaned_df['timestamp'].apply(format_timestamp)
-
-    cleaned_df['name'] = cleaned_df['name'].apply(format_op_names)
-
-    return cleaned_df
-
-def split_operation_name(s):
-    # First get the language by splitting on first underscore
-    language = s.split('_', 1)[0]
-
-    if language == "dotnet":
-        language = "c#"
-    # Then get everything between the first underscore and '_program' if it exists
-    operation = s.split('_', 1)[1]
-    if '_program' in operation:
-        operation = operation.replace('_program', '')
-        
-    return language, operation
-
-def format_timestamp(original_time):
-
-    # Parse the timestamp assuming it is already in UTC
-    dt = datetime.strptime(original_time, "%m/%d/%Y, %I:%M:%S.%f %p")
-
-    # Format to ISO 8601 (UTC)
-    formatted_time = dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-    dt_object = datetime.strptime(formatted_time, "%Y-%m-%dT%H:%M:%S.%fZ")
-    return dt_object 
-
-
-def format_op_names(s):
-    # First get the language by splitting on first underscore
-    language = s.split('_', 1)[0]
-
-    if language == "dotnet":
-        language = "c#"
-    
-    # Then get everything between the first underscore and '_program' if it exists
-    operation = s.split('_', 1)[1]
-    if '_program' in operation:
-        operation = operation.replace('_program', '')
-
-    cleaned_op = f"{language}_{operation}"
-        
-    return cleaned_op
-
-def get_benchmark_rows(bench_data_json, data_csv):
-    data_rows = []
-
-    for row in bench_data_json:
-        operationname = row['operation_name']
-
-        start_time = row['start_time']
-        end_time = row['end_time']
-
-        # Convert benchmark times to datetime objects for comparison
-        start_time_dt = datetime.strptime(start_time, "%Y-%m-%dT%H:%M:%SZ")
-        end_time_dt = datetime.strptime(end_time, "%Y-%m-%dT%H:%M:%SZ")
-        
-        # Grab the values between start and end time, match the operation name.
-        # Filter the DataFrame
-        filtered_rows = data_csv[
-            (data_csv['timestamp'] >= start_time_dt) &
-            (data_csv['timestamp'] <= end_time_dt) &
-            (data_csv['name'] == operationname)
-        ]
-
-        for index, filtered_row in filtered_rows.iterrows():
-            # Grab the json from the customDimensions
-            customDimensionStr = filtered_row['customDimensions']
-            customDimensionJson = json.loads(customDimensionStr)
-            
-            new_data_row = {}
-
-            start_type = row['start_type']
-
-            language, operation = split_operation_name(operationname)
-
-            new_data_row['start_type'] = start_type
-            new_data_row['language'] = language
-            new_data_row['architecture'] = 'x86'
-            new_data_row['operation'] = operation
-            new_data_row['execution_time_ms'] = customDimensionJson['FunctionExecutionTimeMs']
-
-
-            data_rows.append(new_data_row)
-
-    return data_rows
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark rows of the Azure Functions App Insights export")
+    parser.add_argument("--data-file", default="azurefunctionx86Data.csv", help="App Insights requests exported from the portal as CSV")
+    parser.add_argument("--times-files", default="cold-azurefunc-BenchmarkTimes.json,warm-azurefunc-BenchmarkTimes.json", help="Comma separated benchmark windows saved by benchmarkAzureFunction.py")
+    parser.add_argument("--encoding", default="utf-7", help="Encoding of the export")
+    parser.add_argument("--block-mb", type=int, default=64, help="MB of the export read and joined at a time")
+    parser.add_argument("--output", default="azurefunc-benchmarktimes.csv")
+    parser.add_argument("--results-store", default=None, help="Also append the rows to this results store")
+    parser.add_argument("--workspace-id", default=None, help="Query the windows' requests from this Log Analytics workspace instead of reading --data-file")
+    parser.add_argument("--query-stub", default=None, help="With --workspace-id: query endpoint of the local stub, e.g. https://127.0.0.1:8080/v1")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    data_file = "azurefunctionx86Data.csv"
-    warm_times = "warm-azurefunc-BenchmarkTimes.json"
-    cold_times = "cold-azurefunc-BenchmarkTimes.json"
-
-    # Define CSV file path
-    output_csv_file = 'azurefunc-benchmarktimes.csv'
-
+    args = parse_args()
 
-    csv_data_df = load_csv_data(data_file)
+    windows = app_insights.load_windows(args.times_files.split(","))
+    print(f"Loaded {len(windows)} benchmark windows")
 
-    cold_benchmark_data = load_benchmark_data(cold_times)
+    if args.workspace_id:
+        from benchmarkcommon import app_insights_query
+        df = app_insights_query.export_rows(app_insights_query.get_logs_client(args.query_stub), args.workspace_id, windows)
+    else:
+        df = app_insights.ingest_csv(args.data_file, windows, args.encoding, args.block_mb)
+    print(df.groupby(["start_type", "language"]).size())
 
-    cold_rows = get_benchmark_rows(cold_benchmark_data, csv_data_df)
-    warm_benchmark_data = load_benchmark_data(warm_times)
-
-    warm_rows = get_benchmark_rows(warm_benchmark_data, csv_data_df)
-    final_data_rows = cold_rows + warm_rows
-    print(final_data_rows)
-    # Convert list of dictionaries to a DataFrame
-    df = pd.DataFrame(final_data_rows)
     # Write the DataFrame to a CSV file
-    df.to_csv(output_csv_file, index=False)
-
-    print(f"Data written to {output_csv_file}")
-
+    df.to_csv(args.output, index=False)
+    print(f"Data written to {args.output}")
 
-    
+    if args.results_store:
+        results_store.append(df, "azure_function", args.results_store)